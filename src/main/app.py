@@ -1,3 +1,5 @@
+import threading
+
 from PyQt6.QtWidgets import QMainWindow, QTabWidget, QWidget, QVBoxLayout, QTextEdit, QLabel
 from PyQt6.QtCore import Qt
 from src.ui.single_gen import SingleGenTab
@@ -6,6 +8,8 @@ from src.ui.settings import SettingsTab
 from src.utils.config_manager import ConfigManager
 from src.utils.api_manager import APIManager
 from src.utils.history_manager import HistoryManager
+from src.utils.retention import RetentionService
+from src.utils.trash import Trash, configured_trash_dir
 
 class HelpTab(QWidget):
     """帮助标签页"""
@@ -87,6 +91,14 @@ class MainWindow(QMainWindow):
         # 初始化历史记录管理器
         self.history_manager = HistoryManager()
         
+        # 在后台按保留策略清理历史记录和输出文件（未启用时不做任何事）
+        self.retention = RetentionService(self.history_manager, self.config, parent=self)
+        self.retention.start()
+        
+        # 清除回收站中过期的批次（不必等到下一次删除）
+        trash = Trash(configured_trash_dir(self.config))
+        threading.Thread(target=trash.expire, daemon=True).start()
+        
         # 创建标签页
         self.init_tabs()
         
@@ -98,11 +110,10 @@ class MainWindow(QMainWindow):
         # 创建各个标签页
         self.single_gen_tab = SingleGenTab(self.api_manager, self.config, self.history_manager)
         self.batch_gen_tab = BatchGenTab(self.api_manager, self.config, self.history_manager)
-        self.settings_tab = SettingsTab(self.config, self.api_manager)
+        self.settings_tab = SettingsTab(self.config, self.api_manager, self.history_manager)
         self.help_tab = HelpTab()
         
-        # 连接设置更新信号
-        self.settings_tab.settings_updated.connect(self.single_gen_tab.update_defaults)
+        # 连接设置更新信号（手动生成页订阅默认参数的变化，只在其修改后更新）
         self.settings_tab.settings_updated.connect(self.batch_gen_tab.update_defaults)
         
         # 添加标签页
@@ -112,7 +123,15 @@ class MainWindow(QMainWindow):
         tabs.addTab(self.help_tab, "帮助")
         
         # 设置中心部件
-        self.setCentralWidget(tabs) 
+        self.setCentralWidget(tabs)
+    
+    def closeEvent(self, event):
+        """关闭窗口时取消进行中的生成请求，避免线程在后台继续运行"""
+        self.single_gen_tab.shutdown()
+        self.batch_gen_tab.shutdown()
+        self.retention.stop()
+        self.config.flush()  # 写入尚未保存的配置修改
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     import sys
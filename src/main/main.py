@@ -12,8 +12,11 @@ sys.path.insert(0, project_root)
 
 from PyQt6.QtWidgets import QApplication
 from src.main.app import MainWindow
+from src.utils.log_manager import setup_logging
 
 def main():
+    # 日志写入程序目录下的 logs/app.log
+    setup_logging(os.path.join(project_root, "logs"))
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -1,13 +1,18 @@
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class GenerationTask:
-    """生成任务类"""
+    """生成任务类
+    
+    只用于描述待添加的任务，加入任务队列后由 TaskStore 统一保存。
+    """
     prompt: str
     model: str
     size: str
     status: str = "等待中"
     result_path: str = None
+    job: str = "default"  # 所属作业，同优先级的作业轮流处理
+    priority: int = 0  # 优先级，数值大的先处理
     
     def __post_init__(self):
         """初始化后处理"""
@@ -0,0 +1,274 @@
+import threading
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+# 任务状态按小整数保存，编号即在此元组中的位置
+STATUS_NAMES = ("等待中", "处理中", "完成", "失败", "已取消")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# 字符串字段: 默认值。值保存在共享的字符串表中，列中只保存编号
+STRING_FIELDS = {
+    "prompt": "",
+    "negative_prompt": "",
+    "model": "",
+    "size": "",
+    "job": "default",
+}
+
+# 数值字段: (类型, 默认值)
+NUMERIC_FIELDS = {
+    "priority": (np.int32, 0),
+    "steps": (np.int32, 20),
+    "guidance": (np.float64, 7.5),
+    "batch_size": (np.int32, 1),
+    "seed": (np.int64, -1),
+    "enhance_prompt": (np.bool_, False),
+    "enqueued_at": (np.float64, 0.0),
+}
+
+# 只有少数任务有值的字段，按行号保存在字典中
+SPARSE_FIELDS = ("result_path", "result", "error")
+
+FIELDS = tuple(STRING_FIELDS) + ("status",) + tuple(NUMERIC_FIELDS) + SPARSE_FIELDS
+
+
+def status_code(status: str) -> int:
+    """状态名称对应的编号"""
+    try:
+        return STATUS_CODES[status]
+    except KeyError:
+        raise ValueError(f"未知的任务状态: {status}") from None
+
+
+class StringTable:
+    """字符串表，相同的字符串（模型、尺寸、重复的提示词）只保存一份"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._values: List[str] = []
+
+    def intern(self, value: str) -> int:
+        """返回字符串的编号，新字符串加入表中"""
+        key = self._ids.get(value)
+        if key is None:
+            key = self._ids[value] = len(self._values)
+            self._values.append(value)
+        return key
+
+    def __getitem__(self, key: int) -> str:
+        return self._values[key]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class TaskStore:
+    """按列保存的任务存储
+
+    每个字段一列 numpy 数组，字符串保存为字符串表中的编号，状态保存为
+    int8，结果和错误信息按行号稀疏保存。各列每个任务约60字节；提示词
+    各不相同时字符串表占用更多，百万级任务实测共约220MB。统计各状态的
+    任务数不需要逐个遍历任务对象。读写都在同一把锁中进行。
+
+    通过下标或迭代得到的是 TaskView，读写直接作用于存储，
+    存储是任务数据唯一的来源。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._initial_capacity = max(capacity, 1)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        capacity = self._initial_capacity
+        self.strings = StringTable()
+        self._size = 0
+        self._capacity = capacity
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(capacity, np.int32) for name in STRING_FIELDS}
+        self._columns["status"] = np.zeros(capacity, np.int8)
+        for name, (dtype, default) in NUMERIC_FIELDS.items():
+            self._columns[name] = np.full(capacity, default, dtype)
+        self._sparse: Dict[str, Dict[int, Any]] = {name: {} for name in SPARSE_FIELDS}
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(self._capacity, column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> "TaskView":
+        if index < 0:
+            index += self._size
+        self._check(index)
+        return TaskView(self, index)
+
+    def __iter__(self) -> Iterator["TaskView"]:
+        for index in range(self._size):
+            yield TaskView(self, index)
+
+    def _check(self, index: int) -> None:
+        if not 0 <= index < self._size:
+            raise IndexError(f"任务序号超出范围: {index}")
+
+    @property
+    def nbytes(self) -> int:
+        """各列数组占用的字节数（不含字符串表和稀疏字段）"""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def append(self, task) -> "TaskView":
+        """添加任务
+
+        Args:
+            task: 任务字典或带有同名属性的对象（如 GenerationTask），
+                缺少的字段使用默认值
+
+        Returns:
+            TaskView: 新任务的视图
+        """
+        if isinstance(task, Mapping):
+            get = task.get
+        else:
+            def get(name):
+                return getattr(task, name, None)
+
+        with self._lock:
+            if self._size == self._capacity:
+                self._grow()
+            index = self._size
+            for name, default in STRING_FIELDS.items():
+                value = get(name)
+                self._columns[name][index] = self.strings.intern(default if value is None else str(value))
+            self._columns["status"][index] = status_code(get("status") or STATUS_NAMES[0])
+            for name, (_, default) in NUMERIC_FIELDS.items():
+                value = get(name)
+                self._columns[name][index] = default if value is None else value
+            for name in SPARSE_FIELDS:
+                value = get(name)
+                if value is not None:
+                    self._sparse[name][index] = value
+            self._size += 1
+        return TaskView(self, index)
+
+    def extend(self, tasks: Iterable) -> range:
+        """批量添加任务，返回新任务的序号范围"""
+        start = self._size
+        for task in tasks:
+            self.append(task)
+        return range(start, self._size)
+
+    def get(self, index: int, name: str) -> Any:
+        """读取任务字段"""
+        with self._lock:
+            self._check(index)
+            if name in STRING_FIELDS:
+                return self.strings[int(self._columns[name][index])]
+            if name == "status":
+                return STATUS_NAMES[self._columns["status"][index]]
+            if name in NUMERIC_FIELDS:
+                return self._columns[name][index].item()
+            if name in SPARSE_FIELDS:
+                return self._sparse[name].get(index)
+        raise KeyError(name)
+
+    def set(self, index: int, name: str, value: Any) -> None:
+        """修改任务字段"""
+        with self._lock:
+            self._check(index)
+            if name in STRING_FIELDS:
+                text = STRING_FIELDS[name] if value is None else str(value)
+                self._columns[name][index] = self.strings.intern(text)
+            elif name == "status":
+                self._columns["status"][index] = status_code(value)
+            elif name in NUMERIC_FIELDS:
+                self._columns[name][index] = value
+            elif name in SPARSE_FIELDS:
+                if value is None:
+                    self._sparse[name].pop(index, None)
+                else:
+                    self._sparse[name][index] = value
+            else:
+                raise KeyError(name)
+
+    def column(self, name: str) -> List:
+        """读取一列的全部值"""
+        with self._lock:
+            if name in STRING_FIELDS:
+                values = self.strings
+                return [values[key] for key in self._columns[name][:self._size].tolist()]
+            if name == "status":
+                return [STATUS_NAMES[code] for code in self._columns["status"][:self._size].tolist()]
+            if name in NUMERIC_FIELDS:
+                return self._columns[name][:self._size].tolist()
+            if name in SPARSE_FIELDS:
+                return [self._sparse[name].get(index) for index in range(self._size)]
+        raise KeyError(name)
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._lock:
+            counts = np.bincount(self._columns["status"][:self._size], minlength=len(STATUS_NAMES))
+        return {name: int(count) for name, count in zip(STATUS_NAMES, counts)}
+
+    def count(self, *statuses: str) -> int:
+        """处于指定状态之一的任务数"""
+        counts = self.counts()
+        return sum(counts[status] for status in statuses)
+
+    def indices(self, status: str) -> np.ndarray:
+        """处于指定状态的任务序号"""
+        code = status_code(status)
+        with self._lock:
+            return np.flatnonzero(self._columns["status"][:self._size] == code)
+
+    def clear(self) -> None:
+        """清空任务并释放存储空间，之前取得的 TaskView 不再可用"""
+        with self._lock:
+            self._reset()
+
+
+class TaskView(MutableMapping):
+    """任务存储中一行的视图
+
+    同时支持属性访问（task.status）和字典访问（task["prompt"]），
+    兼容原来以字典表示的批量任务，读写直接作用于存储。
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: TaskStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, name: str) -> Any:
+        return self.store.get(self.index, name)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self.store.set(self.index, name, value)
+
+    def __delitem__(self, name: str) -> None:
+        raise TypeError("任务字段不能删除")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"TaskView({self.index}, prompt={self.prompt!r}, status={self.status!r})"
+
+
+def _field(name: str) -> property:
+    return property(lambda self: self.store.get(self.index, name),
+                    lambda self, value: self.store.set(self.index, name, value))
+
+
+for _name in FIELDS:
+    setattr(TaskView, _name, _field(_name))
+del _name
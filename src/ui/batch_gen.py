@@ -1,44 +1,109 @@
 import os
+import time
 import random
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from threading import Event, Lock
 import pandas as pd
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-    QGroupBox, QListWidget, QListWidgetItem, QTextEdit,
-    QFileDialog, QMessageBox
+    QGroupBox, QListView, QTextEdit,
+    QFileDialog, QMessageBox, QLabel
 )
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QPixmap, QIcon
 
-from src.utils.api_client import SiliconFlowAPI
+from src.utils.api_client import SiliconFlowAPI, CircuitOpenError
 from src.utils.api_manager import APIManager
 from src.utils.config_manager import ConfigManager
 from src.utils.history_manager import HistoryManager
+from src.utils.dedup_index import compute_content_hash, get_dedup_index
+from src.utils.telemetry import Telemetry, get_telemetry
+from src.utils.progress import ProgressTracker, summary_text
+from src.utils.concurrency import AIMDController, create_controller, error_status
+from src.utils.cancellation import CancelToken, OperationCancelled
+from src.utils.scheduler import PRIORITY_NORMAL
+from src.utils.sweep import AXIS_LABELS, CONTACT_SHEET_DIR, write_contact_sheets
+from src.utils.output_layout import get_output_layout
+from src.utils.preset_manager import PresetManager
+from src.models.task_store import TaskStore
+from src.ui.task_list_model import TaskListModel
+from src.ui.sweep_dialog import SweepDialog
 
 class BatchGenerationThread(QThread):
     """批量生成线程"""
-    progress = pyqtSignal(str)  # 进度信号
+    progress_updated = pyqtSignal(dict)  # 进度快照信号（限频发送）
     error = pyqtSignal(str)     # 错误信号
     finished = pyqtSignal(list)  # 完成信号，传递生成的文件列表
     image_saved = pyqtSignal(dict)  # 单张图片保存完成信号
+    task_status = pyqtSignal(int, str, str)  # 任务状态信号（任务序号、状态、第一张图片路径）
     
-    def __init__(self, api, prompts, params, save_dir, naming_rule):
+    def __init__(self, api, prompts, params, save_dir, naming_rule,
+                 dedup_index=None, dedup_mode="off", concurrency=None, deadline=None, sweep=None,
+                 layout=None, job=""):
         super().__init__()
         self.api = api
         self.prompts = prompts
         self.params = params
+        self.sweep = sweep  # 参数扫描，不为None时按扫描点生成（忽略 prompts 和 params）
+        self.sweep_images = {}  # 扫描点序号 -> 图片路径
+        self.contact_sheets = []  # 参数扫描结束后生成的对比图
         self.save_dir = save_dir
         self.naming_rule = naming_rule
+        self.layout = layout  # 输出目录布局，为None时直接保存到 save_dir
+        self.job = job  # 作业名称，按作业分目录时使用
+        self.dedup_index = dedup_index  # 去重索引，为None时不去重
+        self.dedup_mode = dedup_mode  # skip: 跳过重复图片, hardlink: 以硬链接保存
         self.is_running = True
         self.saved_files = []  # 保存已生成的文件路径
+        self.telemetry = get_telemetry()  # 阶段耗时统计
+        self.run_telemetry = Telemetry()  # 本次运行期间的阶段耗时
+        # 为False时线程结束后仍统计本次运行，由界面处理完已发出的信号后调用 detach_telemetry()
+        self.detach_telemetry_on_exit = True
+        total = sweep.request_count() if sweep is not None else len(prompts)
+        self.tracker = ProgressTracker(total=total)  # 进度汇总
+        # 并发控制器，为None时逐个提示词顺序生成
+        self.concurrency = concurrency or AIMDController(initial=1, min_limit=1, max_limit=1)
+        self._save_lock = Lock()  # 多个提示词并发保存时保证文件名唯一
+        self.deadline = deadline  # 单个提示词含重试的总时限（秒），为None时不限制
+        self.cancel_token = CancelToken()  # 停止时取消进行中的请求和重试等待
+        self._resume_event = Event()  # 未设置时暂停，不再开始新的请求
+        self._resume_event.set()
     
-    def save_image(self, img_url, seeds, j, prompt, params):
+    def _log(self, text):
+        """记录一行进度，按最小间隔合并发送"""
+        self.tracker.log(text)
+        self._report_progress()
+    
+    def _report_progress(self, force=False):
+        """发送进度快照，未到发送间隔时跳过（force 为True时立即发送）"""
+        snapshot = self.tracker.poll(force=force)
+        if snapshot is not None:
+            self.progress_updated.emit(snapshot)
+    
+    def _report_error(self, message, fatal=False):
+        """记录错误（写入进度日志），整个批量生成无法继续时（fatal）再通知界面"""
+        self.tracker.add_error(message)
+        if fatal:
+            self.error.emit(message)
+        self._report_progress(force=True)
+    
+    def _wait_for_service(self, error):
+        """熔断期间等待服务恢复，不逐个把剩余的提示词判为失败
+        
+        Returns:
+            bool: 是否等到了可以重试（被停止时为False）
+        """
+        seconds = max(error.retry_after, 1.0)
+        self._log(f"• API服务暂时不可用，{seconds:.0f}秒后继续")
+        self._report_progress(force=True)
+        return not self.cancel_token.wait(seconds) and self.is_running
+    
+    def save_image(self, img_info, seeds, j, prompt, params):
         """保存单张图片并发送记录"""
         try:
-            response = requests.get(img_url, timeout=30)
-            if response.status_code != 200:
-                return None
+            # 由生成后端获取图片内容（下载URL或解码内联数据）
+            content = self.api.fetch_image(img_info)
             
             # 生成文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -52,8 +117,8 @@ class BatchGenerationThread(QThread):
                 "{date}": date,
                 "{time}": time,
                 "{prompt}": prompt[:30].replace(" ", "_"),  # 限制提示词长度
-                "{model}": self.params["model"].split("/")[-1],
-                "{size}": self.params["size"],
+                "{model}": params["model"].split("/")[-1],
+                "{size}": params["size"],
                 "{seed}": str(seeds[j]),
                 "{index}": f"{j+1:02d}"
             }
@@ -69,27 +134,53 @@ class BatchGenerationThread(QThread):
                 filename = filename[:100]
             filename = f"{filename}.png"
             
-            # 确保保存目录存在
-            os.makedirs(self.save_dir, exist_ok=True)
-            
-            # 保存图片
-            filepath = os.path.join(self.save_dir, filename)
-            
-            # 确保文件名唯一
-            base_name, ext = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(filepath):
-                new_name = f"{base_name}_{counter}{ext}"
-                filepath = os.path.join(self.save_dir, new_name)
-                counter += 1
-            
-            # 检查最终路径长度
-            if len(filepath) > 250:  # Windows MAX_PATH 限制
-                short_name = f"{j+1:02d}_{timestamp[:8]}_{seeds[j]}.png"
-                filepath = os.path.join(self.save_dir, short_name)
-            
-            with open(filepath, "wb") as f:
-                f.write(response.content)
+            # 按输出目录布局选择子目录（已创建），否则直接保存到输出目录
+            if self.layout is not None:
+                save_dir = self.layout.directory(filename, params["model"], self.job)
+            else:
+                save_dir = self.save_dir
+                os.makedirs(save_dir, exist_ok=True)
+            
+            # 确定文件名到写入完成期间加锁，避免并发保存时文件名冲突或重复写入相同内容
+            with self._save_lock:
+                # 查找内容完全相同的已有图片
+                duplicate_path = None
+                if self.dedup_index is not None:
+                    duplicate_path = self.dedup_index.lookup(compute_content_hash(content))
+                
+                # 保存图片
+                filepath = os.path.join(save_dir, filename)
+                
+                # 确保文件名唯一
+                base_name, ext = os.path.splitext(filename)
+                counter = 1
+                while os.path.exists(filepath):
+                    new_name = f"{base_name}_{counter}{ext}"
+                    filepath = os.path.join(save_dir, new_name)
+                    counter += 1
+                
+                # 检查最终路径长度
+                if len(filepath) > 250:  # Windows MAX_PATH 限制
+                    short_name = f"{j+1:02d}_{timestamp[:8]}_{seeds[j]}.png"
+                    filepath = os.path.join(save_dir, short_name)
+                
+                skipped = False
+                if duplicate_path and self.dedup_mode == "skip":
+                    # 跳过重复图片，记录指向已有文件
+                    filepath = duplicate_path
+                    skipped = True
+                    self._log(f"  - 跳过重复图片: {duplicate_path}")
+                elif duplicate_path and self.dedup_mode == "hardlink" and self._link_duplicate(duplicate_path, filepath):
+                    skipped = True
+                    self._log(f"  - 重复图片已硬链接到: {duplicate_path}")
+                else:
+                    with self.telemetry.span("disk_write"):
+                        with open(filepath, "wb") as f:
+                            f.write(content)
+                    if self.layout is not None:
+                        self.layout.add_file(save_dir)
+                    if self.dedup_index is not None:
+                        self.dedup_index.register(filepath, content)
             
             # 创建该图片的记录
             record = {
@@ -107,111 +198,264 @@ class BatchGenerationThread(QThread):
                 "image_path": filepath
             }
             
+            self.tracker.add_image(skipped=skipped)
             self.image_saved.emit(record)
             return filepath
             
         except Exception as e:
             if self.is_running:
-                self.error.emit(f"保存图片时出错: {str(e)}")
+                self._report_error(f"保存图片时出错: {str(e)}")
             return None
     
+    def _link_duplicate(self, source, filepath):
+        """为重复图片创建硬链接，失败时返回False以回退为普通写入"""
+        try:
+            os.link(source, filepath)
+            return True
+        except OSError:
+            return False
+    
     def run(self):
+        self.telemetry.add_sink(self.run_telemetry)
         try:
-            total = len(self.prompts)
-            
+            self._run_prompts()
+        finally:
+            if self.detach_telemetry_on_exit:
+                self.detach_telemetry()
+            # 持久化本次运行新增的去重索引项
+            if self.dedup_index is not None:
+                self.dedup_index.save()
+    
+    def detach_telemetry(self):
+        """之后的阶段耗时不再计入本次运行"""
+        self.telemetry.remove_sink(self.run_telemetry)
+    
+    def _finish(self):
+        """发送剩余的进度后发出完成信号"""
+        self._report_progress(force=True)
+        self.finished.emit(self.saved_files)
+    
+    def _requests(self):
+        """依次产生每次请求的 (序号, 提示词, 参数, 种子列表, 任务序号列表)，参数扫描按需展开"""
+        if self.sweep is not None:
+            for i, request in enumerate(self.sweep.requests(), 1):
+                yield i, request.prompt, request.params, request.seeds, request.points
+        else:
             for i, prompt in enumerate(self.prompts, 1):
-                if not self.is_running:
-                    self.progress.emit("生成已取消")
-                    self.finished.emit(self.saved_files)
-                    return
-                
-                # 生成随机种子列表
-                if self.params["seed"] == -1:
-                    seeds = [random.randint(1, 9999999998) for _ in range(self.params["batch_size"])]
-                else:
-                    seeds = [self.params["seed"]] * self.params["batch_size"]
-                
-                self.progress.emit(f"=== 处理第 {i}/{total} 个提示词 ===")
-                self.progress.emit(f"• 提示词: {prompt}")
-                self.progress.emit(f"• 使用模型: {self.params['model']}")
-                self.progress.emit(f"• 图片尺寸: {self.params['size']}")
-                self.progress.emit(f"• 生成步数: {self.params['steps']}")
-                self.progress.emit(f"• 引导系数: {self.params['guidance']}")
-                self.progress.emit(f"• 使用的种子值: {', '.join(map(str, seeds))}")
-                self.progress.emit("=== 调用API ===")
-                
-                try:
-                    # 调用API生成图片
-                    result = self.api.generate_image(
-                        prompt=prompt,
-                        model=self.params["model"],
-                        negative_prompt=self.params["negative_prompt"],
-                        size=self.params["size"],
-                        batch_size=self.params["batch_size"],
-                        num_inference_steps=self.params["steps"],
-                        guidance_scale=self.params["guidance"],
-                        prompt_enhancement=False,
-                        seeds=seeds
-                    )
-                    
+                yield i, prompt, self.params, None, None
+    
+    def _run_prompts(self):
+        try:
+            if self.sweep is not None:
+                axes = " × ".join(f"{AXIS_LABELS[name]}({len(values)})" for name, values in self.sweep.axes)
+                self._log(f"• 参数扫描: {axes}，共 {len(self.sweep)} 个组合，{self.tracker.total} 次请求")
+            else:
+                # 所有提示词共用同一组参数，只输出一次
+                self._log(f"• 使用模型: {self.params['model']}")
+                self._log(f"• 图片尺寸: {self.params['size']}")
+                self._log(f"• 生成步数: {self.params['steps']}")
+                self._log(f"• 引导系数: {self.params['guidance']}")
+            
+            if self.concurrency.max_limit == 1:
+                for request in self._requests():
                     if not self.is_running:
-                        self.progress.emit("生成已取消")
-                        self.finished.emit(self.saved_files)
-                        return
-                    
-                    # 处理生成的图片
-                    images = result.get("data", [])
-                    for j, img_info in enumerate(images):
+                        break
+                    self._process_prompt(*request)
+            else:
+                # 工作线程数取并发上限的最大值，实际同时进行的请求数由控制器决定；
+                # 按需提交，等待中的请求不超过工作线程数的两倍，参数扫描不会一次展开全部请求
+                limit = self.concurrency.max_limit
+                with ThreadPoolExecutor(max_workers=limit) as executor:
+                    pending = set()
+                    for request in self._requests():
                         if not self.is_running:
-                            self.progress.emit("生成已取消")
-                            self.finished.emit(self.saved_files)
-                            return
-                        
-                        img_url = img_info.get("url")
-                        if not img_url:
-                            continue
-                            
-                        # 保存图片并获取文件路径
-                        filepath = self.save_image(img_url, seeds, j, prompt, self.params)
-                        if filepath:
-                            self.saved_files.append(filepath)
-                            self.progress.emit(f"• 已保存第 {j+1}/{len(images)} 张图片")
-                            self.progress.emit(f"  - 种子值: {seeds[j]}")
-                            self.progress.emit(f"  - 提示词: {prompt[:50]}...")
-                            self.progress.emit(f"  - 保存路径: {filepath}")
-                
-                except Exception as e:
-                    if self.is_running:
-                        self.error.emit(f"生成第{i}个提示词时出错: {str(e)}")
-                    continue
+                            break
+                        if len(pending) >= limit * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                future.result()
+                        pending.add(executor.submit(self._process_prompt, *request))
+                    for future in pending:
+                        future.result()
+            
+            if self.sweep is not None and self.sweep_images:
+                self._write_contact_sheets()
             
             if self.is_running:
-                self.progress.emit("生成完成")
+                self._log("生成完成")
             else:
-                self.progress.emit("生成已取消")
+                self._log("生成已取消")
             
-            self.finished.emit(self.saved_files)
+            self._finish()
             
         except Exception as e:
             if self.is_running:
-                self.error.emit(f"批量生成过程出错: {str(e)}")
-            self.finished.emit(self.saved_files)
+                self._report_error(f"批量生成过程出错: {str(e)}", fatal=True)
+            self._finish()
+    
+    def _write_contact_sheets(self):
+        """把参数扫描的结果排列成对比图"""
+        try:
+            prefix = f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            self.contact_sheets = write_contact_sheets(
+                self.sweep, self.sweep_images, os.path.join(self.save_dir, CONTACT_SHEET_DIR), prefix
+            )
+            for path in self.contact_sheets:
+                self._log(f"• 已生成对比图: {path}")
+        except Exception as e:
+            self._report_error(f"生成对比图时出错: {str(e)}")
+    
+    def _process_prompt(self, i, prompt, params=None, seeds=None, rows=None):
+        """生成并保存一次请求的图片（在工作线程中执行）
+        
+        Args:
+            i: 请求序号（从1开始）
+            prompt: 提示词
+            params: 生成参数，为None时使用共用的参数
+            seeds: 种子列表，为None时按参数中的种子生成
+            rows: 各图片对应的任务序号，为None时为第 i 个任务
+        """
+        params = params or self.params
+        rows = rows or [i - 1]
+        # 等待恢复和并发名额，期间检查是否已取消；等待并发名额的时间计为排队耗时
+        ticket = None
+        waited = 0.0
+        while ticket is None:
+            if not self.is_running:
+                return
+            if not self._resume_event.wait(timeout=0.1):
+                continue
+            start = time.monotonic()
+            ticket = self.concurrency.acquire(timeout=0.1)
+            waited += time.monotonic() - start
+        self.telemetry.record("queue_wait", waited)
+        
+        status = None
+        cancelled = True  # 没有得到请求结果时归还名额，但不调整并发上限
+        start = time.monotonic()
+        try:
+            if not self.is_running:
+                return
+            
+            # 生成随机种子列表（参数扫描的种子轴已指定种子）
+            if seeds is None:
+                if params["seed"] == -1:
+                    seeds = [random.randint(1, 9999999998) for _ in range(params["batch_size"])]
+                else:
+                    seeds = [params["seed"]] * params["batch_size"]
+            
+            self.tracker.start_prompt(prompt)
+            self._emit_status(rows, "处理中")
+            self._log(f"=== 处理第 {i}/{self.tracker.total} 个提示词 ===")
+            self._log(f"• 提示词: {prompt}")
+            if self.sweep is not None:
+                self._log(f"• 参数: {self.sweep.label(rows[0])}")
+            self._log(f"• 使用的种子值: {', '.join(map(str, seeds))}")
+            
+            # 调用API前先把本提示词的信息发出去
+            self._report_progress(force=True)
+            
+            try:
+                # 调用API生成图片，熔断期间等待服务恢复后重试
+                while True:
+                    try:
+                        result = self._generate(prompt, params, seeds)
+                        break
+                    except CircuitOpenError as e:
+                        if not self._wait_for_service(e):
+                            raise OperationCancelled("操作已取消")
+                        start = time.monotonic()
+                status, cancelled = 200, False
+            except OperationCancelled:
+                self._emit_status(rows, "等待中")
+                return
+            except Exception as e:
+                status, cancelled = error_status(e), False
+                self.tracker.finish_prompt()
+                self._emit_status(rows, "失败")
+                if self.is_running:
+                    self._report_error(f"生成第{i}个提示词时出错: {str(e)}")
+                return
+        finally:
+            if cancelled:
+                self.concurrency.abandon(ticket)
+            else:
+                self.concurrency.release(ticket, time.monotonic() - start, status)
+        
+        # 处理生成的图片（不占用并发名额）
+        images = result.get("data", [])
+        saved = []
+        first_paths = {}  # 任务序号 -> 第一张图片路径
+        for j, img_info in enumerate(images):
+            if not self.is_running:
+                break
+            
+            # 保存图片并获取文件路径
+            filepath = self.save_image(img_info, seeds, j, prompt, params)
+            if filepath:
+                saved.append(filepath)
+                self.saved_files.append(filepath)
+                # 打包的请求中每张图片对应一个任务
+                first_paths.setdefault(rows[min(j, len(rows) - 1)], filepath)
+                self._log(f"• 已保存第 {j+1}/{len(images)} 张图片 (种子值: {seeds[j]}): {filepath}")
+        
+        self.tracker.finish_prompt()
+        if self.sweep is not None:
+            self.sweep_images.update(first_paths)
+        for row in rows:
+            path = first_paths.get(row, "")
+            self.task_status.emit(row, "完成" if path else "失败", path)
+    
+    def _generate(self, prompt, params, seeds):
+        """调用API生成一次请求的图片"""
+        return self.api.generate_image(
+            prompt=prompt,
+            model=params["model"],
+            negative_prompt=params["negative_prompt"],
+            size=params["size"],
+            batch_size=params["batch_size"],
+            num_inference_steps=params["steps"],
+            guidance_scale=params["guidance"],
+            prompt_enhancement=False,
+            seeds=seeds,
+            cancel=self.cancel_token,
+            deadline=self.deadline
+        )
+    
+    def _emit_status(self, rows, status):
+        """发送一次请求中各任务的状态"""
+        for row in rows:
+            self.task_status.emit(row, status, "")
     
     def stop(self):
-        """停止生成"""
+        """停止生成，进行中的请求和重试等待立即结束"""
         self.is_running = False
+        self._resume_event.set()
+        self.cancel_token.cancel()
+    
+    def pause(self):
+        """暂停生成：不再开始新的请求，进行中的请求完成后保存结果"""
+        self._resume_event.clear()
+    
+    def resume(self):
+        """恢复生成"""
+        self._resume_event.set()
 
 class BatchGenTab(QWidget):
     """批量生成标签页"""
     
+    MAX_LOG_LINES = 2000  # 进度日志最多保留的行数，超出后丢弃最早的行
+    
     def __init__(self, api_manager, config_manager, history_manager):
         super().__init__()
         self.api_manager = api_manager
         self.config_manager = config_manager
         self.history_manager = history_manager
-        self.tasks = []
+        self.task_model = TaskListModel()  # 任务列表模型，任务数据保存在其中的 TaskStore
         self.current_task_index = 0
         self.is_cancelling = False
+        self._dedup_index = None  # 去重索引，首次启用去重时加载
+        self._preset_manager = None  # 预设管理器，首次打开参数扫描时加载
         
         # 创建按钮
         self.start_btn = QPushButton("开始生成")
@@ -221,6 +465,9 @@ class BatchGenTab(QWidget):
         self.clear_btn = QPushButton("清空任务")
         self.import_btn = QPushButton("导入Excel参数")
         self.template_btn = QPushButton("下载参数模板")
+        self.sweep_btn = QPushButton("参数扫描")
+        self.export_stats_btn = QPushButton("导出耗时统计")
+        self.export_stats_btn.setToolTip("导出上一次生成各阶段的耗时（JSON或Prometheus文本格式）")
         
         # 设置按钮初始状态
         self.start_btn.setEnabled(False)
@@ -228,6 +475,7 @@ class BatchGenTab(QWidget):
         self.resume_btn.setEnabled(False)
         self.cancel_btn.setEnabled(False)
         self.clear_btn.setEnabled(False)
+        self.export_stats_btn.setEnabled(False)
         
         # 连接按钮点击事件
         self.start_btn.clicked.connect(self.on_generate_clicked)
@@ -237,6 +485,8 @@ class BatchGenTab(QWidget):
         self.clear_btn.clicked.connect(self.clear_tasks)
         self.import_btn.clicked.connect(self.import_excel)
         self.template_btn.clicked.connect(self.download_template)
+        self.sweep_btn.clicked.connect(self.open_sweep_dialog)
+        self.export_stats_btn.clicked.connect(self.export_stats)
         
         # 初始化界面
         self.init_ui()
@@ -248,34 +498,79 @@ class BatchGenTab(QWidget):
         scrollbar = self.progress_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
+    def on_progress_updated(self, snapshot):
+        """处理进度快照：刷新摘要并一次性追加期间累积的日志"""
+        self.summary_label.setText(summary_text(snapshot))
+        if snapshot["recent_errors"]:
+            self.summary_label.setToolTip("最近的错误:\n" + "\n".join(snapshot["recent_errors"]))
+        if snapshot["lines"]:
+            self.update_progress_text("\n".join(snapshot["lines"]))
+    
     def on_generation_error(self, error_msg):
-        """处理生成错误"""
+        """处理导致批量生成中止的错误（单个提示词的错误只写入进度日志）
+        
+        生成线程随后发出完成信号，界面状态在 on_generation_finished 中恢复。
+        """
         QMessageBox.warning(self, "错误", error_msg)
-        # 恢复界面状态
-        self.start_btn.setEnabled(True)
-        self.pause_btn.setEnabled(False)
-        self.resume_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(False)
-        self.clear_btn.setEnabled(True)
-        self.import_btn.setEnabled(True)
     
     def on_generation_finished(self, saved_files):
         """生成完成的处理"""
+        # 从调度器注销本次批量作业
+        if getattr(self, "_job_api", None) is not None:
+            self._job_api.close()
+            self._job_api = None
+        
+        # 之前发出的图片保存信号都已处理，停止统计本次运行
+        if getattr(self, "gen_thread", None) is not None:
+            self.gen_thread.detach_telemetry()
+        
         # 恢复界面状态
-        self.start_btn.setEnabled(True)
-        self.pause_btn.setEnabled(False)
-        self.resume_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(False)
-        self.clear_btn.setEnabled(True)
-        self.import_btn.setEnabled(True)
+        self._reset_buttons()
+        
+        self.export_stats_btn.setEnabled(getattr(self, "gen_thread", None) is not None)
         
         if self.is_cancelling:
             self.update_progress_text(f"已取消生成，保存了{len(saved_files)}张图片")
             self.is_cancelling = False
         else:
             self.update_progress_text("生成完成！")
+            # 显示各阶段耗时，便于定位慢的环节
+            gen_thread = getattr(self, "gen_thread", None)
+            summary = gen_thread.run_telemetry.summary_lines() if gen_thread is not None else []
+            if summary:
+                self.update_progress_text("=== 各阶段耗时 ===\n" + "\n".join(summary))
+            # 使用多个API密钥时显示各密钥的使用情况
+            key_summary = self.api_manager.key_summary_lines()
+            if key_summary:
+                self.update_progress_text("=== API密钥使用情况 ===\n" + "\n".join(key_summary))
+            # 显示并发上限的调整情况
+            if gen_thread is not None and gen_thread.concurrency.max_limit > 1:
+                self.update_progress_text("=== 并发控制 ===\n" + "\n".join(gen_thread.concurrency.summary_lines()))
+            # 参数扫描的对比图
+            if gen_thread is not None and gen_thread.contact_sheets:
+                self.update_progress_text("=== 对比图 ===\n" + "\n".join(gen_thread.contact_sheets))
+            failed = gen_thread.tracker.errors if gen_thread is not None else 0
             if saved_files:
-                QMessageBox.information(self, "完成", f"批量生成完成，已保存{len(saved_files)}张图片！")
+                message = f"批量生成完成，已保存{len(saved_files)}张图片！"
+                if failed:
+                    message += f"\n有{failed}个错误，详见进度日志。"
+                QMessageBox.information(self, "完成", message)
+
+    def export_stats(self):
+        """导出上一次生成各阶段的耗时"""
+        gen_thread = getattr(self, "gen_thread", None)
+        if gen_thread is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出耗时统计", "", "JSON Files (*.json);;Prometheus Files (*.prom)"
+        )
+        if not file_path:
+            return
+        try:
+            gen_thread.run_telemetry.export(file_path)
+            QMessageBox.information(self, "成功", f"耗时统计已导出到: {file_path}")
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导出耗时统计失败: {str(e)}")
 
     def init_ui(self):
         """初始化界面"""
@@ -292,6 +587,12 @@ class BatchGenTab(QWidget):
         excel_layout.addWidget(self.template_btn)
         excel_group.setLayout(excel_layout)
         
+        # 参数扫描
+        sweep_group = QGroupBox("参数扫描")
+        sweep_layout = QVBoxLayout()
+        sweep_layout.addWidget(self.sweep_btn)
+        sweep_group.setLayout(sweep_layout)
+        
         # 生成控制按钮
         control_group = QGroupBox("生成控制")
         control_layout = QVBoxLayout()
@@ -300,10 +601,12 @@ class BatchGenTab(QWidget):
         control_layout.addWidget(self.resume_btn)
         control_layout.addWidget(self.cancel_btn)
         control_layout.addWidget(self.clear_btn)
+        control_layout.addWidget(self.export_stats_btn)
         control_group.setLayout(control_layout)
         
         # 添加到左侧布局
         left_layout.addWidget(excel_group)
+        left_layout.addWidget(sweep_group)
         left_layout.addWidget(control_group)
         left_layout.addStretch()
         left_panel.setLayout(left_layout)
@@ -315,15 +618,23 @@ class BatchGenTab(QWidget):
         # 任务列表
         task_group = QGroupBox("任务列表")
         task_layout = QVBoxLayout()
-        self.task_list = QListWidget()
+        self.task_list = QListView()
+        self.task_list.setModel(self.task_model)
+        # 各行高度相同，只计算可见行的布局，任务数量很大时也能立即显示
+        self.task_list.setUniformItemSizes(True)
         task_layout.addWidget(self.task_list)
         task_group.setLayout(task_layout)
         
         # 进度显示
         progress_group = QGroupBox("生成进度")
         progress_layout = QVBoxLayout()
+        self.summary_label = QLabel("")
+        self.summary_label.setWordWrap(True)
         self.progress_text = QTextEdit()
         self.progress_text.setReadOnly(True)
+        # 限制日志行数，长时间运行时不会无限增长
+        self.progress_text.document().setMaximumBlockCount(self.MAX_LOG_LINES)
+        progress_layout.addWidget(self.summary_label)
         progress_layout.addWidget(self.progress_text)
         progress_group.setLayout(progress_layout)
         
@@ -337,6 +648,20 @@ class BatchGenTab(QWidget):
         
         self.setLayout(layout)
 
+    @property
+    def tasks(self) -> TaskStore:
+        """导入的任务，保存在按列存储的 TaskStore 中"""
+        return self.task_model.store
+
+    @tasks.setter
+    def tasks(self, tasks):
+        """设置任务，可以是 TaskStore 或任务字典列表"""
+        if not isinstance(tasks, TaskStore):
+            store = TaskStore()
+            store.extend(tasks)
+            tasks = store
+        self.task_model.set_store(tasks)
+
     def download_template(self):
         """下载Excel参数模板"""
         filename, _ = QFileDialog.getSaveFileName(
@@ -385,39 +710,8 @@ class BatchGenTab(QWidget):
                 QMessageBox.warning(self, "警告", "Excel文件为空")
                 return
             
-            # 清空任务列表
-            self.task_list.clear()
-            self.tasks = []
-            
-            # 导入任务
-            for _, row in df.iterrows():
-                try:
-                    prompt = row.get("prompt", "").strip()
-                    if not prompt:  # 跳过空提示词
-                        continue
-                    
-                    # 创建任务项
-                    task_info = {
-                        "prompt": prompt,
-                        "negative_prompt": str(row.get("negative_prompt", "")),
-                        "model": str(row.get("model", "stabilityai/stable-diffusion-3-5-large")),
-                        "size": str(row.get("size", "1024x1024")),
-                        "steps": int(row.get("steps", 20)),
-                        "guidance": float(row.get("guidance", 7.5)),
-                        "batch_size": int(row.get("batch_size", 1)),
-                        "seed": int(row.get("seed", -1)) if pd.notna(row.get("seed")) else -1,
-                        "enhance_prompt": bool(row.get("enhance_prompt", False))
-                    }
-                    
-                    # 添加到任务列表
-                    item = QListWidgetItem(f"提示词: {prompt[:50]}...")
-                    item.setData(Qt.ItemDataRole.UserRole, task_info)
-                    self.task_list.addItem(item)
-                    self.tasks.append(task_info)
-                    
-                except Exception as e:
-                    print(f"导入任务时出错: {str(e)}")
-                    continue
+            # 清空任务列表后导入，列表只在导入完成后刷新一次
+            self.task_model.load(self._parse_rows(df))
             
             # 更新界面状态
             self.start_btn.setEnabled(bool(self.tasks))
@@ -429,10 +723,33 @@ class BatchGenTab(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "错误", f"导入失败: {str(e)}")
 
+    def _parse_rows(self, df):
+        """逐行解析Excel中的任务参数，跳过空提示词和格式错误的行"""
+        for row in df.to_dict("records"):
+            try:
+                prompt = row.get("prompt", "").strip()
+                if not prompt:  # 跳过空提示词
+                    continue
+                
+                yield {
+                    "prompt": prompt,
+                    "negative_prompt": str(row.get("negative_prompt", "")),
+                    "model": str(row.get("model", "stabilityai/stable-diffusion-3-5-large")),
+                    "size": str(row.get("size", "1024x1024")),
+                    "steps": int(row.get("steps", 20)),
+                    "guidance": float(row.get("guidance", 7.5)),
+                    "batch_size": int(row.get("batch_size", 1)),
+                    "seed": int(row.get("seed", -1)) if pd.notna(row.get("seed")) else -1,
+                    "enhance_prompt": bool(row.get("enhance_prompt", False))
+                }
+            except Exception as e:
+                print(f"导入任务时出错: {str(e)}")
+                continue
+
     def pause_generation(self):
         """暂停生成"""
         if hasattr(self, 'gen_thread') and self.gen_thread and self.gen_thread.isRunning():
-            self.gen_thread.stop()
+            self.gen_thread.pause()
             self.pause_btn.setEnabled(False)
             self.resume_btn.setEnabled(True)
             self.update_progress_text("已暂停生成")
@@ -440,44 +757,96 @@ class BatchGenTab(QWidget):
     def resume_generation(self):
         """恢复生成"""
         if hasattr(self, 'gen_thread') and self.gen_thread:
-            self.gen_thread.is_running = True
+            self.gen_thread.resume()
             self.pause_btn.setEnabled(True)
             self.resume_btn.setEnabled(False)
             self.update_progress_text("继续生成")
 
     def on_generate_clicked(self):
         """处理生成按钮点击事件"""
+        if not self.tasks:
+            QMessageBox.warning(self, "提示", "请先导入任务")
+            return
+        # 使用第一个任务的参数作为基础参数
+        self._start_generation(self.tasks.column("prompt"), dict(self.tasks[0]))
+    
+    def get_preset_manager(self):
+        """获取预设管理器（首次调用时加载预设索引）"""
+        if self._preset_manager is None:
+            self._preset_manager = PresetManager(self.config_manager)
+        return self._preset_manager
+    
+    def open_sweep_dialog(self):
+        """打开参数扫描设置，确认后开始扫描"""
+        try:
+            dialog = SweepDialog(self.get_preset_manager(), self.config_manager.get("defaults", {}), self)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"加载预设失败: {str(e)}")
+            return
+        if dialog.exec() == SweepDialog.DialogCode.Accepted:
+            self.start_sweep(dialog.result_sweep)
+    
+    def start_sweep(self, sweep):
+        """开始参数扫描
+        
+        扫描点在生成过程中按需展开，不加入任务列表；只有种子不同的扫描点
+        打包为一次请求，结束后按扫描轴生成对比图。
+        """
+        self._start_generation([], sweep.base, sweep=sweep)
+    
+    def _start_generation(self, prompts, params, sweep=None):
+        """创建并启动生成线程"""
         try:
-            if not self.tasks:
-                QMessageBox.warning(self, "提示", "请先导入任务")
-                return
-            
             # 获取保存目录
             save_dir = self.config_manager.get("paths", {}).get("output_dir", "")
             if not save_dir:
                 QMessageBox.warning(self, "提示", "请先在设置中配置输出目录")
                 return
             
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
+            # 首次使用时确认输出目录可写（结果会被缓存）
+            if not self.config_manager.ensure_writable(save_dir):
+                QMessageBox.warning(self, "错误", f"输出目录不可写: {save_dir}")
+                return
             
             # 获取命名规则
             naming_rule = self.config_manager.get("naming_rule", "{timestamp}_{prompt}_{model}_{size}_{seed}")
             
+            # 获取去重设置
+            dedup_mode = self.config_manager.get("dedup.mode", "off")
+            dedup_index = self.get_dedup_index() if dedup_mode in ("skip", "hardlink") else None
+            
+            # 注册为调度器作业，与单图生成等其他作业共享请求名额
+            started = datetime.now()
+            self._job_api = self.api_manager.job_api(
+                f"批量生成 {started.strftime('%H:%M:%S')}", PRIORITY_NORMAL
+            )
+            
             # 创建并启动生成线程
             self.gen_thread = BatchGenerationThread(
-                self.api_manager.api,
-                [task["prompt"] for task in self.tasks],
-                self.tasks[0],  # 使用第一个任务的参数作为基础参数
+                self._job_api,
+                prompts,
+                params,
                 save_dir,
-                naming_rule
+                naming_rule,
+                dedup_index=dedup_index,
+                dedup_mode=dedup_mode,
+                concurrency=create_controller(self.config_manager),
+                deadline=self.config_manager.get("timeouts.deadline", 900) or None,
+                sweep=sweep,
+                layout=get_output_layout(self.config_manager, save_dir),
+                job=f"{'sweep' if sweep is not None else 'batch'}_{started.strftime('%Y%m%d_%H%M%S')}"
             )
             
+            # 写入历史记录在界面线程中进行，处理完所有已保存的图片后再停止统计本次运行
+            self.gen_thread.detach_telemetry_on_exit = False
+            
             # 连接信号
-            self.gen_thread.progress.connect(self.update_progress_text)
+            self.gen_thread.progress_updated.connect(self.on_progress_updated)
             self.gen_thread.error.connect(self.on_generation_error)
             self.gen_thread.finished.connect(self.on_generation_finished)
             self.gen_thread.image_saved.connect(self.on_image_saved)  # 连接新的信号
+            if sweep is None:
+                self.gen_thread.task_status.connect(self.task_model.update_task)  # 只更新状态变化的行
             
             # 更新界面状态
             self.start_btn.setEnabled(False)
@@ -486,6 +855,7 @@ class BatchGenTab(QWidget):
             self.cancel_btn.setEnabled(True)
             self.clear_btn.setEnabled(False)
             self.import_btn.setEnabled(False)
+            self.sweep_btn.setEnabled(False)
             
             # 重置取消状态
             self.is_cancelling = False
@@ -494,20 +864,42 @@ class BatchGenTab(QWidget):
             self.gen_thread.start()
             
         except Exception as e:
+            # 线程未能启动时从调度器注销作业，避免一直占用请求名额
+            if getattr(self, "_job_api", None) is not None:
+                self._job_api.close()
+                self._job_api = None
+            self._reset_buttons()
             QMessageBox.warning(self, "错误", f"启动生成失败: {str(e)}")
-            self.start_btn.setEnabled(True)
+    
+    def _reset_buttons(self):
+        """恢复未在生成时的按钮状态，没有任务时不能开始生成和清空"""
+        self.start_btn.setEnabled(bool(self.tasks))
+        self.pause_btn.setEnabled(False)
+        self.resume_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.clear_btn.setEnabled(bool(self.tasks))
+        self.import_btn.setEnabled(True)
+        self.sweep_btn.setEnabled(True)
+
+    def get_dedup_index(self):
+        """获取去重索引（首次调用时从索引文件加载）"""
+        if self._dedup_index is None:
+            self._dedup_index = get_dedup_index(self.config_manager)
+        return self._dedup_index
 
     def clear_tasks(self):
         """清空任务"""
-        self.task_list.clear()  # 清空任务列表
-        self.tasks = []  # 清空任务数组
+        self.task_model.clear()  # 清空任务列表
         self.progress_text.clear()  # 清空进度文本
+        self.summary_label.clear()
+        self.summary_label.setToolTip("")
         self.start_btn.setEnabled(False)
         self.pause_btn.setEnabled(False)
         self.resume_btn.setEnabled(False)
         self.cancel_btn.setEnabled(False)
         self.clear_btn.setEnabled(False)
         self.import_btn.setEnabled(True)  # 启用导入按钮
+        self.sweep_btn.setEnabled(True)
 
     def update_defaults(self):
         """更新默认参数设置"""
@@ -542,12 +934,21 @@ class BatchGenTab(QWidget):
                 self.cancel_btn.setEnabled(False)
                 self.clear_btn.setEnabled(False)
                 self.import_btn.setEnabled(False)
+                self.sweep_btn.setEnabled(False)
+
+    def shutdown(self, timeout_ms=2000):
+        """关闭程序前停止生成线程并等待其退出"""
+        gen_thread = getattr(self, "gen_thread", None)
+        if gen_thread is not None and gen_thread.isRunning():
+            gen_thread.stop()
+            gen_thread.wait(timeout_ms)
 
     def on_image_saved(self, record):
         """处理单张图片保存完成事件"""
         # 直接添加到历史记录
-        self.history_manager.add_record({
-            "timestamp": record["timestamp"],
-            "params": record["params"],
-            "image_paths": [record["image_path"]]  # 转换为列表格式
-        })
\ No newline at end of file
+        with get_telemetry().span("history_write"):
+            self.history_manager.add_record({
+                "timestamp": record["timestamp"],
+                "params": record["params"],
+                "image_paths": [record["image_path"]]  # 转换为列表格式
+            })
\ No newline at end of file
@@ -6,14 +6,156 @@ from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QTableWidget, QTableWidgetItem, QPushButton, 
     QLabel, QFileDialog, QMessageBox, QHeaderView, QMenu,
-    QAbstractItemView, QApplication
+    QAbstractItemView, QApplication, QProgressDialog, QDialog, QDialogButtonBox,
+    QListWidget, QListWidgetItem
 )
-from PyQt6.QtCore import Qt, QSize, QPointF, QPoint
+from PyQt6.QtCore import Qt, QSize, QPointF, QPoint, QThread, pyqtSignal
 from PyQt6.QtGui import (
     QPixmap, QIcon, QPainter, QPen, QBrush, QColor,
     QCursor, QMouseEvent
 )
 from src.utils.history_manager import HistoryManager
+from src.utils.dedup_index import find_similar_groups
+from src.utils.history_exporter import export_records_to_excel, ExportCancelled
+from src.utils.record_exporter import FORMATS, export_history, import_history
+from src.utils.compositor import CompositionCancelled, compose_contact_sheet, record_tiles
+from src.utils.history_exporter import record_image_paths
+from src.utils.retention import normalize_path, referenced_paths
+from src.utils.trash import Trash
+
+MAX_UNDO = 20  # 最多可撤销的删除次数
+
+# 导出文件类型
+EXPORT_FILTERS = "Excel Files (*.xlsx);;CSV Files (*.csv);;JSON Lines (*.jsonl);;Parquet Files (*.parquet)"
+
+class ExportThread(QThread):
+    """历史记录导出线程（Excel、CSV、JSONL、Parquet）"""
+    progress = pyqtSignal(int, int)  # 进度信号（已导出数量，总数）
+    finished = pyqtSignal(int)  # 完成信号，传递导出数量，取消时为-1
+    error = pyqtSignal(str)  # 错误信号
+    
+    def __init__(self, records, file_path):
+        super().__init__()
+        self.records = records
+        self.file_path = file_path
+        self.is_running = True
+        self.invalid = []  # 无法转换、导出为空的单元格的列名
+    
+    def run(self):
+        try:
+            if os.path.splitext(self.file_path)[1].lower() in FORMATS:
+                count = export_history(self.records, self.file_path, chunk_size=1000,
+                                       progress=self._on_rows_written, invalid=self.invalid)
+                if not self.is_running:
+                    raise ExportCancelled("导出已取消")
+            else:
+                count = export_records_to_excel(
+                    self.records, self.file_path,
+                    progress=self.progress.emit,
+                    is_cancelled=lambda: not self.is_running
+                )
+            self.finished.emit(count)
+        except ExportCancelled:
+            # Excel导出取消时不会生成文件，其他格式需删除写了一半的文件
+            if os.path.exists(self.file_path) and os.path.splitext(self.file_path)[1].lower() in FORMATS:
+                os.remove(self.file_path)
+            self.finished.emit(-1)
+        except Exception as e:
+            self.error.emit(str(e))
+    
+    def _on_rows_written(self, count):
+        if not self.is_running:
+            raise ExportCancelled("导出已取消")
+        self.progress.emit(count, len(self.records))
+    
+    def stop(self):
+        """取消导出"""
+        self.is_running = False
+
+class ContactSheetThread(QThread):
+    """对比图生成线程"""
+    progress = pyqtSignal(int, int)  # 进度信号（已完成图片数，总数）
+    finished = pyqtSignal(int)  # 完成信号，传递图片数，取消时为-1
+    error = pyqtSignal(str)  # 错误信号
+    
+    def __init__(self, tiles, file_path):
+        super().__init__()
+        self.tiles = tiles
+        self.file_path = file_path
+        self.is_running = True
+    
+    def run(self):
+        try:
+            count = compose_contact_sheet(self.tiles, self.file_path, progress=self.progress.emit,
+                                          is_cancelled=lambda: not self.is_running)
+            self.finished.emit(count)
+        except CompositionCancelled:
+            self.finished.emit(-1)
+        except Exception as e:
+            self.error.emit(str(e))
+    
+    def stop(self):
+        """取消生成"""
+        self.is_running = False
+
+class TrashThread(QThread):
+    """回收站线程：把删除的图片移入回收站，或撤销时移回原处"""
+    progress = pyqtSignal(int, int)  # 进度信号（已处理文件数，总数）
+    finished = pyqtSignal(int)  # 完成信号，传递移动的文件数
+    error = pyqtSignal(str)  # 错误信号
+    
+    def __init__(self, trash, batch, paths=None):
+        super().__init__()
+        self.trash = trash
+        self.batch = batch
+        self.paths = paths  # 为None时恢复批次中的文件
+    
+    def run(self):
+        try:
+            if self.paths is None:
+                count = self.trash.restore(self.batch, progress=self.progress.emit)
+            else:
+                count = self.trash.move(self.batch, self.paths, progress=self.progress.emit)
+                self.trash.expire()
+            self.finished.emit(count)
+        except Exception as e:
+            self.error.emit(str(e))
+
+class TrashDialog(QDialog):
+    """回收站：列出删除过的批次（最新的在前），选择一个恢复"""
+    
+    def __init__(self, trash, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("回收站")
+        self.resize(420, 300)
+        
+        self.batch_list = QListWidget()
+        for batch in reversed(trash.batches()):
+            info = trash.info(batch)
+            deleted_at = datetime.fromtimestamp(info["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            item = QListWidgetItem(f"{deleted_at}  {info['records']} 条记录，{info['files']} 张图片")
+            item.setData(Qt.ItemDataRole.UserRole, batch)
+            self.batch_list.addItem(item)
+        if self.batch_list.count():
+            self.batch_list.setCurrentRow(0)
+        self.batch_list.itemDoubleClicked.connect(self.accept)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Cancel)
+        restore_btn = buttons.addButton("恢复", QDialogButtonBox.ButtonRole.AcceptRole)
+        restore_btn.setEnabled(self.batch_list.count() > 0)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"删除的记录和图片保留 {trash.max_age_days:g} 天"))
+        layout.addWidget(self.batch_list)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+    
+    def selected_batch(self):
+        """选中的批次目录，没有选中时为None"""
+        item = self.batch_list.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item is not None else None
 
 class DraggableTableWidget(QTableWidget):
     """支持拖放的表格控件"""
@@ -269,9 +411,18 @@ class DraggableTableWidget(QTableWidget):
             QMessageBox.warning(self, "错误", f"显示右键菜单失败: {str(e)}")
 
 class HistoryWindow(QMainWindow):
-    def __init__(self, history_manager):
+    def __init__(self, history_manager, trash_dir, dedup_index=None, similarity_threshold=6):
         super().__init__()
         self.history_manager = history_manager
+        self.trash = Trash(str(trash_dir))  # 删除的记录和图片移入回收站（见 configured_trash_dir），可撤销或从回收站恢复
+        self.trash_thread = None  # 回收站线程
+        self.trash_dialog = None  # 删除进度对话框
+        self.undo_stack = []  # 本次打开窗口后可撤销的删除（回收站批次）
+        self.dedup_index = dedup_index  # 去重索引，用于复用已计算的感知哈希
+        self.similarity_threshold = similarity_threshold  # 相似图片的最大汉明距离
+        self.export_thread = None  # 导出线程
+        self.sheet_thread = None  # 对比图生成线程
+        self.export_dialog = None  # 导出进度对话框
         self.init_ui()
         
     def init_ui(self):
@@ -301,10 +452,25 @@ class HistoryWindow(QMainWindow):
         delete_btn.clicked.connect(lambda: self.delete_selected(False))
         delete_with_files_btn = QPushButton("删除记录和文件")
         delete_with_files_btn.clicked.connect(lambda: self.delete_selected(True))
-        
-        # 导出按钮
-        export_btn = QPushButton("导出到Excel")
+        self.undo_btn = QPushButton("撤销删除")
+        self.undo_btn.setEnabled(False)
+        self.undo_btn.clicked.connect(self.undo_delete)
+        trash_btn = QPushButton("回收站")
+        trash_btn.clicked.connect(self.show_trash)
+        
+        # 导出/导入按钮
+        export_btn = QPushButton("导出记录")
         export_btn.clicked.connect(self.export_to_excel)
+        import_btn = QPushButton("导入记录")
+        import_btn.clicked.connect(self.import_records)
+        
+        # 查找相似图片按钮
+        similar_btn = QPushButton("查找相似图片")
+        similar_btn.clicked.connect(self.select_similar_records)
+        
+        # 对比图按钮
+        sheet_btn = QPushButton("生成对比图")
+        sheet_btn.clicked.connect(self.create_contact_sheet)
         
         # 刷新按钮
         refresh_btn = QPushButton("刷新")
@@ -315,7 +481,12 @@ class HistoryWindow(QMainWindow):
         toolbar.addWidget(unselect_all_btn)
         toolbar.addWidget(delete_btn)
         toolbar.addWidget(delete_with_files_btn)
+        toolbar.addWidget(self.undo_btn)
+        toolbar.addWidget(trash_btn)
         toolbar.addWidget(export_btn)
+        toolbar.addWidget(import_btn)
+        toolbar.addWidget(similar_btn)
+        toolbar.addWidget(sheet_btn)
         toolbar.addWidget(refresh_btn)
         toolbar.addStretch()
         
@@ -384,6 +555,53 @@ class HistoryWindow(QMainWindow):
                 checked_rows.append(row)
         return checked_rows
     
+    def find_similar_rows(self):
+        """查找图片相似的记录分组
+        
+        Returns:
+            list: 行号分组，每组按行号排序
+        """
+        records = self.history_manager.get_records()
+        path_rows = {}
+        for row, record in enumerate(records):
+            image_paths = record.get("image_paths", [])
+            if not image_paths and "image_path" in record:  # 兼容旧格式
+                image_paths = [record["image_path"]]
+            if image_paths:
+                path_rows.setdefault(image_paths[0], []).append(row)
+        
+        groups = find_similar_groups(list(path_rows), self.similarity_threshold, self.dedup_index)
+        
+        # 同一文件被多条记录引用时同样视为重复
+        grouped_paths = {path for group in groups for path in group}
+        row_groups = [sorted(row for path in group for row in path_rows[path]) for group in groups]
+        row_groups += [rows for path, rows in path_rows.items() if len(rows) > 1 and path not in grouped_paths]
+        return row_groups
+    
+    def select_similar_records(self):
+        """勾选相似图片中的重复记录（每组保留第一条）"""
+        try:
+            row_groups = self.find_similar_rows()
+            if not row_groups:
+                QMessageBox.information(self, "提示", "未发现相似图片")
+                return
+            
+            self.unselect_all_records()
+            duplicate_count = 0
+            for rows in row_groups:
+                for row in rows[1:]:
+                    item = self.table.item(row, 0)
+                    if item:
+                        item.setCheckState(Qt.CheckState.Checked)
+                        duplicate_count += 1
+            
+            QMessageBox.information(
+                self, "提示",
+                f"发现 {len(row_groups)} 组相似图片，已勾选 {duplicate_count} 条重复记录"
+            )
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"查找相似图片失败: {str(e)}")
+    
     def refresh_table(self):
         """刷新表格数据"""
         records = self.history_manager.get_records()
@@ -470,7 +688,7 @@ class HistoryWindow(QMainWindow):
             if self.table.item(row, 0) and self.table.item(row, 0).checkState() == Qt.CheckState.Checked:
                 selected_rows.add(row)
         
-        selected_rows = sorted(selected_rows, reverse=True)  # 从后往前排序
+        selected_rows = sorted(selected_rows)
         
         if not selected_rows:
             QMessageBox.warning(self, "警告", "请先选择要删除的记录")
@@ -479,7 +697,7 @@ class HistoryWindow(QMainWindow):
         # 确认删除
         msg = "确定要删除选中的记录吗？"
         if delete_files:
-            msg = "确定要删除选中的记录及其关联的图片文件吗？"
+            msg = "确定要删除选中的记录及其关联的图片文件吗？（图片移入回收站，可撤销）"
         
         reply = QMessageBox.question(
             self, 
@@ -489,43 +707,93 @@ class HistoryWindow(QMainWindow):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
+            if self.trash_thread is not None and self.trash_thread.isRunning():
+                QMessageBox.warning(self, "提示", "上一次删除尚未完成，请稍后再试")
+                return
             try:
-                # 从后往前删除，避免索引变化
-                for row in selected_rows:
-                    if row < len(self.history_manager.records):
-                        record = self.history_manager.records[row]
-                        
-                        # 如果需要删除文件
-                        if delete_files:
-                            image_paths = record.get("image_paths", [])
-                            if not image_paths and "image_path" in record:
-                                image_paths = [record["image_path"]]
-                            
-                            for path in image_paths:
-                                if os.path.exists(path):
-                                    try:
-                                        os.remove(path)
-                                    except Exception as e:
-                                        print(f"删除文件失败: {path}, 错误: {str(e)}")
-                        
-                        # 删除记录
-                        del self.history_manager.records[row]
-                
-                # 保存更改
-                self.history_manager.save_records()
-                
-                # 刷新表格
+                # 删除的记录先保存到回收站，再一次删除全部选中的记录（只保存一次）
+                records = self.history_manager.get_records()
+                removed = [(row, records[row]) for row in selected_rows if row < len(records)]
+                batch = self.trash.new_batch()
+                self.trash.save_records(batch, removed)
+                self.history_manager.remove_records([record for _, record in removed])
                 self.refresh_table()
                 
-                # 发送历史记录更新信号
-                self.history_manager.history_updated.emit()
+                # 图片在后台移入回收站，仍被其他记录引用的图片（去重时）保留
+                if delete_files:
+                    referenced = referenced_paths(self.history_manager.get_records())
+                    paths = [path for path in dict.fromkeys(
+                        path for _, record in removed for path in record_image_paths(record))
+                        if normalize_path(path) not in referenced]
+                    if paths:
+                        self._start_trash_thread(TrashThread(self.trash, batch, paths), "正在删除文件...")
+                
+                self.undo_stack.append(batch)
+                del self.undo_stack[:-MAX_UNDO]
+                self.undo_btn.setEnabled(True)
                 
             except Exception as e:
                 print(f"删除记录失败: {str(e)}")
                 raise  # 重新抛出异常以便测试捕获
     
+    def undo_delete(self):
+        """撤销最近一次删除：恢复记录到原来的位置，并把图片从回收站移回原处"""
+        if self.undo_stack:
+            self.restore_batch(self.undo_stack[-1])
+    
+    def show_trash(self):
+        """打开回收站，恢复选中的一次删除（包括关闭窗口或重启程序之前的删除）"""
+        dialog = TrashDialog(self.trash, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted and dialog.selected_batch():
+            self.restore_batch(dialog.selected_batch())
+    
+    def restore_batch(self, batch):
+        """从回收站恢复一次删除的记录和图片"""
+        if self.trash_thread is not None and self.trash_thread.isRunning():
+            QMessageBox.warning(self, "提示", "删除尚未完成，请稍后再试")
+            return
+        if batch in self.undo_stack:
+            self.undo_stack.remove(batch)
+        self.history_manager.restore_records(self.trash.take_records(batch))
+        self.refresh_table()
+        self._start_trash_thread(TrashThread(self.trash, batch), "正在恢复文件...")
+        self.undo_btn.setEnabled(bool(self.undo_stack))
+    
+    def _start_trash_thread(self, thread, label):
+        """在后台移动文件，超过半秒时显示进度"""
+        self.trash_dialog = QProgressDialog(label, None, 0, 0, self)
+        self.trash_dialog.setWindowTitle("删除记录")
+        self.trash_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.trash_dialog.setMinimumDuration(500)
+        
+        self.trash_thread = thread
+        self.trash_thread.progress.connect(self.on_trash_progress)
+        self.trash_thread.finished.connect(self.on_trash_finished)
+        self.trash_thread.error.connect(self.on_trash_error)
+        self.trash_thread.start()
+    
+    def on_trash_progress(self, done, total):
+        """更新删除进度"""
+        if self.trash_dialog is not None:
+            self.trash_dialog.setMaximum(total)
+            self.trash_dialog.setValue(done)
+    
+    def _close_trash_dialog(self):
+        if self.trash_dialog is not None:
+            self.trash_dialog.close()
+            self.trash_dialog = None
+    
+    def on_trash_finished(self, count):
+        """文件移动完成"""
+        self._close_trash_dialog()
+    
+    def on_trash_error(self, error_msg):
+        """文件移动失败"""
+        self._close_trash_dialog()
+        QMessageBox.warning(self, "错误", f"移动文件失败: {error_msg}")
+    
     def export_to_excel(self):
-        """导出选中记录为Excel（包含原图）"""
+        """导出选中记录（Excel嵌入缩略图，也可选择CSV、JSONL或Parquet），在后台线程中进行"""
         try:
             # 获取选中的行
             selected_rows = self.get_checked_rows()
@@ -534,121 +802,128 @@ class HistoryWindow(QMainWindow):
                 return
             
             # 选择保存路径
-            file_path, _ = QFileDialog.getSaveFileName(
+            file_path, selected_filter = QFileDialog.getSaveFileName(
                 self,
-                "导出Excel",
+                "导出记录",
                 "",
-                "Excel Files (*.xlsx)"
+                EXPORT_FILTERS
             )
             
             if not file_path:
                 return
+            
+            # 未填写后缀时按所选文件类型补全
+            if not os.path.splitext(file_path)[1]:
+                suffix = selected_filter[selected_filter.find("*") + 1:selected_filter.find(")")] if "*" in selected_filter else ".xlsx"
+                file_path += suffix
                 
             # 准备数据
             records = self.history_manager.get_records()
             selected_records = [records[row] for row in selected_rows]
             
-            # 创建一个新的Excel工作簿
-            from openpyxl import Workbook
-            from openpyxl.drawing.image import Image
-            from openpyxl.utils import get_column_letter
+            # 进度对话框，点击取消时停止导出
+            self.export_dialog = QProgressDialog("正在导出...", "取消", 0, len(selected_records), self)
+            self.export_dialog.setWindowTitle("导出记录")
+            self.export_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+            self.export_dialog.setMinimumDuration(0)
             
-            wb = Workbook()
-            ws = wb.active
+            self.export_thread = ExportThread(selected_records, file_path)
+            self.export_thread.progress.connect(self.on_export_progress)
+            self.export_thread.finished.connect(self.on_export_finished)
+            self.export_thread.error.connect(self.on_export_error)
+            self.export_dialog.canceled.connect(self.export_thread.stop)
+            self.export_thread.start()
             
-            # 设置列标题
-            headers = [
-                "图片", "名称", "提示词", "负面提示词", "模型", 
-                "尺寸", "步数", "引导系数", "随机种子", "提示增强", 
-                "图片路径"
-            ]
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
-            # 设置第一列的宽度（用于显示图片）
-            ws.column_dimensions['A'].width = 20  # 设置为20个字符宽度（约120像素）
-            
-            # 设置行高
-            ws.row_dimensions[1].height = 15  # 标题行高度
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导出失败: {str(e)}")
+    
+    def on_export_progress(self, exported, total):
+        """更新导出进度"""
+        if self.export_dialog is not None:
+            self.export_dialog.setMaximum(total)
+            self.export_dialog.setValue(exported)
+    
+    def _close_export_dialog(self):
+        if self.export_dialog is not None:
+            self.export_dialog.canceled.disconnect()
+            self.export_dialog.close()
+            self.export_dialog = None
+    
+    def on_export_finished(self, count):
+        """导出完成"""
+        self._close_export_dialog()
+        if count >= 0:
+            message = f"已导出 {count} 条记录"
+            invalid = self.export_thread.invalid if self.export_thread is not None else []
+            if invalid:
+                message += f"\n其中 {len(invalid)} 个无效的值（{', '.join(sorted(set(invalid)))}）已留空"
+            QMessageBox.information(self, "提示", message)
+    
+    def on_export_error(self, error_msg):
+        """导出失败"""
+        self._close_export_dialog()
+        QMessageBox.warning(self, "错误", f"导出失败: {error_msg}")
+    
+    def create_contact_sheet(self):
+        """把选中记录的图片排列成带种子和提示词标注的对比图，在后台线程中生成"""
+        try:
+            selected_rows = self.get_checked_rows()
+            if not selected_rows:
+                QMessageBox.warning(self, "提示", "请先选择要生成对比图的记录")
+                return
             
-            # 填充数据
-            for row_idx, record in enumerate(selected_records, 2):  # 从第2行开始（第1行是标题）
-                params = record.get("params", {})
-                image_paths = record.get("image_paths", [])
-                if not image_paths and "image_path" in record:  # 兼容旧格式
-                    image_paths = [record["image_path"]]
-                
-                # 处理图片
-                if image_paths:
-                    try:
-                        # 获取第一张图片
-                        img_path = image_paths[0]
-                        if os.path.exists(img_path):
-                            # 直接使用原图
-                            img = Image(img_path)
-                            
-                            # 计算合适的显示大小
-                            # Excel中1个字符宽度约等于6像素，1个单位高度约等于1.5像素
-                            max_width = 120  # 20个字符宽度 * 6像素
-                            max_height = 100  # 约67个单位高度（100像素）
-                            
-                            # 计算缩放比例
-                            width_scale = max_width / img.width if img.width > max_width else 1
-                            height_scale = max_height / img.height if img.height > max_height else 1
-                            scale = min(width_scale, height_scale)
-                            
-                            # 应用缩放
-                            img.width = int(img.width * scale)
-                            img.height = int(img.height * scale)
-                            
-                            # 设置行高，确保图片完整显示
-                            # 将像素转换为Excel单位（1像素约等于0.75单位）
-                            row_height = img.height * 0.75
-                            # 确保最小行高
-                            row_height = max(row_height, 20)
-                            ws.row_dimensions[row_idx].height = row_height
-                            
-                            # 将图片添加到单元格，并设置锚点使其居中
-                            ws.add_image(img, f'A{row_idx}')
-                    except Exception as e:
-                        print(f"处理图片失败: {str(e)}")
-                
-                # 获取文件名（不带扩展名）
-                filename = "未知"
-                if image_paths:
-                    filename = os.path.splitext(os.path.basename(image_paths[0]))[0]
-                    if len(image_paths) > 1:
-                        filename += f" (+{len(image_paths)-1})"
-                
-                # 填充其他列
-                row_data = [
-                    "",  # 第一列是图片
-                    filename,  # 名称列
-                    params.get("prompt", ""),
-                    params.get("negative_prompt", ""),
-                    params.get("model", ""),
-                    params.get("size", ""),
-                    params.get("num_inference_steps", ""),
-                    params.get("guidance_scale", ""),
-                    params.get("seed", ""),
-                    "是" if params.get("prompt_enhancement", False) else "否",
-                    "\n".join(image_paths)
-                ]
-                
-                for col, value in enumerate(row_data, 1):
-                    cell = ws.cell(row=row_idx, column=col, value=value)
-                    # 对于长文本，启用自动换行
-                    if isinstance(value, str) and len(value) > 50:
-                        cell.alignment = cell.alignment.copy(wrapText=True)
+            records = self.history_manager.get_records()
+            tiles = record_tiles(records[row] for row in selected_rows)
+            if not tiles:
+                QMessageBox.warning(self, "提示", "选中的记录没有图片")
+                return
             
-            # 调整列宽
-            for col in range(2, len(headers) + 1):
-                ws.column_dimensions[get_column_letter(col)].width = 20
+            file_path, _ = QFileDialog.getSaveFileName(self, "保存对比图", "contact_sheet.png", "PNG Files (*.png)")
+            if not file_path:
+                return
+            if not file_path.lower().endswith(".png"):
+                file_path += ".png"
             
-            # 保存Excel文件
-            wb.save(file_path)
+            self.export_dialog = QProgressDialog("正在生成对比图...", "取消", 0, len(tiles), self)
+            self.export_dialog.setWindowTitle("生成对比图")
+            self.export_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+            self.export_dialog.setMinimumDuration(0)
             
-            QMessageBox.information(self, "提示", f"已导出 {len(selected_records)} 条记录")
+            self.sheet_thread = ContactSheetThread(tiles, file_path)
+            self.sheet_thread.progress.connect(self.on_export_progress)
+            self.sheet_thread.finished.connect(self.on_contact_sheet_finished)
+            self.sheet_thread.error.connect(self.on_export_error)
+            self.export_dialog.canceled.connect(self.sheet_thread.stop)
+            self.sheet_thread.start()
             
         except Exception as e:
-            QMessageBox.warning(self, "错误", f"导出失败: {str(e)}") 
\ No newline at end of file
+            QMessageBox.warning(self, "错误", f"生成对比图失败: {str(e)}")
+    
+    def on_contact_sheet_finished(self, count):
+        """对比图生成完成"""
+        self._close_export_dialog()
+        if count >= 0:
+            QMessageBox.information(self, "提示", f"已生成对比图，共 {count} 张图片")
+    
+    def import_records(self):
+        """从CSV、JSONL或Parquet文件导入历史记录"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "导入记录",
+            "",
+            "Record Files (*.csv *.jsonl *.ndjson *.parquet)"
+        )
+        if not file_path:
+            return
+        
+        try:
+            invalid = []
+            records = list(import_history(file_path, invalid=invalid))
+            self.history_manager.add_records(records)
+            self.refresh_table()
+            message = f"已导入 {len(records)} 条记录"
+            if invalid:
+                message += f"\n其中 {len(invalid)} 个无效的值（{', '.join(sorted(set(invalid)))}）已跳过"
+            QMessageBox.information(self, "提示", message)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导入失败: {str(e)}")
@@ -1,3 +1,5 @@
+import dataclasses
+
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QFormLayout, QLineEdit, 
                            QPushButton, QGroupBox, QFileDialog, QMessageBox, QHBoxLayout, 
                            QSizePolicy, QComboBox, QLabel, QSpinBox, QDoubleSpinBox, 
@@ -5,6 +7,8 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QFormLayout, QLineEdit,
 from src.utils.config_manager import ConfigManager
 from src.utils.api_client import SiliconFlowAPI, APIError
 from src.utils.api_manager import APIManager
+from src.utils.output_layout import LAYOUTS, DEFAULT_SHARD_SIZE
+from src.utils.retention import RetentionEngine, RetentionPolicy
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QIntValidator
 
@@ -33,10 +37,11 @@ class SettingsTab(QWidget):
     """设置标签页"""
     settings_updated = pyqtSignal()  # 设置更新信号
     
-    def __init__(self, config: ConfigManager, api_manager: APIManager):
+    def __init__(self, config: ConfigManager, api_manager: APIManager, history_manager=None):
         super().__init__()
         self.config = config
         self.api_manager = api_manager
+        self.history_manager = history_manager  # 用于启用存储清理前试运行
         self.init_ui()
         self.load_settings()
     
@@ -72,6 +77,22 @@ class SettingsTab(QWidget):
         api_key_layout.addWidget(self.test_api_btn)
         api_layout.addRow("API密钥:", api_key_layout)
         
+        # 备用API密钥，与主密钥一起组成密钥池分担请求
+        self.extra_api_keys_input = QLineEdit()
+        self.extra_api_keys_input.setPlaceholderText("可选，多个密钥用逗号分隔")
+        self.extra_api_keys_input.setEchoMode(QLineEdit.EchoMode.Password)
+        api_layout.addRow("备用API密钥:", self.extra_api_keys_input)
+        
+        # 自适应并发，默认每次只发一个请求
+        self.concurrency_check = QCheckBox("批量生成时根据延迟和错误率自动增加同时进行的请求数")
+        self.concurrency_check.setToolTip("遇到限流、超时或延迟升高时自动减少，不勾选时每次只发一个请求")
+        api_layout.addRow("", self.concurrency_check)
+        
+        self.max_concurrency_spin = QSpinBox()
+        self.max_concurrency_spin.setRange(1, 64)
+        self.max_concurrency_spin.setValue(8)
+        api_layout.addRow("最多同时请求数:", self.max_concurrency_spin)
+        
         api_group.setLayout(api_layout)
         basic_layout.addWidget(api_group)
         
@@ -93,9 +114,64 @@ class SettingsTab(QWidget):
         output_dir_layout.addWidget(self.select_dir_btn)
         path_layout.addRow("输出目录:", output_dir_layout)
         
+        # 输出目录布局
+        self.layout_combo = QComboBox()
+        for mode, label in LAYOUTS.items():
+            self.layout_combo.addItem(label, mode)
+        path_layout.addRow("子目录:", self.layout_combo)
+        
+        # 每个目录的文件数上限
+        self.shard_size_spin = QSpinBox()
+        self.shard_size_spin.setRange(0, 1000000)
+        self.shard_size_spin.setSingleStep(1000)
+        self.shard_size_spin.setSpecialValueText("不限制")
+        self.shard_size_spin.setValue(DEFAULT_SHARD_SIZE)
+        self.shard_size_spin.setToolTip("目录中的文件达到上限后放到编号递增的分片目录，单个目录文件很多时建议设为5000左右")
+        path_layout.addRow("每个目录最多文件数:", self.shard_size_spin)
+        
         path_group.setLayout(path_layout)
         basic_layout.addWidget(path_group)
         
+        # 存储清理设置
+        retention_group = QGroupBox("存储清理")
+        retention_layout = QFormLayout()
+        retention_layout.setFieldGrowthPolicy(QFormLayout.FieldGrowthPolicy.ExpandingFieldsGrow)
+        retention_layout.setLabelAlignment(Qt.AlignmentFlag.AlignRight)
+        retention_layout.setSpacing(10)
+        
+        self.retention_check = QCheckBox("在后台自动清理旧的历史记录和图片")
+        retention_layout.addRow("", self.retention_check)
+        
+        self.max_items_spin = QSpinBox()
+        self.max_items_spin.setRange(0, 10000000)
+        self.max_items_spin.setSingleStep(100)
+        self.max_items_spin.setSpecialValueText("不限制")
+        retention_layout.addRow("最多历史记录数:", self.max_items_spin)
+        
+        self.max_age_spin = QSpinBox()
+        self.max_age_spin.setRange(0, 36500)
+        self.max_age_spin.setSuffix(" 天")
+        self.max_age_spin.setSpecialValueText("不限制")
+        retention_layout.addRow("最多保留:", self.max_age_spin)
+        
+        self.max_total_spin = QSpinBox()
+        self.max_total_spin.setRange(0, 10000000)
+        self.max_total_spin.setSingleStep(1024)
+        self.max_total_spin.setSuffix(" MB")
+        self.max_total_spin.setSpecialValueText("不限制")
+        retention_layout.addRow("图片总大小上限:", self.max_total_spin)
+        
+        self.delete_files_check = QCheckBox("删除历史记录时同时删除其图片")
+        self.delete_files_check.setToolTip("不勾选时只删除历史记录，图片保留在输出目录中")
+        retention_layout.addRow("", self.delete_files_check)
+        
+        self.delete_orphans_check = QCheckBox("删除输出目录中未被历史记录引用的图片")
+        self.delete_orphans_check.setToolTip("只删除保存超过一天的图片，参数扫描的对比图（contact_sheets 目录）不受影响")
+        retention_layout.addRow("", self.delete_orphans_check)
+        
+        retention_group.setLayout(retention_layout)
+        basic_layout.addWidget(retention_group)
+        
         # 命名规则设置
         naming_group = QGroupBox("命名规则设置")
         naming_layout = QFormLayout()
@@ -261,11 +337,27 @@ class SettingsTab(QWidget):
             # 加载API密钥
             api_key = self.config.get("api_key", "")
             self.api_key_input.setText(api_key)
+            self.extra_api_keys_input.setText(",".join(self.config.get("api_keys", []) or []))
+            self.concurrency_check.setChecked(bool(self.config.get("concurrency.enabled", False)))
+            self.max_concurrency_spin.setValue(int(self.config.get("concurrency.max", 8) or 8))
             
             # 加载输出目录
             output_dir = self.config.get("paths.output_dir", "")
             self.output_dir.setText(output_dir)
             
+            # 加载输出目录布局
+            index = self.layout_combo.findData(self.config.get("output_layout.mode", "flat"))
+            self.layout_combo.setCurrentIndex(max(index, 0))
+            self.shard_size_spin.setValue(int(self.config.get("output_layout.shard_size", DEFAULT_SHARD_SIZE)))
+            
+            # 加载存储清理设置
+            self.retention_check.setChecked(bool(self.config.get("retention.enabled", False)))
+            self.max_items_spin.setValue(int(self.config.get("history.max_items", 0) or 0))
+            self.max_age_spin.setValue(int(self.config.get("retention.max_age_days", 0) or 0))
+            self.max_total_spin.setValue(int(self.config.get("retention.max_total_mb", 0) or 0))
+            self.delete_files_check.setChecked(bool(self.config.get("retention.delete_files", False)))
+            self.delete_orphans_check.setChecked(bool(self.config.get("retention.delete_orphans", False)))
+            
             # 加载命名规则
             naming_preset = self.config.get("naming_rule.preset", "默认")
             custom_rule = self.config.get("naming_rule.custom", "")
@@ -360,37 +452,96 @@ class SettingsTab(QWidget):
         self.test_api_btn.setEnabled(True)
         self.test_api_btn.setText("测试API")
     
+    def retention_policy(self) -> RetentionPolicy:
+        """界面中设置的保留策略"""
+        return dataclasses.replace(
+            RetentionPolicy.from_config(self.config),
+            enabled=self.retention_check.isChecked(),
+            max_items=self.max_items_spin.value(),
+            max_age_days=self.max_age_spin.value(),
+            max_bytes=self.max_total_spin.value() * 1024 * 1024,
+            delete_files=self.delete_files_check.isChecked(),
+            delete_orphans=self.delete_orphans_check.isChecked(),
+        )
+    
+    def confirm_retention(self) -> bool:
+        """启用或修改存储清理时，先试运行并请用户确认将要删除的内容
+        
+        Returns:
+            bool: 是否继续保存
+        """
+        policy = self.retention_policy()
+        if not policy.enabled or self.history_manager is None:
+            return True
+        if policy == RetentionPolicy.from_config(self.config):
+            return True  # 策略未变化，已确认过
+        
+        engine = RetentionEngine(self.output_dir.text() or self.config.get("paths.output_dir", ""))
+        preview = engine.preview(list(self.history_manager.get_records()), policy)
+        if not preview.records and not policy.delete_orphans:
+            return True
+        
+        message = f"按当前设置将立即删除 {preview.records} 条历史记录"
+        if policy.delete_files:
+            message += f"和 {preview.files} 张图片（{preview.bytes / 1024 / 1024:.1f} MB）"
+        message += "。"
+        if policy.delete_orphans:
+            message += "\n此外还会删除输出目录中未被历史记录引用的图片。"
+        message += "\n删除后无法恢复，是否继续？"
+        reply = QMessageBox.question(self, "确认存储清理", message,
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                     QMessageBox.StandardButton.No)
+        return reply == QMessageBox.StandardButton.Yes
+    
     def save_settings(self):
         """保存设置"""
+        if not self.confirm_retention():
+            return
         try:
-            # 保存API密钥
-            self.config.set("api_key", self.api_key_input.text())
-            
-            # 保存输出目录
-            self.config.set("paths.output_dir", self.output_dir.text())
-            
-            # 保存命名规则
-            current_rule = self.naming_rule_combo.currentText()
-            self.config.set("naming_rule.preset", current_rule)
-            
-            # 如果是自定义规则，保存自定义规则内容
-            if current_rule == "自定义规则":
-                self.config.set("naming_rule.custom", self.custom_rule_input.text())
-            else:
-                self.config.set("naming_rule.custom", current_rule)
-            
-            # 保存默认参数
-            defaults = {
-                "model": self.default_model_combo.currentText(),
-                "size": self.default_size_combo.currentText(),
-                "batch_size": self.default_batch_spin.value(),
-                "steps": self.default_steps_spin.value(),
-                "guidance": self.default_guidance_spin.value(),
-                "negative_prompt": self.default_negative_prompt.text(),
-                "seed": int(self.default_seed_input.text()) if self.default_seed_input.text() else -1,
-                "use_random_seed": self.default_random_seed_check.isChecked()
-            }
-            self.config.set("defaults", defaults)
+            # 所有设置合并为一次写入
+            with self.config.batch():
+                # 保存API密钥
+                self.config.set("api_key", self.api_key_input.text())
+                extra_keys = [key.strip() for key in self.extra_api_keys_input.text().split(",") if key.strip()]
+                self.config.set("api_keys", extra_keys)
+                self.config.set("concurrency.enabled", self.concurrency_check.isChecked())
+                self.config.set("concurrency.max", self.max_concurrency_spin.value())
+                
+                # 保存输出目录
+                self.config.set("paths.output_dir", self.output_dir.text())
+                self.config.set("output_layout.mode", self.layout_combo.currentData())
+                self.config.set("output_layout.shard_size", self.shard_size_spin.value())
+                
+                # 保存存储清理设置
+                self.config.set("retention.enabled", self.retention_check.isChecked())
+                self.config.set("history.max_items", self.max_items_spin.value())
+                self.config.set("retention.max_age_days", self.max_age_spin.value())
+                self.config.set("retention.max_total_mb", self.max_total_spin.value())
+                self.config.set("retention.delete_files", self.delete_files_check.isChecked())
+                self.config.set("retention.delete_orphans", self.delete_orphans_check.isChecked())
+                
+                # 保存命名规则
+                current_rule = self.naming_rule_combo.currentText()
+                self.config.set("naming_rule.preset", current_rule)
+                
+                # 如果是自定义规则，保存自定义规则内容
+                if current_rule == "自定义规则":
+                    self.config.set("naming_rule.custom", self.custom_rule_input.text())
+                else:
+                    self.config.set("naming_rule.custom", current_rule)
+                
+                # 保存默认参数
+                defaults = {
+                    "model": self.default_model_combo.currentText(),
+                    "size": self.default_size_combo.currentText(),
+                    "batch_size": self.default_batch_spin.value(),
+                    "steps": self.default_steps_spin.value(),
+                    "guidance": self.default_guidance_spin.value(),
+                    "negative_prompt": self.default_negative_prompt.text(),
+                    "seed": int(self.default_seed_input.text()) if self.default_seed_input.text() else -1,
+                    "use_random_seed": self.default_random_seed_check.isChecked()
+                }
+                self.config.set("defaults", defaults)
             
             # 发送设置更新信号
             self.settings_updated.emit()
@@ -453,9 +604,10 @@ class SettingsTab(QWidget):
                 presets.append(self.naming_rule_combo.itemText(i))
             
             # 保存命名规则配置
-            self.config.set("naming_rule.preset", custom_rule)
-            self.config.set("naming_rule.custom", custom_rule)
-            self.config.set("naming_rule.presets", presets)
+            with self.config.batch():
+                self.config.set("naming_rule.preset", custom_rule)
+                self.config.set("naming_rule.custom", custom_rule)
+                self.config.set("naming_rule.presets", presets)
             
             # 发送设置更新信号
             self.settings_updated.emit()
@@ -2,7 +2,6 @@
 
 import os
 import random
-import requests
 from datetime import datetime
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
@@ -16,6 +15,13 @@ from PyQt6.QtGui import QPixmap, QIcon
 from ..utils.config_manager import ConfigManager
 from ..utils.api_manager import APIManager
 from ..utils.history_manager import HistoryManager
+from ..utils.telemetry import get_telemetry
+from ..utils.api_client import APIError
+from ..utils.cancellation import CancelToken, OperationCancelled
+from ..utils.scheduler import PRIORITY_INTERACTIVE
+from ..utils.output_layout import get_output_layout
+from ..utils.trash import configured_trash_dir
+from ..utils.dedup_index import get_dedup_index
 from .history_window import HistoryWindow
 
 class ImageGenerationThread(QThread):
@@ -24,12 +30,18 @@ class ImageGenerationThread(QThread):
     error = pyqtSignal(str)     # 错误信号
     success = pyqtSignal(list)  # 成功信号，传递保存的文件列表
     
-    def __init__(self, api, params, save_dir, naming_rule):
+    def __init__(self, api, params, save_dir, naming_rule, layout=None):
         super().__init__()
         self.api = api
         self.params = params
         self.save_dir = save_dir
         self.naming_rule = naming_rule
+        self.layout = layout  # 输出目录布局，为None时直接保存到 save_dir
+        self.cancel_token = CancelToken()  # 关闭程序时取消进行中的请求
+    
+    def stop(self):
+        """停止生成，进行中的请求立即结束"""
+        self.cancel_token.cancel()
         
     def run(self):
         try:
@@ -58,7 +70,8 @@ class ImageGenerationThread(QThread):
                     num_inference_steps=self.params["num_inference_steps"],
                     guidance_scale=self.params["guidance_scale"],
                     prompt_enhancement=self.params["enhance_prompt"],
-                    seeds=seeds  # 使用seeds而不是seed
+                    seeds=seeds,  # 使用seeds而不是seed
+                    cancel=self.cancel_token
                 )
                 
                 # 显示推理时间
@@ -66,6 +79,8 @@ class ImageGenerationThread(QThread):
                     inference_time = result["timings"].get("inference", 0)
                     self.progress.emit(f"• 推理完成，耗时: {inference_time:.2f}秒")
                 
+            except OperationCancelled:
+                return
             except Exception as e:
                 error_msg = str(e)
                 if "IPM limit reached" in error_msg:
@@ -114,19 +129,15 @@ class ImageGenerationThread(QThread):
             # 处理生成的图片
             for i, img_info in enumerate(images):
                 try:
-                    img_url = img_info.get("url")
-                    if not img_url:
-                        self.error.emit(f"第{i+1}张图片URL为空")
-                        continue
-                    
                     self.progress.emit(f"• 正在下载第 {i+1}/{batch_size} 张图片")
                     self.progress.emit(f"  - 种子值: {seeds[i]}")
                     self.progress.emit(f"  - 提示词: {self.params['prompt'][:50]}...")
                     
-                    # 下载图片
-                    response = requests.get(img_url, timeout=30)
-                    if response.status_code != 200:
-                        self.error.emit(f"图片下载失败, 状态码: {response.status_code}")
+                    # 由生成后端获取图片内容
+                    try:
+                        content = self.api.fetch_image(img_info)
+                    except APIError as e:
+                        self.error.emit(f"第{i+1}张{e.message}")
                         continue
                     
                     # 生成唯一的文件名
@@ -157,29 +168,36 @@ class ImageGenerationThread(QThread):
                         file_name = file_name[:100]
                     file_name = f"{file_name}.png"
                     
-                    # 确保保存目录存在
-                    os.makedirs(self.save_dir, exist_ok=True)
+                    # 按输出目录布局选择子目录（已创建），否则直接保存到输出目录
+                    if self.layout is not None:
+                        save_dir = self.layout.directory(file_name, self.params["model"], "single")
+                    else:
+                        save_dir = self.save_dir
+                        os.makedirs(save_dir, exist_ok=True)
                     
                     # 确保文件名唯一
-                    file_path = os.path.join(self.save_dir, file_name)
+                    file_path = os.path.join(save_dir, file_name)
                     base_name, ext = os.path.splitext(file_name)
                     counter = 1
                     while os.path.exists(file_path):
                         new_name = f"{base_name}_{counter}{ext}"
-                        file_path = os.path.join(self.save_dir, new_name)
+                        file_path = os.path.join(save_dir, new_name)
                         counter += 1
                     
                     # 检查最终路径长度
                     if len(file_path) > 250:  # Windows MAX_PATH 限制
                         short_name = f"{i+1:02d}_{timestamp[:8]}_{seeds[i]}.png"
-                        file_path = os.path.join(self.save_dir, short_name)
+                        file_path = os.path.join(save_dir, short_name)
                     
                     self.progress.emit(f"• 正在保存第 {i+1}/{batch_size} 张图片")
                     self.progress.emit(f"  - 保存路径: {file_path}")
                     
                     # 保存图片
-                    with open(file_path, "wb") as f:
-                        f.write(response.content)
+                    with get_telemetry().span("disk_write"):
+                        with open(file_path, "wb") as f:
+                            f.write(content)
+                    if self.layout is not None:
+                        self.layout.add_file(save_dir)
                     saved_files.append((file_path, seeds[i]))  # 保存文件路径和种子值
                     
                 except Exception as e:
@@ -196,6 +214,7 @@ class ImageGenerationThread(QThread):
 
 class SingleGenTab(QWidget):
     """单图生成标签页"""
+    defaults_changed = pyqtSignal()  # 默认参数已修改（可能在其他线程中发出，界面在主线程中更新）
     
     def __init__(self, api_manager, config_manager, history_manager):
         super().__init__()
@@ -212,6 +231,13 @@ class SingleGenTab(QWidget):
         # 初始化界面
         self.init_ui()
         
+        # 只在默认参数修改后更新界面，其他配置修改不影响此页；
+        # 配置可能在其他线程中修改，通过信号在主线程中更新界面
+        self.defaults_changed.connect(self.update_defaults)
+        self._unsubscribe_defaults = self.config_manager.subscribe(
+            "defaults", lambda key, value: self.defaults_changed.emit()
+        )
+        
     def init_ui(self):
         """初始化界面"""
         layout = QHBoxLayout()  # 改为水平布局
@@ -463,7 +489,12 @@ class SingleGenTab(QWidget):
     def show_history_window(self):
         """显示历史记录管理窗口"""
         if not self.history_window:
-            self.history_window = HistoryWindow(self.history_manager)
+            self.history_window = HistoryWindow(
+                self.history_manager,
+                configured_trash_dir(self.config_manager),
+                dedup_index=get_dedup_index(self.config_manager),
+                similarity_threshold=self.config_manager.get("dedup.similarity_threshold", 6)
+            )
         self.history_window.show()
         self.history_window.activateWindow()
         
@@ -583,7 +614,9 @@ class SingleGenTab(QWidget):
             save_dir = self.config_manager.get("paths.output_dir")
             if not save_dir:
                 save_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "图片保存")
-            os.makedirs(save_dir, exist_ok=True)
+            if not self.config_manager.ensure_writable(save_dir):
+                QMessageBox.warning(self, "错误", f"输出目录不可写: {save_dir}")
+                return
             
             # 获取命名规则
             naming_rule = self.config_manager.get("naming.rule", "{timestamp}_{prompt}_{model}_{size}_{seed}")
@@ -594,12 +627,16 @@ class SingleGenTab(QWidget):
             self.generate_btn.setText("生成中...")
             self.progress_label.setText("准备生成...")
             
+            # 单图生成为交互式作业，优先于后台批量任务获得请求名额
+            self._job_api = self.api_manager.job_api("单图生成", PRIORITY_INTERACTIVE)
+            
             # 创建并启动生成线程
             self.gen_thread = ImageGenerationThread(
-                self.api_manager.api,
+                self._job_api,
                 self.params,  # 使用保存的参数
                 save_dir,
-                naming_rule
+                naming_rule,
+                layout=get_output_layout(self.config_manager, save_dir)
             )
             
             # 连接信号
@@ -645,7 +682,8 @@ class SingleGenTab(QWidget):
                 },
                 "image_paths": [file_path]  # 单张图片路径
             }
-            self.history_manager.add_record(history_item)
+            with get_telemetry().span("history_write"):
+                self.history_manager.add_record(history_item)
         
         self.load_history()
         QMessageBox.information(self, "提示", f"生成完成，已保存{len(saved_files)}张图片")
@@ -656,6 +694,17 @@ class SingleGenTab(QWidget):
         self.generate_btn.setText("生成图片")
         self.progress_label.setText("")
         self.gen_thread = None
+        if getattr(self, "_job_api", None) is not None:
+            self._job_api.close()
+            self._job_api = None
+
+    def shutdown(self, timeout_ms=2000):
+        """关闭程序前停止生成线程并等待其退出"""
+        self._unsubscribe_defaults()
+        gen_thread = getattr(self, "gen_thread", None)
+        if gen_thread is not None and gen_thread.isRunning():
+            gen_thread.stop()
+            gen_thread.wait(timeout_ms)
 
     def randomize_seed(self):
         """生成新的随机种子"""
@@ -0,0 +1,121 @@
+from PyQt6.QtWidgets import (
+    QComboBox, QDialog, QDialogButtonBox, QFormLayout, QLabel, QLineEdit, QMessageBox, QVBoxLayout
+)
+
+from src.utils.sweep import AXIS_LABELS, SWEEP_AXES, ParameterSweep, base_params, parse_axis_values
+
+# 各扫描参数输入框的提示文字
+AXIS_PLACEHOLDERS = {
+    "seed": "例如 1-8 或 42, 43, 44（留空则不扫描）",
+    "guidance": "例如 5-9:1 或 6.5, 7.5",
+    "steps": "例如 20-40:10",
+    "model": "多个模型用逗号分隔",
+    "size": "例如 512x512, 1024x1024",
+}
+
+
+class SweepDialog(QDialog):
+    """参数扫描设置对话框
+
+    选择作为基础参数的预设（或设置页的默认参数），并为要扫描的参数
+    填写取值，实时显示组合数和打包后的请求数。
+    """
+
+    def __init__(self, preset_manager, defaults=None, parent=None):
+        super().__init__(parent)
+        self.preset_manager = preset_manager
+        self.defaults = defaults or {}
+        self._sweep = None
+        self.setWindowTitle("参数扫描")
+
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItem("默认参数", None)
+        for summary in preset_manager.list_summaries():
+            self.preset_combo.addItem(summary["name"], summary["name"])
+        if self.preset_combo.count() > 1:
+            self.preset_combo.setCurrentIndex(1)
+        
+        self.prompt_input = QLineEdit()
+        self.prompt_input.setPlaceholderText("留空则使用预设中的提示词")
+
+        form = QFormLayout()
+        form.addRow("基础参数:", self.preset_combo)
+        form.addRow("提示词:", self.prompt_input)
+        self.axis_inputs = {}
+        for name in SWEEP_AXES:
+            edit = QLineEdit()
+            edit.setPlaceholderText(AXIS_PLACEHOLDERS[name])
+            edit.textChanged.connect(self.update_summary)
+            self.axis_inputs[name] = edit
+            form.addRow(f"{AXIS_LABELS[name]}:", edit)
+
+        self.summary_label = QLabel("")
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+        self.update_summary()
+
+    def axes(self) -> dict:
+        """解析已填写的扫描参数
+
+        Raises:
+            ValueError: 取值格式错误
+        """
+        axes = {}
+        for name, edit in self.axis_inputs.items():
+            if edit.text().strip():
+                values = parse_axis_values(name, edit.text())
+                if values:
+                    axes[name] = values
+        return axes
+
+    def update_summary(self):
+        """显示组合数和请求数"""
+        try:
+            axes = self.axes()
+        except ValueError as e:
+            self.summary_label.setText(str(e))
+            return
+        if not axes:
+            self.summary_label.setText("请至少填写一个扫描参数")
+            return
+        sweep = ParameterSweep({}, axes)
+        self.summary_label.setText(f"共 {len(sweep)} 个组合，{sweep.request_count()} 次请求")
+
+    def sweep(self) -> ParameterSweep:
+        """按当前设置创建参数扫描
+
+        Raises:
+            ValueError: 没有提示词、预设无效或扫描参数错误
+        """
+        name = self.preset_combo.currentData()
+        params = {}
+        if name is not None:
+            params = self.preset_manager.get_preset(name)
+            if params is None:
+                raise ValueError(f"预设不存在: {name}")
+        prompt = self.prompt_input.text().strip()
+        if prompt:
+            params = {**params, "prompt": prompt}
+        elif name is None:
+            raise ValueError("使用默认参数时请填写提示词")
+        return ParameterSweep(base_params(params, self.defaults), self.axes())
+
+    def accept(self):
+        try:
+            self._sweep = self.sweep()
+        except ValueError as e:
+            QMessageBox.warning(self, "错误", str(e))
+            return
+        super().accept()
+
+    @property
+    def result_sweep(self):
+        """确认后创建的参数扫描"""
+        return self._sweep
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QSize, Qt
+from PyQt6.QtGui import QColor, QIcon, QImageReader, QPixmap
+
+from src.models.task_store import TaskStore
+
+# 各状态的文字颜色，等待中使用默认颜色
+STATUS_COLORS = {
+    "处理中": QColor(0, 102, 204),
+    "完成": QColor(0, 128, 0),
+    "失败": QColor(200, 0, 0),
+    "已取消": QColor(128, 128, 128),
+}
+
+
+class TaskListModel(QAbstractListModel):
+    """批量任务列表模型
+
+    直接读取 TaskStore，不为每个任务创建列表项；配合开启 uniformItemSizes
+    的 QListView，只有可见的行才会读取数据和绘制，导入十万级任务也能立即显示。
+    任务状态变化时只通知对应的一行重绘。
+    """
+
+    THUMBNAIL_SIZE = 32
+    MAX_THUMBNAILS = 512  # 缓存的缩略图数，超出后丢弃最久未显示的
+
+    def __init__(self, store: Optional[TaskStore] = None, parent=None):
+        super().__init__(parent)
+        self.store = store if store is not None else TaskStore()
+        self._thumbnails: "OrderedDict[int, QIcon]" = OrderedDict()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.store):
+            return None
+        task = self.store[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"[{task.status}] 提示词: {task.prompt[:50]}..."
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return task.prompt
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return STATUS_COLORS.get(task.status)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._thumbnail(index.row(), task.result_path)
+        if role == Qt.ItemDataRole.UserRole:
+            return task
+        return None
+
+    def _thumbnail(self, row: int, path: Optional[str]) -> Optional[QIcon]:
+        """读取已完成任务的缩略图，按需加载并缓存"""
+        if not path:
+            return None
+        icon = self._thumbnails.get(row)
+        if icon is not None:
+            self._thumbnails.move_to_end(row)
+            return icon
+        reader = QImageReader(path)
+        size = reader.size()
+        if size.isValid():
+            # 解码时直接缩小，避免读取完整尺寸的图片
+            reader.setScaledSize(size.scaled(QSize(self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE),
+                                             Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return None
+        icon = QIcon(QPixmap.fromImage(image))
+        self._thumbnails[row] = icon
+        if len(self._thumbnails) > self.MAX_THUMBNAILS:
+            self._thumbnails.popitem(last=False)
+        return icon
+
+    def set_store(self, store: TaskStore) -> None:
+        """更换显示的任务存储"""
+        self.beginResetModel()
+        self.store = store
+        self._thumbnails.clear()
+        self.endResetModel()
+
+    def load(self, tasks: Iterable[dict]) -> int:
+        """清空后导入任务，导入完成后整体刷新一次
+
+        Returns:
+            int: 导入的任务数
+        """
+        self.beginResetModel()
+        try:
+            self.store.clear()
+            self._thumbnails.clear()
+            self.store.extend(tasks)
+        finally:
+            self.endResetModel()
+        return len(self.store)
+
+    def clear(self) -> None:
+        """清空任务"""
+        self.beginResetModel()
+        self.store.clear()
+        self._thumbnails.clear()
+        self.endResetModel()
+
+    def update_task(self, row: int, status: str, result_path: str = "") -> None:
+        """更新一个任务的状态，只重绘对应的行
+
+        Args:
+            row: 任务序号
+            status: 新状态
+            result_path: 完成时第一张图片的路径，用作缩略图
+        """
+        if not 0 <= row < len(self.store):
+            return
+        task = self.store[row]
+        task.status = status
+        if result_path:
+            task.result_path = result_path
+            self._thumbnails.pop(row, None)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
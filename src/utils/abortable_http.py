@@ -0,0 +1,107 @@
+import socket
+from typing import Callable, Optional, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .cancellation import CancelToken, Deadline, run_cancellable
+
+T = TypeVar("T")
+
+
+class _TrackingPoolMixin:
+    """记录取出的连接，中止时关闭其套接字"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checked_out = []
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        self.checked_out.append(conn)
+        return conn
+
+    def abort(self) -> None:
+        for conn in self.checked_out:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                # 直接关闭底层套接字（不经过SSL层），阻塞在读取中的线程随即出错返回
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _TrackingHTTPConnectionPool(_TrackingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackingHTTPSConnectionPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+_TRACKING_POOLS = {"http": _TrackingHTTPConnectionPool, "https": _TrackingHTTPSConnectionPool}
+
+
+class _AbortableAdapter(HTTPAdapter):
+    """可中止进行中请求的适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _TRACKING_POOLS
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = _TRACKING_POOLS
+        return manager
+
+    def abort(self) -> None:
+        for manager in [self.poolmanager, *self.proxy_manager.values()]:
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if isinstance(pool, _TrackingPoolMixin):
+                    pool.abort()
+
+
+class AbortableSession(requests.Session):
+    """可从其他线程中止进行中请求的会话
+
+    abort() 关闭会话已取出的全部连接，阻塞在等待响应中的请求随即以
+    ConnectionError 结束。尚在建立连接的请求仍受连接超时限制。每个
+    会话只用于一次请求，中止不会影响其他请求。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._adapter = _AbortableAdapter()
+        self.mount("http://", self._adapter)
+        self.mount("https://", self._adapter)
+
+    def abort(self) -> None:
+        self._adapter.abort()
+        self.close()
+
+
+def run_request(fn: Callable[[requests.Session], T], template: requests.Session,
+                cancel: Optional[CancelToken] = None, deadline: Optional[Deadline] = None) -> T:
+    """在单独的会话中执行一次请求，取消或超过时限时中止请求
+
+    会话的请求头、代理等设置与 template 相同。中止后等待执行请求的
+    线程结束再返回，不会留下仍占用连接的线程。
+
+    Raises:
+        OperationCancelled: 已取消
+        TimeoutError: 超过时限
+    """
+    session = AbortableSession()
+    session.headers.update(template.headers)
+    session.proxies.update(template.proxies)
+    session.trust_env = template.trust_env
+    session.verify = template.verify
+    session.cert = template.cert
+    try:
+        return run_cancellable(lambda: fn(session), cancel, abort=session.abort, deadline=deadline)
+    finally:
+        session.close()
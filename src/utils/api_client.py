@@ -1,21 +1,64 @@
 import requests
 import json
+import binascii
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 import logging
 from datetime import datetime
 import time
+from .telemetry import Telemetry, get_telemetry
+from .log_manager import log_event
+from .resilience import CircuitBreaker, HedgePolicy, is_retryable
+from .abortable_http import run_request
+from .cancellation import CancelToken, Deadline, OperationCancelled, sleep
 
 class APIError(Exception):
     """API错误基类"""
-    def __init__(self, message: str, code: Optional[int] = None, data: Any = None):
+    def __init__(self, message: str, code: Optional[int] = None, data: Any = None,
+                 headers: Optional[Dict] = None):
         self.message = message
         self.code = code
         self.data = data
+        self.headers = dict(headers or {})  # 出错的响应的响应头，请求未得到响应时为空
         super().__init__(self.message)
 
+class CircuitOpenError(APIError):
+    """熔断期间请求被直接拒绝"""
+    def __init__(self, message: str, code: Optional[int] = 503, retry_after: float = 0.0):
+        super().__init__(message, code=code)
+        self.retry_after = retry_after  # 距离允许探测请求的剩余秒数
+
+def decode_inline_image(img_info) -> Optional[bytes]:
+    """解码生成结果中内联的图片数据
+
+    支持 b64_json 字段和 data: URL。解码后从 img_info 中移除Base64文本，
+    避免批量生成时结果中同时保留两份图片数据。
+
+    Returns:
+        Optional[bytes]: 图片内容，没有内联数据时返回None
+    """
+    if not isinstance(img_info, dict):
+        return None
+    encoded = img_info.get("b64_json")
+    if not encoded:
+        url = img_info.get("url") or ""
+        if not url.startswith("data:") or "," not in url:
+            return None
+        encoded = url.split(",", 1)[1]
+    try:
+        content = binascii.a2b_base64(encoded)
+    except (binascii.Error, ValueError) as e:
+        raise APIError(f"图片数据解码失败: {e}")
+    img_info.pop("b64_json", None)
+    return content
+
 class SiliconFlowAPI:
-    def __init__(self, api_key: str, base_url: str = "https://api.siliconflow.cn/v1", proxy: Optional[Dict] = None):
+    INLINE_RETRY_INTERVAL = 600  # 服务不支持内联返回时，改用URL下载的时间（秒），之后再尝试内联
+    
+    def __init__(self, api_key: str, base_url: str = "https://api.siliconflow.cn/v1", proxy: Optional[Dict] = None,
+                 telemetry: Optional[Telemetry] = None, breaker: Optional[CircuitBreaker] = None,
+                 hedge: Optional[HedgePolicy] = None, connect_timeout: float = 10, read_timeout: float = 300,
+                 response_format: str = "url"):
         """
         初始化API客户端
         
@@ -23,25 +66,45 @@ class SiliconFlowAPI:
             api_key: API密钥
             base_url: API基础URL
             proxy: 代理设置，格式如 {"http": "http://proxy:port", "https": "https://proxy:port"}
+            telemetry: 阶段耗时统计，默认使用进程内共享实例
+            breaker: 熔断器，多个客户端访问同一服务时可共用
+            hedge: 对冲请求策略，为None时不发送对冲请求
+            connect_timeout: 建立连接的超时（秒）
+            read_timeout: 等待响应的超时（秒），生成图片可能较慢
+            response_format: "b64_json" 时请求在响应中直接返回图片数据，省去下载；
+                服务报错不支持时，该请求改用 "url" 重发，之后 INLINE_RETRY_INTERVAL 秒内也使用 "url"
         """
         self.api_key = api_key
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.response_format = response_format
+        self._inline_retry_at = 0.0  # 在此时间之前不请求内联返回
+        self.telemetry = telemetry or get_telemetry()
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
+        # 图片下载使用单独的会话，不携带API密钥
+        self.download_session = requests.Session()
         if proxy:
             self.session.proxies.update(proxy)
+            self.download_session.proxies.update(proxy)
         
         # 设置默认请求头
         self.session.headers.update(self._get_headers())
         
-        # 设置日志
+        # 设置日志（级别和输出由 log_manager.setup_logging 统一配置）
         self.logger = logging.getLogger("SiliconFlowAPI")
-        # 确保日志器有处理器
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.DEBUG)  # 设置为DEBUG级别以显示详细信息
+    
+    @property
+    def inline_enabled(self) -> bool:
+        """当前是否请求内联返回图片数据"""
+        return self.response_format == "b64_json" and time.monotonic() >= self._inline_retry_at
+    
+    def _wait(self, stage: str, seconds: float, cancel: Optional[CancelToken] = None) -> None:
+        """重试前等待并记录等待耗时，被取消时抛出 OperationCancelled"""
+        with self.telemetry.span(stage):
+            sleep(seconds, cancel)
     
     def _get_headers(self) -> Dict[str, str]:
         """获取请求头"""
@@ -51,9 +114,14 @@ class SiliconFlowAPI:
             "Accept": "application/json"
         }
     
-    def generate_image(self, prompt, model, negative_prompt="", size="1024x1024", 
-                      batch_size=1, num_inference_steps=20, guidance_scale=7.5, 
-                      prompt_enhancement=False, seeds=None, max_retries=3):
+    def generate_image(self, *args, **kwargs):
+        """生成图片，参数见 generate_image_with_headers，返回API响应结果"""
+        return self.generate_image_with_headers(*args, **kwargs)[0]
+    
+    def generate_image_with_headers(self, prompt, model, negative_prompt="", size="1024x1024",
+                                    batch_size=1, num_inference_steps=20, guidance_scale=7.5,
+                                    prompt_enhancement=False, seeds=None, max_retries=3,
+                                    cancel: Optional[CancelToken] = None, deadline: Optional[float] = None):
         """
         生成图片
         :param prompt: 提示词
@@ -66,109 +134,200 @@ class SiliconFlowAPI:
         :param prompt_enhancement: 是否启用提示词增强
         :param seeds: 种子值列表，每个图片对应一个种子值
         :param max_retries: 最大重试次数
-        :return: API响应结果
+        :param cancel: 取消令牌，取消后进行中的请求和重试等待立即结束（抛出 OperationCancelled）
+        :param deadline: 整个调用（含所有重试）的时限（秒），为None时不限制
+        :return: (API响应结果, 响应头)；失败时响应头见 APIError.headers
         """
-        retry_count = 0
-        last_error = None
+        # 准备请求参数
+        data = {
+            "model": model,
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "size": size,
+            "batch_size": batch_size,
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "prompt_enhancement": prompt_enhancement
+        }
+        
+        # 添加种子值
+        if seeds and len(seeds) == batch_size:
+            data["seeds"] = seeds
+        else:
+            log_event(self.logger, logging.WARNING, "未提供种子值或种子值数量不匹配，将使用随机种子",
+                      every=100, batch_size=batch_size)
+        
+        # 请求内联返回图片数据
+        if self.inline_enabled:
+            data["response_format"] = "b64_json"
+        
+        # 指定种子值时结果确定，才允许发送对冲请求
+        hedge = self.hedge if "seeds" in data else None
+        budget = Deadline(deadline)
         
-        while retry_count < max_retries:
+        attempt = 0
+        while attempt < max_retries:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            if budget.expired:
+                raise APIError("请求超过时限", code=408)
+            
+            # 熔断期间直接失败，不占用工作线程
+            if not self.breaker.allow():
+                retry_after = self.breaker.retry_after()
+                raise CircuitOpenError(
+                    f"API服务连续出错，已暂停请求，{retry_after:.0f}秒后重试", retry_after=retry_after
+                )
+            
+            # 发送请求（只记录摘要，不记录完整请求参数）
+            log_event(self.logger, logging.DEBUG, "generate_request", model=model, size=size,
+                      batch_size=batch_size, steps=num_inference_steps, prompt_chars=len(prompt),
+                      attempt=attempt + 1)
+            
+            timeout = budget.timeout(self.connect_timeout, self.read_timeout)
+            headers = {}  # 本次请求的响应头（含限流额度信息）
+            tokens = []  # 每个请求（含对冲请求）各自的取消令牌
+
+            def send():
+                token = CancelToken()
+                tokens.append(token)
+                if cancel is not None:
+                    cancel.add_callback(token.cancel)
+                try:
+                    return run_request(lambda session: self._post_generation(session, data, model, timeout),
+                                       self.session, token, budget)
+                finally:
+                    if cancel is not None:
+                        cancel.remove_callback(token.cancel)
+
             try:
-                # 准备请求参数
-                data = {
-                    "model": model,
-                    "prompt": prompt,
-                    "negative_prompt": negative_prompt,
-                    "size": size,
-                    "batch_size": batch_size,
-                    "num_inference_steps": num_inference_steps,
-                    "guidance_scale": guidance_scale,
-                    "prompt_enhancement": prompt_enhancement
-                }
-                
-                # 添加种子值
-                if seeds and len(seeds) == batch_size:
-                    data["seeds"] = seeds
-                    self.logger.debug(f"使用种子值: {seeds}")
+                if hedge is not None:
+                    response = hedge.call(send, accept=lambda r: r.status_code == 200)
                 else:
-                    self.logger.warning("未提供种子值或种子值数量不匹配，将使用随机种子")
-                
-                # 发送请求
-                self.logger.debug(f"发送请求到 {self.base_url}/images/generations")
-                self.logger.debug(f"请求参数: {data}")
-                
-                response = self.session.post(
-                    f"{self.base_url}/images/generations",
-                    json=data,
-                    timeout=300
-                )
-                
-                # 检查响应状态
+                    response = send()
+            except OperationCancelled:
+                self.breaker.release_probe()
+                raise
+            except (requests.exceptions.Timeout, TimeoutError):
+                code, error_msg = 408, "请求超时，请检查网络状态"
+            except requests.exceptions.ConnectionError:
+                code, error_msg = 503, "网络连接失败，请检查网络设置"
+            except requests.exceptions.RequestException as e:
+                code, error_msg = None, f"网络请求失败: {e}"
+            else:
+                headers = dict(response.headers)
                 if response.status_code == 200:
-                    result = response.json()
-                    
-                    # 处理返回的种子值
-                    if "data" in result:
-                        images = result["data"]
-                        if seeds and len(seeds) == len(images):
-                            for i, img in enumerate(images):
-                                if "seed" not in img:
-                                    img["seed"] = seeds[i]
-                        self.logger.debug(f"处理后的图片数据: {images}")
-                    
-                    return result
-                    
-                elif response.status_code == 429:
-                    error_msg = "API请求超出限制，请稍后重试"
-                    self.logger.warning(f"第{retry_count + 1}次尝试失败: {error_msg}")
-                    if retry_count == max_retries - 1:
-                        raise APIError(error_msg, code=429)
-                    time.sleep(5 * (retry_count + 1))  # 指数退避
-                
-                elif response.status_code == 503:
-                    error_msg = "API服务暂时不可用，请稍后重试"
-                    self.logger.warning(f"第{retry_count + 1}次尝试失败: {error_msg}")
-                    if retry_count == max_retries - 1:
-                        raise APIError(error_msg, code=503)
-                    time.sleep(5 * (retry_count + 1))
-                
-                else:
                     try:
-                        error_data = response.json()
-                        error_msg = error_data.get('message', response.text)
-                    except:
-                        error_msg = f"未知错误 (状态码: {response.status_code})"
-                    
-                    self.logger.error(f"API请求失败: {error_msg}")
-                    if retry_count == max_retries - 1:
-                        raise APIError(error_msg, code=response.status_code)
-                
-            except requests.exceptions.Timeout:
-                error_msg = "请求超时，请检查网络状态"
-                self.logger.warning(f"第{retry_count + 1}次尝试失败: {error_msg}")
-                if retry_count == max_retries - 1:
-                    raise APIError(error_msg, code=408)
-                time.sleep(5 * (retry_count + 1))
-                
-            except requests.exceptions.ConnectionError:
-                error_msg = "网络连接失败，请检查网络设置"
-                self.logger.warning(f"第{retry_count + 1}次尝试失败: {error_msg}")
-                if retry_count == max_retries - 1:
-                    raise APIError(error_msg, code=503)
-                time.sleep(5 * (retry_count + 1))
-                
-            except Exception as e:
-                last_error = str(e)
-                self.logger.error(f"生成图片时出错: {last_error}")
-                if retry_count == max_retries - 1:
-                    if isinstance(e, APIError):
-                        raise e
+                        result = response.json()
+                    except ValueError:
+                        code, error_msg = 500, "生成图片失败: 响应不是有效的JSON"
                     else:
-                        raise APIError(f"生成图片失败: {last_error}", code=500)
-                time.sleep(5 * (retry_count + 1))
+                        self.breaker.record_success()
+                        return self._parse_result(result, model, seeds), headers
+                else:
+                    code, error_msg = response.status_code, self._error_message(response)
+            finally:
+                # 中止未被采用、仍在进行的对冲请求
+                for token in tokens:
+                    token.cancel()
             
-            retry_count += 1
+            if code in (400, 422) and "response_format" in data and "response_format" in str(error_msg):
+                # 服务不支持内联返回：本次改用URL下载并重新请求，一段时间内不再请求内联返回
+                self.logger.warning("服务不支持内联返回图片，改用URL下载: %s", error_msg)
+                self.breaker.record_success()
+                self._inline_retry_at = time.monotonic() + self.INLINE_RETRY_INTERVAL
+                del data["response_format"]
+                continue  # 不计入重试次数
+            
+            if not is_retryable(code):
+                # 请求本身有问题（参数错误、认证失败等），服务正常，直接失败
+                self.breaker.record_success()
+                self.logger.error("API请求失败: %s", error_msg)
+                raise APIError(error_msg, code=code, headers=headers)
+            
+            self.breaker.record_failure()
+            self.logger.warning("第%d次尝试失败: %s", attempt + 1, error_msg)
+            wait_seconds = 5 * (attempt + 1)
+            remaining = budget.remaining()
+            if attempt == max_retries - 1 or (remaining is not None and remaining <= wait_seconds):
+                raise APIError(error_msg, code=code or 503, headers=headers)
+            stage = "rate_limit_wait" if code == 429 else "retry_wait"
+            self._wait(stage, wait_seconds, cancel)
+            attempt += 1
         
-        raise APIError(f"达到最大重试次数，最后一次错误: {last_error}", code=500)
+        raise APIError("达到最大重试次数", code=500)
+    
+    def _post_generation(self, session: requests.Session, data: Dict, model: str, timeout) -> requests.Response:
+        """在 session 中发送一次生成请求，timeout 为（连接超时, 读取超时）"""
+        with self.telemetry.span("http", model=model) as span:
+            response = session.post(
+                f"{self.base_url}/images/generations",
+                json=data,
+                timeout=timeout
+            )
+            span["status"] = response.status_code
+        return response
+    
+    def _error_message(self, response: requests.Response) -> str:
+        """根据响应生成错误信息"""
+        if response.status_code == 429:
+            return "API请求超出限制，请稍后重试"
+        if response.status_code == 503:
+            return "API服务暂时不可用，请稍后重试"
+        try:
+            return response.json().get('message', response.text)
+        except ValueError:
+            return f"未知错误 (状态码: {response.status_code})"
+    
+    def _parse_result(self, result: Dict, model: str, seeds: Optional[List[int]]) -> Dict:
+        """记录推理耗时并补全返回结果中的种子值"""
+        inference_time = (result.get("timings") or {}).get("inference")
+        if inference_time is not None:
+            self.telemetry.record("inference", float(inference_time), model=model)
+        
+        if "data" in result:
+            images = result["data"]
+            if seeds and len(seeds) == len(images):
+                for i, img in enumerate(images):
+                    if "seed" not in img:
+                        img["seed"] = seeds[i]
+            log_event(self.logger, logging.DEBUG, "generate_response", every=10,
+                      images=len(images), inference=inference_time)
+        
+        return result
+    
+    def fetch_image(self, img_info, timeout: float = 30) -> bytes:
+        """
+        获取生成结果中一张图片的内容
+        
+        响应中带有内联图片数据时直接解码，否则下载URL。
+        
+        Args:
+            img_info: generate_image 返回的 data 中的一项（或图片URL）
+            timeout: 下载超时（秒）
+            
+        Returns:
+            bytes: 图片内容
+            
+        Raises:
+            APIError: 解码或下载失败时抛出
+        """
+        start = time.monotonic()
+        content = decode_inline_image(img_info)
+        if content is not None:
+            self.telemetry.record("decode", time.monotonic() - start)
+            return content
+        
+        url = img_info.get("url") if isinstance(img_info, dict) else img_info
+        if not url:
+            raise APIError("图片URL为空")
+        
+        with self.telemetry.span("download"):
+            response = self.download_session.get(url, timeout=(min(self.connect_timeout, timeout), timeout))
+            content = response.content
+        if response.status_code != 200:
+            raise APIError(f"图片下载失败, 状态码: {response.status_code}", code=response.status_code)
+        return content
     
     def download_image(self, url: str, save_path: Path) -> Path:
         """
@@ -185,15 +344,16 @@ class SiliconFlowAPI:
             APIError: 下载失败时抛出
         """
         try:
-            response = self.session.get(url, stream=True)
-            response.raise_for_status()
-            
-            # 确保保存目录存在
-            save_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            with self.telemetry.span("download"):
+                response = self.session.get(url, stream=True)
+                response.raise_for_status()
+                
+                # 确保保存目录存在
+                save_path.parent.mkdir(parents=True, exist_ok=True)
+                
+                with open(save_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        f.write(chunk)
             
             return save_path
             
@@ -208,12 +368,9 @@ class SiliconFlowAPI:
             bool: 密钥是否有效
         """
         try:
-            self.logger.debug(f"正在验证API密钥，请求URL: {self.base_url}/models")
-            self.logger.debug(f"请求头: {self.session.headers}")
-            
             response = self.session.get(f"{self.base_url}/models")
             
-            self.logger.debug(f"收到响应，状态码: {response.status_code}")
+            log_event(self.logger, logging.DEBUG, "validate_api_key", status=response.status_code)
             
             # 检查响应状态码
             if response.status_code == 200:
@@ -228,11 +385,11 @@ class SiliconFlowAPI:
                     error_message = error_data.get('message', response.text)
                 except:
                     error_message = response.text
-                self.logger.error(f"API请求失败: {error_message}")
+                self.logger.error("API请求失败: %s", error_message)
                 return False
                 
         except requests.exceptions.RequestException as e:
-            self.logger.error(f"网络请求失败: {str(e)}")
+            self.logger.error("网络请求失败: %s", e)
             return False 
     
     def validate_params(self, params: Dict) -> None:
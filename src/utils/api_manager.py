@@ -1,6 +1,16 @@
+import logging
 from PyQt6.QtCore import QObject, pyqtSignal
 from .api_client import SiliconFlowAPI
 from .config_manager import ConfigManager
+from .key_pool import KeyPool, PooledAPI
+from .backends import BackendRouter, create_backends
+from .resilience import CircuitBreaker, HedgePolicy
+from .scheduler import JobScheduler, ScheduledAPI, PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+# 影响API客户端创建的配置项，变化时重建客户端
+API_CONFIG_KEYS = ("api_key", "api_keys", "key_pool", "inline_images", "timeouts", "resilience", "backends")
 
 class APIManager(QObject):
     api_status_changed = pyqtSignal(bool)  # 信号：API状态变化
@@ -15,29 +25,144 @@ class APIManager(QObject):
         super().__init__()
         self.config = config
         self._api = None
+        self._siliconflow = None  # 硅基流动客户端（单密钥或密钥池）
+        self._keys = []
+        self._settings = None
+        # 配置管理器支持变化通知时，只在相关配置修改后重新检查，否则每次比较配置
+        self._stale = True
+        self._watching = isinstance(config, ConfigManager)
+        if self._watching:
+            for key in API_CONFIG_KEYS:
+                config.subscribe(key, self._on_config_changed)
+            config.subscribe("scheduler.max_concurrent", self._on_limit_changed)
+        # 各生成线程共享的请求调度器
+        self.scheduler = JobScheduler(config.get("scheduler.max_concurrent", 8))
         self.refresh_api()
     
+    def _on_config_changed(self, key, value):
+        self._stale = True
+    
+    def _on_limit_changed(self, key, value):
+        self.scheduler.set_limit(int(value or 8))
+    
     def refresh_api(self) -> SiliconFlowAPI:
         """
-        刷新API实例，如果API密钥发生变化则创建新实例
+        刷新API实例，如果API密钥或后端配置发生变化则创建新实例
+        
+        配置了多个密钥（api_key 加上 api_keys）时使用密钥池，
+        请求按剩余额度分配到各密钥，限流或失效的密钥自动暂停使用。
+        配置了其他默认后端或按模型路由（backends.default / backends.routes）时，
+        返回按模型分发请求的 BackendRouter。
         
         Returns:
-            SiliconFlowAPI: API客户端实例
+            SiliconFlowAPI: API客户端实例（多个密钥时为 PooledAPI，使用路由时为 BackendRouter）
         """
-        api_key = self.config.get("api_key", "")
+        if self._watching and not self._stale and self._api is not None:
+            return self._api
+        self._stale = False
+        keys = self.get_api_keys()
+        settings = self._backend_settings()
         
-        # 如果API密钥为空，返回None
-        if not api_key:
-            self._api = None
-            self.api_status_changed.emit(False)
+        # 密钥和后端配置均未变化时复用现有实例
+        if self._api is not None and self._keys == keys and self._settings == settings:
+            return self._api
+        
+        self._siliconflow = self._create_siliconflow(keys)
+        default, routes = settings[0], settings[1]
+        if default == "siliconflow" and not routes:
+            api = self._siliconflow
+        else:
+            backends = create_backends(self.config, self._siliconflow)
+            if default in backends:
+                api = BackendRouter(backends, default, [r for r in routes if r[1] in backends])
+            else:
+                logger.warning("默认后端 %s 不可用", default)
+                api = None
+        
+        self._api = api
+        self._keys = keys
+        self._settings = settings
+        self.api_status_changed.emit(api is not None)
+        return api
+    
+    def _create_siliconflow(self, keys: list):
+        """创建硅基流动客户端，没有密钥时返回None"""
+        if not keys:
             return None
+        breaker = CircuitBreaker(
+            failure_threshold=self.config.get("resilience.failure_threshold", 5),
+            reset_timeout=self.config.get("resilience.reset_timeout", 30),
+        )
+        hedge = None
+        if self.config.get("resilience.hedge", False):
+            hedge = HedgePolicy(
+                percentile=self.config.get("resilience.hedge_percentile", 0.95),
+                min_delay=self.config.get("resilience.hedge_min_delay", 10),
+            )
+        options = {
+            "breaker": breaker,
+            "hedge": hedge,
+            "connect_timeout": self.config.get("timeouts.connect", 10),
+            "read_timeout": self.config.get("timeouts.read", 300),
+            "response_format": "b64_json" if self.config.get("inline_images", True) else "url",
+        }
+        if len(keys) == 1:
+            return SiliconFlowAPI(keys[0], **options)
+        pool = KeyPool(keys, cooldown=self.config.get("key_pool.cooldown", 60))
+        return PooledAPI(keys, pool=pool, **options)
+    
+    def _backend_settings(self) -> tuple:
+        """获取影响后端创建的配置，用于判断是否需要重建"""
+        routes = self.config.get("backends.routes", {}) or {}
+        return (
+            self.config.get("backends.default", "siliconflow"),
+            tuple(routes.items()),
+            self.config.get("backends.openai.api_key", ""),
+            self.config.get("backends.openai.base_url", ""),
+            self.config.get("backends.stub.latency", 0.0),
+            tuple(sorted((self.config.get("resilience", {}) or {}).items())),
+            tuple(sorted((self.config.get("key_pool", {}) or {}).items())),
+            self.config.get("timeouts.connect", 10),
+            self.config.get("timeouts.read", 300),
+            self.config.get("inline_images", True),
+        )
+    
+    def get_api_keys(self) -> list:
+        """获取配置的所有API密钥（去重，主密钥在前）"""
+        keys = [self.config.get("api_key", "")] + list(self.config.get("api_keys", []) or [])
+        return list(dict.fromkeys(key.strip() for key in keys if key and key.strip()))
+    
+    def key_stats(self) -> list:
+        """获取各密钥的使用情况，未使用密钥池时返回空列表"""
+        if isinstance(self._siliconflow, PooledAPI):
+            return self._siliconflow.pool.stats()
+        return []
+    
+    def key_summary_lines(self) -> list:
+        """获取便于显示的密钥使用摘要，未使用密钥池时返回空列表"""
+        if isinstance(self._siliconflow, PooledAPI):
+            return self._siliconflow.pool.summary_lines()
+        return []
+    
+    def job_api(self, name: str, priority: int = PRIORITY_NORMAL, weight: float = 1.0):
+        """获取注册为调度器作业的API客户端
+        
+        多个生成线程同时运行时，按作业优先级和份额分配请求名额。
+        
+        Args:
+            name: 作业名称
+            priority: 优先级，交互式请求使用 PRIORITY_INTERACTIVE
+            weight: 同优先级作业之间的权重
             
-        # 如果API实例不存在或API密钥已更改，创建新实例
-        if self._api is None or self._api.api_key != api_key:
-            self._api = SiliconFlowAPI(api_key)
-            self.api_status_changed.emit(True)
-            
-        return self._api
+        Returns:
+            ScheduledAPI: 包装后的客户端，没有可用API时返回None
+        """
+        api = self.refresh_api()
+        if api is None:
+            return None
+        if not self._watching:
+            self.scheduler.set_limit(self.config.get("scheduler.max_concurrent", 8))
+        return ScheduledAPI(api, self.scheduler, self.scheduler.job(name, priority, weight))
     
     @property
     def api(self) -> SiliconFlowAPI:
@@ -0,0 +1,290 @@
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from fnmatch import fnmatch
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse, parse_qs
+
+import numpy as np
+import requests
+from PIL import Image
+
+from .api_client import APIError, SiliconFlowAPI, decode_inline_image
+from .abortable_http import run_request
+from .cancellation import CancelToken, Deadline, sleep
+from .key_pool import PooledAPI
+from .telemetry import Telemetry, get_telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class ImageBackend(ABC):
+    """图片生成后端接口
+
+    生成线程和任务队列只依赖以下方法，SiliconFlowAPI 和 PooledAPI 即按此接口实现
+    （注册为虚拟子类）：
+
+    - generate_image(prompt, model, negative_prompt, size, batch_size, num_inference_steps,
+      guidance_scale, prompt_enhancement, seeds, max_retries, cancel, deadline) -> Dict
+      返回 {"data": [{"url": ..., "seed": ...}, ...], "timings": {"inference": 秒}}；
+      cancel 被取消时立即抛出 OperationCancelled，deadline 为含重试的总时限（秒）
+    - fetch_image(img_info) -> bytes  获取 data 中一项对应的图片内容
+    - validate_api_key() -> bool
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate_image(self, prompt, model, negative_prompt="", size="1024x1024",
+                       batch_size=1, num_inference_steps=20, guidance_scale=7.5,
+                       prompt_enhancement=False, seeds=None, max_retries=3,
+                       cancel: Optional[CancelToken] = None, deadline: Optional[float] = None) -> Dict:
+        """生成图片"""
+
+    @abstractmethod
+    def fetch_image(self, img_info, timeout: float = 30) -> bytes:
+        """获取生成结果中一张图片的内容"""
+
+    def validate_api_key(self) -> bool:
+        return True
+
+
+# 硅基流动客户端不继承本类（api_client 不依赖后端模块），注册为虚拟子类
+ImageBackend.register(SiliconFlowAPI)
+ImageBackend.register(PooledAPI)
+
+
+def _parse_size(size: str) -> Tuple[int, int]:
+    try:
+        width, height = (int(v) for v in str(size).lower().split("x"))
+        return width, height
+    except ValueError:
+        raise APIError(f"无效的图片尺寸: {size}", code=400)
+
+
+class StubBackend(ImageBackend):
+    """本地确定性模拟后端
+
+    不访问网络，根据提示词和种子值生成程序化图片（相同参数得到相同图片），
+    用于离线测试和全速运行生成流程。图片在 fetch_image 时才生成。
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, telemetry: Optional[Telemetry] = None):
+        self.latency = latency  # 模拟的推理耗时（秒）
+        self.telemetry = telemetry or get_telemetry()
+        self.api_key = ""
+
+    def generate_image(self, prompt, model, negative_prompt="", size="1024x1024",
+                       batch_size=1, num_inference_steps=20, guidance_scale=7.5,
+                       prompt_enhancement=False, seeds=None, max_retries=3,
+                       cancel: Optional[CancelToken] = None, deadline: Optional[float] = None) -> Dict:
+        _parse_size(size)
+        if not seeds or len(seeds) != batch_size:
+            seeds = [self._default_seed(prompt, i) for i in range(batch_size)]
+        if self.latency:
+            sleep(self.latency, cancel)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        return {
+            "data": [
+                {"url": f"stub://image?model={quote(model)}&size={size}&seed={seed}&prompt={digest}", "seed": seed}
+                for seed in seeds
+            ],
+            "timings": {"inference": self.latency},
+        }
+
+    @staticmethod
+    def _default_seed(prompt: str, index: int) -> int:
+        digest = hashlib.sha256(f"{prompt}:{index}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") % 9999999998 + 1
+
+    def fetch_image(self, img_info, timeout: float = 30) -> bytes:
+        url = img_info.get("url") if isinstance(img_info, dict) else img_info
+        if not url or not url.startswith("stub://"):
+            raise APIError(f"无效的模拟图片地址: {url}")
+        query = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+        with self.telemetry.span("download"):
+            return self.render(unquote(query.get("model", "")), query.get("size", "64x64"),
+                               int(query.get("seed", 0)), query.get("prompt", ""))
+
+    @staticmethod
+    def render(model: str, size: str, seed: int, prompt_digest: str) -> bytes:
+        """生成程序化图片：由参数决定的渐变叠加噪声"""
+        width, height = _parse_size(size)
+        key = hashlib.sha256(f"{model}:{seed}:{prompt_digest}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(key[:8], "big"))
+        colors = rng.integers(0, 256, size=(2, 3)).astype(np.float32)
+        t = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :, None]
+        gradient = colors[0] * (1 - t) + colors[1] * t
+        pixels = np.broadcast_to(gradient, (height, width, 3)).copy()
+        pixels += rng.normal(0, 8, size=(height, 1, 1)).astype(np.float32)
+        buffer = BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+
+class OpenAICompatibleBackend(ImageBackend):
+    """OpenAI 兼容接口后端（POST {base_url}/images/generations）"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1",
+                 proxy: Optional[Dict] = None, timeout: float = 300, connect_timeout: float = 10,
+                 response_format: str = "url", telemetry: Optional[Telemetry] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.response_format = response_format  # "b64_json" 时在响应中直接返回图片数据
+        self.telemetry = telemetry or get_telemetry()
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        self.download_session = requests.Session()
+        if proxy:
+            self.session.proxies.update(proxy)
+            self.download_session.proxies.update(proxy)
+
+    def generate_image(self, prompt, model, negative_prompt="", size="1024x1024",
+                       batch_size=1, num_inference_steps=20, guidance_scale=7.5,
+                       prompt_enhancement=False, seeds=None, max_retries=3,
+                       cancel: Optional[CancelToken] = None, deadline: Optional[float] = None) -> Dict:
+        # OpenAI 接口不支持负面提示词、步数、引导系数和种子值
+        data = {"model": model, "prompt": prompt, "n": batch_size, "size": size}
+        if self.response_format == "b64_json":
+            data["response_format"] = "b64_json"
+        budget = Deadline(deadline)
+        for attempt in range(max_retries):
+            if budget.expired:
+                raise APIError("请求超过时限", code=408)
+            timeout = budget.timeout(self.connect_timeout, self.timeout)
+            try:
+                response = run_request(lambda session: self._post(session, data, model, timeout),
+                                       self.session, cancel, budget)
+            except (requests.exceptions.RequestException, TimeoutError) as e:
+                if attempt == max_retries - 1:
+                    raise APIError(f"网络请求失败: {e}", code=503)
+                self._wait("retry_wait", 5 * (attempt + 1), cancel)
+                continue
+
+            if response.status_code == 200:
+                result = response.json()
+                images = result.get("data", [])
+                for i, img in enumerate(images):
+                    img.setdefault("seed", seeds[i] if seeds and i < len(seeds) else None)
+                return {"data": images, "timings": result.get("timings", {})}
+
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt == max_retries - 1:
+                try:
+                    message = response.json().get("error", {}).get("message", response.text)
+                except ValueError:
+                    message = response.text
+                raise APIError(message or f"未知错误 (状态码: {response.status_code})", code=response.status_code)
+            stage = "rate_limit_wait" if response.status_code == 429 else "retry_wait"
+            self._wait(stage, 5 * (attempt + 1), cancel)
+        raise APIError("达到最大重试次数", code=500)
+
+    def _post(self, session: requests.Session, data: Dict, model: str, timeout) -> requests.Response:
+        with self.telemetry.span("http", model=model) as span:
+            response = session.post(f"{self.base_url}/images/generations", json=data, timeout=timeout)
+            span["status"] = response.status_code
+        return response
+
+    def _wait(self, stage: str, seconds: float, cancel: Optional[CancelToken] = None) -> None:
+        with self.telemetry.span(stage):
+            sleep(seconds, cancel)
+
+    def fetch_image(self, img_info, timeout: float = 30) -> bytes:
+        content = decode_inline_image(img_info)
+        if content is not None:
+            return content
+        url = img_info.get("url") if isinstance(img_info, dict) else img_info
+        if not url:
+            raise APIError("图片URL为空")
+        with self.telemetry.span("download"):
+            response = self.download_session.get(url, timeout=(min(self.connect_timeout, timeout), timeout))
+            content = response.content
+        if response.status_code != 200:
+            raise APIError(f"图片下载失败, 状态码: {response.status_code}", code=response.status_code)
+        return content
+
+    def validate_api_key(self) -> bool:
+        try:
+            return self.session.get(f"{self.base_url}/models", timeout=30).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+
+class BackendRouter(ImageBackend):
+    """按模型名称把请求路由到不同后端
+
+    routes 中的模式使用通配符匹配模型名（如 "stub/*"），按顺序取第一个匹配项，
+    都不匹配时使用默认后端。生成结果的每张图片会记录所用后端，
+    fetch_image 据此交给同一后端获取图片。
+    """
+
+    name = "router"
+
+    def __init__(self, backends: Dict[str, ImageBackend], default: str,
+                 routes: Optional[List[Tuple[str, str]]] = None):
+        if default not in backends:
+            raise ValueError(f"未知的默认后端: {default}")
+        for _, backend_name in routes or []:
+            if backend_name not in backends:
+                raise ValueError(f"未知的后端: {backend_name}")
+        self.backends = backends
+        self.default = default
+        self.routes = list(routes or [])
+
+    @property
+    def api_key(self) -> str:
+        return getattr(self.backends[self.default], "api_key", "")
+
+    def __getattr__(self, name):
+        # 其他方法和属性使用默认后端
+        return getattr(self.backends[self.default], name)
+
+    def backend_for(self, model: str) -> str:
+        """获取模型对应的后端名称"""
+        for pattern, backend_name in self.routes:
+            if fnmatch(model, pattern):
+                return backend_name
+        return self.default
+
+    def generate_image(self, prompt, model, *args, **kwargs) -> Dict:
+        backend_name = self.backend_for(model)
+        result = self.backends[backend_name].generate_image(prompt, model, *args, **kwargs)
+        for img in result.get("data", []):
+            img["backend"] = backend_name
+        return result
+
+    def fetch_image(self, img_info, timeout: float = 30) -> bytes:
+        backend_name = img_info.get("backend", self.default) if isinstance(img_info, dict) else self.default
+        return self.backends[backend_name].fetch_image(img_info, timeout=timeout)
+
+    def validate_api_key(self) -> bool:
+        return self.backends[self.default].validate_api_key()
+
+
+def create_backends(config, siliconflow: Optional[ImageBackend] = None) -> Dict[str, ImageBackend]:
+    """根据配置创建可用的后端
+
+    Args:
+        config: 配置管理器
+        siliconflow: 已创建的硅基流动客户端（单密钥或密钥池），为None时不提供该后端
+    """
+    backends = {"stub": StubBackend(latency=config.get("backends.stub.latency", 0.0))}
+    if siliconflow is not None:
+        backends["siliconflow"] = siliconflow
+    openai_key = config.get("backends.openai.api_key", "")
+    if openai_key:
+        backends["openai"] = OpenAICompatibleBackend(
+            openai_key, base_url=config.get("backends.openai.base_url", "https://api.openai.com/v1"),
+            response_format="b64_json" if config.get("inline_images", True) else "url"
+        )
+    return backends
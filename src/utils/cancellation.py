@@ -0,0 +1,148 @@
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+ABORT_GRACE = 5.0  # 中止阻塞调用后最多等待后台线程结束的秒数
+
+
+class OperationCancelled(Exception):
+    """操作已取消"""
+    pass
+
+
+class CancelToken:
+    """取消令牌
+
+    由控制方（停止按钮、关闭程序）调用 cancel()，执行方在等待和
+    阻塞调用时通过 wait() / run_cancellable() 及时响应。
+    """
+
+    def __init__(self):
+        self._event = Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """取消操作，正在等待的调用立即返回"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """注册取消时执行的回调，已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, seconds: float) -> bool:
+        """等待指定时间，期间被取消时提前返回
+
+        Returns:
+            bool: 是否已取消
+        """
+        return self._event.wait(max(seconds, 0))
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelled("操作已取消")
+
+
+class Deadline:
+    """整个操作（含所有重试）的时间预算"""
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget
+        self._expires_at = None if budget is None else time.monotonic() + budget
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，没有时限时返回None"""
+        if self._expires_at is None:
+            return None
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, connect: float, read: float) -> Tuple[float, float]:
+        """按剩余时间缩短连接和读取超时，作为 requests 的 timeout 参数"""
+        remaining = self.remaining()
+        if remaining is None:
+            return connect, read
+        remaining = max(remaining, 0.001)
+        return min(connect, remaining), min(read, remaining)
+
+
+def sleep(seconds: float, cancel: Optional[CancelToken] = None) -> None:
+    """可取消的等待，被取消时抛出 OperationCancelled"""
+    if cancel is None:
+        time.sleep(seconds)
+    elif cancel.wait(seconds):
+        raise OperationCancelled("操作已取消")
+
+
+def run_cancellable(fn: Callable[[], T], cancel: Optional[CancelToken] = None,
+                    abort: Optional[Callable[[], None]] = None, deadline: Optional[Deadline] = None,
+                    grace: float = ABORT_GRACE) -> T:
+    """在后台线程中执行阻塞调用，被取消时立即抛出 OperationCancelled
+
+    被取消或超过 deadline 时调用 abort 中止阻塞调用（如关闭连接），并
+    等待后台线程结束（最多 grace 秒）。没有 abort 时被取消的调用在后台
+    线程中继续执行到结束（受其自身超时限制），结果被丢弃。
+
+    Raises:
+        OperationCancelled: 已取消
+        TimeoutError: 超过时限
+    """
+    if cancel is None and (deadline is None or deadline.remaining() is None):
+        return fn()
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+
+    done = Event()
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    if cancel is not None:
+        cancel.add_callback(done.set)
+    worker = Thread(target=target, daemon=True)
+    worker.start()
+    done.wait(None if deadline is None else deadline.remaining())
+    if cancel is not None:
+        cancel.remove_callback(done.set)
+    if "result" in outcome:
+        return outcome["result"]
+    if "error" in outcome:
+        raise outcome["error"]
+
+    if abort is not None:
+        abort()
+        worker.join(grace)
+    if cancel is not None and cancel.cancelled:
+        raise OperationCancelled("操作已取消")
+    raise TimeoutError("操作超过时限")
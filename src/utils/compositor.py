@@ -0,0 +1,243 @@
+import logging
+import math
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .history_exporter import record_image_paths
+
+logger = logging.getLogger(__name__)
+
+CELL_SIZE = 256  # 每张图片缩小后的最大边长（像素）
+LABEL_HEIGHT = 20  # 图片下方标注的高度（像素）
+TITLE_HEIGHT = 28  # 对比图标题的高度（像素）
+STRIP_ROWS = 4  # 每次拼接并写入的图片行数
+BACKGROUND = 255  # 背景为白色
+
+# 标注使用的字体，依次尝试（需支持中文），都不存在时使用 Pillow 自带的字体
+LABEL_FONTS = ("msyh.ttc", "simhei.ttf", "PingFang.ttc", "NotoSansCJK-Regular.ttc", "wqy-microhei.ttc")
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class CompositionCancelled(Exception):
+    """生成对比图被取消"""
+    pass
+
+
+@dataclass(slots=True)
+class Tile:
+    """对比图中的一格"""
+    path: Optional[str]  # 图片路径，为None时留空
+    label: str = ""
+
+
+def record_tiles(records: Iterable[Dict]) -> List[Tile]:
+    """把历史记录中的每张图片转换为一格，标注种子和提示词"""
+    tiles = []
+    for record in records:
+        params = record.get("params", {})
+        prompt = " ".join(str(params.get("prompt", "")).split())
+        seed = params.get("seed")
+        label = f"种子 {seed}  {prompt}" if seed not in (None, "") else prompt
+        tiles.extend(Tile(path, label) for path in record_image_paths(record))
+    return tiles
+
+
+class PNGStripWriter:
+    """按行块流式写入的PNG文件（8位RGB）
+
+    每次写入若干行像素，压缩后立即写出，内存占用只与一次写入的行数有关。
+    先写入同目录下的临时文件，写完全部行后再替换目标文件。
+    """
+
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 6):
+        if width <= 0 or height <= 0:
+            raise ValueError(f"图片尺寸无效: {width}x{height}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(_PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write(self, rows: np.ndarray) -> None:
+        """写入若干行像素
+
+        Args:
+            rows: 形状为 (行数, 宽度, 3) 的 uint8 数组
+        """
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"像素数组的形状应为 (行数, {self.width}, 3)，实际为 {rows.shape}")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError("写入的行数超过图片高度")
+        rows = np.ascontiguousarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        # 每行使用 Sub 过滤（与左侧像素的差值），照片类图片压缩率明显高于不过滤
+        filtered = np.empty((len(rows), rows.shape[1] + 1), np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        """写入结尾并替换目标文件
+
+        Raises:
+            ValueError: 写入的行数少于图片高度
+        """
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f"只写入了 {self.rows_written}/{self.height} 行")
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self) -> None:
+        """放弃写入，删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self) -> "PNGStripWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+@lru_cache(maxsize=8)
+def _label_font(size: int):
+    for name in LABEL_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def _text_strip(text: str, width: int, height: int) -> np.ndarray:
+    """绘制一行文字，超出宽度的部分被截掉"""
+    image = Image.new("RGB", (width, height), (BACKGROUND,) * 3)
+    if text:
+        draw = ImageDraw.Draw(image)
+        draw.text((4, height // 2), text, fill=(0, 0, 0), font=_label_font(max(height - 8, 8)), anchor="lm")
+    return np.asarray(image)
+
+
+def _load_cell(tile: Optional[Tile], cell_size: int, label_height: int) -> np.ndarray:
+    """读取一格：缩小后的图片居中放置，下方为标注"""
+    cell = np.full((cell_size + label_height, cell_size, 3), BACKGROUND, np.uint8)
+    if tile is None:
+        return cell
+    if tile.path:
+        try:
+            with Image.open(tile.path) as img:
+                img.draft("RGB", (cell_size, cell_size))  # JPEG 可在解码时直接缩小
+                img.thumbnail((cell_size, cell_size))
+                pixels = np.asarray(img.convert("RGB"))
+            h, w = pixels.shape[:2]
+            top, left = (cell_size - h) // 2, (cell_size - w) // 2
+            cell[top:top + h, left:left + w] = pixels
+        except Exception as e:
+            logger.warning("读取图片失败: %s: %s", tile.path, e)
+    if label_height and tile.label:
+        cell[cell_size:] = _text_strip(tile.label, cell_size, label_height)
+    return cell
+
+
+def compose_contact_sheet(tiles: Sequence[Tile], output_path: str, columns: int = 8,
+                          cell_size: int = CELL_SIZE, label_height: int = LABEL_HEIGHT,
+                          title: str = "", strip_rows: int = STRIP_ROWS,
+                          max_workers: Optional[int] = None,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          is_cancelled: Optional[Callable[[], bool]] = None) -> int:
+    """生成对比图（按行排列的缩略图，每张图片下方带标注）
+
+    图片在线程池中读取并缩小，每次取 strip_rows 行图片用 NumPy 拼接成
+    一块像素后写入PNG；写入当前块时下一块已在读取。内存占用只与列数和
+    strip_rows 有关，与图片总数无关。
+
+    Args:
+        tiles: 各格的图片和标注，按行优先排列
+        output_path: 保存路径（PNG）
+        columns: 每行的图片数
+        cell_size: 每张图片缩小后的最大边长
+        label_height: 标注高度，为0时不标注
+        title: 顶部标题，为空时不显示
+        strip_rows: 每次拼接写入的图片行数
+        max_workers: 读取图片的线程数
+        progress: 进度回调，参数为已完成的格数和总格数
+        is_cancelled: 返回True时取消
+
+    Returns:
+        int: 写入的格数
+
+    Raises:
+        CompositionCancelled: 被取消（不保留未完成的文件）
+    """
+    if not tiles:
+        raise ValueError("没有要排列的图片")
+    columns = max(1, min(columns, len(tiles)))
+    strip_rows = max(1, strip_rows)
+    rows = math.ceil(len(tiles) / columns)
+    cell_height = cell_size + label_height
+    width = columns * cell_size
+    title_height = TITLE_HEIGHT if title else 0
+    per_strip = columns * strip_rows
+
+    def load(tile):
+        return _load_cell(tile, cell_size, label_height)
+
+    def submit(executor, start):
+        chunk = list(tiles[start:start + per_strip])
+        return [executor.submit(load, tile) for tile in chunk]
+
+    with PNGStripWriter(output_path, width, title_height + rows * cell_height) as writer:
+        if title:
+            writer.write(_text_strip(title, width, title_height))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = submit(executor, 0)
+            for start in range(0, len(tiles), per_strip):
+                if is_cancelled and is_cancelled():
+                    for future in pending:
+                        future.cancel()
+                    raise CompositionCancelled("生成对比图已取消")
+                cells = [future.result() for future in pending]
+                pending = submit(executor, start + per_strip)  # 写入本块时读取下一块
+                # 最后一行不足时补空白格，再把 (行, 列, 高, 宽, 3) 的格子重排为一整块像素
+                strip_count = math.ceil(len(cells) / columns)
+                blank = _load_cell(None, cell_size, label_height)
+                cells.extend([blank] * (strip_count * columns - len(cells)))
+                strip = (np.stack(cells)
+                         .reshape(strip_count, columns, cell_height, cell_size, 3)
+                         .transpose(0, 2, 1, 3, 4)
+                         .reshape(strip_count * cell_height, width, 3))
+                writer.write(strip)
+                if progress:
+                    progress(min(start + per_strip, len(tiles)), len(tiles))
+    return len(tiles)
@@ -0,0 +1,183 @@
+import time
+import logging
+from collections import deque
+from threading import Condition
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 表示服务端过载的状态码：限流、服务不可用、网关超时、请求超时
+OVERLOAD_CODES = (408, 429, 503, 504)
+
+
+def is_overload(status: Optional[int]) -> bool:
+    """判断请求结果是否表示服务端过载，status 为None（原因未知的错误）时不算过载"""
+    return status in OVERLOAD_CODES
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """请求失败时对应的状态码：API错误取其状态码，超时为408，连接失败为503，其他错误为None"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+        return 408
+    if isinstance(error, (requests.exceptions.ConnectionError, ConnectionError)):
+        return 503
+    return None
+
+
+class AIMDController:
+    """自适应并发控制（加性增、乘性减）
+
+    同时进行的请求数不超过当前上限。请求成功且延迟正常时，每完成约
+    一个上限数量的请求，上限加 increase；遇到限流、503、超时或延迟
+    超过基线的 latency_tolerance 倍时，上限乘以 decrease。一次减小后
+    等待当时在途的请求返回再允许下一次减小，避免同一波拥塞重复减半。
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 8,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_tolerance: float = 2.0, history_size: int = 200):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"无效的并发范围: {min_limit}-{max_limit}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._condition = Condition()
+        self._started = 0  # 已发出的请求序号
+        self._recover_after = 0  # 序号不超过此值的请求结果不再触发减小
+        self._baseline: Optional[float] = None  # 正常情况下的请求延迟
+        self._latency: Optional[float] = None  # 延迟的指数移动平均
+        self.successes = 0
+        self.overloads = 0
+        self.failures = 0
+        self.history = deque([(0.0, self.limit, "初始")], maxlen=history_size)
+        self._created_at = time.monotonic()
+
+    @property
+    def limit(self) -> int:
+        """当前允许的并发请求数"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """等待并占用一个并发名额
+
+        Returns:
+            Optional[int]: 请求序号（传给 release），超时返回None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= self.limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            self._started += 1
+            return self._started
+
+    def release(self, ticket: int, latency: Optional[float] = None, status: Optional[int] = 200) -> None:
+        """归还名额并根据请求结果调整上限
+
+        Args:
+            ticket: acquire() 返回的请求序号
+            latency: 请求耗时（秒）
+            status: 响应状态码（见 error_status），超时为408，连接失败为503，
+                原因未知的错误为None，不调整上限
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if status == 200:
+                self.successes += 1
+                self._on_success(ticket, latency)
+            elif is_overload(status):
+                self.overloads += 1
+                self._decrease(ticket, f"过载({status})")
+            else:
+                # 参数错误、认证失败、解析失败等与负载无关，不调整上限
+                self.failures += 1
+            self._condition.notify_all()
+
+    def abandon(self, ticket: int) -> None:
+        """归还没有得到结果（被取消）的请求的名额，不调整上限"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_success(self, ticket: int, latency: Optional[float]) -> None:
+        if latency is not None:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            elif self._latency > self._baseline * self.latency_tolerance:
+                self._decrease(ticket, f"延迟升高({self._latency:.1f}秒)")
+                # 以当前延迟重新作为基线，避免服务整体变慢后持续减小
+                self._baseline = self._latency
+                return
+        if self._limit < self.max_limit:
+            old = self.limit
+            self._limit = min(self._limit + self.increase / self._limit, float(self.max_limit))
+            if self.limit != old:
+                self._record("增加")
+
+    def _decrease(self, ticket: int, reason: str) -> None:
+        if ticket <= self._recover_after:
+            return
+        self._recover_after = self._started
+        old = self.limit
+        self._limit = max(self._limit * self.decrease, float(self.min_limit))
+        if self.limit != old:
+            logger.info("并发上限 %d -> %d: %s", old, self.limit, reason)
+        self._record(reason)
+
+    def _record(self, reason: str) -> None:
+        self.history.append((time.monotonic() - self._created_at, self.limit, reason))
+
+    def stats(self) -> Dict:
+        """当前状态和统计"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "successes": self.successes,
+                "overloads": self.overloads,
+                "failures": self.failures,
+                "latency": self._latency,
+                "baseline": self._baseline,
+                "peak": max(limit for _, limit, _ in self.history),
+            }
+
+    def summary_lines(self) -> List[str]:
+        """生成便于显示的并发控制摘要"""
+        stats = self.stats()
+        lines = [f"当前并发上限: {stats['limit']} (最高 {stats['peak']})",
+                 f"成功 {stats['successes']}, 过载 {stats['overloads']}, 其他错误 {stats['failures']}"]
+        if stats["latency"] is not None:
+            lines.append(f"平均延迟: {stats['latency']:.1f}秒 (基线 {stats['baseline']:.1f}秒)")
+        changes = [f"{elapsed:.0f}秒: {limit} ({reason})" for elapsed, limit, reason in list(self.history)[1:]]
+        if changes:
+            lines.append("调整记录: " + ", ".join(changes[-10:]))
+        return lines
+
+
+def create_controller(config) -> AIMDController:
+    """根据配置创建并发控制器，未启用（默认）时并发固定为1"""
+    if not config.get("concurrency.enabled", False):
+        return AIMDController(initial=1, min_limit=1, max_limit=1)
+    max_limit = max(int(config.get("concurrency.max", 8)), 1)
+    return AIMDController(
+        initial=int(config.get("concurrency.initial", 2)),
+        min_limit=min(max(int(config.get("concurrency.min", 1)), 1), max_limit),
+        max_limit=max_limit,
+    )
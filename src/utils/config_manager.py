@@ -1,32 +1,155 @@
 import json
 import os
 import sys
+import copy
+import atexit
 import logging
-from typing import Dict, Any
+import threading
+import weakref
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
 from pathlib import Path
 
-class ConfigManager:
+# 缓存中表示配置项不存在
+_MISSING = object()
+
+# 配置文件格式版本，读取旧版本的配置时依次执行 MIGRATIONS 中的升级
+CONFIG_VERSION = 2
+
+
+def _migrate_v1(config: Dict[str, Any]) -> None:
+    """v1 -> v2: 命名规则由字符串改为包含预设和自定义规则的字典"""
+    rule = config.get("naming_rule")
+    if isinstance(rule, str):
+        config["naming_rule"] = {"preset": rule, "custom": rule}
+
+
+# 版本号 -> 升级到下一版本的函数
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], None]] = {1: _migrate_v1}
+
+# 本进程内已确认可写的目录
+_writable_dirs: Set[Path] = set()
+
+# 有未保存修改的配置管理器，退出程序或重新加载同一文件前先写入
+_instances: "weakref.WeakSet[ConfigManager]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all() -> None:
+    for manager in list(_instances):
+        manager.flush()
+
+
+class ConfigSaveError(RuntimeError):
+    """配置文件写入失败（修改仍保留在内存中，下次写入时重试）"""
+
+
+class _BatchState(threading.local):
+    """当前线程的批量修改状态，各线程的批量修改互不影响"""
+    
     def __init__(self):
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
+        self.depth = 0
+        self.undo: Dict[str, Any] = {}  # 修改过的键 -> 修改前的值，出错时按相反顺序恢复
+
+
+class _DebouncedWriter:
+    """延迟写入：第一次修改后等待 delay 秒再写入，期间的修改合并为一次写入"""
+    
+    def __init__(self, write: Callable[[], bool], delay: float):
+        self._write = write
+        self.delay = delay
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def pending(self) -> bool:
+        return self._timer is not None
+    
+    def schedule(self) -> None:
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def cancel(self) -> None:
+        """取消等待中的写入"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+    
+    def flush(self) -> bool:
+        """立即执行等待中的写入"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is None:
+            return True
+        timer.cancel()
+        return self._write()
+
+class ConfigManager:
+    SAVE_DELAY = 0.5  # 修改后延迟保存的秒数，期间的修改合并为一次写入
+    
+    def __init__(self, save_delay: float = SAVE_DELAY):
+        # 设置日志（输出由 log_manager.setup_logging 统一配置）
         self.logger = logging.getLogger(__name__)
         
         # 获取程序运行目录
         if getattr(sys, 'frozen', False):
             # 如果是打包后的 exe
             self.project_root = Path(os.path.dirname(sys.executable))
-            self.logger.info(f"使用打包模式，程序根目录: {self.project_root}")
+            self.logger.info("使用打包模式，程序根目录: %s", self.project_root)
         else:
             # 如果是源码运行，使用当前工作目录
             self.project_root = Path.cwd()
-            self.logger.info(f"使用开发模式，程序根目录: {self.project_root}")
+            self.logger.info("使用开发模式，程序根目录: %s", self.project_root)
         
         # 配置文件路径（在程序运行目录下）
         self.config_dir = self.project_root / 'config'
         self.config_file = self.config_dir / 'config.json'
         
         self.defaults = {
+            "config_version": CONFIG_VERSION,
             "api_key": "",
+            "api_keys": [],  # 备用API密钥，与 api_key 一起组成密钥池
+            "key_pool": {
+                "cooldown": 60  # 密钥触发限流后暂停使用的秒数（响应头有 Retry-After 时以其为准）
+            },
+            "inline_images": True,  # 请求在响应中直接返回图片数据（Base64），服务不支持时自动改用URL下载
+            "timeouts": {
+                "connect": 10,  # 建立连接的超时（秒）
+                "read": 300,  # 等待生成结果的超时（秒）
+                "deadline": 900  # 批量生成中单个提示词含重试的总时限（秒），0表示不限制
+            },
+            "resilience": {
+                "failure_threshold": 5,  # 连续出错多少次后暂停请求（熔断）
+                "reset_timeout": 30,  # 熔断后多少秒尝试恢复
+                "hedge": False,  # 指定种子值的请求耗时异常时发送对冲请求
+                "hedge_percentile": 0.95,  # 超过最近耗时的该分位数视为异常
+                "hedge_min_delay": 10  # 发送对冲请求前至少等待的秒数
+            },
+            "scheduler": {
+                "max_concurrent": 8  # 所有生成任务合计的同时请求数
+            },
+            "concurrency": {
+                "enabled": False,  # 根据延迟和错误率自动调整同时进行的请求数（需显式开启）
+                "initial": 2,
+                "min": 1,
+                "max": 8
+            },
+            "backends": {
+                "default": "siliconflow",  # siliconflow / openai / stub
+                "routes": {},  # 模型名通配符 -> 后端名称，如 {"stub/*": "stub"}
+                "openai": {
+                    "base_url": "https://api.openai.com/v1",
+                    "api_key": ""
+                },
+                "stub": {
+                    "latency": 0.0  # 模拟后端的推理耗时（秒）
+                }
+            },
             "models": [
                 "stabilityai/stable-diffusion-3-5-large",
                 "stabilityai/stable-diffusion-3-medium",
@@ -46,11 +169,31 @@ class ConfigManager:
             "paths": {
                 "output_dir": str(self.project_root / "output"),
                 "presets_dir": str(self.project_root / "presets"),
-                "history_file": str(self.project_root / "history" / "history.json")
+                "history_file": str(self.project_root / "history" / "history.json"),
+                "trash_dir": ""  # 回收站目录，为空时使用输出目录下的 .trash
             },
             "history": {
                 "max_items": 100
             },
+            "retention": {
+                "enabled": False,  # 启用后在后台按 history.max_items 和以下上限清理，0表示不限制
+                "max_age_days": 0,
+                "max_total_mb": 0,  # 历史记录引用的图片总大小上限
+                "delete_files": False,  # 删除记录时同时删除其图片（默认只删除记录）
+                "delete_orphans": False,  # 删除输出目录中未被历史记录引用的图片
+                "orphan_min_age_hours": 24,
+                "interval": 600,  # 执行间隔（秒）
+                "scan_batch": 2000  # 每次最多检查的输出目录条目数
+            },
+            "output_layout": {
+                "mode": "flat",  # flat: 不分目录, date: 按日期, job: 按作业, model: 按模型, hash: 按文件名哈希前缀
+                "shard_size": 0  # 每个目录最多的文件数，超出时放到编号递增的分片目录，0表示不限制
+            },
+            "dedup": {
+                "mode": "off",  # off: 不去重, skip: 跳过重复图片, hardlink: 以硬链接保存重复图片
+                "index_file": str(self.project_root / "history" / "dedup_index.json"),
+                "similarity_threshold": 6
+            },
             "naming_rule": {
                 "preset": "{date}_{prompt}_{index}_{seed}",
                 "custom": "{date}_{prompt}_{index}_{seed}",
@@ -67,11 +210,42 @@ class ConfigManager:
         if not self._ensure_directories():
             raise RuntimeError("无法创建必要的目录，请检查程序权限")
         
+        # 修改配置和写入文件时加锁，后台写入不会读到修改了一半的配置
+        self._lock = threading.RLock()
+        self._batch = _BatchState()
+        self._dirty = False
+        # 点号分隔的键预先拆分，读取结果按键缓存，修改时只清除相关的键
+        self._paths: Dict[str, Tuple[str, ...]] = {}
+        self._cache: Dict[str, Any] = {}
+        self._subscribers: Dict[str, List[Callable[[str, Any], None]]] = {}
+        self._config: Dict[str, Any] = {}
+        self._writer = _DebouncedWriter(self.save_config, save_delay) if save_delay > 0 else None
+        
         # 加载配置
         self.config = self.load_config()
+        _instances.add(self)
+    
+    @property
+    def config(self) -> Dict[str, Any]:
+        """当前配置（嵌套字典），修改请使用 set()"""
+        return self._config
+    
+    @config.setter
+    def config(self, config: Dict[str, Any]) -> None:
+        """替换整个配置，清空缓存并通知所有订阅者"""
+        if config is self._config:
+            return
+        with self._lock:
+            self._config = config
+            self._cache.clear()
+        self._notify(list(self._subscribers))
         
     def _ensure_directories(self) -> bool:
-        """确保所有必要的目录存在"""
+        """确保所有必要的目录存在
+        
+        启动时只创建目录，不再逐个写入探测文件；
+        目录是否可写在首次写入前由 ensure_writable() 检查。
+        """
         directories = [
             self.config_dir,
             Path(self.defaults["paths"]["output_dir"]),
@@ -79,80 +253,123 @@ class ConfigManager:
             Path(self.defaults["paths"]["history_file"]).parent
         ]
         
-        try:
-            for directory in directories:
-                try:
-                    # 尝试创建目录
-                    os.makedirs(directory, exist_ok=True)
-                    
-                    # 测试目录是否可写
-                    test_file = directory / ".write_test"
-                    test_file.touch()
-                    test_file.unlink()
-                    
-                    self.logger.info(f"成功创建并验证目录: {directory}")
-                except Exception as e:
-                    self.logger.error(f"创建或验证目录失败: {directory}, 错误: {e}")
-                    return False
-            return True
+        for directory in directories:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                self.logger.error("创建目录失败: %s, 错误: %s", directory, e)
+                return False
+        return True
+    
+    def ensure_writable(self, directory) -> bool:
+        """确保目录存在且可写，检查结果在本进程内缓存
+        
+        Args:
+            directory: 要写入的目录
             
-        except Exception as e:
-            self.logger.error(f"创建目录时发生错误: {e}")
+        Returns:
+            bool: 目录是否可写
+        """
+        directory = Path(directory)
+        if directory in _writable_dirs:
+            return True
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.TemporaryFile(dir=directory):
+                pass
+        except OSError as e:
+            self.logger.error("目录不可写: %s, 错误: %s，请检查程序权限", directory, e)
             return False
+        _writable_dirs.add(directory)
+        return True
         
     def load_config(self) -> Dict[str, Any]:
         """加载配置文件"""
+        # 同一配置文件尚未写入的修改先保存，避免读到旧内容
+        for manager in list(_instances):
+            if manager is not self and manager.config_file == self.config_file:
+                manager.flush()
+        
         try:
             if os.path.exists(self.config_file):
                 try:
                     with open(self.config_file, 'r', encoding='utf-8') as f:
                         config = json.load(f)
+                    migrated = self._migrate(config)
                     # 合并默认配置，确保新添加的配置项存在
                     merged_config = self._merge_configs(self.defaults, config)
                     self.logger.info("成功加载配置文件")
+                    if migrated:
+                        # 升级后的配置写回文件，下次启动无需再升级
+                        self.save_config(merged_config)
                     return merged_config
                 except json.JSONDecodeError as e:
-                    self.logger.error(f"配置文件格式错误: {e}")
+                    self.logger.error("配置文件格式错误: %s", e)
                     # 备份损坏的配置文件
                     backup_file = self.config_file.with_suffix('.json.bak')
                     os.rename(self.config_file, backup_file)
-                    self.logger.info(f"已备份损坏的配置文件到: {backup_file}")
+                    self.logger.info("已备份损坏的配置文件到: %s", backup_file)
             
             # 如果配置文件不存在或已损坏，创建新的配置文件
-            self.save_config(self.defaults)
+            config = copy.deepcopy(self.defaults)
+            self.save_config(config)
             self.logger.info("已创建新的配置文件")
-            return self.defaults
+            return config
             
         except Exception as e:
-            self.logger.error(f"加载配置文件失败: {e}")
-            return self.defaults
+            self.logger.error("加载配置文件失败: %s", e)
+            return copy.deepcopy(self.defaults)
+    
+    def _migrate(self, config: Dict[str, Any]) -> bool:
+        """将旧版本的配置升级到当前版本（原地修改）
+        
+        Returns:
+            bool: 是否执行了升级
+        """
+        version = config.get("config_version", 1)
+        if not isinstance(version, int) or version > CONFIG_VERSION:
+            self.logger.warning("配置文件版本 %s 高于程序支持的版本 %s，按当前版本读取", version, CONFIG_VERSION)
+            return False
+        if version == CONFIG_VERSION:
+            return False
+        while version < CONFIG_VERSION:
+            MIGRATIONS[version](config)
+            version += 1
+        config["config_version"] = version
+        self.logger.info("配置文件已升级到版本 %s", version)
+        return True
             
     def save_config(self, config=None) -> bool:
         """保存配置文件"""
-        if config is None:
-            config = self.config
-            
+        temp_file = self.config_file.with_suffix('.tmp')
         try:
-            # 确保配置目录存在
-            os.makedirs(self.config_dir, exist_ok=True)
-            
-            # 先将配置写入临时文件
-            temp_file = self.config_file.with_suffix('.tmp')
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-            
-            # 如果写入成功，替换原文件
-            if os.path.exists(self.config_file):
-                os.replace(temp_file, self.config_file)
-            else:
-                os.rename(temp_file, self.config_file)
-            
-            self.config = config
+            with self._lock:
+                if config is None:
+                    config = self.config
+                
+                # 首次写入时确认配置目录可写
+                if not self.ensure_writable(self.config_dir):
+                    return False
+                
+                # 先将配置写入临时文件，落盘后再替换原文件
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                # 如果写入成功，替换原文件
+                if os.path.exists(self.config_file):
+                    os.replace(temp_file, self.config_file)
+                else:
+                    os.rename(temp_file, self.config_file)
+                
+                self.config = config
+                self._dirty = False
             self.logger.info("成功保存配置文件")
             return True
             
         except Exception as e:
-            self.logger.error(f"保存配置文件失败: {e}")
+            self.logger.error("保存配置文件失败: %s", e)
             if os.path.exists(temp_file):
                 try:
                     os.remove(temp_file)
@@ -161,52 +378,221 @@ class ConfigManager:
             return False
             
     def get(self, key: str, default: Any = None) -> Any:
-        """获取配置项"""
+        """获取配置项
+        
+        结果按键缓存，重复读取同一配置项只需一次字典查找。读取和修改
+        在同一把锁中进行，其他线程读不到修改了一半的配置或过期的缓存。
+        """
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._cache[key] = self._resolve(key)
+        return default if value is _MISSING else value
+    
+    def _resolve(self, key: str) -> Any:
+        """按点号分隔的键读取嵌套配置，不存在时返回 _MISSING"""
+        path = self._paths.get(key)
+        if path is None:
+            path = self._paths[key] = tuple(key.split('.'))
         try:
-            # 使用点号分隔的键获取嵌套配置
-            keys = key.split('.')
-            value = self.config
-            for k in keys:
+            value = self._config
+            for k in path:
                 if k not in value:
-                    return default
+                    return _MISSING
                 value = value[k]
             return value
         except (KeyError, TypeError):
-            return default
+            return _MISSING
+    
+    def _invalidate(self, key: str) -> None:
+        """清除受修改影响的缓存：该键本身、上级键和下级键（调用时需持有锁）"""
+        for cached in list(self._cache):
+            if _related(cached, key):
+                self._cache.pop(cached, None)
+    
+    def subscribe(self, key: str, callback: Callable[[str, Any], None]) -> Callable[[], None]:
+        """订阅配置项的变化
+        
+        该键、其上级键或下级键被修改后调用 callback(key, 新值)；
+        批量修改在结束时统一通知。回调在修改配置的线程中执行，界面组件
+        应通过信号把更新转到主线程。
+        
+        Returns:
+            Callable: 调用后取消订阅
+        """
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(callback)
+        
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(key, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+                if not callbacks:
+                    self._subscribers.pop(key, None)
+        return unsubscribe
+    
+    def _notify(self, changed) -> None:
+        """通知受修改影响的订阅者（在锁外调用回调）"""
+        with self._lock:
+            targets = [(key, list(callbacks)) for key, callbacks in self._subscribers.items()
+                       if any(_related(key, item) for item in changed)]
+        for key, callbacks in targets:
+            value = self.get(key)
+            for callback in callbacks:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    self.logger.error("配置变化通知失败: %s, 错误: %s", key, e)
             
+    def _remember(self, undo: Dict[str, Any], key: str) -> None:
+        """记录键修改前的值；上级键不存在时记录最上层不存在的键，撤销时一并删除"""
+        parts = key.split('.')
+        for i in range(1, len(parts) + 1):
+            prefix = '.'.join(parts[:i])
+            value = self._resolve(prefix)
+            if value is _MISSING or i == len(parts):
+                if prefix not in undo:
+                    undo[prefix] = value if value is _MISSING else copy.deepcopy(value)
+                return
+    
+    def _restore(self, key: str, value: Any) -> None:
+        """把键恢复为 value，value 为 _MISSING 时删除该键"""
+        keys = key.split('.')
+        config = self._config
+        for k in keys[:-1]:
+            config = config.setdefault(k, {})
+        if value is _MISSING:
+            config.pop(keys[-1], None)
+        else:
+            config[keys[-1]] = value
+        self._invalidate(key)
+    
     def set(self, key: str, value: Any) -> bool:
-        """设置配置项"""
+        """设置配置项
+        
+        修改立即生效，文件在 save_delay 秒后写入，写入失败时记录日志，
+        修改保留在内存中，下次写入时重试。批量修改中在批量结束时写入，
+        写入失败时由 batch() 抛出 ConfigSaveError。
+        
+        Returns:
+            bool: 修改是否生效（未启用延迟写入时为是否写入成功）
+        """
         try:
-            # 使用点号分隔的键设置嵌套配置
-            keys = key.split('.')
-            config = self.config
-            
-            # 遍历到最后一个键之前
-            for k in keys[:-1]:
-                if k not in config:
-                    config[k] = {}
-                config = config[k]
+            batch = self._batch
+            with self._lock:
+                if batch.depth:
+                    self._remember(batch.undo, key)
                 
-            # 设置最后一个键的值
-            config[keys[-1]] = value
+                # 使用点号分隔的键设置嵌套配置
+                keys = key.split('.')
+                config = self.config
+                
+                # 遍历到最后一个键之前
+                for k in keys[:-1]:
+                    if k not in config:
+                        config[k] = {}
+                    config = config[k]
+                    
+                # 设置最后一个键的值
+                config[keys[-1]] = value
+                self._invalidate(key)
+                self._dirty = True
+                if batch.depth:
+                    return True
             
-            # 立即保存配置
-            return self.save_config()
+            self._notify([key])
+            
+            # 延迟保存，未启用延迟时立即保存
+            if self._writer is None:
+                return self.save_config()
+            self._writer.schedule()
+            return True
             
         except Exception as e:
-            self.logger.error(f"设置配置项失败: {e}")
+            self.logger.error("设置配置项失败: %s", e)
             return False
+    
+    @contextmanager
+    def batch(self):
+        """批量修改配置，结束时只写入一次文件
+        
+        只对当前线程中的 set() 生效，其他线程的修改照常写入。期间出现
+        异常时撤销这些修改（只恢复本线程修改过的键），不写入文件::
+        
+            with config.batch():
+                config.set("api_key", key)
+                config.set("paths.output_dir", path)
+        
+        Raises:
+            ConfigSaveError: 结束时写入文件失败
+        """
+        batch = self._batch
+        batch.depth += 1
+        try:
+            yield self
+        except BaseException:
+            batch.depth -= 1
+            if batch.depth == 0:
+                # 恢复修改前的值，修改未通知过订阅者，无需再通知
+                with self._lock:
+                    for key, value in reversed(list(batch.undo.items())):
+                        self._restore(key, value)
+                batch.undo = {}
+            raise
+        else:
+            batch.depth -= 1
+            if batch.depth:
+                return
+            changed, batch.undo = list(batch.undo), {}
+            if changed:
+                self._notify(changed)
+            if self._dirty:
+                if self._writer is not None:
+                    self._writer.cancel()  # 等待中的延迟写入由本次写入一并完成
+                if not self.save_config():
+                    raise ConfigSaveError(f"保存配置文件失败: {self.config_file}")
+    
+    def flush(self) -> bool:
+        """立即写入尚未保存的修改（包括之前写入失败的修改）"""
+        if self._writer is not None:
+            self._writer.cancel()
+        if not self._dirty:
+            return True
+        return self.save_config()
             
     def _merge_configs(self, default: Dict, config: Dict) -> Dict:
-        """合并配置，确保所有默认配置项都存在"""
-        result = default.copy()
+        """以默认配置为结构合并配置
         
-        def merge_dict(target, source):
+        默认配置深拷贝后作为结果，不会被修改；文件中类型与默认值不符的
+        配置项（如应为字典却是字符串）忽略并使用默认值，默认配置中没有的
+        配置项原样保留。
+        """
+        result = copy.deepcopy(default)
+        
+        def merge_dict(target, source, prefix):
             for key, value in source.items():
-                if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-                    merge_dict(target[key], value)
-                else:
+                expected = target.get(key)
+                if isinstance(expected, dict) and isinstance(value, dict):
+                    merge_dict(expected, value, f"{prefix}{key}.")
+                elif key not in target or expected is None or _same_type(expected, value):
                     target[key] = value
+                else:
+                    self.logger.warning("配置项 %s%s 类型错误，使用默认值", prefix, key)
                     
-        merge_dict(result, config)
-        return result 
\ No newline at end of file
+        merge_dict(result, config, "")
+        return result
+
+
+def _same_type(expected: Any, value: Any) -> bool:
+    """配置值与默认值类型是否一致（整数和小数视为同一类型）"""
+    if isinstance(expected, bool) or isinstance(value, bool):
+        return isinstance(expected, bool) and isinstance(value, bool)
+    if isinstance(expected, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(expected))
+
+
+def _related(a: str, b: str) -> bool:
+    """两个点号分隔的键是否相同或互为上下级"""
+    return a == b or a.startswith(b + ".") or b.startswith(a + ".")
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import logging
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Iterable
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 感知哈希边长（8x8=64位）
+HASH_SIZE = 8
+
+
+def compute_content_hash(data: bytes) -> str:
+    """计算图片内容哈希（SHA-256）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash_array(gray_stack: np.ndarray) -> np.ndarray:
+    """对一组灰度缩略图批量计算差值哈希
+
+    Args:
+        gray_stack: 形状为 (n, HASH_SIZE, HASH_SIZE + 1) 的灰度数组
+
+    Returns:
+        np.ndarray: 形状为 (n,) 的 uint64 哈希数组
+    """
+    # 相邻像素比较，一次完成所有图片
+    bits = gray_stack[:, :, 1:] > gray_stack[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(gray_stack), -1), axis=1)
+    return packed.view(">u8").reshape(-1).astype(np.uint64)
+
+
+def _load_gray(source) -> np.ndarray:
+    """将图片缩放为哈希所需的灰度数组"""
+    with Image.open(source) as img:
+        small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+        return np.asarray(small, dtype=np.int16)
+
+
+def compute_phash(source) -> int:
+    """计算单张图片的感知哈希
+
+    Args:
+        source: 图片路径或文件对象
+
+    Returns:
+        int: 64位感知哈希
+    """
+    return int(dhash_array(_load_gray(source)[np.newaxis])[0])
+
+
+def compute_phashes(paths: Iterable[str]) -> Dict[str, int]:
+    """批量计算多张图片的感知哈希，无法读取的图片会被跳过"""
+    valid_paths = []
+    grays = []
+    for path in paths:
+        try:
+            grays.append(_load_gray(path))
+            valid_paths.append(path)
+        except Exception as e:
+            logger.warning(f"计算感知哈希失败: {path}, 错误: {e}")
+    if not grays:
+        return {}
+    hashes = dhash_array(np.stack(grays))
+    return {path: int(h) for path, h in zip(valid_paths, hashes)}
+
+
+def hamming_distances(target: int, hashes: np.ndarray) -> np.ndarray:
+    """计算一个哈希与一组哈希之间的汉明距离"""
+    xor = np.bitwise_xor(hashes.astype(np.uint64), np.uint64(target))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def cluster_hashes(hashes: Dict[str, int], threshold: int) -> List[List[str]]:
+    """按汉明距离将相似图片聚类
+
+    Args:
+        hashes: 路径到感知哈希的映射
+        threshold: 视为相似的最大汉明距离
+
+    Returns:
+        List[List[str]]: 相似图片分组（只返回包含两张及以上图片的分组）
+    """
+    paths = list(hashes)
+    values = np.array([hashes[p] for p in paths], dtype=np.uint64)
+    parent = list(range(len(paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(paths) - 1):
+        distances = hamming_distances(int(values[i]), values[i + 1:])
+        for offset in np.nonzero(distances <= threshold)[0]:
+            root_a, root_b = find(i), find(i + 1 + int(offset))
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    groups: Dict[int, List[str]] = {}
+    for i, path in enumerate(paths):
+        groups.setdefault(find(i), []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class DedupIndex:
+    """生成图片去重索引
+
+    以内容哈希为键持久化保存已生成图片的路径和感知哈希，
+    用于保存时识别完全相同的图片，以及在历史记录中查找相似图片。
+    """
+
+    VERSION = 1
+
+    def __init__(self, index_file):
+        """初始化去重索引
+
+        Args:
+            index_file: 索引文件路径
+        """
+        self.index_file = Path(index_file)
+        self._lock = Lock()
+        self._entries: Dict[str, Dict] = {}  # 内容哈希 -> {"path", "phash"}
+        self._dirty = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> None:
+        """加载索引文件"""
+        try:
+            if self.index_file.exists():
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    self._entries = data.get("entries", {})
+        except Exception as e:
+            logger.error(f"加载去重索引失败: {e}")
+            self._entries = {}
+
+    def save(self) -> bool:
+        """保存索引文件（先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            data = {"version": self.VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+
+        temp_file = self.index_file.with_suffix(".tmp")
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.index_file)
+            return True
+        except Exception as e:
+            logger.error(f"保存去重索引失败: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def lookup(self, content_hash: str) -> Optional[str]:
+        """查找内容完全相同的已有图片
+
+        Returns:
+            Optional[str]: 已有图片路径，不存在或文件已被删除时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["path"]):
+                # 文件已被删除，索引项失效
+                del self._entries[content_hash]
+                self._dirty = True
+                return None
+            return entry["path"]
+
+    def add(self, path: str, content_hash: str, phash: Optional[int] = None) -> None:
+        """添加索引项，已存在的内容哈希保留原路径"""
+        with self._lock:
+            if content_hash in self._entries:
+                return
+            self._entries[content_hash] = {
+                "path": str(path),
+                "phash": f"{phash:016x}" if phash is not None else None
+            }
+            self._dirty = True
+
+    def register(self, path: str, data: bytes) -> str:
+        """计算图片的内容哈希和感知哈希并加入索引
+
+        Returns:
+            str: 内容哈希
+        """
+        content_hash = compute_content_hash(data)
+        phash = None
+        try:
+            phash = compute_phash(path)
+        except Exception as e:
+            logger.warning(f"计算感知哈希失败: {path}, 错误: {e}")
+        self.add(path, content_hash, phash)
+        return content_hash
+
+    def remove_paths(self, paths: Iterable[str]) -> None:
+        """从索引中移除指定路径"""
+        targets = {str(p) for p in paths}
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if v["path"] in targets]:
+                del self._entries[key]
+                self._dirty = True
+
+    def path_hashes(self) -> Dict[str, int]:
+        """获取所有已记录感知哈希的路径"""
+        with self._lock:
+            return {
+                entry["path"]: int(entry["phash"], 16)
+                for entry in self._entries.values() if entry.get("phash")
+            }
+
+
+_indexes: Dict[str, DedupIndex] = {}  # 索引文件 -> 实例
+_indexes_lock = Lock()
+
+
+def get_dedup_index(config) -> DedupIndex:
+    """按配置获取去重索引（首次调用时从索引文件加载）
+
+    索引文件为 dedup.index_file，未设置时为历史记录目录下的
+    dedup_index.json。同一索引文件共用一个实例，单图生成和批量生成
+    不会各自保存而互相覆盖。
+    """
+    index_file = config.get("dedup.index_file", "")
+    if not index_file:
+        history_file = config.get("paths.history_file", "history/history.json")
+        index_file = os.path.join(os.path.dirname(history_file), "dedup_index.json")
+    key = os.path.abspath(index_file)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = DedupIndex(index_file)
+        return index
+
+
+def find_similar_groups(paths: List[str], threshold: int = 6,
+                        index: Optional[DedupIndex] = None) -> List[List[str]]:
+    """查找一组图片中的相似图片分组
+
+    Args:
+        paths: 图片路径列表
+        threshold: 视为相似的最大汉明距离
+        index: 去重索引，已记录的感知哈希无需重新计算
+
+    Returns:
+        List[List[str]]: 相似图片分组
+    """
+    known = index.path_hashes() if index is not None else {}
+    hashes = {}
+    missing = []
+    for path in dict.fromkeys(paths):
+        if path in known:
+            hashes[path] = known[path]
+        elif os.path.exists(path):
+            missing.append(path)
+    hashes.update(compute_phashes(missing))
+    return cluster_hashes(hashes, threshold)
@@ -2,6 +2,7 @@ import pandas as pd
 from typing import List, Dict, Optional
 from pathlib import Path
 from src.models.generation_task import GenerationTask
+from src.utils.record_exporter import FORMATS, TASK_COLUMNS, export_rows, read_rows
 
 class ExcelHandler:
     """Excel文件处理类"""
@@ -22,6 +23,9 @@ class ExcelHandler:
             FileNotFoundError: 文件不存在
             ValueError: 文件格式错误
         """
+        if Path(file_path).suffix.lower() in FORMATS:
+            return ExcelHandler._read_columnar_tasks(file_path)
+        
         try:
             df = pd.read_excel(file_path)
             
@@ -47,9 +51,24 @@ class ExcelHandler:
         except Exception as e:
             raise ValueError(f"文件格式错误: {str(e)}")
     
+    @staticmethod
+    def _read_columnar_tasks(file_path: str) -> list:
+        """从CSV、JSONL或Parquet文件读取任务（列名为 prompt、model、size）"""
+        if not Path(file_path).exists():
+            raise FileNotFoundError("文件不存在")
+        try:
+            return [
+                GenerationTask(prompt=row["prompt"], model=row["model"], size=row["size"])
+                for row in read_rows(file_path, columns=["prompt", "model", "size"])
+            ]
+        except Exception as e:
+            raise ValueError(f"文件格式错误: {str(e)}")
+    
     @staticmethod
     def export_results(tasks: list, file_path: str) -> None:
-        """导出任务结果到Excel文件
+        """导出任务结果到文件
+        
+        后缀为 .csv、.jsonl 或 .parquet 时流式写入对应格式，其余导出为Excel。
         
         Args:
             tasks: 任务列表
@@ -58,6 +77,23 @@ class ExcelHandler:
         Raises:
             ValueError: 导出失败
         """
+        if Path(file_path).suffix.lower() in FORMATS:
+            try:
+                rows = (
+                    {
+                        "prompt": task.prompt,
+                        "model": task.model,
+                        "size": task.size,
+                        "status": task.status,
+                        "result_path": str(task.result_path) if task.result_path else None
+                    }
+                    for task in tasks
+                )
+                export_rows(rows, file_path, list(TASK_COLUMNS), TASK_COLUMNS)
+                return
+            except Exception as e:
+                raise ValueError(f"导出失败: {str(e)}")
+        
         try:
             # 准备数据
             data = []
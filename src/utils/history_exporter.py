@@ -0,0 +1,210 @@
+import os
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image as PILImage
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+
+# 导出表格的列标题
+EXPORT_HEADERS = [
+    "图片", "名称", "提示词", "负面提示词", "模型",
+    "尺寸", "步数", "引导系数", "随机种子", "提示增强",
+    "图片路径"
+]
+
+# 缩略图最大尺寸（像素），与图片列宽（20个字符，约120像素）对应
+THUMBNAIL_SIZE = (120, 100)
+
+WRAP_ALIGNMENT = Alignment(wrap_text=True)
+
+
+class ExportCancelled(Exception):
+    """导出被取消"""
+    pass
+
+
+def record_image_paths(record: Dict) -> List[str]:
+    """获取记录中的图片路径（兼容旧格式）"""
+    image_paths = record.get("image_paths", [])
+    if not image_paths and "image_path" in record:
+        image_paths = [record["image_path"]]
+    return image_paths
+
+
+def record_row(record: Dict) -> List:
+    """将历史记录转换为一行导出数据（第一列留给图片）"""
+    params = record.get("params", {})
+    image_paths = record_image_paths(record)
+
+    # 获取文件名（不带扩展名）
+    filename = "未知"
+    if image_paths:
+        filename = os.path.splitext(os.path.basename(image_paths[0]))[0]
+        if len(image_paths) > 1:
+            filename += f" (+{len(image_paths)-1})"
+
+    return [
+        "",  # 第一列是图片
+        filename,
+        params.get("prompt", ""),
+        params.get("negative_prompt", ""),
+        params.get("model", ""),
+        params.get("size", ""),
+        params.get("num_inference_steps", ""),
+        params.get("guidance_scale", ""),
+        params.get("seed", ""),
+        "是" if params.get("prompt_enhancement", False) else "否",
+        "\n".join(image_paths)
+    ]
+
+
+def make_thumbnail(image_path: str, max_size: Tuple[int, int] = THUMBNAIL_SIZE) -> Optional[Tuple[bytes, int, int]]:
+    """生成缩略图
+
+    Args:
+        image_path: 原图路径
+        max_size: 缩略图最大宽高
+
+    Returns:
+        Optional[Tuple[bytes, int, int]]: PNG数据和宽高，图片不存在或无法读取时返回None
+    """
+    if not image_path or not os.path.exists(image_path):
+        return None
+    try:
+        with PILImage.open(image_path) as img:
+            img.draft("RGB", max_size)  # JPEG 可在解码时直接缩小
+            img.thumbnail(max_size)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            buffer = BytesIO()
+            img.save(buffer, format="PNG")
+            return buffer.getvalue(), img.width, img.height
+    except Exception as e:
+        logger.warning("生成缩略图失败: %s: %s", image_path, e)
+        return None
+
+
+def _styled(ws, value):
+    """长文本启用自动换行"""
+    if isinstance(value, str) and len(value) > 50:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.alignment = WRAP_ALIGNMENT
+        return cell
+    return value
+
+
+def export_records_to_excel(records: Iterable[Dict], file_path: str,
+                            thumbnail_size: Tuple[int, int] = THUMBNAIL_SIZE,
+                            max_workers: Optional[int] = None, chunk_size: int = 64,
+                            progress: Optional[Callable[[int, int], None]] = None,
+                            is_cancelled: Optional[Callable[[], bool]] = None,
+                            total: Optional[int] = None) -> int:
+    """以流式方式导出历史记录到Excel
+
+    工作表使用 openpyxl 的只写模式逐行写入，图片以缩略图嵌入，
+    缩略图按块在线程池中并行生成，内存占用与记录数量基本无关。
+
+    Args:
+        records: 历史记录
+        file_path: 导出文件路径
+        thumbnail_size: 缩略图最大宽高
+        max_workers: 生成缩略图的线程数
+        chunk_size: 每块处理的记录数
+        progress: 进度回调，参数为已导出数量和总数
+        is_cancelled: 返回True时取消导出
+        total: 记录总数，records 不支持 len() 时用于进度显示
+
+    Returns:
+        int: 导出的记录数
+
+    Raises:
+        ExportCancelled: 导出被取消（不保留未完成的文件）
+    """
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+
+    # 只写模式下列宽需在写入数据前设置
+    ws.column_dimensions["A"].width = 20  # 约120像素，用于显示图片
+    for col in range(2, len(EXPORT_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 20
+    ws.row_dimensions[1].height = 15
+    ws.append(EXPORT_HEADERS)
+
+    try:
+        exported = _write_rows(ws, records, thumbnail_size, max_workers, chunk_size,
+                               progress, is_cancelled, total)
+    except BaseException:
+        _discard(wb)
+        raise
+
+    try:
+        wb.save(file_path)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return exported
+
+
+def _discard(wb) -> None:
+    """丢弃未完成的工作簿
+
+    只写模式的工作表写入临时文件，保存时才会删除；保存到随即删除的
+    临时文件中以释放这些文件，不影响导出路径上已有的文件。
+    """
+    try:
+        with tempfile.TemporaryFile() as f:
+            wb.save(f)
+    except Exception as e:
+        logger.warning("清理未完成的导出失败: %s", e)
+
+
+def _write_rows(ws, records, thumbnail_size, max_workers, chunk_size,
+                progress, is_cancelled, total) -> int:
+    """按块并行生成缩略图并逐行写入工作表"""
+    exported = 0
+    row_idx = 1
+    iterator = iter(records)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            if is_cancelled and is_cancelled():
+                raise ExportCancelled("导出已取消")
+
+            first_paths = [(record_image_paths(record) or [None])[0] for record in chunk]
+            thumbnails = executor.map(lambda path: make_thumbnail(path, thumbnail_size), first_paths)
+
+            for record, thumbnail in zip(chunk, thumbnails):
+                row_idx += 1
+                if thumbnail is not None:
+                    data, width, height = thumbnail
+                    img = Image(BytesIO(data))
+                    img.width, img.height = width, height
+                    ws.add_image(img, f"A{row_idx}")
+                    # 1像素约等于0.75单位，确保图片完整显示
+                    ws.row_dimensions[row_idx].height = max(height * 0.75, 20)
+                ws.append([_styled(ws, value) for value in record_row(record)])
+                ws.row_dimensions.pop(row_idx, None)  # 行已写出，释放行属性
+                exported += 1
+
+            if progress:
+                progress(exported, total or exported)
+
+    if is_cancelled and is_cancelled():
+        raise ExportCancelled("导出已取消")
+    return exported
@@ -50,6 +50,15 @@ class HistoryManager(QObject):
         except Exception as e:
             print(f"添加历史记录失败: {str(e)}")
             
+    def add_records(self, records):
+        """批量添加历史记录（按原顺序插入到开头，只保存一次）"""
+        try:
+            self.records[:0] = list(records)
+            self.save_records()
+            self.history_updated.emit()
+        except Exception as e:
+            print(f"添加历史记录失败: {str(e)}")
+            
     def clear_records(self):
         """清空历史记录"""
         try:
@@ -79,4 +88,34 @@ class HistoryManager(QObject):
             self.history_updated.emit()
             
         except Exception as e:
-            print(f"删除历史记录失败: {str(e)}") 
\ No newline at end of file
+            print(f"删除历史记录失败: {str(e)}")
+
+    def remove_records(self, records):
+        """删除指定的记录对象（按对象而不是序号，期间增加或删除了其他记录也不受影响）
+
+        Returns:
+            int: 删除的记录数
+        """
+        try:
+            targets = {id(record) for record in records}
+            kept = [record for record in self.records if id(record) not in targets]
+            removed = len(self.records) - len(kept)
+            if removed:
+                self.records[:] = kept
+                self.save_records()
+                self.history_updated.emit()
+            return removed
+        except Exception as e:
+            print(f"删除历史记录失败: {str(e)}")
+            return 0
+
+    def restore_records(self, removed):
+        """把删除的记录插回原来的位置，removed 为 (原序号, 记录)，按原序号升序（只保存一次）"""
+        try:
+            for row, record in removed:
+                self.records.insert(min(row, len(self.records)), record)
+            if removed:
+                self.save_records()
+                self.history_updated.emit()
+        except Exception as e:
+            print(f"恢复历史记录失败: {str(e)}")
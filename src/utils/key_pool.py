@@ -0,0 +1,268 @@
+import time
+import logging
+from dataclasses import dataclass
+from threading import Condition
+from typing import Dict, List, Optional
+
+from .api_client import SiliconFlowAPI, APIError, CircuitOpenError
+from .cancellation import CancelToken, Deadline, OperationCancelled
+from .resilience import CircuitBreaker, is_retryable
+
+logger = logging.getLogger(__name__)
+
+# 响应头中的剩余额度（不同服务商的命名不同，依次尝试）
+REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+
+
+def mask_key(api_key: str) -> str:
+    """隐藏密钥中间部分，用于显示和日志"""
+    if len(api_key) <= 10:
+        return api_key[:2] + "***"
+    return f"{api_key[:5]}***{api_key[-4:]}"
+
+
+@dataclass
+class KeyState:
+    """单个API密钥的状态和统计"""
+    key: str
+    quota: int = 100  # 预估的剩余额度，响应头提供时以响应头为准
+    in_flight: int = 0
+    requests: int = 0
+    successes: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+    cooldown_until: float = 0.0
+    auth_failed: bool = False  # 最近一次请求认证失败
+    last_error: str = ""
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def score(self) -> float:
+        """剩余额度越多、进行中的请求越少，得分越高"""
+        return self.quota / (self.in_flight + 1)
+
+
+class KeyPool:
+    """API密钥池
+
+    按剩余额度加权选择密钥；返回429的密钥暂停使用一段时间，
+    返回401/403的密钥暂停更长时间（通常是密钥失效或被禁用）。
+    """
+
+    def __init__(self, keys: List[str], cooldown: float = 60.0, auth_cooldown: float = 3600.0,
+                 default_quota: int = 100):
+        keys = list(dict.fromkeys(k for k in keys if k))  # 去重并保持顺序
+        if not keys:
+            raise ValueError("API密钥池不能为空")
+        self.cooldown = cooldown
+        self.auth_cooldown = auth_cooldown
+        self._states = [KeyState(key, quota=default_quota) for key in keys]
+        self._condition = Condition()
+        self._next = 0  # 得分相同时轮流选择
+
+    @property
+    def keys(self) -> List[str]:
+        return [state.key for state in self._states]
+
+    def acquire(self, timeout: Optional[float] = None, cancel: Optional[CancelToken] = None) -> KeyState:
+        """选择一个可用密钥，全部处于冷却时等待
+
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等到有密钥恢复
+            cancel: 取消令牌，等待期间被取消时抛出 OperationCancelled
+
+        Raises:
+            APIError: 所有密钥都认证失败（code=401），或等待时限内不会有
+                密钥恢复（code=429），不等待直接抛出
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                now = time.monotonic()
+                candidates = [s for s in self._states if s.available(now)]
+                if candidates:
+                    state = self._choose(candidates)
+                    state.in_flight += 1
+                    state.requests += 1
+                    return state
+                if all(s.auth_failed for s in self._states):
+                    raise APIError("所有API密钥均认证失败，请检查密钥设置", code=401)
+                soonest = min(s.cooldown_until for s in self._states)
+                wait = soonest - now
+                if deadline is not None:
+                    if soonest >= deadline:
+                        raise APIError("所有API密钥均处于限流冷却中，请稍后重试", code=429)
+                    wait = min(wait, deadline - now)
+                if cancel is not None:
+                    wait = min(wait, 0.05)  # 定期检查是否已取消
+                self._condition.wait(max(wait, 0.01))
+
+    def _choose(self, candidates: List[KeyState]) -> KeyState:
+        best = max(state.score() for state in candidates)
+        top = [state for state in candidates if state.score() == best]
+        state = top[self._next % len(top)]
+        self._next += 1
+        return state
+
+    def release(self, state: KeyState, status: Optional[int] = 200,
+                headers: Optional[Dict] = None, error: str = "") -> None:
+        """归还密钥并根据请求结果更新状态
+
+        Args:
+            state: acquire() 返回的密钥状态
+            status: 响应状态码，网络错误时为None
+            headers: 响应头，用于读取剩余额度和 Retry-After
+            error: 错误信息
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        with self._condition:
+            state.in_flight -= 1
+            remaining = next((headers[h] for h in REMAINING_HEADERS if h in headers), None)
+            if remaining is not None:
+                try:
+                    state.quota = max(int(float(remaining)), 0)
+                except ValueError:
+                    pass
+
+            if status == 200:
+                state.successes += 1
+                state.auth_failed = False
+                state.last_error = ""
+            elif status == 429:
+                state.rate_limited += 1
+                state.last_error = error or "请求超出限制"
+                state.cooldown_until = time.monotonic() + self._retry_after(headers, self.cooldown)
+                logger.warning("API密钥 %s 触发限流，暂停使用", mask_key(state.key))
+            elif status in (401, 403):
+                state.failures += 1
+                state.auth_failed = True
+                state.last_error = error or "密钥无效"
+                state.cooldown_until = time.monotonic() + self.auth_cooldown
+                logger.warning("API密钥 %s 认证失败，暂停使用", mask_key(state.key))
+            else:
+                state.failures += 1
+                state.last_error = error
+            self._condition.notify_all()
+
+    def cancel(self, state: KeyState) -> None:
+        """归还未得到结果的密钥（请求被取消或未发出），不计入统计"""
+        with self._condition:
+            state.in_flight -= 1
+            self._condition.notify_all()
+
+    @staticmethod
+    def _retry_after(headers: Dict, default: float) -> float:
+        try:
+            return max(float(headers["retry-after"]), 0.0)
+        except (KeyError, ValueError):
+            return default
+
+    def stats(self) -> List[Dict]:
+        """各密钥的使用情况"""
+        now = time.monotonic()
+        with self._condition:
+            total = sum(state.requests for state in self._states) or 1
+            return [
+                {
+                    "key": mask_key(state.key),
+                    "requests": state.requests,
+                    "successes": state.successes,
+                    "rate_limited": state.rate_limited,
+                    "failures": state.failures,
+                    "in_flight": state.in_flight,
+                    "quota": state.quota,
+                    "share": state.requests / total,
+                    "cooldown": max(state.cooldown_until - now, 0.0),
+                    "last_error": state.last_error,
+                }
+                for state in self._states
+            ]
+
+    def summary_lines(self) -> List[str]:
+        """生成便于显示的密钥使用摘要"""
+        lines = []
+        for item in self.stats():
+            line = (f"{item['key']}: {item['requests']}次 ({item['share']:.0%}), "
+                    f"成功{item['successes']}, 限流{item['rate_limited']}, 失败{item['failures']}")
+            if item["cooldown"] > 0:
+                line += f", 冷却中({item['cooldown']:.0f}秒)"
+            lines.append(line)
+        return lines
+
+
+class PooledAPI:
+    """使用密钥池的API客户端
+
+    接口与 SiliconFlowAPI 相同，每次请求从密钥池选择密钥，
+    遇到429或401/403时立即换用其他密钥重试。各密钥的客户端访问同一服务，
+    共用一个熔断器。
+    """
+
+    # 换用其他密钥重试的状态码
+    FAILOVER_CODES = (401, 403, 429)
+
+    def __init__(self, keys: List[str], pool: Optional[KeyPool] = None, **client_kwargs):
+        self.pool = pool or KeyPool(keys)
+        client_kwargs.setdefault("breaker", CircuitBreaker())
+        self.clients = {key: SiliconFlowAPI(key, **client_kwargs) for key in self.pool.keys}
+        self.primary = self.clients[self.pool.keys[0]]
+
+    @property
+    def api_key(self) -> str:
+        return self.primary.api_key
+
+    def __getattr__(self, name):
+        # 其他方法和属性（validate_params、session 等）使用第一个密钥的客户端
+        return getattr(self.primary, name)
+
+    def generate_image(self, *args, max_retries=3, **kwargs):
+        """生成图片，参数与 SiliconFlowAPI.generate_image 相同
+
+        限流和认证失败时换用其他密钥（不计入重试次数）；其他可重试的错误按
+        max_retries 退避重试，不可重试的错误和熔断直接抛出。
+        """
+        retries = 0
+        failovers = 0
+        cancel = kwargs.get("cancel")
+        budget = Deadline(kwargs.get("deadline"))
+        while True:
+            if budget.expired:
+                raise APIError("请求超过时限", code=408)
+            kwargs["deadline"] = budget.remaining()
+            start = time.monotonic()
+            state = self.pool.acquire(timeout=budget.remaining(), cancel=cancel)
+            waited = time.monotonic() - start
+            if waited > 0.01:
+                self.primary.telemetry.record("rate_limit_wait", waited)
+
+            client = self.clients[state.key]
+            try:
+                # 响应头随本次结果返回，同一密钥被多个线程同时使用时也不会混用
+                result, headers = client.generate_image_with_headers(*args, max_retries=1, **kwargs)
+            except (CircuitOpenError, OperationCancelled):
+                self.pool.cancel(state)
+                raise
+            except APIError as e:
+                self.pool.release(state, e.code, e.headers, e.message)
+                if e.code in self.FAILOVER_CODES:
+                    failovers += 1
+                    if failovers >= max_retries * len(self.clients):
+                        raise
+                    continue
+                retries += 1
+                if retries >= max_retries or not is_retryable(e.code):
+                    raise
+                client._wait("retry_wait", 5 * retries, cancel)
+                continue
+            except Exception as e:
+                self.pool.release(state, None, error=str(e))
+                raise
+            self.pool.release(state, 200, headers)
+            return result
+
+    def validate_api_key(self) -> bool:
+        """所有密钥都有效时返回True"""
+        return all(client.validate_api_key() for client in self.clients.values())
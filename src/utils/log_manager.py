@@ -0,0 +1,169 @@
+import atexit
+import logging
+import re
+from itertools import count
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Lock
+from typing import Dict, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# 需要脱敏的敏感信息
+SECRET_PATTERNS = [
+    (re.compile(r"(Bearer\s+)[^\s'\",}]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"\bsk-[A-Za-z0-9_\-]{6,}"), "sk-***"),
+    # 字段名前须为单词边界，max_token、prompt_tokens 等用量字段不脱敏
+    (re.compile(r"\b((?:api_key|apikey|(?:access_|refresh_|auth_|id_)?token|authorization)['\"]?\s*[:=]\s*['\"]?)"
+                r"(?!Bearer\s)[^\s'\",}*]+", re.IGNORECASE), r"\1***"),
+]
+
+
+def redact(text: str) -> str:
+    """隐藏文本中的密钥等敏感信息"""
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class StructuredMessage:
+    """结构化日志消息，只有在真正输出时才格式化"""
+
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event: str, fields: Dict):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self) -> str:
+        if not self.fields:
+            return self.event
+        return self.event + " " + " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+
+class Sampler:
+    """按事件计数的采样器，每 every 次只放行一次"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: Dict[str, count] = {}
+
+    def should_log(self, key: str, every: int) -> bool:
+        if every <= 1:
+            return True
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = count()
+            return next(counter) % every == 0
+
+
+_sampler = Sampler()
+
+
+def log_event(logger: logging.Logger, level: int, event: str, every: int = 1, **fields) -> None:
+    """输出结构化日志事件
+
+    日志级别未启用或被采样跳过时不做任何格式化。
+
+    Args:
+        logger: 日志器
+        level: 日志级别
+        event: 事件名称
+        every: 采样间隔，每 every 次输出一次，用于逐张图片等高频消息
+        fields: 事件字段
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if not _sampler.should_log(f"{logger.name}:{event}", every):
+        return
+    logger.log(level, StructuredMessage(event, fields))
+
+
+class RedactingFilter(logging.Filter):
+    """在输出前隐藏日志中的敏感信息"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = redact(message)
+        if redacted != message or record.args:
+            record.msg = redacted
+            record.args = None
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """只入队不格式化的队列处理器，格式化和脱敏在后台线程中完成"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def setup_logging(log_dir, level: int = logging.INFO, max_bytes: int = 5 * 1024 * 1024,
+                  backup_count: int = 3, console_level: Optional[int] = logging.WARNING) -> QueueListener:
+    """初始化应用日志
+
+    日志记录通过队列交给后台线程写入滚动日志文件，调用线程只负责入队。
+    重复调用时返回已有的监听器。
+
+    Args:
+        log_dir: 日志目录
+        level: 根日志级别
+        max_bytes: 单个日志文件最大字节数
+        backup_count: 保留的历史日志文件数量
+        console_level: 控制台输出级别，为None时不输出到控制台
+
+    Returns:
+        QueueListener: 后台日志监听器
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    redacting_filter = RedactingFilter()
+
+    file_handler = RotatingFileHandler(log_dir / "app.log", maxBytes=max_bytes,
+                                       backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    file_handler.addFilter(redacting_filter)
+    handlers = [file_handler]
+
+    if console_level is not None:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(formatter)
+        console_handler.addFilter(redacting_filter)
+        handlers.append(console_handler)
+
+    queue = SimpleQueue()
+    _queue_handler = DeferredQueueHandler(queue)
+    _listener = QueueListener(queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """停止后台日志线程并写出剩余日志"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
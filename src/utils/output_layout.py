@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 输出目录布局 -> 显示名称
+LAYOUTS = {
+    "flat": "不分目录",
+    "date": "按日期",
+    "job": "按作业",
+    "model": "按模型",
+    "hash": "按文件名哈希",
+}
+
+DEFAULT_SHARD_SIZE = 0  # 每个目录最多的文件数，0表示不限制（需要时在设置中开启，建议5000）
+MAX_LAYOUTS = 8  # get_output_layout 最多保留的布局实例数
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def _safe_name(text: str, fallback: str) -> str:
+    """把作业名、模型名转换为可用作目录名的文字"""
+    name = _UNSAFE_CHARS.sub("_", text).strip(" .")[:60]
+    return name or fallback
+
+
+def _count_files(path: str) -> int:
+    try:
+        with os.scandir(path) as entries:
+            return sum(1 for entry in entries if entry.is_file(follow_symlinks=False))
+    except FileNotFoundError:
+        return 0
+
+
+class OutputLayout:
+    """输出目录布局
+
+    按布局把图片放到输出目录的子目录中（按日期、作业、模型或文件名哈希
+    前缀），并限制每个目录的文件数：目录中的文件达到 shard_size 时，之后
+    的文件放到编号递增的分片目录（"名称_002"，不分目录时为 "part_002"）。
+    每个目录的文件数只在首次使用时统计一次，之后在内存中计数：directory()
+    只选择目录，实际写入文件后由 add_file() 计数（跳过或硬链接的重复图片
+    不计入），保存文件时不需要列出目录。同时保存多个文件时，目录中的
+    文件数最多超出上限同时保存的文件数。
+    """
+
+    def __init__(self, root: str, mode: str = "flat", shard_size: int = DEFAULT_SHARD_SIZE):
+        if mode not in LAYOUTS:
+            raise ValueError(f"未知的输出目录布局: {mode}")
+        self.root = root
+        self.mode = mode
+        self.shard_size = max(0, shard_size)
+        self._lock = threading.Lock()
+        self._shards: Dict[str, List[int]] = {}  # 子目录名 -> [当前分片编号, 文件数]
+        self._groups: Dict[str, str] = {}  # 当前分片的路径 -> 子目录名
+
+    def group(self, filename: str = "", model: str = "", job: str = "",
+              when: Optional[datetime] = None) -> str:
+        """布局对应的子目录名（不含分片编号），不分目录时为空"""
+        if self.mode == "date":
+            return (when or datetime.now()).strftime("%Y-%m-%d")
+        if self.mode == "job":
+            return _safe_name(job, "default")
+        if self.mode == "model":
+            return _safe_name(model.split("/")[-1], "unknown")
+        if self.mode == "hash":
+            return hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+        return ""
+
+    def shard_path(self, group: str, shard: int) -> str:
+        """子目录第 shard 个分片的路径，第一个分片即子目录本身"""
+        if shard == 1:
+            return os.path.join(self.root, group) if group else self.root
+        return os.path.join(self.root, f"{group}_{shard:03d}" if group else f"part_{shard:03d}")
+
+    def _scan(self, group: str) -> List[int]:
+        """找到子目录已有的最后一个分片并统计其文件数"""
+        shard = 1
+        while os.path.isdir(self.shard_path(group, shard + 1)):
+            shard += 1
+        return [shard, _count_files(self.shard_path(group, shard))]
+
+    def directory(self, filename: str = "", model: str = "", job: str = "",
+                  when: Optional[datetime] = None) -> str:
+        """保存一个文件的目录（不存在时创建），写入文件后调用 add_file() 计数
+
+        Args:
+            filename: 文件名（按哈希分目录时使用）
+            model: 模型名称（按模型分目录时使用）
+            job: 作业名称（按作业分目录时使用）
+            when: 保存时间（按日期分目录时使用），默认为当前时间
+        """
+        group = self.group(filename, model, job, when)
+        with self._lock:
+            state = self._shards.get(group)
+            if state is None:
+                state = self._shards[group] = self._scan(group)
+            if self.shard_size and state[1] >= self.shard_size:
+                self._groups.pop(self.shard_path(group, state[0]), None)
+                state[0] += 1
+                state[1] = _count_files(self.shard_path(group, state[0]))
+            path = self.shard_path(group, state[0])
+            self._groups[path] = group
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def add_file(self, directory: str) -> None:
+        """在 directory() 返回的目录中写入了一个新文件"""
+        with self._lock:
+            group = self._groups.get(directory)
+            if group is not None:
+                self._shards[group][1] += 1
+
+
+# 最近使用的布局实例，修改设置后旧的实例逐渐淘汰
+_layouts: "OrderedDict[Tuple[str, str, int], OutputLayout]" = OrderedDict()
+_layouts_lock = threading.Lock()
+
+
+def get_output_layout(config, root: Optional[str] = None) -> OutputLayout:
+    """按配置获取输出目录布局
+
+    同一输出目录和设置共用一个实例，单图生成和批量生成的文件计数一致；
+    只保留最近使用的 MAX_LAYOUTS 个实例。配置无效时不分目录。
+
+    Args:
+        config: 配置管理器（output_layout.mode / output_layout.shard_size）
+        root: 输出目录，默认为 paths.output_dir
+    """
+    root = root or config.get("paths.output_dir")
+    mode = config.get("output_layout.mode", "flat")
+    shard_size = config.get("output_layout.shard_size", DEFAULT_SHARD_SIZE)
+    if not isinstance(mode, str) or mode not in LAYOUTS:
+        logger.warning("未知的输出目录布局 %r，改为不分目录", mode)
+        mode = "flat"
+    if not isinstance(shard_size, int):
+        shard_size = DEFAULT_SHARD_SIZE
+    key = (os.path.abspath(root), mode, shard_size)
+    with _layouts_lock:
+        layout = _layouts.get(key)
+        if layout is None:
+            layout = _layouts[key] = OutputLayout(root, mode, shard_size)
+            while len(_layouts) > MAX_LAYOUTS:
+                _layouts.popitem(last=False)
+        else:
+            _layouts.move_to_end(key)
+        return layout
@@ -1,13 +1,144 @@
 import json
 import os
+import re
+import hashlib
+import tempfile
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 from .config_manager import ConfigManager
 
+# 文件名中不允许的字符
+_INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# 进程的 umask，新建文件的权限与 open() 创建的文件一致（mkstemp 创建的文件只有所有者可读写）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def preset_file_name(name: str) -> str:
+    """预设名称对应的文件名
+    
+    名称可直接作为文件名时使用 "{名称}.json"，否则替换非法字符并
+    附加名称的哈希值，避免写到预设目录之外或不同名称对应同一文件。
+    """
+    stem = _INVALID_FILENAME_CHARS.sub("_", name).strip(" .")
+    if stem != name or not stem or len(stem) > 100:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+        stem = f"{stem[:80] or 'preset'}_{digest}"
+    return f"{stem}.json"
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    """先写入同目录下的临时文件并落盘，再替换目标文件，读取方不会读到写了一半的文件
+    
+    替换后的文件保留原文件的权限，新文件按 umask 设置权限。
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class _PresetCache:
+    """预设名称 -> 预设内容
+    
+    内部保存清单索引中的条目（文件、修改时间、大小、摘要），通过下标、get、
+    values、items 读取时返回预设内容，条目只能通过 entry/entries 读取。
+    预设内容在首次访问时读取，文件在读取后被外部修改（修改时间或大小变化）
+    时重新读取。
+    """
+    
+    def __init__(self, manager: "PresetManager"):
+        self._manager = manager
+        self._entries: Dict[str, dict] = {}  # 预设名称 -> 清单条目
+        self.bodies: Dict[str, dict] = {}  # 已读取的预设内容
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+    
+    def __getitem__(self, name: str) -> dict:
+        entry = self._entries[name]
+        body = self.bodies.get(name)
+        if body is None or self._manager._changed_on_disk(entry):
+            body = self._manager._read_entry(name, entry)
+            if body is None:
+                raise KeyError(name)
+            self.bodies[name] = body
+        return body
+    
+    def __delitem__(self, name: str) -> None:
+        del self._entries[name]
+        self.bodies.pop(name, None)
+    
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+    
+    def values(self) -> List[dict]:
+        return [preset for _, preset in self.items()]
+    
+    def items(self) -> List[tuple]:
+        items = []
+        for name in list(self._entries):
+            preset = self.get(name)
+            if preset is not None:
+                items.append((name, preset))
+        return items
+    
+    def pop(self, name: str, *default):
+        self.bodies.pop(name, None)
+        return self._entries.pop(name, *default)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bodies.clear()
+    
+    def entry(self, name: str) -> Optional[dict]:
+        """清单条目，不读取预设内容"""
+        return self._entries.get(name)
+    
+    def entries(self) -> Dict[str, dict]:
+        """全部清单条目（副本）"""
+        return dict(self._entries)
+    
+    def set_entry(self, name: str, entry: dict, preset: Optional[dict] = None) -> None:
+        self._entries[name] = entry
+        if preset is not None:
+            self.bodies[name] = preset
+    
+    def reset(self, entries: Dict[str, dict]) -> None:
+        """替换全部条目，丢弃已不在清单中的预设内容"""
+        self._entries = dict(entries)
+        for name in set(self.bodies) - set(entries):
+            del self.bodies[name]
+
+
 class PresetManager:
+    INDEX_FILE = Path(".index") / "manifest.json"  # 清单索引，放在子目录中以免写入索引改变预设目录的修改时间
+    
     def __init__(self, config: ConfigManager):
         """初始化预设管理器
         
+        启动时只读取清单索引；预设目录自上次索引后有变化时，只读取新增和
+        修改过的预设文件。预设内容在首次使用时读取。
+        
         Args:
             config: 配置管理器实例
         """
@@ -15,20 +146,126 @@ class PresetManager:
         output_dir = Path(config.get("paths.output_dir"))
         self.presets_dir = output_dir / config.get("paths.presets_dir", "presets")
         self.presets_dir.mkdir(parents=True, exist_ok=True)
-        self._presets = {}
+        self.index_file = self.presets_dir / self.INDEX_FILE
+        self._lock = threading.RLock()
+        self._presets = _PresetCache(self)
+        self._skipped: Dict[str, list] = {}  # 无效的预设文件 -> [修改时间, 大小]，未修改前不再读取
         self.load_presets()
     
     def load_presets(self) -> None:
-        """加载所有预设"""
+        """加载预设清单"""
         try:
-            for preset_file in self.presets_dir.glob("*.json"):
-                with open(preset_file, "r", encoding="utf-8") as f:
-                    preset = json.load(f)
-                    if isinstance(preset, dict) and "name" in preset and "params" in preset:
-                        self._presets[preset["name"]] = preset
+            with self._lock:
+                index = self._read_index()
+                if index is not None:
+                    self._presets.reset(index.get("presets", {}))
+                    self._skipped = index.get("skipped", {})
+                # 目录在索引之后没有变化时直接使用索引
+                if index is None or index.get("dir_mtime") != self._dir_mtime():
+                    self.refresh()
         except Exception as e:
             print(f"加载预设失败: {e}")
     
+    def refresh(self) -> None:
+        """检查预设目录的变化，读取新增和修改过的预设文件并更新索引"""
+        with self._lock:
+            dir_mtime = self._dir_mtime()
+            known = {entry["file"]: (name, entry) for name, entry in self._presets.entries().items()}
+            entries, skipped = {}, {}
+            for item in os.scandir(self.presets_dir):
+                if not item.is_file() or not item.name.endswith(".json"):
+                    continue
+                stat = item.stat()
+                signature = [stat.st_mtime_ns, stat.st_size]
+                name, entry = known.get(item.name, (None, None))
+                if entry is not None and [entry["mtime"], entry["size"]] == signature:
+                    entries[name] = entry
+                    continue
+                if self._skipped.get(item.name) == signature:
+                    skipped[item.name] = signature
+                    continue
+                preset = self._parse(Path(item.path))
+                if preset is None:
+                    skipped[item.name] = signature
+                    continue
+                entries[preset["name"]] = self._entry(item.name, signature, preset)
+                self._presets.bodies[preset["name"]] = preset
+            self._presets.reset(entries)
+            self._skipped = skipped
+            self._write_index(dir_mtime)
+    
+    def list_summaries(self) -> List[Dict]:
+        """获取所有预设的名称和摘要（来自索引，不读取预设文件）"""
+        return [{"name": name, **entry.get("summary", {})} for name, entry in self._presets.entries().items()]
+    
+    def _dir_mtime(self) -> int:
+        return self.presets_dir.stat().st_mtime_ns
+    
+    def _read_index(self) -> Optional[dict]:
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else None
+        except (OSError, ValueError):
+            return None
+    
+    def _write_index(self, dir_mtime: Optional[int] = None) -> None:
+        """保存清单索引；dir_mtime 为None时表示索引之后目录有变化，下次启动重新检查"""
+        try:
+            self.index_file.parent.mkdir(exist_ok=True)
+            _write_json_atomic(self.index_file, {
+                "version": 1,
+                "dir_mtime": dir_mtime,
+                "presets": self._presets.entries(),
+                "skipped": self._skipped,
+            })
+        except OSError as e:
+            print(f"保存预设索引失败: {e}")
+    
+    def _parse(self, path: Path) -> Optional[dict]:
+        """读取预设文件，格式无效时返回None"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                preset = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if isinstance(preset, dict) and "name" in preset and "params" in preset:
+            return preset
+        return None
+    
+    def _entry(self, file_name: str, signature: list, preset: dict) -> dict:
+        params = preset.get("params") or {}
+        return {
+            "file": file_name,
+            "mtime": signature[0],
+            "size": signature[1],
+            "summary": {
+                "description": preset.get("description", ""),
+                "model": params.get("model", ""),
+                "size": params.get("size", ""),
+            },
+        }
+    
+    def _changed_on_disk(self, entry: dict) -> bool:
+        try:
+            stat = os.stat(self.presets_dir / entry["file"])
+        except OSError:
+            return True
+        return [stat.st_mtime_ns, stat.st_size] != [entry["mtime"], entry["size"]]
+    
+    def _read_entry(self, name: str, entry: dict) -> Optional[dict]:
+        """读取预设内容，文件已删除或无效时从索引中移除"""
+        path = self.presets_dir / entry["file"]
+        preset = self._parse(path)
+        with self._lock:
+            if preset is None or preset["name"] != name:
+                self._presets.pop(name, None)
+                self._write_index()
+                return None
+            stat = path.stat()
+            self._presets.set_entry(name, self._entry(entry["file"], [stat.st_mtime_ns, stat.st_size], preset))
+        return preset
+    
     def save_preset(self, name: str, params: dict) -> bool:
         """保存预设
         Args:
@@ -49,11 +286,19 @@ class PresetManager:
                 print("预设目录不可写")
                 return False
             
-            file_path = self.presets_dir / f"{name}.json"
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(preset, f, ensure_ascii=False, indent=2)
-            
-            self._presets[name] = preset
+            with self._lock:
+                entry = self._presets.entry(name)
+                file_name = entry["file"] if entry else preset_file_name(name)
+                file_path = self.presets_dir / file_name
+                if file_path.exists() and not os.access(file_path, os.W_OK):
+                    print("预设文件只读")
+                    return False
+                
+                _write_json_atomic(file_path, preset)
+                stat = file_path.stat()
+                self._presets.set_entry(name, self._entry(file_name, [stat.st_mtime_ns, stat.st_size], preset), preset)
+                self._skipped.pop(file_name, None)
+                self._write_index(self._dir_mtime())
             return True
         except Exception as e:
             print(f"保存预设失败: {e}")
@@ -84,13 +329,16 @@ class PresetManager:
             bool: 是否删除成功
         """
         try:
-            if name in self._presets:
-                file_path = self.presets_dir / f"{name}.json"
+            with self._lock:
+                entry = self._presets.entry(name)
+                if entry is None:
+                    return False
+                file_path = self.presets_dir / entry["file"]
                 if file_path.exists():
                     file_path.unlink()
                 del self._presets[name]
+                self._write_index(self._dir_mtime())
                 return True
-            return False
         except Exception as e:
             print(f"删除预设失败: {e}")
             return False
@@ -146,10 +394,17 @@ class PresetManager:
                 print("导出目录不可写")
                 return False
             
-            if preset_names is None:
-                presets = list(self._presets.values())
-            else:
-                presets = [self._presets[name] for name in preset_names if name in self._presets]
+            names = list(self._presets.entries()) if preset_names is None else preset_names
+            presets, missing = [], []
+            for name in names:
+                preset = self._presets.get(name)
+                if preset is None:
+                    missing.append(name)
+                else:
+                    presets.append(preset)
+            if missing:
+                # 预设文件在列出后被删除或损坏时跳过，其余预设照常导出
+                print(f"以下预设已不存在或无法读取，未导出: {', '.join(missing)}")
             
             with open(file_path, "w", encoding="utf-8") as f:
                 json.dump(presets, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,116 @@
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, List, Optional
+
+# 默认最小上报间隔（秒），即每秒最多刷新4次界面
+DEFAULT_INTERVAL = 0.25
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """将秒数格式化为便于阅读的时长"""
+    if seconds is None:
+        return "--"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}秒"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}分{seconds}秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}小时{minutes}分"
+
+
+class ProgressTracker:
+    """生成进度汇总
+
+    工作线程只更新计数并缓存日志行，由 poll() 按固定的最小间隔取出
+    一份快照（计数、速率、预计剩余时间、最近错误和期间累积的日志），
+    避免逐行发送信号占满界面事件循环。
+    """
+
+    def __init__(self, total: int = 0, interval: float = DEFAULT_INTERVAL, max_errors: int = 5):
+        self._lock = Lock()
+        self.interval = interval
+        self.total = total
+        self.prompts_done = 0
+        self.images_saved = 0
+        self.images_skipped = 0
+        self.errors = 0
+        self.current_prompt = ""
+        self.recent_errors = deque(maxlen=max_errors)
+        self._pending_lines: List[str] = []
+        self._started_at = time.monotonic()
+        self._last_emit: Optional[float] = None
+
+    def log(self, line: str) -> None:
+        """缓存一行日志，随下一次快照发送"""
+        with self._lock:
+            self._pending_lines.append(line)
+
+    def start_prompt(self, prompt: str) -> None:
+        with self._lock:
+            self.current_prompt = prompt
+
+    def finish_prompt(self) -> None:
+        with self._lock:
+            self.prompts_done += 1
+
+    def add_image(self, skipped: bool = False) -> None:
+        with self._lock:
+            self.images_saved += 1
+            if skipped:
+                self.images_skipped += 1
+
+    def add_error(self, message: str) -> None:
+        with self._lock:
+            self.errors += 1
+            self.recent_errors.append(message)
+            self._pending_lines.append(message)
+
+    def poll(self, force: bool = False) -> Optional[Dict]:
+        """距上次上报超过最小间隔（或 force 为True）时返回快照，否则返回None"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._last_emit is not None and now - self._last_emit < self.interval:
+                return None
+            self._last_emit = now
+            return self._snapshot(now)
+
+    def _snapshot(self, now: float) -> Dict:
+        elapsed = now - self._started_at
+        rate = self.images_saved / elapsed * 60 if elapsed > 0 else 0.0
+        eta = None
+        if self.prompts_done and self.total:
+            eta = elapsed / self.prompts_done * (self.total - self.prompts_done)
+        lines, self._pending_lines = self._pending_lines, []
+        return {
+            "total": self.total,
+            "prompts_done": self.prompts_done,
+            "images_saved": self.images_saved,
+            "images_skipped": self.images_skipped,
+            "errors": self.errors,
+            "current_prompt": self.current_prompt,
+            "elapsed": elapsed,
+            "images_per_minute": rate,
+            "eta": eta,
+            "recent_errors": list(self.recent_errors),
+            "lines": lines,
+        }
+
+
+def summary_text(snapshot: Dict) -> str:
+    """生成一行进度摘要"""
+    text = (
+        f"提示词 {snapshot['prompts_done']}/{snapshot['total']} | "
+        f"已保存 {snapshot['images_saved']} 张"
+    )
+    if snapshot["images_skipped"]:
+        text += f"（重复 {snapshot['images_skipped']}）"
+    text += (
+        f" | 错误 {snapshot['errors']} | "
+        f"{snapshot['images_per_minute']:.1f} 张/分钟 | "
+        f"已用 {format_duration(snapshot['elapsed'])} | "
+        f"预计剩余 {format_duration(snapshot['eta'])}"
+    )
+    return text
@@ -0,0 +1,276 @@
+import csv
+import json
+import logging
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 支持的格式及对应的文件后缀
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+}
+
+# 历史记录导出列：列名 -> (参数名, 类型)
+# 类型用于Parquet的列类型和CSV读回时的类型转换
+HISTORY_COLUMNS = {
+    "timestamp": (None, "string"),
+    "prompt": ("prompt", "string"),
+    "negative_prompt": ("negative_prompt", "string"),
+    "model": ("model", "string"),
+    "size": ("size", "string"),
+    "num_inference_steps": ("num_inference_steps", "int"),
+    "guidance_scale": ("guidance_scale", "float"),
+    "seed": ("seed", "int"),
+    "prompt_enhancement": ("prompt_enhancement", "bool"),
+    "source": ("source", "string"),
+    "image_paths": (None, "list"),
+}
+
+# 批量任务结果导出列
+TASK_COLUMNS = {
+    "prompt": (None, "string"),
+    "model": (None, "string"),
+    "size": (None, "string"),
+    "status": (None, "string"),
+    "result_path": (None, "string"),
+}
+
+
+def detect_format(file_path, fmt: Optional[str] = None) -> str:
+    """根据参数或文件后缀确定格式
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    if fmt is None:
+        fmt = FORMATS.get(Path(file_path).suffix.lower())
+    if fmt not in FORMATS.values():
+        raise ValueError(f"不支持的导出格式: {fmt or Path(file_path).suffix}")
+    return fmt
+
+
+def _select_columns(columns: Optional[List[str]], schema: Dict) -> List[str]:
+    """检查并返回要导出的列，未指定时返回全部列"""
+    if columns is None:
+        return list(schema)
+    unknown = [column for column in columns if column not in schema]
+    if unknown:
+        raise ValueError(f"未知的列: {', '.join(unknown)}")
+    return list(columns)
+
+
+def _convert(value, kind: str):
+    """将值转换为列类型，空值转换为None"""
+    if value is None or value == "":
+        return [] if kind == "list" else None
+    if kind == "int":
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if kind == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "是", "yes")
+        return bool(value)
+    if kind == "list":
+        if isinstance(value, str):
+            return json.loads(value)
+        return list(value)
+    return str(value)
+
+
+def _convert_cell(value, kind: str, column: str, invalid: Optional[List[str]]):
+    """转换一个单元格，无法转换为列类型的值按空值处理，列名记入 invalid"""
+    try:
+        return _convert(value, kind)
+    except (TypeError, ValueError):
+        if invalid is not None:
+            invalid.append(column)
+        return [] if kind == "list" else None
+
+
+def flatten_history_record(record: Dict, columns: Optional[List[str]] = None,
+                           invalid: Optional[List[str]] = None) -> Dict:
+    """将历史记录展开为一行
+
+    无法转换为列类型的值（如非数字的种子值）导出为空，列名记入 invalid。
+    """
+    params = record.get("params", {})
+    row = {}
+    for column in _select_columns(columns, HISTORY_COLUMNS):
+        param, kind = HISTORY_COLUMNS[column]
+        if column == "timestamp":
+            value = record.get("timestamp")
+        elif column == "image_paths":
+            value = record.get("image_paths") or ([record["image_path"]] if "image_path" in record else [])
+        else:
+            value = params.get(param)
+        row[column] = _convert_cell(value, kind, column, invalid)
+    return row
+
+
+def unflatten_history_record(row: Dict, invalid: Optional[List[str]] = None) -> Dict:
+    """将一行数据还原为历史记录格式，无法转换的值跳过，列名记入 invalid"""
+    params = {}
+    record = {"timestamp": row.get("timestamp") or "", "params": params, "image_paths": []}
+    for column, value in row.items():
+        if column not in HISTORY_COLUMNS:
+            continue
+        param, kind = HISTORY_COLUMNS[column]
+        value = _convert_cell(value, kind, column, invalid)
+        if column == "image_paths":
+            record["image_paths"] = value
+        elif param is not None and value is not None:
+            params[param] = value
+    return record
+
+
+def _arrow_schema(columns: List[str], schema: Dict):
+    import pyarrow as pa
+    types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(),
+             "bool": pa.bool_(), "list": pa.list_(pa.string())}
+    return pa.schema([(column, types[schema[column][1]]) for column in columns])
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError("导出Parquet格式需要安装pyarrow: pip install pyarrow")
+
+
+def export_rows(rows: Iterable[Dict], file_path, columns: List[str], schema: Dict,
+                fmt: Optional[str] = None, chunk_size: int = 10000,
+                progress: Optional[Callable[[int], None]] = None) -> int:
+    """以流式方式将数据行写入CSV、JSONL或Parquet文件
+
+    数据按块处理，不会一次性载入内存。
+
+    Args:
+        rows: 数据行（字典）
+        file_path: 导出文件路径
+        columns: 导出的列
+        schema: 列定义
+        fmt: 格式（csv/jsonl/parquet），为None时根据文件后缀确定
+        chunk_size: 每块行数（Parquet的行组大小）
+        progress: 进度回调，参数为已写入行数
+
+    Returns:
+        int: 写入的行数
+
+    Raises:
+        ValueError: 格式不支持或缺少依赖
+    """
+    fmt = detect_format(file_path, fmt)
+    rows = iter(rows)
+    count = 0
+
+    if fmt == "parquet":
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        arrow_schema = _arrow_schema(columns, schema)
+        with pq.ParquetWriter(str(file_path), arrow_schema) as writer:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                writer.write_batch(pa.RecordBatch.from_pylist(chunk, schema=arrow_schema))
+                count += len(chunk)
+                if progress:
+                    progress(count)
+        return count
+
+    with open(file_path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+        for row in rows:
+            if fmt == "csv":
+                # 列表类型以JSON文本保存，便于读回
+                writer.writerow({key: json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+                                 for key, value in row.items()})
+            else:
+                f.write(json.dumps(row, ensure_ascii=False))
+                f.write("\n")
+            count += 1
+            if progress and count % chunk_size == 0:
+                progress(count)
+    if progress:
+        progress(count)
+    return count
+
+
+def read_rows(file_path, columns: Optional[List[str]] = None, fmt: Optional[str] = None,
+              chunk_size: int = 10000) -> Iterator[Dict]:
+    """以流式方式读取CSV、JSONL或Parquet文件中的数据行
+
+    Args:
+        file_path: 文件路径
+        columns: 只读取的列，为None时读取全部列
+        fmt: 格式，为None时根据文件后缀确定
+        chunk_size: Parquet每次读取的行数
+
+    Yields:
+        Dict: 数据行
+    """
+    fmt = detect_format(file_path, fmt)
+
+    if fmt == "parquet":
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(str(file_path))
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield from batch.to_pylist()
+        return
+
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f) if fmt == "csv" else (json.loads(line) for line in f if line.strip())
+        for row in reader:
+            if columns is not None:
+                row = {column: row.get(column) for column in columns}
+            yield row
+
+
+def export_history(records: Iterable[Dict], file_path, columns: Optional[List[str]] = None,
+                   fmt: Optional[str] = None, invalid: Optional[List[str]] = None, **kwargs) -> int:
+    """导出历史记录到CSV、JSONL或Parquet文件
+
+    Args:
+        records: 历史记录
+        file_path: 导出文件路径
+        columns: 导出的列（见 HISTORY_COLUMNS），为None时导出全部列
+        fmt: 格式，为None时根据文件后缀确定
+        invalid: 无法转换为列类型、导出为空的单元格的列名追加到该列表
+
+    Returns:
+        int: 导出的记录数
+    """
+    columns = _select_columns(columns, HISTORY_COLUMNS)
+    invalid = [] if invalid is None else invalid
+    skipped = len(invalid)
+    rows = (flatten_history_record(record, columns, invalid) for record in records)
+    count = export_rows(rows, file_path, columns, HISTORY_COLUMNS, fmt=fmt, **kwargs)
+    if len(invalid) > skipped:
+        logger.warning("导出时有 %d 个无效的值已留空: %s", len(invalid) - skipped,
+                       ", ".join(sorted(set(invalid[skipped:]))))
+    return count
+
+
+def import_history(file_path, fmt: Optional[str] = None,
+                   invalid: Optional[List[str]] = None) -> Iterator[Dict]:
+    """从CSV、JSONL或Parquet文件导入历史记录
+
+    Args:
+        invalid: 无法转换为列类型、已跳过的单元格的列名追加到该列表
+
+    Yields:
+        Dict: 历史记录
+    """
+    for row in read_rows(file_path, fmt=fmt):
+        yield unflatten_history_record(row, invalid)
@@ -0,0 +1,178 @@
+import time
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 可重试的状态码：超时、限流和服务端错误；其他4xx为请求本身的问题，重试无意义
+RETRYABLE_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+
+def is_retryable(code: Optional[int]) -> bool:
+    """判断错误是否可重试（网络错误时 code 为None）"""
+    return code is None or code in RETRYABLE_CODES
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续 failure_threshold 次可重试错误（服务端不可用、超时等）后打开，
+    打开期间的请求直接失败；reset_timeout 秒后进入半开状态，只放行一个
+    探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = Lock()
+        self.rejected = 0  # 熔断期间直接拒绝的请求数
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update()
+            return self._state
+
+    def _update(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+
+    def retry_after(self) -> float:
+        """距离允许探测请求的剩余秒数"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """是否允许发送请求，半开状态下同一时间只允许一个探测请求"""
+        with self._lock:
+            self._update()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("熔断器关闭，服务已恢复")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """请求被取消、没有结果时调用，允许下一个探测请求"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("连续%d次请求失败，熔断%.0f秒", self._failures, self.reset_timeout)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyTracker:
+    """记录最近的请求耗时，用于计算对冲请求的等待时间"""
+
+    def __init__(self, size: int = 100, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """最近耗时的分位数，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class HedgePolicy:
+    """对冲请求策略
+
+    请求耗时超过最近耗时的 percentile 分位数（不小于 min_delay 秒）仍未
+    返回时，再发送一个相同的请求，采用先返回的结果。只适用于结果确定的
+    请求（生成图片时需指定种子值），否则两次请求的结果不同。
+    """
+
+    def __init__(self, percentile: float = 0.95, min_delay: float = 10.0, max_workers: int = 8):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker()
+        self.hedged = 0  # 发出的对冲请求数
+        self.hedge_wins = 0  # 对冲请求先返回的次数
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def delay(self) -> Optional[float]:
+        """发出对冲请求前的等待时间，样本不足时返回None（不对冲）"""
+        value = self.latencies.percentile(self.percentile)
+        return None if value is None else max(value, self.min_delay)
+
+    def call(self, fn: Callable[[], T], accept: Optional[Callable[[T], bool]] = None) -> T:
+        """执行请求，超过等待时间时发出对冲请求，返回先成功的结果
+
+        Args:
+            fn: 发送请求的函数
+            accept: 判断返回结果是否成功（如状态码为200），为None时任何返回都算成功
+
+        两个请求都没有成功时，返回先发出的请求的结果或抛出其异常。
+        """
+        start = time.monotonic()
+        delay = self.delay()
+        if delay is None:
+            result = fn()
+            self.latencies.add(time.monotonic() - start)
+            return result
+
+        primary = self._executor.submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            result = primary.result()
+            self.latencies.add(time.monotonic() - start)
+            return result
+
+        self.hedged += 1
+        logger.info("请求超过%.1f秒未返回，发送对冲请求", delay)
+        hedge = self._executor.submit(fn)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and (accept is None or accept(future.result())):
+                    if future is hedge:
+                        self.hedge_wins += 1
+                    # 未返回的请求在后台结束，不再等待
+                    self.latencies.add(time.monotonic() - start)
+                    return future.result()
+        return primary.result()
+
+    def stats(self) -> Dict:
+        return {"hedged": self.hedged, "hedge_wins": self.hedge_wins, "delay": self.delay()}
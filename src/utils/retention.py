@@ -0,0 +1,319 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from .history_exporter import record_image_paths
+from .sweep import CONTACT_SHEET_DIR
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")  # 回收未引用文件时只处理图片
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # 历史记录中 timestamp 的格式
+
+
+@dataclass(slots=True)
+class RetentionPolicy:
+    """保留策略，各上限为0时不限制"""
+    enabled: bool = False
+    max_items: int = 0  # 历史记录最多条数
+    max_age_days: float = 0  # 历史记录最多保留的天数
+    max_bytes: int = 0  # 历史记录引用的图片总大小上限
+    delete_files: bool = False  # 删除记录时同时删除不再被引用的图片（需显式开启）
+    delete_orphans: bool = False  # 删除输出目录中未被历史记录引用的图片
+    orphan_min_age: float = 86400  # 未被引用的图片至少存在多久（秒）才删除，避免删掉刚保存、尚未写入历史的文件
+    interval: float = 600  # 两次执行的间隔（秒）
+    scan_batch: int = 2000  # 每次执行最多检查的输出目录条目数
+
+    @classmethod
+    def from_config(cls, config) -> "RetentionPolicy":
+        """由配置（history.max_items 和 retention.*）创建保留策略，无效的值按不限制处理"""
+        def number(key, default, kind=float):
+            try:
+                return max(kind(config.get(key, default)), 0)
+            except (TypeError, ValueError):
+                logger.warning("无效的保留策略设置 %s，按默认值处理", key)
+                return default
+        return cls(
+            enabled=bool(config.get("retention.enabled", False)),
+            max_items=number("history.max_items", 0, int),
+            max_age_days=number("retention.max_age_days", 0),
+            max_bytes=int(number("retention.max_total_mb", 0) * 1024 * 1024),
+            delete_files=bool(config.get("retention.delete_files", False)),
+            delete_orphans=bool(config.get("retention.delete_orphans", False)),
+            orphan_min_age=number("retention.orphan_min_age_hours", 24) * 3600,
+            interval=max(number("retention.interval", 600), 10),
+            scan_batch=max(number("retention.scan_batch", 2000, int), 1),
+        )
+
+
+@dataclass
+class RetentionResult:
+    """一次执行的结果"""
+    records: int = 0  # 删除的历史记录数
+    files: int = 0  # 删除的图片数（含未被引用的图片）
+    bytes: int = 0  # 释放的字节数
+    orphans: int = 0  # 其中未被引用的图片数
+    errors: List[str] = field(default_factory=list)
+
+
+def normalize_path(path: str) -> str:
+    """规范化路径，用于比较两个路径是否为同一文件"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def referenced_paths(records: Iterable[Dict]) -> Set[str]:
+    """历史记录引用的全部图片路径（规范化后）"""
+    return {normalize_path(path) for record in records for path in record_image_paths(record)}
+
+
+def _record_time(record: Dict) -> Optional[float]:
+    try:
+        return datetime.strptime(record.get("timestamp", ""), TIME_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RetentionEngine:
+    """保留策略的执行逻辑（不涉及界面和线程）
+
+    按条数、保留天数和图片总大小选出要删除的历史记录（从最旧的开始），
+    删除这些记录中不再被其他记录引用的图片，并分批扫描输出目录，删除
+    未被任何记录引用的图片。图片大小在首次计算后缓存；扫描输出目录时
+    记住进度，每次只检查 scan_batch 个条目，下次从中断处继续，扫描完
+    整个目录后重新开始。以 "." 开头的目录（如预设索引、回收站）和参数
+    扫描的对比图目录不扫描。
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self._sizes: Dict[str, int] = {}  # 图片路径 -> 大小
+        self._walker: Optional[Iterator[os.DirEntry]] = None
+
+    def _size(self, path: str) -> int:
+        size = self._sizes.get(path)
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = 0
+            self._sizes[path] = size
+        return size
+
+    def plan(self, records: Sequence[Dict], policy: RetentionPolicy,
+             now: Optional[float] = None) -> List[int]:
+        """选出要删除的历史记录
+
+        Args:
+            records: 历史记录，最新的在前
+            policy: 保留策略
+            now: 当前时间，默认为 time.time()
+
+        Returns:
+            List[int]: 要删除的记录序号（升序）
+        """
+        now = time.time() if now is None else now
+        remove = set()
+        if policy.max_items and len(records) > policy.max_items:
+            remove.update(range(policy.max_items, len(records)))
+        if policy.max_age_days:
+            cutoff = now - policy.max_age_days * 86400
+            for index, record in enumerate(records):
+                when = _record_time(record)
+                if when is not None and when < cutoff:
+                    remove.add(index)
+        if policy.max_bytes:
+            kept = [index for index in range(len(records)) if index not in remove]
+            sizes = {index: sum(self._size(path) for path in record_image_paths(records[index]))
+                     for index in kept}
+            total = sum(sizes.values())
+            for index in reversed(kept):
+                if total <= policy.max_bytes:
+                    break
+                remove.add(index)
+                total -= sizes[index]
+        return sorted(remove)
+
+    def preview(self, records: Sequence[Dict], policy: RetentionPolicy,
+                now: Optional[float] = None) -> RetentionResult:
+        """试运行：统计按策略会删除的记录数和图片数，不做任何删除
+
+        未被引用的图片是分批扫描的，不计入结果。
+        """
+        indices = set(self.plan(records, policy, now))
+        result = RetentionResult(records=len(indices))
+        if policy.delete_files and indices:
+            referenced = referenced_paths(record for index, record in enumerate(records)
+                                          if index not in indices)
+            paths = {normalize_path(path) for index in indices
+                     for path in record_image_paths(records[index])}
+            for path in paths - referenced:
+                if os.path.isfile(path):
+                    result.files += 1
+                    result.bytes += self._size(path)
+        return result
+
+    def delete_files(self, paths: Iterable[str], result: RetentionResult) -> None:
+        """删除图片，已不存在的文件忽略"""
+        for path in paths:
+            key = normalize_path(path)
+            try:
+                size = os.stat(path).st_size
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                result.errors.append(f"{path}: {e}")
+            else:
+                result.files += 1
+                result.bytes += size
+            self._sizes.pop(key, None)
+            self._sizes.pop(path, None)
+
+    def _walk(self) -> Iterator[os.DirEntry]:
+        """逐个目录列出输出目录中的文件"""
+        stack = [self.output_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if directory == self.output_dir and entry.name == CONTACT_SHEET_DIR:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def collect_orphans(self, referenced: Set[str], policy: RetentionPolicy,
+                        result: RetentionResult, now: Optional[float] = None) -> bool:
+        """检查输出目录中的下一批条目，删除未被引用且足够旧的图片
+
+        Args:
+            referenced: 历史记录引用的图片路径（见 referenced_paths）
+
+        Returns:
+            bool: 本次是否扫描完了整个输出目录
+        """
+        now = time.time() if now is None else now
+        if self._walker is None:
+            self._walker = self._walk()
+        orphans = []
+        for _ in range(policy.scan_batch):
+            entry = next(self._walker, None)
+            if entry is None:
+                self._walker = None
+                break
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or normalize_path(entry.path) in referenced:
+                continue
+            try:
+                if now - entry.stat(follow_symlinks=False).st_mtime >= policy.orphan_min_age:
+                    orphans.append(entry.path)
+            except OSError:
+                continue
+        files = result.files
+        self.delete_files(orphans, result)
+        result.orphans += result.files - files
+        return self._walker is None
+
+
+class RetentionService(QObject):
+    """在后台按保留策略清理历史记录和输出文件
+
+    按 retention.interval 定时执行：在工作线程中选出要删除的记录，回到
+    主线程一次删除并保存历史记录，再在工作线程中删除图片、检查一批输出
+    目录条目。每次执行都读取最新配置，未启用时不做任何事。
+    """
+    planned = pyqtSignal(object)  # 内部使用：工作线程选出的记录
+    finished = pyqtSignal(object)  # 一次执行结束，参数为 RetentionResult
+
+    def __init__(self, history_manager, config, output_dir: Optional[str] = None, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.config = config
+        self.engine = RetentionEngine(output_dir or config.get("paths.output_dir"))
+        self._busy = False
+        self._stopped = False
+        self.planned.connect(self._apply)  # 跨线程的信号在主线程中执行
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.run_once)
+
+    def start(self) -> None:
+        """开始定时执行"""
+        self._stopped = False
+        self.timer.start(int(RetentionPolicy.from_config(self.config).interval * 1000))
+
+    def stop(self) -> None:
+        """停止定时执行，正在进行的删除会完成当前一批"""
+        self._stopped = True
+        self.timer.stop()
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def run_once(self) -> bool:
+        """立即执行一次
+
+        Returns:
+            bool: 是否开始执行（未启用或上一次尚未结束时为False）
+        """
+        policy = RetentionPolicy.from_config(self.config)
+        output_dir = self.config.get("paths.output_dir")
+        if output_dir and output_dir != self.engine.output_dir and not self._busy:
+            self.engine = RetentionEngine(output_dir)
+        if self.timer.isActive() and self.timer.interval() != int(policy.interval * 1000):
+            self.timer.setInterval(int(policy.interval * 1000))
+        if not policy.enabled or self._busy:
+            return False
+        self._busy = True
+        records = list(self.history_manager.get_records())
+        threading.Thread(target=self._plan, args=(records, policy), daemon=True).start()
+        return True
+
+    def _plan(self, records: List[Dict], policy: RetentionPolicy) -> None:
+        try:
+            indices = self.engine.plan(records, policy)
+        except Exception as e:
+            logger.warning("计算保留策略失败: %s", e)
+            indices = []
+        self.planned.emit((policy, [records[index] for index in indices]))
+
+    def _apply(self, payload) -> None:
+        policy, removed = payload
+        result = RetentionResult()
+        if removed and not self._stopped:
+            result.records = self.history_manager.remove_records(removed)
+        else:
+            removed = []
+        remaining = list(self.history_manager.get_records())
+        threading.Thread(target=self._clean, args=(policy, removed, remaining, result), daemon=True).start()
+
+    def _clean(self, policy: RetentionPolicy, removed: List[Dict], remaining: List[Dict],
+               result: RetentionResult) -> None:
+        try:
+            referenced = referenced_paths(remaining)
+            if policy.delete_files and removed:
+                # 同一张图片可能被多条记录引用（去重时），仍被保留的记录引用的不删除
+                paths = {path for record in removed for path in record_image_paths(record)}
+                self.engine.delete_files(sorted(p for p in paths if normalize_path(p) not in referenced), result)
+            if policy.delete_orphans and not self._stopped:
+                self.engine.collect_orphans(referenced, policy, result)
+        except Exception as e:
+            logger.warning("清理输出文件失败: %s", e)
+            result.errors.append(str(e))
+        if result.records or result.files:
+            logger.info("保留策略删除了 %d 条记录、%d 个文件（%d 个未被引用），释放 %d 字节",
+                        result.records, result.files, result.orphans, result.bytes)
+        self._busy = False
+        self.finished.emit(result)
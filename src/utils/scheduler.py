@@ -0,0 +1,242 @@
+import time
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Condition
+from typing import Dict, Iterable, List, Optional
+
+from .cancellation import CancelToken
+from .telemetry import get_telemetry
+
+# 常用优先级：交互式的单图生成优先于后台批量任务
+PRIORITY_INTERACTIVE = 10
+PRIORITY_NORMAL = 0
+PRIORITY_BACKGROUND = -10
+
+
+@dataclass
+class Job:
+    """一个生成作业（单图生成、批量任务、命令行导入等）"""
+    name: str
+    priority: int = PRIORITY_NORMAL
+    weight: float = 1.0  # 同优先级作业之间按权重分配请求
+    served: int = 0  # 已分配的请求数
+    waiting: int = 0  # 等待中的请求数
+    in_flight: int = 0
+    seq: int = 0  # 注册顺序，份额相同时先注册的优先
+    created: float = field(default_factory=time.monotonic)
+
+    def share(self) -> float:
+        """已获得的份额，越小越先分配"""
+        return self.served / self.weight
+
+
+def pick_job(jobs: Iterable[Job]) -> Optional[Job]:
+    """选择下一个获得请求的作业
+
+    只考虑有等待请求的作业：优先级高的先分配；同优先级按已获得的
+    份额（请求数/权重）取最小，使多个作业按权重交替执行。
+    """
+    candidates = [job for job in jobs if job.waiting > 0]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda job: (-job.priority, job.share(), job.seq))
+
+
+class _JobRegistry:
+    """管理已注册的作业，新作业的份额从同优先级作业的最小份额开始，不会长期独占
+
+    按作业对象区分：作业注销后同名的新作业与仍持有旧对象的调用方互不
+    影响；按名称获取时返回最近注册的同名作业。
+    """
+
+    def __init__(self):
+        self._jobs: Dict[int, Job] = {}  # id(job) -> job，保持注册顺序
+        self._names: Dict[str, Job] = {}
+        self._seq = itertools.count()
+
+    def _rebase(self, job: Job) -> None:
+        """份额至少从同优先级活跃作业的最小份额开始"""
+        peers = [j for j in self._jobs.values()
+                 if j is not job and j.priority == job.priority and j.waiting + j.in_flight > 0]
+        if peers:
+            job.served = max(job.served, int(min(j.share() for j in peers) * job.weight))
+
+    def get(self, name: str, priority: int = PRIORITY_NORMAL, weight: Optional[float] = None) -> Job:
+        """获取或注册作业，已注册的作业按新的优先级（和权重）调整"""
+        job = self._names.get(name)
+        if job is None:
+            job = Job(name, priority, 1.0 if weight is None else weight, seq=next(self._seq))
+            self.add(job)
+            return job
+        if weight is not None:
+            job.weight = weight
+        if job.priority != priority:
+            job.priority = priority
+            self._rebase(job)
+        return job
+
+    def find(self, name: str) -> Optional[Job]:
+        return self._names.get(name)
+
+    def add(self, job: Job) -> None:
+        if id(job) not in self._jobs:
+            self._rebase(job)
+            self._jobs[id(job)] = job
+            self._names.setdefault(job.name, job)
+
+    def remove(self, job: Job) -> None:
+        self._jobs.pop(id(job), None)
+        if self._names.get(job.name) is job:
+            del self._names[job.name]
+
+    def values(self) -> List[Job]:
+        return list(self._jobs.values())
+
+
+class JobQueue(Queue):
+    """按作业优先级和公平份额出队的任务队列
+
+    接口与 queue.Queue 相同。放入的任务按其 job / priority 属性归入作业，
+    get() 时先取优先级最高的作业，同优先级的作业轮流出队，
+    避免单个大批量作业阻塞其他作业。
+    """
+
+    def _init(self, maxsize):
+        self._registry = _JobRegistry()
+        self._pending: Dict[str, deque] = {}
+
+    def _qsize(self):
+        return sum(len(items) for items in self._pending.values())
+
+    def _put(self, item):
+        name = getattr(item, "job", None) or "default"
+        job = self._registry.get(name, getattr(item, "priority", PRIORITY_NORMAL))
+        self._pending.setdefault(name, deque()).append(item)
+        job.waiting += 1
+
+    def _get(self):
+        job = pick_job(self._registry.values())
+        job.waiting -= 1
+        job.served += 1
+        item = self._pending[job.name].popleft()
+        if not self._pending[job.name]:
+            del self._pending[job.name]
+            self._registry.remove(job)
+        return item
+
+    def jobs(self) -> List[Dict]:
+        """各作业的排队情况"""
+        with self.mutex:
+            return [{"name": job.name, "priority": job.priority, "waiting": job.waiting, "served": job.served}
+                    for job in self._registry.values()]
+
+    def remove_job(self, name: str) -> list:
+        """移除作业中尚未开始的任务并返回"""
+        with self.mutex:
+            items = list(self._pending.pop(name, ()))
+            job = self._registry.find(name)
+            if job is not None:
+                self._registry.remove(job)
+            # 移除的任务视为已完成，便于 join() 正常结束
+            self.unfinished_tasks -= len(items)
+            if self.unfinished_tasks <= 0:
+                self.all_tasks_done.notify_all()
+            self.not_full.notify_all()
+            return items
+
+
+class JobScheduler:
+    """请求调度器
+
+    多个作业（单图生成、批量生成线程、任务队列）共享有限的同时请求数。
+    每次调用API前通过 acquire() 申请名额，空出名额时交给优先级最高、
+    同优先级中份额最少的作业，交互式请求不会排在大批量任务之后。
+    """
+
+    def __init__(self, max_concurrent: int = 4):
+        self.max_concurrent = max(max_concurrent, 1)
+        self._registry = _JobRegistry()
+        self._condition = Condition()
+        self._in_flight = 0
+
+    def job(self, name: str, priority: int = PRIORITY_NORMAL, weight: float = 1.0) -> Job:
+        """获取或注册作业，已注册的同名作业按新的优先级和权重调整"""
+        with self._condition:
+            return self._registry.get(name, priority, weight)
+
+    def remove(self, job: Job) -> None:
+        """作业结束后注销"""
+        with self._condition:
+            self._registry.remove(job)
+            self._condition.notify_all()
+
+    def set_limit(self, max_concurrent: int) -> None:
+        with self._condition:
+            self.max_concurrent = max(max_concurrent, 1)
+            self._condition.notify_all()
+
+    def acquire(self, job: Job, cancel: Optional[CancelToken] = None) -> None:
+        """等待轮到该作业并占用一个名额
+
+        Raises:
+            OperationCancelled: 等待期间被取消
+        """
+        with self._condition:
+            self._registry.add(job)  # 已注销的作业重新加入（与同名的新作业分别调度）
+            job.waiting += 1
+            try:
+                while self._in_flight >= self.max_concurrent or pick_job(self._registry.values()) is not job:
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    self._condition.wait(0.05 if cancel is not None else None)
+                job.served += 1
+                job.in_flight += 1
+                self._in_flight += 1
+            finally:
+                job.waiting -= 1
+                self._condition.notify_all()
+
+    def release(self, job: Job) -> None:
+        with self._condition:
+            job.in_flight -= 1
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> List[Dict]:
+        """各作业的请求情况"""
+        with self._condition:
+            return [{"name": job.name, "priority": job.priority, "served": job.served,
+                     "waiting": job.waiting, "in_flight": job.in_flight}
+                    for job in self._registry.values()]
+
+
+class ScheduledAPI:
+    """经调度器分配名额后再调用的API客户端
+
+    接口与包装的客户端相同，用于把一个生成线程注册为调度器中的作业。
+    """
+
+    def __init__(self, api, scheduler: JobScheduler, job: Job):
+        self.api = api
+        self.scheduler = scheduler
+        self.job = job
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+    def generate_image(self, *args, **kwargs):
+        start = time.monotonic()
+        self.scheduler.acquire(self.job, kwargs.get("cancel"))
+        # 等待调度器分配名额的时间计为排队耗时
+        telemetry = getattr(self.api, "telemetry", None) or get_telemetry()
+        telemetry.record("queue_wait", time.monotonic() - start, job=self.job.name)
+        try:
+            return self.api.generate_image(*args, **kwargs)
+        finally:
+            self.scheduler.release(self.job)
+
+    def close(self) -> None:
+        """作业结束，从调度器注销"""
+        self.scheduler.remove(self.job)
@@ -0,0 +1,277 @@
+import itertools
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .compositor import Tile, compose_contact_sheet
+
+logger = logging.getLogger(__name__)
+
+# 可扫描的参数 -> 取值类型
+SWEEP_AXES = {
+    "seed": int,
+    "guidance": float,
+    "steps": int,
+    "model": str,
+    "size": str,
+}
+AXIS_LABELS = {
+    "seed": "种子",
+    "guidance": "引导系数",
+    "steps": "步数",
+    "model": "模型",
+    "size": "尺寸",
+}
+
+# 批量生成使用的参数及其默认值
+BASE_PARAMS = {
+    "prompt": "",
+    "negative_prompt": "",
+    "model": "stabilityai/stable-diffusion-3-5-large",
+    "size": "1024x1024",
+    "steps": 20,
+    "guidance": 7.5,
+    "seed": -1,
+}
+
+# 预设（单图生成的参数）中的参数名 -> 批量生成中的参数名
+PRESET_PARAM_NAMES = {
+    "guidance_scale": "guidance",
+    "num_inference_steps": "steps",
+}
+
+MAX_BATCH_SIZE = 4  # 单次请求最多生成的图片数（硅基流动API限制）
+
+CONTACT_SHEET_DIR = "contact_sheets"  # 输出目录中保存对比图的子目录，清理未引用的图片时跳过
+
+# 范围写法：起始-结束[:步长]，包含结束值
+_RANGE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)\s*(?::\s*(\d+(?:\.\d+)?))?\s*$")
+
+
+def parse_axis_values(name: str, text: str) -> list:
+    """解析扫描轴的取值
+
+    支持逗号分隔的列表（"7, 7.5, 8"），数值参数还支持范围写法
+    "起始-结束:步长"（"20-40:10" 即 20, 30, 40，省略步长时为1）。
+
+    Raises:
+        ValueError: 参数不能扫描或取值格式错误
+    """
+    if name not in SWEEP_AXES:
+        raise ValueError(f"不支持扫描的参数: {name}")
+    kind = SWEEP_AXES[name]
+    if kind is not str:
+        match = _RANGE.match(text)
+        if match:
+            start, end = float(match.group(1)), float(match.group(2))
+            step = float(match.group(3) or 1)
+            if step <= 0 or end < start:
+                raise ValueError(f"{AXIS_LABELS[name]}的范围无效: {text}")
+            count = int(math.floor((end - start) / step + 1e-9)) + 1
+            return [kind(round(start + i * step, 6)) for i in range(count)]
+    values = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            values.append(kind(item) if kind is not int else int(float(item)))
+        except ValueError:
+            raise ValueError(f"{AXIS_LABELS[name]}的取值无效: {item}") from None
+    return values
+
+
+def base_params(params: dict, defaults: Optional[dict] = None) -> dict:
+    """由预设参数得到批量生成使用的基础参数，预设中没有的参数使用默认参数"""
+    base = dict(BASE_PARAMS)
+    for source in (defaults or {}, params):
+        for key, value in source.items():
+            key = PRESET_PARAM_NAMES.get(key, key)
+            if key in base and value is not None:
+                base[key] = value
+    if not str(base["prompt"]).strip():
+        raise ValueError("预设中没有提示词")
+    return base
+
+
+@dataclass(slots=True)
+class SweepRequest:
+    """一次生成请求：除种子外参数相同的若干个扫描点"""
+    points: List[int]  # 扫描点序号，与生成的图片一一对应
+    prompt: str
+    params: dict
+    seeds: Optional[List[int]]  # 为None时由参数中的种子决定（-1为随机）
+
+
+class ParameterSweep:
+    """参数扫描
+
+    由基础参数和若干扫描轴展开为扫描点（各轴取值的笛卡尔积）。扫描点按序号
+    计算，不预先生成列表，组合数再多也只占用各轴取值的空间。种子轴固定在
+    最内层，相邻的扫描点只有种子不同，可以打包到同一次请求中。
+    """
+
+    def __init__(self, base: dict, axes: Dict[str, Sequence]):
+        """
+        Args:
+            base: 基础参数（见 base_params）
+            axes: 参数名 -> 取值列表，按从外到内的顺序
+
+        Raises:
+            ValueError: 没有扫描轴、参数不能扫描或取值为空
+        """
+        if not axes:
+            raise ValueError("至少需要一个扫描参数")
+        names = [name for name in axes if name != "seed"] + (["seed"] if "seed" in axes else [])
+        self.axes: List[Tuple[str, list]] = []
+        for name in names:
+            if name not in SWEEP_AXES:
+                raise ValueError(f"不支持扫描的参数: {name}")
+            values = list(axes[name])
+            if not values:
+                raise ValueError(f"{AXIS_LABELS[name]}没有取值")
+            self.axes.append((name, values))
+        self.base = dict(base)
+        self.base["batch_size"] = 1
+        self._sizes = [len(values) for _, values in self.axes]
+
+    @classmethod
+    def from_preset(cls, preset_manager, name: str, axes: Dict[str, Sequence],
+                    defaults: Optional[dict] = None) -> "ParameterSweep":
+        """以预设为基础参数创建参数扫描"""
+        preset = preset_manager.get_preset(name)
+        if preset is None:
+            raise ValueError(f"预设不存在: {name}")
+        return cls(base_params(preset, defaults), axes)
+
+    def __len__(self) -> int:
+        return math.prod(self._sizes)
+
+    @property
+    def names(self) -> List[str]:
+        """扫描轴的参数名，从外到内"""
+        return [name for name, _ in self.axes]
+
+    def coordinates(self, index: int) -> Tuple[int, ...]:
+        """扫描点在各扫描轴上的取值序号"""
+        if not 0 <= index < len(self):
+            raise IndexError(f"扫描点序号超出范围: {index}")
+        coords = []
+        for size in reversed(self._sizes):
+            index, coord = divmod(index, size)
+            coords.append(coord)
+        return tuple(reversed(coords))
+
+    def point(self, index: int) -> dict:
+        """第 index 个扫描点的参数"""
+        params = dict(self.base)
+        for (name, values), coord in zip(self.axes, self.coordinates(index)):
+            params[name] = values[coord]
+        return params
+
+    def __iter__(self) -> Iterator[dict]:
+        names = self.names
+        for values in itertools.product(*(values for _, values in self.axes)):
+            params = dict(self.base)
+            params.update(zip(names, values))
+            yield params
+
+    def _run_length(self, max_batch: int) -> Tuple[int, int]:
+        """(最内层每组的扫描点数, 每次请求最多打包的点数)"""
+        if self.axes[-1][0] != "seed":
+            return 1, 1
+        return self._sizes[-1], max(1, min(max_batch, MAX_BATCH_SIZE))
+
+    def request_count(self, max_batch: int = MAX_BATCH_SIZE) -> int:
+        """按 max_batch 打包后的请求数"""
+        run, batch = self._run_length(max_batch)
+        return len(self) // run * math.ceil(run / batch)
+
+    def requests(self, max_batch: int = MAX_BATCH_SIZE) -> Iterator[SweepRequest]:
+        """按需生成请求
+
+        只有种子不同的扫描点打包为一次请求（batch_size 为点数），
+        每次最多 max_batch 个点。
+        """
+        run, batch = self._run_length(max_batch)
+        for start in range(0, len(self), run):
+            for offset in range(0, run, batch):
+                first = start + offset
+                points = list(range(first, min(first + batch, start + run)))
+                params = self.point(first)
+                params["batch_size"] = len(points)
+                seeds = None
+                if run > 1:
+                    seeds = [self.axes[-1][1][point - start] for point in points]
+                    params["seed"] = seeds[0]
+                yield SweepRequest(points, params["prompt"], params, seeds)
+
+    def value_label(self, name: str, value) -> str:
+        """扫描轴取值的显示文字"""
+        if name == "model":
+            value = str(value).split("/")[-1]
+        return f"{AXIS_LABELS[name]}={value}"
+
+    def label(self, index: int) -> str:
+        """扫描点的显示文字（各扫描轴的取值）"""
+        point = self.point(index)
+        return ", ".join(self.value_label(name, point[name]) for name in self.names)
+
+
+CELL_SIZE = 256  # 对比图中每张图片的边长（像素）
+MAX_SHEET_CELLS = 16  # 对比图每行、每列最多的图片数，超出时拆分为多张
+
+
+def write_contact_sheets(sweep: ParameterSweep, images: Dict[int, str], output_dir: str,
+                         prefix: str = "sweep", cell_size: int = CELL_SIZE,
+                         max_cells: int = MAX_SHEET_CELLS) -> List[str]:
+    """把扫描结果排列成对比图
+
+    列为最内层扫描轴（有种子轴时即种子），行为次内层扫描轴，其余扫描轴的
+    每种取值组合各生成一张，标题为这些扫描轴的取值；行或列超过 max_cells
+    时拆分为多张。每张图片下方标注其行、列取值，没有结果的扫描点留空，
+    完全没有结果的对比图不生成。
+
+    Args:
+        sweep: 参数扫描
+        images: 扫描点序号 -> 图片路径
+        output_dir: 保存目录
+        prefix: 文件名前缀
+
+    Returns:
+        List[str]: 生成的对比图路径
+    """
+    names = sweep.names
+    col_name, col_values = sweep.axes[-1]
+    row_name, row_values = sweep.axes[-2] if len(sweep.axes) > 1 else (None, [None])
+    block = len(col_values) * len(row_values)
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = []
+    for start in sorted({point // block * block for point in images}):  # 只处理有结果的组合
+        point = sweep.point(start)
+        title = ", ".join(sweep.value_label(name, point[name]) for name in names[:-2])
+        for row0 in range(0, len(row_values), max_cells):
+            for col0 in range(0, len(col_values), max_cells):
+                rows = range(row0, min(row0 + max_cells, len(row_values)))
+                cols = range(col0, min(col0 + max_cells, len(col_values)))
+                tiles = []
+                for r in rows:
+                    row_label = sweep.value_label(row_name, row_values[r]) if row_name else ""
+                    for c in cols:
+                        label = ", ".join(filter(None, (row_label, sweep.value_label(col_name, col_values[c]))))
+                        tiles.append(Tile(images.get(start + r * len(col_values) + c), label))
+                if not any(tile.path for tile in tiles):
+                    continue
+                path = os.path.join(output_dir, f"{prefix}_{len(paths) + 1:03d}.png")
+                try:
+                    compose_contact_sheet(tiles, path, columns=len(cols), cell_size=cell_size, title=title)
+                except OSError as e:
+                    logger.warning("保存对比图失败: %s: %s", path, e)
+                    continue
+                paths.append(path)
+    return paths
+
@@ -1,25 +1,56 @@
 from typing import List, Optional, Callable
-from queue import Queue, Empty
+from queue import Empty
 from threading import Thread, Event, Lock
 from .excel_handler import GenerationTask
-from .api_client import SiliconFlowAPI
+from src.models.task_store import TaskStore, TaskView
+from .backends import ImageBackend
+from .telemetry import Telemetry, get_telemetry
+from .cancellation import CancelToken, OperationCancelled
+from .scheduler import JobQueue
 import time
 import logging
 
+def compact_result(result):
+    """任务结果中只保留保存路径、图片地址和种子值
+
+    生成结果中可能内联了Base64图片数据，任务很多时全部保留在任务存储中
+    会占用大量内存。
+    """
+    if not isinstance(result, dict):
+        return result
+    compact = {key: result[key] for key in ("image_path", "image_paths", "seed") if key in result}
+    images = []
+    for img in result.get("data") or []:
+        if isinstance(img, dict):
+            item = {"seed": img["seed"]} if "seed" in img else {}
+            url = img.get("url")
+            if url and not url.startswith("data:"):
+                item["url"] = url
+            images.append(item)
+    if images:
+        compact["images"] = images
+    return compact
+
 class TaskQueue:
-    """任务队列管理类"""
+    """任务队列管理类
     
-    def __init__(self, api: SiliconFlowAPI):
+    可同时容纳多个作业的任务，按作业优先级出队，同优先级的作业轮流处理。
+    任务数据保存在 TaskStore 中，队列和回调中传递的是任务的 TaskView。
+    """
+    
+    def __init__(self, api: ImageBackend, telemetry: Optional[Telemetry] = None):
         self.api = api
-        self.queue = Queue()
-        self.tasks: List[GenerationTask] = []
-        self._current_task: Optional[GenerationTask] = None
+        self.telemetry = telemetry or get_telemetry()
+        self.queue = JobQueue()
+        self.tasks = TaskStore()
+        self._current_task: Optional[TaskView] = None
         self._current_task_lock = Lock()
         
         # 线程控制
         self.worker_thread: Optional[Thread] = None
         self.pause_event = Event()
         self.stop_event = Event()
+        self.cancel_token = CancelToken()  # 停止时取消进行中的请求
         
         # 回调函数
         self.on_task_complete: Optional[Callable] = None
@@ -27,27 +58,35 @@ class TaskQueue:
         self.on_progress_update: Optional[Callable] = None
         
     @property
-    def current_task(self) -> Optional[GenerationTask]:
+    def current_task(self) -> Optional[TaskView]:
         """获取当前任务"""
         with self._current_task_lock:
             return self._current_task
             
     @current_task.setter
-    def current_task(self, task: Optional[GenerationTask]) -> None:
+    def current_task(self, task: Optional[TaskView]) -> None:
         """设置当前任务"""
         with self._current_task_lock:
             self._current_task = task
     
-    def add_tasks(self, tasks: List[GenerationTask]) -> None:
+    def add_tasks(self, tasks: List[GenerationTask], job: Optional[str] = None,
+                  priority: Optional[int] = None) -> None:
         """添加任务到队列
         
         Args:
             tasks: 任务列表
+            job: 所属作业名称，为None时使用任务自身的设置
+            priority: 作业优先级，为None时使用任务自身的设置
         """
         try:
             for task in tasks:
-                self.queue.put(task)
-                self.tasks.append(task)
+                view = self.tasks.append(task)
+                if job is not None:
+                    view.job = job
+                if priority is not None:
+                    view.priority = priority
+                view.enqueued_at = time.monotonic()
+                self.queue.put(view)
             
             # 更新进度
             if self.on_progress_update:
@@ -57,6 +96,21 @@ class TaskQueue:
             logging.error(f"添加任务失败: {str(e)}")
             raise
     
+    def cancel_job(self, job: str) -> int:
+        """取消作业中尚未开始的任务
+        
+        Returns:
+            int: 取消的任务数
+        """
+        removed = self.queue.remove_job(job)
+        for task in removed:
+            task.status = "已取消"
+        return len(removed)
+    
+    def jobs(self) -> List[dict]:
+        """各作业的排队情况"""
+        return self.queue.jobs()
+    
     def clear_tasks(self) -> None:
         """清空任务队列"""
         try:
@@ -83,6 +137,7 @@ class TaskQueue:
             
         self.pause_event.set()
         self.stop_event.clear()
+        self.cancel_token = CancelToken()
         self.worker_thread = Thread(target=self._process_queue)
         self.worker_thread.daemon = True
         self.worker_thread.start()
@@ -97,6 +152,7 @@ class TaskQueue:
             
         self.stop_event.set()
         self.pause_event.set()  # 确保线程不会卡在暂停状态
+        self.cancel_token.cancel()  # 进行中的请求立即结束
         
         if self.worker_thread.is_alive():
             self.worker_thread.join(timeout=5.0)
@@ -122,23 +178,33 @@ class TaskQueue:
                 task = self.queue.get(timeout=0.1)
                 self.current_task = task
                 task.status = "处理中"
+                self.telemetry.record("queue_wait", time.monotonic() - task.enqueued_at)
                 
                 try:
                     # 调用API生成图片
                     result = self.api.generate_image(
                         prompt=task.prompt,
                         model=task.model,
-                        size=task.size
+                        size=task.size,
+                        cancel=self.cancel_token
                     )
                     
                     # 更新任务状态
                     task.status = "完成"
                     task.result = result
                     
-                    # 调用完成回调
-                    if self.on_task_complete:
-                        self.on_task_complete(task)
+                    # 调用完成回调（回调中可读取完整结果），之后只保留精简的结果
+                    try:
+                        if self.on_task_complete:
+                            self.on_task_complete(task)
+                    finally:
+                        task.result = compact_result(result)
                         
+                except OperationCancelled:
+                    # 停止时取消的任务放回队列，下次启动时重新处理
+                    task.status = "等待中"
+                    self.queue.put(task)
+                    
                 except Exception as e:
                     # 更新任务状态
                     task.status = "失败"
@@ -152,7 +218,7 @@ class TaskQueue:
                     
                 finally:
                     # 更新进度
-                    completed = sum(1 for t in self.tasks if t.status in ["完成", "失败"])
+                    completed = self.tasks.count("完成", "失败")
                     if self.on_progress_update:
                         self.on_progress_update(completed, len(self.tasks))
                     
@@ -0,0 +1,187 @@
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+# 各阶段名称
+STAGES = (
+    "queue_wait",        # 任务排队等待
+    "rate_limit_wait",   # 触发限流后的等待
+    "retry_wait",        # 其他错误重试前的等待
+    "http",              # 生成请求往返
+    "inference",         # 服务端推理耗时（来自响应的 timings）
+    "download",          # 图片下载
+    "decode",            # 内联图片数据解码
+    "disk_write",        # 图片写入磁盘
+    "history_write",     # 历史记录写入
+)
+
+# 直方图桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        """记录一个观测值"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """根据桶分布估算分位数（桶内线性插值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(max(value, self.min), self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class Telemetry:
+    """分阶段耗时统计
+
+    记录每次请求各阶段（排队、限流等待、HTTP往返、推理、下载、写盘、写历史）
+    的耗时，聚合为直方图，并可导出为JSON或Prometheus文本格式。
+    """
+
+    def __init__(self, max_spans: int = 1000, buckets=DEFAULT_BUCKETS):
+        self._lock = Lock()
+        self._buckets = buckets
+        self._histograms: Dict[str, Histogram] = {}
+        self._spans = deque(maxlen=max_spans)  # 最近的阶段记录
+        self._sinks: List["Telemetry"] = []  # 同时接收记录的统计实例
+
+    def record(self, stage: str, seconds: float, **attrs) -> None:
+        """记录一个阶段耗时
+
+        Args:
+            stage: 阶段名称
+            seconds: 耗时（秒）
+            attrs: 附加属性，如模型名、状态码
+        """
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self._buckets)
+            histogram.observe(seconds)
+            self._spans.append({"stage": stage, "end": time.time(), "duration": seconds, **attrs})
+            sinks = list(self._sinks)
+        for sink in sinks:
+            sink.record(stage, seconds, **attrs)
+
+    def add_sink(self, sink: "Telemetry") -> None:
+        """之后的记录同时记录到 sink，用于单独统计一次运行期间的耗时"""
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink: "Telemetry") -> None:
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        """计时上下文，退出时记录耗时（发生异常时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(stage, time.perf_counter() - start, **attrs)
+
+    def reset(self) -> None:
+        """清空所有统计"""
+        with self._lock:
+            self._histograms.clear()
+            self._spans.clear()
+
+    def recent_spans(self, limit: Optional[int] = None) -> List[Dict]:
+        """获取最近的阶段记录"""
+        with self._lock:
+            spans = list(self._spans)
+        return spans[-limit:] if limit else spans
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """获取各阶段统计摘要"""
+        with self._lock:
+            return {stage: h.to_dict() for stage, h in self._histograms.items()}
+
+    def summary_lines(self) -> List[str]:
+        """生成便于显示的各阶段耗时摘要"""
+        lines = []
+        snapshot = self.snapshot()
+        for stage in sorted(snapshot, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            data = snapshot[stage]
+            lines.append(
+                f"{stage}: {data['count']}次, 合计{data['sum']:.2f}秒, "
+                f"p50 {data['p50']:.3f}秒, p99 {data['p99']:.3f}秒"
+            )
+        return lines
+
+    def to_json(self) -> str:
+        """导出为JSON文本"""
+        return json.dumps({"timestamp": time.time(), "stages": self.snapshot()}, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, metric: str = "image_generation_stage_seconds") -> str:
+        """导出为Prometheus文本格式"""
+        lines = [
+            f"# HELP {metric} Time spent in each generation stage.",
+            f"# TYPE {metric} histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path) -> None:
+        """导出到文件，.prom/.txt 后缀使用Prometheus格式，其余使用JSON"""
+        file_path = Path(file_path)
+        content = self.to_prometheus() if file_path.suffix in (".prom", ".txt") else self.to_json()
+        file_path.write_text(content, encoding="utf-8")
+
+
+# 进程内共享的默认统计实例
+_default_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """获取默认统计实例"""
+    return _default_telemetry
@@ -0,0 +1,193 @@
+import errno
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"  # 批次目录中记录原路径的文件
+RECORDS = "records.json"  # 批次目录中保存删除的历史记录及其原序号的文件
+TRASH_DIR = ".trash"  # 未配置 paths.trash_dir 时，回收站位于输出目录下的该目录
+DEFAULT_MAX_AGE_DAYS = 7  # 回收站中的批次保留的天数
+PROGRESS_STEP = 200  # 每处理多少个文件报告一次进度
+
+
+def _move(source: str, target: str) -> None:
+    """移动文件：同一文件系统内只是重命名，跨文件系统时复制后删除"""
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, target)
+
+
+def configured_trash_dir(config) -> str:
+    """配置的回收站目录（paths.trash_dir），未设置时为输出目录下的 .trash"""
+    return config.get("paths.trash_dir") or os.path.join(config.get("paths.output_dir"), TRASH_DIR)
+
+
+def _write_json(path: str, data) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Trash:
+    """应用管理的回收站
+
+    每次删除的图片移动到回收站中的一个批次目录，批次目录中的
+    manifest.json 记录每个文件的原路径（在移动之前写入，中途退出也能
+    找回已移动的文件），records.json 保存删除的历史记录，恢复时把文件
+    移回原处。批次超过 max_age_days 天后由 expire 清除。
+    """
+
+    def __init__(self, root: str, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.root = root
+        self.max_age_days = max_age_days
+
+    def new_batch(self) -> str:
+        """创建一个批次目录并返回其路径"""
+        os.makedirs(self.root, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(self.root, name)
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(self.root, f"{name}_{suffix}")
+        os.makedirs(path)
+        return path
+
+    def batches(self) -> List[str]:
+        """回收站中的批次目录，最旧的在前"""
+        try:
+            with os.scandir(self.root) as entries:
+                return sorted(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except FileNotFoundError:
+            return []
+
+    def save_records(self, batch: str, removed: Sequence) -> None:
+        """保存批次中删除的历史记录，removed 为 (原序号, 记录)"""
+        _write_json(os.path.join(batch, RECORDS), [[row, record] for row, record in removed])
+
+    def load_records(self, batch: str) -> List:
+        """读取批次中删除的历史记录，返回 (原序号, 记录)，按原序号升序"""
+        try:
+            return [(row, record) for row, record in _read_json(os.path.join(batch, RECORDS))]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("读取回收站中的历史记录失败: %s: %s", batch, e)
+            return []
+
+    def take_records(self, batch: str) -> List:
+        """读取并移除批次中删除的历史记录，避免重复恢复"""
+        removed = self.load_records(batch)
+        try:
+            os.remove(os.path.join(batch, RECORDS))
+        except OSError:
+            pass
+        return removed
+
+    def info(self, batch: str) -> Dict:
+        """批次的删除时间、记录数和文件数"""
+        try:
+            files = len(_read_json(os.path.join(batch, MANIFEST)))
+        except (OSError, ValueError, TypeError):
+            files = 0
+        try:
+            deleted_at = os.stat(batch).st_mtime
+        except OSError:
+            deleted_at = 0
+        return {"time": deleted_at, "records": len(self.load_records(batch)), "files": files}
+
+    def move(self, batch: str, paths: Sequence[str],
+             progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """把文件移动到批次目录，不存在的文件忽略
+
+        Returns:
+            int: 移动的文件数
+        """
+        entries = [{"path": os.path.abspath(path), "name": f"{i:06d}_{os.path.basename(path)}"}
+                   for i, path in enumerate(paths)]
+        _write_json(os.path.join(batch, MANIFEST), entries)
+
+        moved = 0
+        for done, entry in enumerate(entries, 1):
+            try:
+                _move(entry["path"], os.path.join(batch, entry["name"]))
+                moved += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("移动到回收站失败: %s: %s", entry["path"], e)
+            if progress and (done % PROGRESS_STEP == 0 or done == len(entries)):
+                progress(done, len(entries))
+        return moved
+
+    def restore(self, batch: str, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """把批次中的文件移回原处并删除批次目录，原处已有同名文件时保留在回收站
+
+        只有历史记录、没有文件的批次直接删除。
+
+        Returns:
+            int: 恢复的文件数
+        """
+        try:
+            entries = _read_json(os.path.join(batch, MANIFEST))
+        except FileNotFoundError:
+            entries = []
+        except (OSError, ValueError) as e:
+            logger.warning("读取回收站清单失败: %s: %s", batch, e)
+            return 0
+
+        restored = kept = 0
+        for done, entry in enumerate(entries, 1):
+            source = os.path.join(batch, entry["name"])
+            if os.path.exists(source):
+                if os.path.exists(entry["path"]):
+                    logger.warning("原位置已有文件，保留在回收站: %s", entry["path"])
+                    kept += 1
+                else:
+                    try:
+                        os.makedirs(os.path.dirname(entry["path"]), exist_ok=True)
+                        _move(source, entry["path"])
+                        restored += 1
+                    except OSError as e:
+                        logger.warning("从回收站恢复失败: %s: %s", entry["path"], e)
+                        kept += 1
+            if progress and (done % PROGRESS_STEP == 0 or done == len(entries)):
+                progress(done, len(entries))
+        if not kept:
+            self.purge(batch)
+        return restored
+
+    def purge(self, batch: str) -> None:
+        """彻底删除一个批次"""
+        shutil.rmtree(batch, ignore_errors=True)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """清除超过保留天数的批次
+
+        Returns:
+            int: 清除的批次数
+        """
+        cutoff = (time.time() if now is None else now) - self.max_age_days * 86400
+        expired = 0
+        for batch in self.batches():
+            try:
+                if os.stat(batch).st_mtime < cutoff:
+                    self.purge(batch)
+                    expired += 1
+            except OSError:
+                continue
+        return expired
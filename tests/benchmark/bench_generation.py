@@ -0,0 +1,281 @@
+"""生成流程性能基准测试
+
+针对本地模拟服务器测量 SiliconFlowAPI、TaskQueue 和 BatchGenerationThread
+的端到端吞吐量（张/分钟）、p50/p99延迟、内存峰值和文件写入吞吐量，
+并可将结果与基线文件比较以发现性能回退。
+
+用法:
+    python -m tests.benchmark.bench_generation --images 40 --latency 0.05
+    python -m tests.benchmark.bench_generation --output bench_results.json
+    python -m tests.benchmark.bench_generation --baseline bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Lock
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from src.models.generation_task import GenerationTask
+from src.utils.api_client import SiliconFlowAPI
+from src.utils.task_queue import TaskQueue
+from tests.benchmark.mock_server import MockSiliconFlowServer
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+# 越大越好的指标，其余指标越小越好
+HIGHER_IS_BETTER = {"images_per_minute", "write_mb_per_s"}
+COMPARED_METRICS = ["images_per_minute", "latency_p50", "latency_p99", "peak_memory_mb", "write_mb_per_s"]
+
+
+class TimedAPI:
+    """记录每次 generate_image 调用耗时的API代理"""
+
+    def __init__(self, api: SiliconFlowAPI):
+        self._api = api
+        self._lock = Lock()
+        self.latencies: List[float] = []
+
+    def generate_image(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._api.generate_image(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+
+def _make_api(server: MockSiliconFlowServer) -> TimedAPI:
+    return TimedAPI(SiliconFlowAPI("bench_key", base_url=server.base_url))
+
+
+def _summarize(name: str, images: int, duration: float, latencies: List[float],
+               peak_memory: int, bytes_written: int = 0, write_time: float = 0.0) -> Dict:
+    """汇总单项基准测试结果"""
+    result = {
+        "name": name,
+        "images": images,
+        "duration": round(duration, 4),
+        "images_per_minute": round(images / duration * 60, 2) if duration > 0 else 0.0,
+        "latency_p50": round(float(np.percentile(latencies, 50)), 4) if latencies else 0.0,
+        "latency_p99": round(float(np.percentile(latencies, 99)), 4) if latencies else 0.0,
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 2),
+        "write_mb_per_s": round(bytes_written / 1024 / 1024 / write_time, 2) if write_time > 0 else 0.0,
+    }
+    if resource is not None:
+        # Linux 下 ru_maxrss 单位为KB，macOS 下为字节
+        scale = 1 if sys.platform == "darwin" else 1024
+        result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024, 2)
+    return result
+
+
+def _measure(func: Callable[[], Dict]) -> Dict:
+    """在内存跟踪下运行基准测试函数"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result["peak_memory"] = peak
+    return result
+
+
+def bench_api_client(server: MockSiliconFlowServer, images: int, batch_size: int, output_dir: Path) -> Dict:
+    """测试 SiliconFlowAPI 生成+下载的吞吐量"""
+    def run():
+        api = _make_api(server)
+        saved = 0
+        bytes_written = 0
+        write_time = 0.0
+        start = time.perf_counter()
+        for i in range(max(1, images // batch_size)):
+            result = api.generate_image(
+                prompt=f"benchmark {i}", model="mock/model", batch_size=batch_size,
+                seeds=list(range(1, batch_size + 1))
+            )
+            for j, img in enumerate(result.get("data", [])):
+                write_start = time.perf_counter()
+                path = api.download_image(img["url"], output_dir / f"api_{i}_{j}.png")
+                write_time += time.perf_counter() - write_start
+                bytes_written += path.stat().st_size
+                saved += 1
+        return {"images": saved, "duration": time.perf_counter() - start, "latencies": api.latencies,
+                "bytes_written": bytes_written, "write_time": write_time}
+
+    data = _measure(run)
+    return _summarize("api_client", data["images"], data["duration"], data["latencies"],
+                      data["peak_memory"], data["bytes_written"], data["write_time"])
+
+
+def bench_task_queue(server: MockSiliconFlowServer, images: int, timeout: float = 600) -> Dict:
+    """测试 TaskQueue 处理生成任务的吞吐量"""
+    def run():
+        api = _make_api(server)
+        queue = TaskQueue(api)
+        done = Event()
+
+        def on_progress(completed, total):
+            if total and completed >= total:
+                done.set()
+
+        queue.on_progress_update = on_progress
+        tasks = [GenerationTask(prompt=f"benchmark {i}", model="mock/model", size="1024x1024") for i in range(images)]
+        start = time.perf_counter()
+        queue.add_tasks(tasks)
+        queue.start()
+        done.wait(timeout)
+        duration = time.perf_counter() - start
+        queue.stop()
+        completed = sum(1 for t in queue.tasks if t.status == "完成")
+        return {"images": completed, "duration": duration, "latencies": api.latencies}
+
+    data = _measure(run)
+    return _summarize("task_queue", data["images"], data["duration"], data["latencies"], data["peak_memory"])
+
+
+def bench_batch_thread(server: MockSiliconFlowServer, images: int, batch_size: int, output_dir: Path) -> Dict:
+    """测试 BatchGenerationThread 端到端（生成、下载、保存）吞吐量"""
+    from src.ui.batch_gen import BatchGenerationThread
+
+    def run():
+        api = _make_api(server)
+        params = {
+            "prompt": "", "negative_prompt": "", "model": "mock/model", "size": "1024x1024",
+            "steps": 20, "guidance": 7.5, "batch_size": batch_size, "seed": -1
+        }
+        prompts = [f"benchmark prompt {i}" for i in range(max(1, images // batch_size))]
+        thread = BatchGenerationThread(api, prompts, params, str(output_dir), "{prompt}_{index}_{seed}")
+        start = time.perf_counter()
+        thread.run()  # 在当前线程中同步执行
+        duration = time.perf_counter() - start
+        bytes_written = sum(os.path.getsize(p) for p in thread.saved_files)
+        # 写入耗时取线程内保存步骤的计时（本次运行的 disk_write 阶段），不含生成和下载
+        write_time = thread.run_telemetry.snapshot().get("disk_write", {}).get("sum", 0.0)
+        return {"images": len(thread.saved_files), "duration": duration, "latencies": api.latencies,
+                "bytes_written": bytes_written, "write_time": write_time}
+
+    data = _measure(run)
+    return _summarize("batch_thread", data["images"], data["duration"], data["latencies"],
+                      data["peak_memory"], data["bytes_written"], data["write_time"])
+
+
+BENCHMARKS = ["api_client", "task_queue", "batch_thread"]
+
+
+def run_benchmarks(images: int = 20, batch_size: int = 1, latency: float = 0.05, jitter: float = 0.0,
+                   error_rates: Dict[int, float] = None, payload_size: int = 256 * 1024,
+                   only: List[str] = None) -> Dict:
+    """运行基准测试并返回结果
+
+    Returns:
+        Dict: 包含运行参数、环境信息和各项结果的字典
+    """
+    # 确保本地请求不经过系统代理
+    os.environ["NO_PROXY"] = ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+    selected = only or BENCHMARKS
+    config = {"images": images, "batch_size": batch_size, "latency": latency, "jitter": jitter,
+              "error_rates": {str(k): v for k, v in (error_rates or {}).items()}, "payload_size": payload_size}
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in selected:
+            with MockSiliconFlowServer(latency=latency, jitter=jitter, error_rates=error_rates,
+                                       payload_size=payload_size) as server:
+                output_dir = Path(temp_dir) / name
+                output_dir.mkdir()
+                if name == "api_client":
+                    results[name] = bench_api_client(server, images, batch_size, output_dir)
+                elif name == "task_queue":
+                    results[name] = bench_task_queue(server, images)
+                elif name == "batch_thread":
+                    results[name] = bench_batch_thread(server, images, batch_size, output_dir)
+                results[name]["server_errors"] = dict(server.stats["errors"])
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": config,
+        "results": results,
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = 0.15,
+                    metrics: List[str] = COMPARED_METRICS) -> List[str]:
+    """与基线结果比较，返回超出容差的性能回退说明"""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in metrics:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="图片生成流程性能基准测试")
+    parser.add_argument("--images", type=int, default=20, help="每项测试生成的图片数量")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次请求生成的图片数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟推理耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="推理耗时随机抖动上限（秒）")
+    parser.add_argument("--error-429", type=float, default=0.0, help="429错误注入概率")
+    parser.add_argument("--error-503", type=float, default=0.0, help="503错误注入概率")
+    parser.add_argument("--payload-kb", type=int, default=256, help="每张图片大小（KB）")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="只运行指定的测试")
+    parser.add_argument("--output", help="结果保存路径（JSON）")
+    parser.add_argument("--baseline", help="用于比较的基线结果路径（JSON）")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="允许的性能波动比例")
+    args = parser.parse_args(argv)
+
+    error_rates = {status: rate for status, rate in ((429, args.error_429), (503, args.error_503)) if rate > 0}
+    report = run_benchmarks(args.images, args.batch_size, args.latency, args.jitter,
+                            error_rates, args.payload_kb * 1024, args.only)
+
+    for name, result in report["results"].items():
+        print(f"[{name}] {result['images']} 张, {result['images_per_minute']} 张/分钟, "
+              f"p50 {result['latency_p50']}s, p99 {result['latency_p99']}s, "
+              f"内存峰值 {result['peak_memory_mb']}MB, 写入 {result['write_mb_per_s']}MB/s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print("发现性能回退:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""启动性能基准测试
+
+测量 ConfigManager 的构造耗时：首次启动（新目录，创建目录和配置文件）
+和再次启动（读取已有配置并合并默认值），并可与基线结果比较。
+
+用法:
+    python -m tests.benchmark.bench_startup --iterations 50
+    python -m tests.benchmark.bench_startup --output startup_baseline.json
+    python -m tests.benchmark.bench_startup --baseline startup_baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from src.utils.config_manager import ConfigManager
+from tests.benchmark.bench_generation import compare_results
+
+STARTUP_METRICS = ["cold_p50_ms", "cold_p99_ms", "warm_p50_ms", "warm_p99_ms"]
+
+
+def _percentile_ms(samples: List[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def bench_config_startup(iterations: int = 20) -> Dict:
+    """在临时目录中反复创建配置管理器，分别统计首次启动和再次启动的耗时"""
+    cold, warm = [], []
+    original_cwd = os.getcwd()
+    # 启动日志不计入耗时
+    logger = logging.getLogger("src.utils.config_manager")
+    original_level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            for i in range(iterations):
+                directory = Path(root) / f"run_{i}"
+                directory.mkdir()
+                os.chdir(directory)  # 开发模式下以当前目录为程序根目录
+
+                start = time.perf_counter()
+                ConfigManager()
+                cold.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                ConfigManager()
+                warm.append(time.perf_counter() - start)
+            os.chdir(original_cwd)  # 离开临时目录后才能删除
+    finally:
+        os.chdir(original_cwd)
+        logger.setLevel(original_level)
+
+    return {
+        "name": "config_startup",
+        "iterations": iterations,
+        "cold_p50_ms": _percentile_ms(cold, 50),
+        "cold_p99_ms": _percentile_ms(cold, 99),
+        "warm_p50_ms": _percentile_ms(warm, 50),
+        "warm_p99_ms": _percentile_ms(warm, 99),
+    }
+
+
+def run_startup_benchmark(iterations: int = 20) -> Dict:
+    """运行启动基准测试，返回与生成基准测试相同结构的报告"""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"iterations": iterations},
+        "results": {"config_startup": bench_config_startup(iterations)},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="启动性能基准测试")
+    parser.add_argument("--iterations", type=int, default=20, help="重复次数")
+    parser.add_argument("--output", help="结果保存路径（JSON）")
+    parser.add_argument("--baseline", help="用于比较的基线结果路径（JSON）")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许的性能波动比例")
+    args = parser.parse_args(argv)
+
+    report = run_startup_benchmark(args.iterations)
+    result = report["results"]["config_startup"]
+    print(f"[config_startup] 首次启动 p50 {result['cold_p50_ms']}ms, p99 {result['cold_p99_ms']}ms; "
+          f"再次启动 p50 {result['warm_p50_ms']}ms, p99 {result['warm_p99_ms']}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance, STARTUP_METRICS)
+        if regressions:
+            print("发现性能回退:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""本地模拟硅基流动API服务器，用于性能基准测试"""
+
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+
+def make_png_payload(payload_size: int, seed: int = 0) -> bytes:
+    """生成大小接近 payload_size 的PNG图片（随机噪声几乎不可压缩）"""
+    side = max(8, int((payload_size / 3) ** 0.5))
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class MockSiliconFlowServer:
+    """模拟 /images/generations 和图片下载地址的本地HTTP服务器
+
+    Args:
+        latency: 生成接口的模拟推理耗时（秒）
+        jitter: 推理耗时的随机抖动上限（秒）
+        error_rates: 注入错误的状态码及概率，如 {429: 0.1, 503: 0.05}
+        payload_size: 每张图片的大致字节数
+        download_latency: 图片下载接口的模拟耗时（秒）
+        seed: 随机数种子，保证错误注入可复现
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0,
+                 error_rates: Optional[Dict[int, float]] = None,
+                 payload_size: int = 256 * 1024, download_latency: float = 0.0,
+                 seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rates = error_rates or {}
+        self.download_latency = download_latency
+        self.payload = make_png_payload(payload_size, seed)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"generations": 0, "downloads": 0, "errors": {}}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """API基础URL，可直接传给 SiliconFlowAPI"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _pick_error(self) -> Optional[int]:
+        with self._lock:
+            roll = self._random.random()
+            for status, rate in self.error_rates.items():
+                if roll < rate:
+                    self.stats["errors"][status] = self.stats["errors"].get(status, 0) + 1
+                    return status
+                roll -= rate
+            return None
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/images/"):
+                    if server.download_latency:
+                        time.sleep(server.download_latency)
+                    with server._lock:
+                        server.stats["downloads"] += 1
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/png")
+                    self.send_header("Content-Length", str(len(server.payload)))
+                    self.end_headers()
+                    self.wfile.write(server.payload)
+                elif self.path == "/v1/models":
+                    self._send_json(200, {"data": [{"id": "mock/model"}]})
+                else:
+                    self._send_json(404, {"message": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/v1/images/generations":
+                    self._send_json(404, {"message": "not found"})
+                    return
+
+                delay = server._delay()
+                time.sleep(delay)
+                status = server._pick_error()
+                if status is not None:
+                    self._send_json(status, {"message": f"injected error {status}"})
+                    return
+
+                batch_size = int(body.get("batch_size", 1))
+                seeds = body.get("seeds") or [server._random.randint(1, 9999999998) for _ in range(batch_size)]
+                with server._lock:
+                    server.stats["generations"] += 1
+                    request_id = server.stats["generations"]
+                host, port = server._server.server_address[:2]
+                images = [
+                    {"url": f"http://{host}:{port}/images/{request_id}_{i}.png", "seed": seeds[i]}
+                    for i in range(batch_size)
+                ]
+                self._send_json(200, {
+                    "images": images,
+                    "data": images,
+                    "timings": {"inference": delay},
+                    "seed": seeds[0]
+                })
+
+        return Handler
+
+    def start(self) -> "MockSiliconFlowServer":
+        """在后台线程中启动服务器"""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务器"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
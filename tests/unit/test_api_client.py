@@ -134,4 +134,150 @@ def test_download_image_errors(api_client, tmp_path):
             api_client.download_image("http://example.com/image.png", test_image_path)
         assert "图片下载失败" in str(exc_info.value)
     
-    test_network_error() 
\ No newline at end of file
+    test_network_error() 
+@responses.activate
+def test_non_retryable_error_fails_fast(api_client):
+    """测试参数错误等不可重试的错误不重试"""
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"message": "Invalid size"},
+        status=400
+    )
+    
+    with pytest.raises(APIError) as exc_info:
+        api_client.generate_image(prompt="test prompt", model="test-model", max_retries=3)
+    assert exc_info.value.code == 400
+    assert "Invalid size" in str(exc_info.value)
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_circuit_breaker_fast_fails():
+    """测试连续服务端错误后熔断，不再发送请求"""
+    from src.utils.api_client import CircuitOpenError
+    from src.utils.resilience import CircuitBreaker
+    
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"message": "Service unavailable"},
+        status=503
+    )
+    client = SiliconFlowAPI("test_key", breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(APIError):
+            client.generate_image(prompt="test prompt", model="test-model", max_retries=1)
+    
+    with pytest.raises(CircuitOpenError) as exc_info:
+        client.generate_image(prompt="test prompt", model="test-model", max_retries=1)
+    assert exc_info.value.code == 503
+    assert len(responses.calls) == 2
+
+def test_cancel_stops_retry_wait():
+    """测试取消后重试等待和进行中的请求立即结束"""
+    import threading
+    import time
+    from unittest.mock import patch
+    from src.utils.cancellation import CancelToken, OperationCancelled
+    
+    client = SiliconFlowAPI("test_key")
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    
+    start = time.monotonic()
+    with patch.object(requests.Session, "post", side_effect=requests.exceptions.ConnectionError()):
+        with pytest.raises(OperationCancelled):
+            client.generate_image(prompt="test prompt", model="test-model", max_retries=3, cancel=token)
+    assert time.monotonic() - start < 2
+    
+    # 已取消的令牌不会再发出请求
+    with patch.object(requests.Session, "post") as post:
+        with pytest.raises(OperationCancelled):
+            client.generate_image(prompt="test prompt", model="test-model", cancel=token)
+    post.assert_not_called()
+
+@responses.activate
+def test_deadline_skips_retry(api_client):
+    """测试剩余时间不足以等待重试时直接失败"""
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"message": "Service unavailable"},
+        status=503
+    )
+    
+    with pytest.raises(APIError) as exc_info:
+        api_client.generate_image(prompt="test prompt", model="test-model", max_retries=3, deadline=2)
+    assert exc_info.value.code == 503
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_inline_response_skips_download():
+    """测试内联返回的图片直接解码，不再下载"""
+    import base64
+    
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"data": [{"b64_json": base64.b64encode(b"inline image").decode()}]},
+        status=200
+    )
+    client = SiliconFlowAPI("test_key", response_format="b64_json")
+    result = client.generate_image(prompt="test prompt", model="test-model", seeds=[7])
+    
+    request_body = json.loads(responses.calls[0].request.body.decode('utf-8'))
+    assert request_body["response_format"] == "b64_json"
+    img_info = result["data"][0]
+    assert img_info["seed"] == 7
+    assert client.fetch_image(img_info) == b"inline image"
+    assert "b64_json" not in img_info  # 解码后释放Base64文本
+    assert len(responses.calls) == 1
+    
+    data_url = {"url": "data:image/png;base64," + base64.b64encode(b"data url").decode()}
+    assert client.fetch_image(data_url) == b"data url"
+
+@responses.activate
+def test_inline_response_falls_back_to_url():
+    """测试服务不支持内联返回时改用URL下载"""
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"message": "unknown field response_format"},
+        status=400
+    )
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"data": [{"url": "http://example.com/image.png"}]},
+        status=200
+    )
+    responses.add(responses.GET, "http://example.com/image.png", body=b"downloaded")
+    client = SiliconFlowAPI("test_key", response_format="b64_json")
+    
+    result = client.generate_image(prompt="test prompt", model="test-model", max_retries=1)
+    
+    assert not client.inline_enabled
+    assert "response_format" not in json.loads(responses.calls[1].request.body.decode('utf-8'))
+    assert client.fetch_image(result["data"][0]) == b"downloaded"
+    
+    # 一段时间后重新尝试内联返回
+    client._inline_retry_at = 0
+    assert client.inline_enabled
+
+@responses.activate
+def test_inline_response_keeps_unrelated_errors():
+    """测试与内联返回无关的参数错误直接失败，不改用URL下载"""
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"message": "invalid size"},
+        status=400
+    )
+    client = SiliconFlowAPI("test_key", response_format="b64_json")
+    
+    with pytest.raises(APIError) as exc_info:
+        client.generate_image(prompt="test prompt", model="test-model", size="1x1")
+    
+    assert exc_info.value.code == 400
+    assert len(responses.calls) == 1
+    assert client.inline_enabled
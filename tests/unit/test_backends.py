@@ -0,0 +1,119 @@
+import base64
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import pytest
+import responses
+from PIL import Image
+
+from src.utils.api_client import APIError, SiliconFlowAPI
+from src.utils.api_manager import APIManager
+from src.utils.backends import BackendRouter, ImageBackend, OpenAICompatibleBackend, StubBackend
+from src.utils.key_pool import PooledAPI
+
+OPENAI_URL = "https://api.openai.com/v1/images/generations"
+
+def test_stub_backend_is_deterministic():
+    """测试模拟后端相同参数生成相同图片"""
+    backend = StubBackend()
+    first = backend.generate_image(prompt="test", model="stub/model", size="64x32", batch_size=2)
+    second = backend.generate_image(prompt="test", model="stub/model", size="64x32", batch_size=2)
+    assert first == second
+    assert len(first["data"]) == 2
+
+    content = backend.fetch_image(first["data"][0])
+    assert content == backend.fetch_image(second["data"][0])
+    assert content != backend.fetch_image(first["data"][1])
+    with Image.open(BytesIO(content)) as img:
+        assert img.size == (64, 32)
+
+    seeded = backend.generate_image(prompt="test", model="stub/model", batch_size=1, seeds=[42])
+    assert seeded["data"][0]["seed"] == 42
+    with pytest.raises(APIError):
+        backend.generate_image(prompt="test", model="stub/model", size="invalid")
+
+def test_backend_interface():
+    """测试后端接口为抽象类，硅基流动客户端注册为其子类"""
+    with pytest.raises(TypeError):
+        ImageBackend()
+    assert isinstance(SiliconFlowAPI("test_key"), ImageBackend)
+    assert issubclass(PooledAPI, ImageBackend)
+    assert isinstance(StubBackend(), ImageBackend)
+
+def test_router_routes_by_model():
+    """测试按模型名称选择后端，并由同一后端获取图片"""
+    default = MagicMock()
+    default.generate_image.return_value = {"data": [{"url": "http://example.com/1.png"}]}
+    default.fetch_image.return_value = b"remote"
+    router = BackendRouter({"siliconflow": default, "stub": StubBackend()}, "siliconflow",
+                           routes=[("stub/*", "stub")])
+
+    local = router.generate_image("test", "stub/model", size="16x16")
+    remote = router.generate_image("test", "black-forest-labs/FLUX.1-dev")
+
+    assert local["data"][0]["backend"] == "stub"
+    assert remote["data"][0]["backend"] == "siliconflow"
+    assert router.fetch_image(local["data"][0]).startswith(b"\x89PNG")
+    assert router.fetch_image(remote["data"][0]) == b"remote"
+    default.generate_image.assert_called_once()
+
+    with pytest.raises(ValueError):
+        BackendRouter({"stub": StubBackend()}, "stub", routes=[("*", "missing")])
+
+@responses.activate
+def test_openai_backend():
+    """测试OpenAI兼容后端解析URL和内联图片数据"""
+    responses.add(responses.POST, OPENAI_URL, json={"data": [
+        {"url": "http://example.com/1.png"},
+        {"b64_json": base64.b64encode(b"inline").decode()},
+    ]})
+    responses.add(responses.GET, "http://example.com/1.png", body=b"downloaded")
+    backend = OpenAICompatibleBackend("test-key")
+
+    result = backend.generate_image(prompt="test", model="dall-e-3", batch_size=2, seeds=[1, 2])
+
+    assert [img["seed"] for img in result["data"]] == [1, 2]
+    assert backend.fetch_image(result["data"][0]) == b"downloaded"
+    assert backend.fetch_image(result["data"][1]) == b"inline"
+    assert "Authorization" not in responses.calls[1].request.headers
+
+def test_api_manager_builds_router():
+    """测试配置路由时使用 BackendRouter，默认后端为模拟后端时无需密钥"""
+    values = {"api_key": "test-key", "backends.routes": {"stub/*": "stub"}}
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+
+    manager = APIManager(config)
+    assert isinstance(manager.api, BackendRouter)
+    assert manager.api.backend_for("stub/model") == "stub"
+    assert manager.api.api_key == "test-key"
+
+    values.update({"api_key": "", "backends.default": "stub", "backends.routes": {}})
+    assert manager.api.backend_for("any/model") == "stub"
+
+def test_api_manager_rebuilds_on_config_change(tmp_path, monkeypatch):
+    """测试使用配置管理器时只在相关配置修改后重建客户端"""
+    from src.utils.config_manager import ConfigManager
+
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0)
+    config.set("api_key", "key-a")
+    manager = APIManager(config)
+    api = manager.api
+    assert api.api_key == "key-a"
+
+    config.set("defaults.steps", 30)
+    assert manager.api is api
+    config.set("scheduler.max_concurrent", 3)
+    assert manager.scheduler.max_concurrent == 3
+
+    config.set("api_key", "key-b")
+    assert manager.api is not api
+    assert manager.api.api_key == "key-b"
+
+    # 修改密钥池设置后按新设置重建密钥池
+    config.set("api_keys", ["key-c"])
+    pooled = manager.api
+    config.set("key_pool.cooldown", 5)
+    assert manager.api is not pooled
+    assert manager.api.pool.cooldown == 5
@@ -3,7 +3,7 @@ from unittest.mock import MagicMock, patch, ANY
 from datetime import datetime
 import pytest
 import pandas as pd
-from PyQt6.QtWidgets import QApplication, QMessageBox, QFileDialog, QListWidgetItem
+from PyQt6.QtWidgets import QApplication, QMessageBox, QFileDialog
 from PyQt6.QtTest import QSignalSpy
 from PyQt6.QtCore import Qt, QThread
 from src.ui.batch_gen import BatchGenTab
@@ -86,7 +86,7 @@ def test_init(batch_gen_tab, mock_api, mock_config, mock_history):
     assert batch_gen_tab.api_manager == mock_api
     assert batch_gen_tab.config_manager == mock_config
     assert batch_gen_tab.history_manager == mock_history
-    assert batch_gen_tab.tasks == []
+    assert len(batch_gen_tab.tasks) == 0
     assert not batch_gen_tab.start_btn.isEnabled()
     assert not batch_gen_tab.pause_btn.isEnabled()
     assert not batch_gen_tab.resume_btn.isEnabled()
@@ -192,28 +192,22 @@ def test_edit_task(batch_gen_tab):
     batch_gen_tab.tasks = [
         {"prompt": "test prompt", "model": "model A", "size": "512x512"}
     ]
-    batch_gen_tab.task_list.clear()
-    for task in batch_gen_tab.tasks:
-        item = QListWidgetItem(f"提示词: {task['prompt'][:50]}...")
-        item.setData(Qt.ItemDataRole.UserRole, task)
-        batch_gen_tab.task_list.addItem(item)
+    assert batch_gen_tab.task_model.rowCount() == 1
     
     # 选择要编辑的任务
-    batch_gen_tab.task_list.setCurrentRow(0)
+    batch_gen_tab.task_list.setCurrentIndex(batch_gen_tab.task_model.index(0))
     
     # 创建一个编辑对话框模拟方法
     def edit_task_mock(task):
         task["prompt"] = "edited prompt"
         return task
     
-    # 模拟编辑任务
-    batch_gen_tab.task_list.currentItem().setData(
-        Qt.ItemDataRole.UserRole, 
-        edit_task_mock(batch_gen_tab.tasks[0])
-    )
+    # 模拟编辑任务（列表中的数据就是任务存储中的任务）
+    edit_task_mock(batch_gen_tab.task_list.currentIndex().data(Qt.ItemDataRole.UserRole))
     
     # 验证任务已更新
     assert batch_gen_tab.tasks[0]["prompt"] == "edited prompt"
+    assert "edited prompt" in batch_gen_tab.task_list.currentIndex().data()
 
 def test_random_seed_behavior(batch_gen_tab, mock_api, mock_config, qtbot):
     """测试随机种子行为"""
@@ -272,4 +266,301 @@ def test_get_generation_params(batch_gen_tab):
     assert len(batch_gen_tab.tasks) == 1
     task = batch_gen_tab.tasks[0]
     assert task["prompt"] == "测试提示词"
-    assert task["model"] == "test model" 
\ No newline at end of file
+    assert task["model"] == "test model" 
+
+def test_save_image_skips_duplicates(tmp_path):
+    """测试启用去重后跳过内容相同的图片"""
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.dedup_index import DedupIndex
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 2, "seed": 12345
+    }
+    index = DedupIndex(tmp_path / "dedup_index.json")
+    api = MagicMock()
+    api.fetch_image.return_value = b"same image bytes"
+    thread = BatchGenerationThread(
+        api, ["test"], params, str(tmp_path / "output"), "{prompt}_{index}",
+        dedup_index=index, dedup_mode="skip"
+    )
+    
+    first = thread.save_image({"url": "http://example.com/1.png"}, [1, 2], 0, "test", params)
+    second = thread.save_image({"url": "http://example.com/2.png"}, [1, 2], 1, "test", params)
+    
+    assert first == second
+    assert os.listdir(tmp_path / "output") == [os.path.basename(first)]
+    assert len(index) == 1
+
+def test_progress_is_throttled(tmp_path, batch_gen_tab):
+    """测试进度按间隔合并发送，日志行数受限"""
+    from src.ui.batch_gen import BatchGenerationThread
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    api = MagicMock()
+    api.generate_image.return_value = {"data": [{"url": "http://example.com/1.png"}]}
+    api.fetch_image.return_value = b"image bytes"
+    prompts = [f"prompt {i}" for i in range(20)]
+    thread = BatchGenerationThread(api, prompts, params, str(tmp_path), "{prompt}_{index}")
+    thread.tracker.interval = 60  # 除强制发送外全部合并
+    
+    snapshots = []
+    thread.progress_updated.connect(snapshots.append)
+    thread.run()
+    
+    # 首行日志一次、每个提示词调用API前一次、结束时一次
+    assert len(snapshots) == len(prompts) + 2
+    final = snapshots[-1]
+    assert final["prompts_done"] == 20
+    assert final["images_saved"] == 20
+    assert final["lines"][-1] == "生成完成"
+    
+    batch_gen_tab.progress_text.document().setMaximumBlockCount(10)
+    for snapshot in snapshots:
+        batch_gen_tab.on_progress_updated(snapshot)
+    assert batch_gen_tab.progress_text.document().blockCount() <= 10
+    assert "提示词 20/20" in batch_gen_tab.summary_label.text()
+
+def test_prompts_run_concurrently(tmp_path):
+    """测试按并发控制器的上限同时处理多个提示词"""
+    import threading
+    import time
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.concurrency import AIMDController
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+    
+    def generate_image(**kwargs):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return {"data": [{"url": "http://example.com/1.png"}]}
+    
+    api = MagicMock()
+    api.generate_image.side_effect = generate_image
+    api.fetch_image.return_value = b"image bytes"
+    controller = AIMDController(initial=3, min_limit=1, max_limit=3)
+    prompts = [f"prompt {i}" for i in range(9)]
+    thread = BatchGenerationThread(api, prompts, params, str(tmp_path), "{prompt}_{index}",
+                                   concurrency=controller)
+    thread.run()
+    
+    assert len(thread.saved_files) == 9
+    assert len(set(thread.saved_files)) == 9
+    assert state["peak"] == 3
+    assert controller.stats()["successes"] == 9
+
+def test_stop_cancels_in_flight_request(tmp_path):
+    """测试停止生成后进行中的请求立即结束，线程及时退出"""
+    import threading
+    import time
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.cancellation import run_cancellable
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    stalled = threading.Event()
+    
+    def generate_image(cancel=None, **kwargs):
+        return run_cancellable(lambda: stalled.wait(10), cancel)
+    
+    api = MagicMock()
+    api.generate_image.side_effect = generate_image
+    thread = BatchGenerationThread(api, ["a", "b", "c"], params, str(tmp_path), "{prompt}_{index}")
+    worker = threading.Thread(target=thread.run)
+    worker.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    thread.stop()
+    worker.join(2)
+    stalled.set()
+    
+    assert not worker.is_alive()
+    assert time.monotonic() - start < 1
+    assert api.generate_image.call_count == 1
+    assert thread.tracker.errors == 0
+    assert thread.concurrency.in_flight == 0
+
+def test_task_status_signals(tmp_path):
+    """测试每个提示词开始和结束时发送任务状态"""
+    from src.ui.batch_gen import BatchGenerationThread
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    api = MagicMock()
+    api.generate_image.side_effect = [{"data": [{"url": "http://example.com/1.png"}]}, Exception("API错误")]
+    api.fetch_image.return_value = b"image bytes"
+    thread = BatchGenerationThread(api, ["ok", "bad"], params, str(tmp_path), "{prompt}_{index}")
+    statuses = []
+    thread.task_status.connect(lambda row, status, path: statuses.append((row, status, bool(path))))
+    thread.run()
+    
+    assert statuses == [(0, "处理中", False), (0, "完成", True), (1, "处理中", False), (1, "失败", False)]
+
+def test_sweep_generation(tmp_path):
+    """测试参数扫描按打包的请求生成并输出对比图"""
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.sweep import ParameterSweep
+    from PyQt6.QtCore import QBuffer, QIODevice
+    from PyQt6.QtGui import QImage, QColor
+    
+    image = QImage(8, 8, QImage.Format.Format_RGB32)
+    image.fill(QColor("green"))
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    
+    base = {"prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+            "steps": 20, "guidance": 7.5, "seed": -1}
+    sweep = ParameterSweep(base, {"guidance": [5.0, 7.5], "seed": [1, 2, 3]})
+    api = MagicMock()
+    api.generate_image.side_effect = lambda **kwargs: {"data": [{"url": f"{s}"} for s in kwargs["seeds"]]}
+    api.fetch_image.side_effect = lambda info: bytes(buffer.data()) + info["url"].encode()
+    thread = BatchGenerationThread(api, [], base, str(tmp_path), "{model}_{seed}", sweep=sweep)
+    statuses = []
+    thread.task_status.connect(lambda row, status, path: statuses.append((row, status)))
+    thread.run()
+    
+    calls = api.generate_image.call_args_list
+    assert len(calls) == 2
+    assert calls[1].kwargs["guidance_scale"] == 7.5 and calls[1].kwargs["seeds"] == [1, 2, 3]
+    assert calls[1].kwargs["batch_size"] == 3
+    assert sorted(thread.sweep_images) == list(range(6))
+    assert sorted(row for row, status in statuses if status == "完成") == list(range(6))
+    assert len(thread.contact_sheets) == 1 and os.path.exists(thread.contact_sheets[0])
+    assert thread.tracker.prompts_done == 2
+
+def test_save_image_uses_output_layout(tmp_path):
+    """测试按输出目录布局保存到模型子目录"""
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.output_layout import OutputLayout
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "org/model-x", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 3, "seed": 12345
+    }
+    api = MagicMock()
+    api.fetch_image.side_effect = [b"1", b"2", b"3"]
+    layout = OutputLayout(str(tmp_path), "model", shard_size=2)
+    thread = BatchGenerationThread(api, ["test"], params, str(tmp_path), "{prompt}_{index}", layout=layout)
+    
+    paths = [thread.save_image({"url": f"{j}"}, [1, 2, 3], j, "test", params) for j in range(3)]
+    
+    assert [os.path.relpath(os.path.dirname(p), tmp_path) for p in paths] == ["model-x", "model-x", "model-x_002"]
+
+def test_waits_while_circuit_open(tmp_path):
+    """测试熔断期间等待服务恢复后继续，不把提示词判为失败，也不弹出错误"""
+    import time
+    from src.ui.batch_gen import BatchGenerationThread
+    from src.utils.api_client import CircuitOpenError
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    api = MagicMock()
+    api.generate_image.side_effect = [
+        CircuitOpenError("熔断", retry_after=0.5),
+        {"data": [{"url": "http://example.com/1.png"}]},
+        Exception("API错误"),
+    ]
+    api.fetch_image.return_value = b"image bytes"
+    thread = BatchGenerationThread(api, ["a", "b"], params, str(tmp_path), "{prompt}_{index}")
+    errors = []
+    thread.error.connect(errors.append)
+    start = time.monotonic()
+    thread.run()
+    
+    assert time.monotonic() - start >= 0.9  # 至少等待1秒
+    assert len(thread.saved_files) == 1
+    assert thread.tracker.errors == 1  # 第二个提示词的错误只写入日志
+    assert errors == []
+
+def test_stats_are_per_run(tmp_path, batch_gen_tab, monkeypatch):
+    """测试每次运行的耗时统计单独计算，并可导出"""
+    import json
+    from src.ui.batch_gen import BatchGenerationThread
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    api = MagicMock()
+    api.generate_image.return_value = {"data": [{"url": "http://example.com/1.png"}]}
+    api.fetch_image.return_value = b"image bytes"
+    counts = []
+    for prompts in (["a"], ["b", "c"]):
+        thread = BatchGenerationThread(api, prompts, params, str(tmp_path), "{prompt}_{index}")
+        thread.run()
+        counts.append(thread.run_telemetry.snapshot()["disk_write"]["count"])
+        assert thread.run_telemetry.snapshot()["queue_wait"]["count"] == len(prompts)
+    assert counts == [1, 2]
+    
+    batch_gen_tab.gen_thread = thread
+    batch_gen_tab.on_generation_finished(thread.saved_files)
+    assert batch_gen_tab.export_stats_btn.isEnabled()
+    export_path = tmp_path / "stats.json"
+    monkeypatch.setattr(QFileDialog, "getSaveFileName", lambda *args, **kwargs: (str(export_path), ""))
+    batch_gen_tab.export_stats()
+    assert json.loads(export_path.read_text(encoding="utf-8"))["stages"]["disk_write"]["count"] == 2
+
+def test_history_writes_count_toward_run(tmp_path, batch_gen_tab, mock_history):
+    """测试线程结束后才处理的图片保存信号，写入历史记录的耗时仍计入本次运行"""
+    from src.ui.batch_gen import BatchGenerationThread
+    
+    params = {
+        "prompt": "test", "negative_prompt": "", "model": "test/model", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "batch_size": 1, "seed": 12345
+    }
+    api = MagicMock()
+    api.generate_image.return_value = {"data": [{"url": "http://example.com/1.png"}]}
+    api.fetch_image.return_value = b"image bytes"
+    thread = BatchGenerationThread(api, ["a", "b"], params, str(tmp_path), "{prompt}_{index}")
+    thread.detach_telemetry_on_exit = False
+    records = []
+    thread.image_saved.connect(records.append)
+    thread.run()
+    
+    for record in records:  # 界面线程稍后处理已发出的信号
+        batch_gen_tab.on_image_saved(record)
+    batch_gen_tab.gen_thread = thread
+    batch_gen_tab.on_generation_finished(thread.saved_files)
+    assert thread.run_telemetry.snapshot()["history_write"]["count"] == 2
+    
+    batch_gen_tab.on_image_saved(records[0])  # 本次运行结束后的记录不再计入
+    assert thread.run_telemetry.snapshot()["history_write"]["count"] == 2
+
+def test_failed_start_releases_job(batch_gen_tab, mock_api, mock_config, tmp_path, monkeypatch):
+    """测试启动生成失败时注销调度器作业，按钮恢复为未生成时的状态"""
+    import src.ui.batch_gen as batch_gen
+    
+    values = {"paths": {"output_dir": str(tmp_path)}}
+    mock_config.get.side_effect = lambda key, default=None: values.get(key, default)
+    job_api = MagicMock()
+    mock_api.job_api.return_value = job_api
+    monkeypatch.setattr(batch_gen, "BatchGenerationThread", MagicMock(side_effect=RuntimeError("boom")))
+    batch_gen_tab.sweep_btn.setEnabled(False)
+    
+    batch_gen_tab.start_sweep(MagicMock())
+    
+    job_api.close.assert_called_once()
+    assert batch_gen_tab._job_api is None
+    assert not batch_gen_tab.start_btn.isEnabled()  # 参数扫描没有导入任务
+    assert not batch_gen_tab.cancel_btn.isEnabled()
+    assert batch_gen_tab.sweep_btn.isEnabled() and batch_gen_tab.import_btn.isEnabled()
+    QMessageBox.warning.assert_called_once()
@@ -0,0 +1,65 @@
+import pytest
+import requests
+from src.utils.api_client import SiliconFlowAPI, APIError
+from tests.benchmark.mock_server import MockSiliconFlowServer
+from tests.benchmark.bench_generation import run_benchmarks, compare_results
+
+@pytest.fixture
+def server():
+    with MockSiliconFlowServer(latency=0, payload_size=4096) as server:
+        yield server
+
+def test_mock_server_generation(server):
+    """测试模拟服务器返回的生成结果和图片"""
+    api = SiliconFlowAPI("test_key", base_url=server.base_url)
+    api.session.trust_env = False
+    result = api.generate_image(prompt="test", model="mock/model", batch_size=2, seeds=[1, 2])
+
+    assert [img["seed"] for img in result["data"]] == [1, 2]
+    response = api.session.get(result["data"][0]["url"])
+    assert response.status_code == 200
+    assert response.content == server.payload
+    assert server.stats["generations"] == 1
+
+def test_mock_server_error_injection():
+    """测试模拟服务器错误注入"""
+    with MockSiliconFlowServer(latency=0, error_rates={503: 1.0}, payload_size=4096) as server:
+        api = SiliconFlowAPI("test_key", base_url=server.base_url)
+        api.session.trust_env = False
+        with pytest.raises(APIError) as exc_info:
+            api.generate_image(prompt="test", model="mock/model", max_retries=1)
+        assert exc_info.value.code == 503
+        assert server.stats["errors"] == {503: 1}
+
+def test_run_benchmarks_and_compare():
+    """测试基准测试结果和回退比较"""
+    report = run_benchmarks(images=2, latency=0, payload_size=4096, only=["api_client", "batch_thread"])
+
+    for name in ("api_client", "batch_thread"):
+        result = report["results"][name]
+        assert result["images"] == 2
+        assert result["images_per_minute"] > 0
+        assert result["latency_p99"] >= result["latency_p50"]
+
+    # 写入吞吐量按线程内保存步骤的耗时计算，而不是整个运行时间
+    batch = report["results"]["batch_thread"]
+    assert batch["write_mb_per_s"] > 2 * 4096 / 1024 / 1024 / batch["duration"]
+
+    assert compare_results(report, report) == []
+
+    slower = {"results": {"api_client": dict(report["results"]["api_client"])}}
+    slower["results"]["api_client"]["images_per_minute"] *= 2
+    regressions = compare_results(report, slower)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("api_client.images_per_minute")
+
+def test_startup_benchmark(monkeypatch, tmp_path):
+    """测试启动基准测试结果"""
+    from tests.benchmark.bench_startup import run_startup_benchmark, STARTUP_METRICS
+
+    monkeypatch.chdir(tmp_path)
+    report = run_startup_benchmark(iterations=3)
+    result = report["results"]["config_startup"]
+    assert result["iterations"] == 3
+    assert all(result[metric] > 0 for metric in STARTUP_METRICS)
+    assert compare_results(report, report, metrics=STARTUP_METRICS) == []
@@ -0,0 +1,81 @@
+import time
+from threading import Event, Thread
+
+import pytest
+
+from src.utils.cancellation import CancelToken, Deadline, OperationCancelled, run_cancellable, sleep
+
+def test_cancel_interrupts_sleep():
+    """测试取消后等待立即结束"""
+    token = CancelToken()
+    Thread(target=lambda: (time.sleep(0.05), token.cancel())).start()
+    start = time.monotonic()
+    with pytest.raises(OperationCancelled):
+        sleep(5, token)
+    assert time.monotonic() - start < 1
+    assert token.cancelled
+
+def test_run_cancellable():
+    """测试阻塞调用被取消时调用方立即返回"""
+    token = CancelToken()
+    assert run_cancellable(lambda: 42, token) == 42
+    with pytest.raises(ValueError):
+        run_cancellable(lambda: int("x"), token)
+
+    blocker = Event()
+    Thread(target=lambda: (time.sleep(0.05), token.cancel())).start()
+    start = time.monotonic()
+    with pytest.raises(OperationCancelled):
+        run_cancellable(lambda: blocker.wait(5), token)
+    assert time.monotonic() - start < 1
+    blocker.set()
+
+    callbacks = []
+    token.add_callback(lambda: callbacks.append(1))  # 已取消时立即执行
+    assert callbacks == [1]
+
+def test_deadline_limits_timeouts():
+    """测试按剩余时间缩短连接和读取超时"""
+    assert Deadline().timeout(10, 300) == (10, 300)
+    assert Deadline().remaining() is None
+
+    deadline = Deadline(5)
+    connect, read = deadline.timeout(10, 300)
+    assert connect <= 5 and read <= 5
+    assert not deadline.expired
+    assert Deadline(0).expired
+
+def test_cancel_aborts_request_and_worker_exits():
+    """测试取消后连接被关闭，执行请求的线程随之结束"""
+    import socket
+    import threading
+    import requests
+    from src.utils.abortable_http import run_request
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    accepted = []
+    Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()  # 接受连接但不响应
+
+    workers = []
+    def post(session):
+        workers.append(threading.current_thread())
+        return session.post(f"http://127.0.0.1:{server.getsockname()[1]}/", timeout=(5, 300))
+
+    token = CancelToken()
+    Thread(target=lambda: (time.sleep(0.2), token.cancel())).start()
+    start = time.monotonic()
+    with pytest.raises(OperationCancelled):
+        run_request(post, requests.Session(), token)
+    assert time.monotonic() - start < 2
+    assert workers and not workers[0].is_alive()
+    server.close()
+
+def test_deadline_aborts_blocking_call():
+    """测试超过时限时中止阻塞调用"""
+    blocker = Event()
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        run_cancellable(lambda: blocker.wait(5), deadline=Deadline(0.1), abort=blocker.set)
+    assert time.monotonic() - start < 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.utils.compositor import (
+    CompositionCancelled, PNGStripWriter, Tile, compose_contact_sheet, record_tiles
+)
+
+def _save(path, color, size=(64, 32)):
+    Image.new("RGB", size, color).save(path)
+    return str(path)
+
+def test_png_strip_writer(tmp_path):
+    """测试分块写入的PNG与原始像素一致，行数不足时不保留文件"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(37, 23, 3), dtype=np.uint8)
+    path = tmp_path / "strips.png"
+    with PNGStripWriter(str(path), 23, 37) as writer:
+        for start in range(0, 37, 10):
+            writer.write(pixels[start:start + 10])
+    
+    with Image.open(path) as img:
+        assert np.array_equal(np.asarray(img), pixels)
+    assert not list(tmp_path.glob("*.tmp"))
+    
+    with pytest.raises(ValueError):
+        with PNGStripWriter(str(tmp_path / "short.png"), 23, 37) as writer:
+            writer.write(pixels[:10])
+    assert not (tmp_path / "short.png").exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_compose_contact_sheet(tmp_path):
+    """测试按行排列缩略图，最后一行不足时留空"""
+    tiles = [Tile(_save(tmp_path / f"{i}.png", color), f"种子 {i}")
+             for i, color in enumerate(["red", "green", "blue", "red", "green"])]
+    tiles.append(Tile(str(tmp_path / "missing.png"), "缺失"))
+    output = tmp_path / "sheet.png"
+    progress = []
+    
+    count = compose_contact_sheet(tiles, str(output), columns=4, cell_size=32, label_height=10,
+                                  strip_rows=1, max_workers=2,
+                                  progress=lambda done, total: progress.append(done))
+    
+    assert count == 6
+    assert progress == [4, 6]
+    with Image.open(output) as img:
+        sheet = np.asarray(img)
+    assert sheet.shape == (2 * 42, 4 * 32, 3)
+    # 64x32 的图片缩小为 32x16，在格子中上下居中
+    assert tuple(sheet[16, 16]) == (255, 0, 0)
+    assert tuple(sheet[16, 2 * 32 + 16]) == (0, 0, 255)
+    assert tuple(sheet[2, 16]) == (255, 255, 255)
+    assert tuple(sheet[42 + 16, 3 * 32 + 16]) == (255, 255, 255)  # 空白格
+
+def test_cancel_and_record_tiles(tmp_path):
+    """测试取消时不保留文件；历史记录中的每张图片各占一格"""
+    records = [
+        {"params": {"prompt": "a  cat", "seed": 1}, "image_paths": ["1.png", "2.png"]},
+        {"params": {"prompt": "dog"}, "image_path": "3.png"},
+    ]
+    tiles = record_tiles(records)
+    assert [(t.path, t.label) for t in tiles] == [
+        ("1.png", "种子 1  a cat"), ("2.png", "种子 1  a cat"), ("3.png", "dog")
+    ]
+    
+    output = tmp_path / "cancelled.png"
+    with pytest.raises(CompositionCancelled):
+        compose_contact_sheet(tiles, str(output), is_cancelled=lambda: True)
+    assert not output.exists()
+    assert not list(tmp_path.glob("*.tmp"))
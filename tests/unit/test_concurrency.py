@@ -0,0 +1,82 @@
+import time
+from threading import Thread
+
+import requests
+
+from src.utils.api_client import APIError
+from src.utils.concurrency import AIMDController, create_controller, error_status, is_overload
+
+def test_is_overload():
+    """测试过载状态码判断"""
+    assert is_overload(429) and is_overload(503) and is_overload(408)
+    assert not is_overload(200) and not is_overload(400) and not is_overload(401)
+    assert not is_overload(None)
+
+def test_error_status_counts_only_timeouts_and_connection_errors():
+    """测试只有超时、连接失败和过载状态码使上限减小，其他异常只计为错误"""
+    assert error_status(requests.exceptions.ReadTimeout()) == 408
+    assert error_status(requests.exceptions.ConnectionError()) == 503
+    assert error_status(APIError("限流", code=429)) == 429
+    assert error_status(APIError("图片数据解码失败")) is None
+    assert error_status(KeyError("data")) is None
+
+    controller = AIMDController(initial=4, max_limit=8)
+    ticket = controller.acquire()
+    controller.release(ticket, status=error_status(ValueError("bad json")))
+    assert (controller.limit, controller.failures, controller.overloads) == (4, 1, 0)
+    ticket = controller.acquire()
+    controller.release(ticket, status=error_status(requests.exceptions.Timeout()))
+    assert (controller.limit, controller.overloads) == (2, 1)
+
+def test_adaptive_concurrency_is_opt_in():
+    """测试未开启自适应并发时并发固定为1"""
+    assert create_controller({}).max_limit == 1
+    controller = create_controller({"concurrency.enabled": True, "concurrency.max": 4})
+    assert (controller.limit, controller.max_limit) == (2, 4)
+
+def test_additive_increase_and_multiplicative_decrease():
+    """测试成功时逐步增加上限，过载时减半且同一波拥塞只减一次"""
+    controller = AIMDController(initial=2, min_limit=1, max_limit=6)
+    for _ in range(20):
+        ticket = controller.acquire()
+        controller.release(ticket, latency=1.0)
+    assert controller.limit == 6
+
+    tickets = [controller.acquire() for _ in range(6)]
+    for ticket in tickets:
+        controller.release(ticket, latency=1.0, status=503)
+    assert controller.limit == 3
+    assert controller.stats()["overloads"] == 6
+
+    ticket = controller.acquire()
+    controller.release(ticket, status=429)
+    assert controller.limit == 1  # 1.5 取整
+
+    ticket = controller.acquire()
+    controller.release(ticket, status=400)  # 与负载无关的错误不调整
+    assert controller.limit == 1
+    assert [reason for _, _, reason in controller.history][:2] == ["初始", "增加"]
+    assert controller.summary_lines()[0] == "当前并发上限: 1 (最高 6)"
+
+def test_latency_increase_backs_off():
+    """测试延迟明显高于基线时减小上限"""
+    controller = AIMDController(initial=4, max_limit=4, latency_tolerance=2.0)
+    for latency in (1.0, 1.0, 10.0, 10.0):
+        ticket = controller.acquire()
+        controller.release(ticket, latency=latency)
+    assert controller.limit == 2
+
+def test_acquire_respects_limit():
+    """测试同时进行的请求数不超过上限"""
+    controller = AIMDController(initial=2, max_limit=2)
+    first, second = controller.acquire(), controller.acquire()
+    assert controller.acquire(timeout=0.05) is None
+
+    acquired = []
+    waiter = Thread(target=lambda: acquired.append(controller.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    controller.release(first, latency=0.1)
+    waiter.join()
+    assert acquired and acquired[0] is not None
+    assert controller.in_flight == 2
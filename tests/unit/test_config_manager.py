@@ -24,4 +24,176 @@ def test_config_get_set():
 def test_config_file_creation():
     config = ConfigManager()
     config_file = Path.home() / '.image_generator' / 'config.json'
-    assert config_file.exists() 
\ No newline at end of file
+    assert config_file.exists() 
+
+def test_batch_writes_once(tmp_path, monkeypatch):
+    """测试批量修改结束时只写入一次，出错时撤销修改"""
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager()
+    writes = []
+    original_save = config.save_config
+    monkeypatch.setattr(config, "save_config", lambda *args: writes.append(1) or original_save(*args))
+    
+    with config.batch():
+        config.set("api_key", "batch_key")
+        config.set("paths.output_dir", "/batch/output")
+        config.set("defaults.steps", 30)
+    assert len(writes) == 1
+    
+    with pytest.raises(ValueError):
+        with config.batch():
+            config.set("api_key", "rolled_back")
+            raise ValueError("中途出错")
+    assert config.get("api_key") == "batch_key"
+    assert len(writes) == 1
+    assert ConfigManager().get("defaults.steps") == 30
+
+
+def test_batch_is_per_thread(tmp_path, monkeypatch):
+    """测试批量修改只推迟本线程的修改，撤销时不影响其他线程的修改"""
+    import threading
+    
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0)
+    with pytest.raises(ValueError):
+        with config.batch():
+            config.set("api_key", "rolled_back")
+            config.set("new.nested.key", 1)
+            worker = threading.Thread(target=config.set, args=("defaults.steps", 35))
+            worker.start()
+            worker.join()
+            assert ConfigManager().get("defaults.steps") == 35  # 其他线程的修改立即写入
+            raise ValueError("中途出错")
+    assert config.get("api_key") == ""
+    assert "new" not in config.config
+    assert config.get("defaults.steps") == 35
+
+
+def test_batch_reports_save_failure(tmp_path, monkeypatch):
+    """测试批量修改写入失败时抛出异常，修改保留并在 flush 时重试"""
+    from src.utils.config_manager import ConfigSaveError
+    
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0.2)
+    original_save = config.save_config
+    monkeypatch.setattr(config, "save_config", lambda *args: False)
+    with pytest.raises(ConfigSaveError):
+        with config.batch():
+            config.set("api_key", "unsaved")
+    assert config.get("api_key") == "unsaved"
+    
+    monkeypatch.setattr(config, "save_config", original_save)
+    assert config.flush()
+    assert ConfigManager().get("api_key") == "unsaved"
+
+
+def test_debounced_save(tmp_path, monkeypatch):
+    """测试连续修改延迟合并为一次写入，flush 时立即写入"""
+    import json
+    import time
+    
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0.2)
+    for i in range(20):
+        config.set("history.max_items", i)
+    
+    saved = json.loads(config.config_file.read_text(encoding="utf-8"))
+    assert saved["history"]["max_items"] == 100  # 尚未写入
+    time.sleep(0.4)
+    saved = json.loads(config.config_file.read_text(encoding="utf-8"))
+    assert saved["history"]["max_items"] == 19
+    
+    config.set("history.max_items", 50)
+    assert config.flush()
+    saved = json.loads(config.config_file.read_text(encoding="utf-8"))
+    assert saved["history"]["max_items"] == 50
+
+
+def test_get_cache_invalidation(tmp_path, monkeypatch):
+    """测试读取缓存在修改上级或下级键后失效"""
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0)
+    
+    assert config.get("defaults.steps") == 20
+    defaults = config.get("defaults")
+    config.set("defaults.steps", 30)
+    assert config.get("defaults.steps") == 30
+    assert config.get("defaults")["steps"] == 30
+    
+    config.set("defaults", dict(defaults, steps=40))
+    assert config.get("defaults.steps") == 40
+    assert config.get("defaults.missing", "x") == "x"
+    
+    config.config = {"defaults": {"steps": 50}}
+    assert config.get("defaults.steps") == 50
+
+
+def test_subscribe(tmp_path, monkeypatch):
+    """测试只通知受修改影响的订阅者，批量修改结束时统一通知"""
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0)
+    events = []
+    config.subscribe("defaults.steps", lambda key, value: events.append((key, value)))
+    unsubscribe = config.subscribe("paths", lambda key, value: events.append((key, "paths")))
+    
+    config.set("defaults.steps", 25)
+    config.set("defaults.size", "512x512")  # 同级的其他键不通知
+    config.set("defaults", {"steps": 30})  # 上级键修改时通知
+    assert events == [("defaults.steps", 25), ("defaults.steps", 30)]
+    
+    events.clear()
+    with config.batch():
+        config.set("paths.output_dir", "/a")
+        config.set("paths.presets_dir", "/b")
+        assert events == []
+    assert events == [("paths", "paths")]
+    
+    events.clear()
+    unsubscribe()
+    config.set("paths.output_dir", "/c")
+    assert events == []
+
+
+def test_migrate_and_schema_merge(tmp_path, monkeypatch):
+    """测试旧版本配置升级，类型错误的配置项使用默认值，默认配置不被修改"""
+    import json
+    from src.utils.config_manager import CONFIG_VERSION
+    
+    monkeypatch.chdir(tmp_path)
+    config_file = tmp_path / "config" / "config.json"
+    config_file.parent.mkdir()
+    config_file.write_text(json.dumps({
+        "naming_rule": "{prompt}_{seed}",
+        "defaults": {"steps": "很多", "guidance": 5},
+        "history": "无效",
+        "custom": {"key": 1}
+    }), encoding="utf-8")
+    
+    config = ConfigManager(save_delay=0)
+    assert config.get("config_version") == CONFIG_VERSION
+    assert config.get("naming_rule.preset") == "{prompt}_{seed}"
+    assert config.get("naming_rule.presets")[0] == "{date}_{prompt}_{index}_{seed}"
+    assert config.get("defaults.steps") == 20
+    assert config.get("defaults.guidance") == 5
+    assert config.get("history.max_items") == 100
+    assert config.get("custom.key") == 1
+    # 升级后的配置已写回文件
+    assert json.loads(config_file.read_text(encoding="utf-8"))["config_version"] == CONFIG_VERSION
+    
+    config.set("defaults.steps", 40)
+    assert config.defaults["defaults"]["steps"] == 20
+
+
+def test_ensure_writable(tmp_path, monkeypatch):
+    """测试首次写入前检查目录可写，结果被缓存"""
+    monkeypatch.chdir(tmp_path)
+    config = ConfigManager(save_delay=0)
+    target = tmp_path / "new" / "output"
+    
+    assert config.ensure_writable(target)
+    assert target.is_dir()
+    assert list(target.iterdir()) == []  # 探测文件已删除
+    
+    import tempfile
+    monkeypatch.setattr(tempfile, "TemporaryFile", None)  # 已缓存的目录不再探测
+    assert config.ensure_writable(target)
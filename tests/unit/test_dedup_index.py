@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+from PIL import Image
+from src.utils.dedup_index import (
+    DedupIndex, compute_content_hash, compute_phash, compute_phashes,
+    hamming_distances, cluster_hashes, find_similar_groups, get_dedup_index
+)
+
+def _save_image(path, array):
+    Image.fromarray(array.astype(np.uint8)).save(path)
+    return str(path)
+
+@pytest.fixture
+def gradient():
+    """创建水平渐变图片数据"""
+    row = np.linspace(0, 255, 64)
+    return np.tile(row, (64, 1))[:, :, np.newaxis].repeat(3, axis=2)
+
+@pytest.fixture
+def index(tmp_path):
+    return DedupIndex(tmp_path / "dedup_index.json")
+
+def test_hamming_distances():
+    """测试汉明距离计算"""
+    hashes = np.array([0b0000, 0b0001, 0b1111, 2**64 - 1], dtype=np.uint64)
+    assert hamming_distances(0, hashes).tolist() == [0, 1, 4, 64]
+
+def test_similar_images_have_close_phash(tmp_path, gradient):
+    """测试相似图片的感知哈希距离很小"""
+    path_a = _save_image(tmp_path / "a.png", gradient)
+    path_b = _save_image(tmp_path / "b.png", np.clip(gradient + 3, 0, 255))
+    path_c = _save_image(tmp_path / "c.png", gradient[:, ::-1])
+
+    hashes = compute_phashes([path_a, path_b, path_c])
+    assert hashes[path_a] == compute_phash(path_a)
+    distances = hamming_distances(hashes[path_a], np.array([hashes[path_b], hashes[path_c]], dtype=np.uint64))
+    assert distances[0] <= 2
+    assert distances[1] > 32
+
+def test_cluster_hashes():
+    """测试相似图片聚类"""
+    groups = cluster_hashes({"a": 0b0, "b": 0b1, "c": 0b11, "d": 2**64 - 1}, threshold=1)
+    assert groups == [["a", "b", "c"]]
+
+def test_lookup_and_persist(index, tmp_path, gradient):
+    """测试索引查找与持久化"""
+    path = _save_image(tmp_path / "a.png", gradient)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    content_hash = index.register(path, data)
+    assert content_hash == compute_content_hash(data)
+    assert index.lookup(content_hash) == path
+    assert index.save()
+
+    reloaded = DedupIndex(index.index_file)
+    assert reloaded.lookup(content_hash) == path
+    assert path in reloaded.path_hashes()
+
+def test_lookup_removed_file(index, tmp_path, gradient):
+    """测试已删除文件的索引项会失效"""
+    path = tmp_path / "a.png"
+    _save_image(path, gradient)
+    content_hash = index.register(str(path), path.read_bytes())
+    path.unlink()
+    assert index.lookup(content_hash) is None
+    assert len(index) == 0
+
+def test_find_similar_groups(index, tmp_path, gradient):
+    """测试查找相似图片分组"""
+    path_a = _save_image(tmp_path / "a.png", gradient)
+    path_b = _save_image(tmp_path / "b.png", np.clip(gradient + 3, 0, 255))
+    path_c = _save_image(tmp_path / "c.png", gradient[:, ::-1])
+    index.register(path_a, open(path_a, "rb").read())
+
+    groups = find_similar_groups([path_a, path_b, path_c, "missing.png"], threshold=4, index=index)
+    assert groups == [[path_a, path_b]]
+
+def test_get_dedup_index_is_shared(tmp_path):
+    """测试同一索引文件共用一个实例，未配置时位于历史记录目录"""
+    config = {"paths.history_file": str(tmp_path / "history" / "history.json")}
+    index = get_dedup_index(config)
+    assert index is get_dedup_index(config)
+    assert index.index_file == tmp_path / "history" / "dedup_index.json"
+    other = get_dedup_index({"dedup.index_file": str(tmp_path / "other.json")})
+    assert other is not index
@@ -115,4 +115,15 @@ def test_create_template(tmp_path):
     assert "尺寸" in df.columns
     assert df.iloc[0]["提示词"] == "示例提示词1"
     assert df.iloc[0]["模型"] == "模型A"
-    assert df.iloc[0]["尺寸"] == "1024x1024" 
\ No newline at end of file
+    assert df.iloc[0]["尺寸"] == "1024x1024" 
+def test_export_and_read_csv(tmp_path):
+    """测试以CSV格式导出任务结果并读回"""
+    tasks = [
+        GenerationTask(prompt="测试1", model="模型A", size="512x512", status="完成", result_path="a.png"),
+        GenerationTask(prompt="测试2", model="模型B", size="1024x1024")
+    ]
+    file_path = tmp_path / "results.csv"
+    ExcelHandler.export_results(tasks, str(file_path))
+    
+    loaded = ExcelHandler.read_tasks(str(file_path))
+    assert [(t.prompt, t.model, t.size) for t in loaded] == [(t.prompt, t.model, t.size) for t in tasks]
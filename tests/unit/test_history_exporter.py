@@ -0,0 +1,72 @@
+import os
+import pytest
+from PIL import Image
+from openpyxl import load_workbook
+from src.utils.history_exporter import (
+    export_records_to_excel, make_thumbnail, record_row, ExportCancelled, EXPORT_HEADERS
+)
+
+@pytest.fixture
+def records(tmp_path):
+    """创建带图片的历史记录"""
+    records = []
+    for i in range(5):
+        img_path = tmp_path / f"image_{i}.png"
+        Image.new("RGB", (512, 256), (i * 40, 0, 0)).save(img_path)
+        records.append({
+            "timestamp": "2024-01-15 12:00:00",
+            "params": {"prompt": f"prompt {i}", "model": "test/model", "seed": i},
+            "image_paths": [str(img_path)]
+        })
+    records.append({"params": {"prompt": "missing"}, "image_path": str(tmp_path / "missing.png")})
+    return records
+
+def test_make_thumbnail(records, tmp_path):
+    """测试缩略图按比例缩小，图片不存在时返回None"""
+    data, width, height = make_thumbnail(records[0]["image_paths"][0], (120, 100))
+    assert (width, height) == (120, 60)
+    assert data.startswith(b"\x89PNG")
+    assert make_thumbnail(str(tmp_path / "missing.png")) is None
+
+def test_export_records(records, tmp_path):
+    """测试流式导出记录和缩略图"""
+    file_path = tmp_path / "export.xlsx"
+    progress = []
+    count = export_records_to_excel(records, str(file_path), chunk_size=2,
+                                    progress=lambda done, total: progress.append((done, total)))
+
+    assert count == 6
+    assert progress[-1] == (6, 6)
+    ws = load_workbook(file_path).active
+    assert [cell.value for cell in ws[1]] == EXPORT_HEADERS
+    assert ws.max_row == 7
+    assert ws["C2"].value == "prompt 0"
+    assert ws["B7"].value == "missing"
+    assert len(ws._images) == 5
+    assert record_row(records[0])[1] == "image_0"
+
+def test_export_cancelled(records, tmp_path):
+    """测试取消导出时不生成文件"""
+    file_path = tmp_path / "export.xlsx"
+    with pytest.raises(ExportCancelled):
+        export_records_to_excel(records, str(file_path), chunk_size=2, is_cancelled=lambda: True)
+    assert not os.path.exists(file_path)
+
+def test_export_cancelled_removes_temp_files(records, tmp_path, monkeypatch):
+    """测试中途取消导出时删除只写模式的临时文件，导出路径上已有的文件不受影响"""
+    import tempfile
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temp_dir))
+    file_path = tmp_path / "export.xlsx"
+    file_path.write_bytes(b"old export")
+    chunks = []
+
+    def cancel_after_first_chunk():
+        chunks.append(1)
+        return len(chunks) > 1
+
+    with pytest.raises(ExportCancelled):
+        export_records_to_excel(records, str(file_path), chunk_size=2, is_cancelled=cancel_after_first_chunk)
+    assert os.listdir(temp_dir) == []
+    assert file_path.read_bytes() == b"old export"
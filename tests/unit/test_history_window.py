@@ -2,7 +2,7 @@ import pytest
 import os
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtCore import Qt
-from src.ui.history_window import HistoryWindow
+from src.ui.history_window import HistoryWindow, TrashDialog
 from src.utils.history_manager import HistoryManager
 from unittest.mock import MagicMock, patch
 
@@ -32,6 +32,9 @@ def mock_history():
     history_mock.get_records.return_value = history_mock.records
     history_mock.delete_record = MagicMock()
     history_mock.save_records = MagicMock()
+    # 删除和恢复按真实逻辑修改 records
+    history_mock.remove_records.side_effect = lambda records: HistoryManager.remove_records(history_mock, records)
+    history_mock.restore_records.side_effect = lambda removed: HistoryManager.restore_records(history_mock, removed)
     return history_mock
 
 @pytest.fixture
@@ -47,11 +50,11 @@ def test_image(tmp_path):
     return str(img_path)
 
 @pytest.fixture
-def history_window(qtbot, mock_history, test_image):
+def history_window(qtbot, mock_history, test_image, tmp_path):
     """创建历史窗口实例"""
     # 更新mock数据使用测试图片
     mock_history.get_records.return_value[0]["image_paths"] = [test_image]
-    window = HistoryWindow(mock_history)
+    window = HistoryWindow(mock_history, trash_dir=tmp_path / "trash")
     qtbot.addWidget(window)
     return window
 
@@ -172,4 +175,109 @@ def test_delete_selected_multiple_files(history_window, mock_history, test_image
     
     # 验证记录被删除
     assert len(mock_history.records) == 0
-    assert mock_history.save_records.called 
\ No newline at end of file
+    assert mock_history.save_records.called 
+def test_export_to_excel_in_background(history_window, qtbot, tmp_path, monkeypatch):
+    """测试在后台线程中导出Excel"""
+    from PyQt6.QtWidgets import QFileDialog
+    file_path = tmp_path / "export.xlsx"
+    monkeypatch.setattr(QFileDialog, "getSaveFileName", lambda *args, **kwargs: (str(file_path), ""))
+    information = MagicMock()
+    monkeypatch.setattr(QMessageBox, "information", information)
+    history_window.select_all_records()
+    
+    history_window.export_to_excel()
+    qtbot.waitUntil(lambda: information.called, timeout=10000)
+    
+    assert "已导出 1 条记录" in information.call_args[0][2]
+    assert file_path.exists()
+    assert history_window.export_dialog is None
+
+def test_contact_sheet_in_background(history_window, qtbot, tmp_path, monkeypatch):
+    """测试在后台线程中生成对比图"""
+    from PyQt6.QtWidgets import QFileDialog
+    file_path = tmp_path / "sheet"
+    monkeypatch.setattr(QFileDialog, "getSaveFileName", lambda *args, **kwargs: (str(file_path), ""))
+    information = MagicMock()
+    monkeypatch.setattr(QMessageBox, "information", information)
+    history_window.select_all_records()
+    
+    history_window.create_contact_sheet()
+    qtbot.waitUntil(lambda: information.called, timeout=10000)
+    
+    assert "共 1 张图片" in information.call_args[0][2]
+    assert (tmp_path / "sheet.png").exists()
+    assert history_window.export_dialog is None
+
+def test_import_records(history_window, tmp_path, monkeypatch):
+    """测试从JSONL文件导入历史记录"""
+    from PyQt6.QtWidgets import QFileDialog
+    from src.utils.record_exporter import export_history
+    file_path = tmp_path / "history.jsonl"
+    export_history([{"timestamp": "2024-01-15 12:00:00", "params": {"prompt": "imported"},
+                     "image_paths": ["a.png"]}], file_path)
+    monkeypatch.setattr(QFileDialog, "getOpenFileName", lambda *args, **kwargs: (str(file_path), ""))
+    monkeypatch.setattr(QMessageBox, "information", MagicMock())
+    
+    history_window.import_records()
+    
+    records = history_window.history_manager.add_records.call_args[0][0]
+    assert records[0]["params"]["prompt"] == "imported"
+    assert records[0]["image_paths"] == ["a.png"]
+
+def test_delete_to_trash_and_undo(history_window, mock_history, tmp_path, qtbot, monkeypatch):
+    """测试删除的图片移入回收站，仍被引用的图片保留，撤销后记录和图片都恢复"""
+    shared = tmp_path / "shared.png"
+    own = tmp_path / "own.png"
+    shared.write_bytes(b"shared")
+    own.write_bytes(b"own")
+    mock_history.records[:] = [
+        {"timestamp": "2024-03-20 10:00:00", "params": {"prompt": "a"}, "image_paths": [str(own), str(shared)]},
+        {"timestamp": "2024-03-20 09:00:00", "params": {"prompt": "b"}, "image_paths": [str(shared)]},
+    ]
+    history_window.refresh_table()
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.StandardButton.Yes)
+    history_window.table.selectRow(0)
+    
+    history_window.delete_selected(delete_files=True)
+    qtbot.waitUntil(lambda: not history_window.trash_thread.isRunning(), timeout=5000)
+    
+    assert [r["params"]["prompt"] for r in mock_history.records] == ["b"]
+    assert not own.exists() and shared.exists()
+    assert len(history_window.trash.batches()) == 1
+    assert history_window.undo_btn.isEnabled()
+    
+    history_window.undo_delete()
+    qtbot.waitUntil(lambda: not history_window.trash_thread.isRunning(), timeout=5000)
+    
+    assert [r["params"]["prompt"] for r in mock_history.records] == ["a", "b"]
+    assert own.read_bytes() == b"own"
+    assert history_window.trash.batches() == []
+    assert not history_window.undo_btn.isEnabled()
+
+def test_restore_from_trash_view(history_window, mock_history, tmp_path, qtbot, monkeypatch):
+    """测试重新打开窗口后（撤销列表为空）从回收站恢复记录和图片"""
+    image = tmp_path / "own.png"
+    image.write_bytes(b"own")
+    mock_history.records[:] = [
+        {"timestamp": "2024-03-20 10:00:00", "params": {"prompt": "a"}, "image_paths": [str(image)]},
+        {"timestamp": "2024-03-20 09:00:00", "params": {"prompt": "b"}, "image_paths": []},
+    ]
+    history_window.refresh_table()
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.StandardButton.Yes)
+    history_window.table.selectRow(0)
+    history_window.delete_selected(delete_files=True)
+    qtbot.waitUntil(lambda: not history_window.trash_thread.isRunning(), timeout=5000)
+    mock_history.remove_records.assert_called_once()
+    
+    reopened = HistoryWindow(mock_history, tmp_path / "trash")
+    qtbot.addWidget(reopened)
+    assert not reopened.undo_btn.isEnabled()
+    dialog = TrashDialog(reopened.trash)
+    assert dialog.batch_list.count() == 1
+    assert "1 条记录，1 张图片" in dialog.batch_list.item(0).text()
+    
+    reopened.restore_batch(dialog.selected_batch())
+    qtbot.waitUntil(lambda: not reopened.trash_thread.isRunning(), timeout=5000)
+    assert [r["params"]["prompt"] for r in mock_history.records] == ["a", "b"]
+    assert image.read_bytes() == b"own"
+    assert reopened.trash.batches() == []
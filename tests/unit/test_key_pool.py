@@ -0,0 +1,146 @@
+import pytest
+import requests
+import responses
+from responses import matchers
+from unittest.mock import MagicMock, patch
+from src.utils.api_client import APIError
+from src.utils.key_pool import KeyPool, PooledAPI, mask_key
+from src.utils.api_manager import APIManager
+
+API_URL = "https://api.siliconflow.cn/v1/images/generations"
+
+def add_response(key, status=200, headers=None):
+    responses.add(
+        responses.POST, API_URL,
+        json={"data": [{"url": "http://example.com/image.png"}]} if status == 200 else {"message": "error"},
+        status=status, headers=headers or {},
+        match=[matchers.header_matcher({"Authorization": f"Bearer {key}"})]
+    )
+
+def test_mask_key():
+    """测试隐藏密钥"""
+    assert mask_key("sk-abcdefghijklmn") == "sk-ab***klmn"
+    assert "abcdef" not in mask_key("sk-abcdef")
+
+def test_pool_prefers_remaining_quota():
+    """测试按剩余额度选择密钥，额度相同时轮流使用"""
+    pool = KeyPool(["key-a", "key-b", "key-a"])
+    assert pool.keys == ["key-a", "key-b"]
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.key, second.key} == {"key-a", "key-b"}
+    pool.release(first, 200, {"X-RateLimit-Remaining-Requests": "5"})
+    pool.release(second, 200, {"X-RateLimit-Remaining-Requests": "50"})
+
+    assert pool.acquire().key == "key-b"
+
+def test_pool_cooldown_and_stats():
+    """测试限流密钥暂停使用，全部冷却时等待超时报错"""
+    pool = KeyPool(["key-a", "key-b"], cooldown=60)
+    state = pool.acquire()
+    pool.release(state, 429, {"Retry-After": "30"})
+
+    other = pool.acquire()
+    assert other.key != state.key
+    pool.release(other, 401)
+
+    with pytest.raises(APIError) as exc_info:
+        pool.acquire(timeout=0.05)
+    assert exc_info.value.code == 429
+
+    stats = pool.stats()
+    limited, invalid = stats[pool.keys.index(state.key)], stats[pool.keys.index(other.key)]
+    assert limited["rate_limited"] == 1
+    assert 0 < limited["cooldown"] <= 30
+    assert invalid["failures"] == 1
+    assert invalid["cooldown"] > 30
+    assert len(pool.summary_lines()) == 2
+
+@responses.activate
+def test_pooled_api_fails_over():
+    """测试密钥限流时换用其他密钥"""
+    add_response("key-a", status=429)
+    add_response("key-b")
+    api = PooledAPI(["key-a", "key-b"])
+    api.pool._next = 0  # 先使用 key-a
+
+    result = api.generate_image(prompt="test", model="test-model")
+
+    assert result["data"][0]["url"] == "http://example.com/image.png"
+    stats = api.pool.stats()
+    assert [item["rate_limited"] for item in stats] == [1, 0]
+    assert [item["successes"] for item in stats] == [0, 1]
+
+@responses.activate
+def test_pooled_api_reports_invalid_keys():
+    """测试所有密钥认证失败时立即报错，不等待冷却结束"""
+    add_response("key-a", status=401, headers={"X-RateLimit-Remaining-Requests": "7"})
+    add_response("key-b", status=403)
+    api = PooledAPI(["key-a", "key-b"])
+
+    with pytest.raises(APIError) as exc_info:
+        api.generate_image(prompt="test", model="test-model", max_retries=10)
+    assert exc_info.value.code == 401
+    assert len(responses.calls) == 2
+    assert [item["failures"] for item in api.pool.stats()] == [1, 1]
+
+def test_pool_stale_headers_not_reused():
+    """测试请求没有响应时不用之前的响应头更新额度"""
+    pool = KeyPool(["key-a"])
+    api = PooledAPI(["key-a"], pool=pool)
+    pool.release(pool.acquire(), 200, {"X-RateLimit-Remaining-Requests": "50"})
+    with patch.object(requests.Session, "post", side_effect=requests.exceptions.ConnectionError("refused")):
+        with pytest.raises(APIError) as exc_info:
+            api.generate_image(prompt="test", model="test-model", max_retries=1)
+    assert exc_info.value.headers == {}
+    assert pool.stats()[0]["quota"] == 50
+
+def test_pool_headers_follow_their_request():
+    """测试同一密钥同时处理多个请求时，各请求的响应头用于更新各自的结果"""
+    import threading
+    pool = KeyPool(["key-a"])
+    api = PooledAPI(["key-a"], pool=pool)
+    both_sent = threading.Barrier(2)
+
+    def generate(prompt, **kwargs):
+        both_sent.wait(timeout=5)
+        if prompt == "limited":
+            raise APIError("限流", code=429, headers={"Retry-After": "30"})
+        return {"data": []}, {"X-RateLimit-Remaining-Requests": "42"}
+
+    released = []
+    release = pool.release
+    pool.release = lambda state, status=200, headers=None, error="": (
+        released.append((status, headers)), release(state, status, headers, error))
+    api.clients["key-a"].generate_image_with_headers = generate
+
+    def worker(prompt):
+        try:
+            api.generate_image(prompt=prompt, model="test-model", max_retries=1)
+        except APIError:
+            pass
+
+    threads = [threading.Thread(target=worker, args=(prompt,)) for prompt in ("limited", "ok")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert sorted(released, key=lambda item: item[0]) == [
+        (200, {"X-RateLimit-Remaining-Requests": "42"}), (429, {"Retry-After": "30"})]
+
+def test_api_manager_uses_pool():
+    """测试配置多个密钥时使用密钥池"""
+    values = {"api_key": "key-a", "api_keys": ["key-b", "key-a"], "key_pool.cooldown": 60}
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+
+    manager = APIManager(config)
+    assert isinstance(manager.api, PooledAPI)
+    assert manager.get_api_keys() == ["key-a", "key-b"]
+    assert len(manager.key_stats()) == 2
+
+    values["api_keys"] = []
+    assert manager.api.api_key == "key-a"
+    assert manager.key_stats() == []
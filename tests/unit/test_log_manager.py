@@ -0,0 +1,65 @@
+import logging
+import pytest
+from src.utils.log_manager import (
+    redact, log_event, Sampler, setup_logging, shutdown_logging
+)
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    level = root.level
+    yield root
+    shutdown_logging()
+    root.setLevel(level)
+
+def test_redact_secrets():
+    """测试隐藏密钥等敏感信息"""
+    text = "headers={'Authorization': 'Bearer sk-abcdef123456'} api_key=secret123"
+    redacted = redact(text)
+
+    assert "sk-abcdef123456" not in redacted
+    assert "secret123" not in redacted
+    assert "Bearer ***" in redacted
+
+def test_redact_keeps_token_usage_fields():
+    """测试只隐藏令牌字段，max_tokens、prompt_tokens 等用量字段保留原值"""
+    assert redact("max_token=5 max_tokens=512 prompt_tokens=12") == "max_token=5 max_tokens=512 prompt_tokens=12"
+    assert redact('{"completion_tokens": 30}') == '{"completion_tokens": 30}'
+    assert redact("token=abc123") == "token=***"
+    assert redact('{"access_token": "abc123", "refresh_token": "def456"}') == '{"access_token": "***", "refresh_token": "***"}'
+
+def test_log_event_skips_formatting_when_disabled():
+    """测试日志级别未启用时不格式化字段"""
+    class Expensive:
+        formatted = False
+
+        def __str__(self):
+            Expensive.formatted = True
+            return "expensive"
+
+    logger = logging.getLogger("test_log_manager.disabled")
+    logger.setLevel(logging.WARNING)
+    log_event(logger, logging.DEBUG, "generate_request", payload=Expensive())
+
+    assert not Expensive.formatted
+
+def test_sampler():
+    """测试按间隔采样"""
+    sampler = Sampler()
+    results = [sampler.should_log("event", 3) for _ in range(7)]
+
+    assert results == [True, False, False, True, False, False, True]
+    assert all(sampler.should_log("other", 1) for _ in range(3))
+
+def test_setup_logging_writes_redacted_file(tmp_path, restore_root_logger):
+    """测试后台线程写入日志文件并脱敏"""
+    setup_logging(tmp_path, console_level=None)
+    logger = logging.getLogger("test_log_manager.file")
+    logger.info("请求头: %s", {"Authorization": "Bearer sk-abcdef123456"})
+    log_event(logger, logging.INFO, "generate_response", status=200, images=2)
+    shutdown_logging()
+
+    content = (tmp_path / "app.log").read_text(encoding="utf-8")
+    assert "sk-abcdef123456" not in content
+    assert "Bearer ***" in content
+    assert "generate_response status=200 images=2" in content
@@ -0,0 +1,82 @@
+import os
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.utils.output_layout import MAX_LAYOUTS, OutputLayout, get_output_layout
+
+def _touch(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        open(os.path.join(directory, f"existing_{i}.png"), "wb").close()
+
+def test_groups(tmp_path):
+    """测试各布局的子目录名"""
+    when = datetime(2024, 1, 15, 12, 0, 0)
+    assert OutputLayout(str(tmp_path), "date").group(when=when) == "2024-01-15"
+    assert OutputLayout(str(tmp_path), "job").group(job="batch/1:2") == "batch_1_2"
+    assert OutputLayout(str(tmp_path), "model").group(model="org/model-a") == "model-a"
+    hashed = OutputLayout(str(tmp_path), "hash")
+    assert len(hashed.group("a.png")) == 2 and hashed.group("a.png") == hashed.group("a.png")
+    assert OutputLayout(str(tmp_path), "flat").directory("a.png") == str(tmp_path)
+    with pytest.raises(ValueError):
+        OutputLayout(str(tmp_path), "unknown")
+
+def _save(layout, **kwargs):
+    """选择目录并计入一个新文件"""
+    directory = layout.directory(**kwargs)
+    layout.add_file(directory)
+    return directory
+
+def test_sharding_continues_existing_shards(tmp_path):
+    """测试目录写满后放到下一个分片，重新打开时接着使用已有的最后一个分片"""
+    when = datetime(2024, 1, 15)
+    _touch(tmp_path / "2024-01-15", 3)
+    _touch(tmp_path / "2024-01-15_002", 1)
+    
+    layout = OutputLayout(str(tmp_path), "date", shard_size=3)
+    dirs = [_save(layout, when=when) for _ in range(3)]
+    assert [os.path.basename(d) for d in dirs] == ["2024-01-15_002", "2024-01-15_002", "2024-01-15_003"]
+    
+    # 不分目录时分片放在输出目录中
+    flat = OutputLayout(str(tmp_path / "flat"), "flat", shard_size=1)
+    assert [os.path.relpath(_save(flat), tmp_path) for _ in range(2)] == ["flat", os.path.join("flat", "part_002")]
+    
+    # 为0时不限制
+    unlimited = OutputLayout(str(tmp_path), "date", shard_size=0)
+    assert {_save(unlimited, when=datetime(2024, 1, 16)) for _ in range(5)} == {str(tmp_path / "2024-01-16")}
+    assert OutputLayout(str(tmp_path)).shard_size == 0  # 默认不分片
+
+def test_only_written_files_are_counted(tmp_path):
+    """测试只有实际写入的文件计入目录的文件数（跳过的重复图片不计入）"""
+    layout = OutputLayout(str(tmp_path), "job", shard_size=2)
+    for _ in range(5):
+        layout.directory(job="batch")  # 选择目录后跳过保存
+    first = _save(layout, job="batch")
+    assert first == _save(layout, job="batch") == str(tmp_path / "batch")
+    assert _save(layout, job="batch") == str(tmp_path / "batch_002")
+
+def test_get_output_layout_from_config(tmp_path):
+    """测试按配置获取布局，相同配置共用实例，无效配置不分目录"""
+    values = {"paths.output_dir": str(tmp_path), "output_layout.mode": "model", "output_layout.shard_size": 10}
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+    
+    layout = get_output_layout(config)
+    assert layout.mode == "model" and layout.shard_size == 10
+    assert get_output_layout(config) is layout
+    
+    values["output_layout.mode"] = "bogus"
+    assert get_output_layout(config).mode == "flat"
+
+def test_layout_cache_is_bounded(tmp_path):
+    """测试只保留最近使用的布局实例"""
+    values = {"output_layout.mode": "flat"}
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+    
+    first = get_output_layout(config, str(tmp_path / "0"))
+    for i in range(1, MAX_LAYOUTS + 5):
+        get_output_layout(config, str(tmp_path / str(i)))
+    assert get_output_layout(config, str(tmp_path / "0")) is not first
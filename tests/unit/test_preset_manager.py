@@ -3,7 +3,7 @@ import json
 import os
 from pathlib import Path
 from unittest.mock import MagicMock
-from src.utils.preset_manager import PresetManager
+from src.utils.preset_manager import PresetManager, _PresetCache, preset_file_name
 
 @pytest.fixture
 def mock_config():
@@ -39,7 +39,7 @@ def test_init(preset_manager):
     """测试初始化"""
     assert preset_manager.config is not None
     assert preset_manager.presets_dir.exists()
-    assert isinstance(preset_manager._presets, dict)
+    assert isinstance(preset_manager._presets, _PresetCache)
 
 def test_save_preset(preset_manager, sample_preset):
     """测试保存预设"""
@@ -181,6 +181,39 @@ def test_export_selected_presets(preset_manager, sample_preset, tmp_path):
         assert any(p["name"] == "预设2" for p in exported)
         assert not any(p["name"] == "预设3" for p in exported)
 
+def test_export_skips_deleted_preset_files(preset_manager, sample_preset, tmp_path, capsys):
+    """测试预设文件被外部删除后，导出跳过该预设并提示"""
+    preset_manager.save_preset(sample_preset["name"], sample_preset["params"])
+    preset_manager.save_preset("已删除", {"prompt": "测试2"})
+    (preset_manager.presets_dir / preset_file_name("已删除")).unlink()
+    
+    export_path = tmp_path / "export.json"
+    assert preset_manager.export_presets(str(export_path), [sample_preset["name"], "已删除"]) is True
+    exported = json.loads(export_path.read_text(encoding="utf-8"))
+    assert [p["name"] for p in exported] == [sample_preset["name"]]
+    assert "已删除" in capsys.readouterr().out
+
+def test_preset_cache_hides_manifest_entries(preset_manager, sample_preset):
+    """测试预设缓存不以字典形式暴露清单条目"""
+    preset_manager.save_preset(sample_preset["name"], sample_preset["params"])
+    cache = preset_manager._presets
+    assert sample_preset["name"] in cache
+    assert not hasattr(cache, "keys")
+    assert cache[sample_preset["name"]]["params"] == sample_preset["params"]
+    assert "file" in cache.entry(sample_preset["name"])
+
+def test_save_keeps_file_permissions(preset_manager, sample_preset):
+    """测试覆盖保存预设时保留原文件的权限，新文件不是仅所有者可读"""
+    preset_manager.save_preset(sample_preset["name"], sample_preset["params"])
+    file_path = preset_manager.presets_dir / preset_file_name(sample_preset["name"])
+    umask = os.umask(0)
+    os.umask(umask)
+    assert file_path.stat().st_mode & 0o777 == 0o666 & ~umask  # 与 open() 新建的文件相同
+    
+    os.chmod(file_path, 0o640)
+    preset_manager.save_preset(sample_preset["name"], {"prompt": "修改后"})
+    assert file_path.stat().st_mode & 0o777 == 0o640
+
 def test_error_handling(preset_manager, sample_preset, tmp_path):
     """测试错误处理"""
     # 创建并写入一个只读文件
@@ -212,4 +245,63 @@ def test_error_handling(preset_manager, sample_preset, tmp_path):
     
     # 清理：恢复文件权限以便删除
     os.chmod(readonly_file, 0o666)
-    os.chmod(export_file, 0o666) 
\ No newline at end of file
+    os.chmod(export_file, 0o666)
+
+def test_lazy_loading_from_index(preset_manager, sample_preset, monkeypatch):
+    """测试启动时只读取索引，预设内容在首次使用时读取"""
+    for i in range(3):
+        assert preset_manager.save_preset(f"预设{i}", sample_preset["params"])
+    
+    parsed = []
+    original_parse = PresetManager._parse
+    def counting_parse(self, path):
+        parsed.append(path.name)
+        return original_parse(self, path)
+    monkeypatch.setattr(PresetManager, "_parse", counting_parse)
+    
+    manager = PresetManager(preset_manager.config)
+    assert parsed == []
+    assert sorted(item["name"] for item in manager.list_summaries()) == ["预设0", "预设1", "预设2"]
+    assert manager.list_summaries()[0]["model"] == "stable-diffusion-3"
+    assert parsed == []
+    
+    assert manager.get_preset("预设1")["prompt"] == "测试提示词"
+    assert parsed == ["预设1.json"]
+
+def test_detects_external_changes(preset_manager, sample_preset):
+    """测试其他进程修改、新增、删除预设文件后能检测到"""
+    preset_manager.save_preset("外部", sample_preset["params"])
+    preset_manager.save_preset("删除", sample_preset["params"])
+    assert preset_manager.get_preset("外部")["steps"] == 20
+    
+    # 修改已读取的预设
+    file_path = preset_manager.presets_dir / "外部.json"
+    preset = json.loads(file_path.read_text(encoding="utf-8"))
+    preset["params"]["steps"] = 50
+    file_path.write_text(json.dumps(preset, ensure_ascii=False, indent=4), encoding="utf-8")
+    assert preset_manager.get_preset("外部")["steps"] == 50
+    
+    # 新增和删除文件后重新打开
+    new_preset = {"name": "新增", "params": {"prompt": "新的"}}
+    (preset_manager.presets_dir / "新增.json").write_text(json.dumps(new_preset), encoding="utf-8")
+    (preset_manager.presets_dir / "删除.json").unlink()
+    manager = PresetManager(preset_manager.config)
+    assert manager.get_preset("新增")["prompt"] == "新的"
+    assert manager.get_preset("删除") is None
+    assert "删除" not in manager._presets
+
+def test_unsafe_name_and_atomic_write(preset_manager, sample_preset):
+    """测试包含路径字符的名称不会写到预设目录之外，写入后不残留临时文件"""
+    name = "../逃逸/预设"
+    assert preset_manager.save_preset(name, sample_preset["params"])
+    
+    file_name = preset_file_name(name)
+    assert "/" not in file_name and file_name != preset_file_name(".._逃逸_预设")
+    assert (preset_manager.presets_dir / file_name).exists()
+    assert not list(preset_manager.presets_dir.glob("*.tmp"))
+    assert not (preset_manager.presets_dir.parent / "逃逸").exists()
+    
+    manager = PresetManager(preset_manager.config)
+    assert manager.get_preset(name)["prompt"] == "测试提示词"
+    assert manager.delete_preset(name)
+    assert not (preset_manager.presets_dir / file_name).exists()
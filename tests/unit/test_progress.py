@@ -0,0 +1,40 @@
+import pytest
+from src.utils.progress import ProgressTracker, format_duration, summary_text
+
+def test_poll_throttles_and_drains_lines():
+    """测试快照限频且日志只发送一次"""
+    tracker = ProgressTracker(total=2, interval=60)
+    tracker.log("第一行")
+    first = tracker.poll()
+    assert first["lines"] == ["第一行"]
+
+    tracker.log("第二行")
+    assert tracker.poll() is None
+    forced = tracker.poll(force=True)
+    assert forced["lines"] == ["第二行"]
+
+def test_counts_and_eta():
+    """测试计数、最近错误和预计剩余时间"""
+    tracker = ProgressTracker(total=4, max_errors=2)
+    assert tracker.poll()["eta"] is None
+
+    tracker.add_image()
+    tracker.add_image(skipped=True)
+    tracker.finish_prompt()
+    for i in range(3):
+        tracker.add_error(f"错误{i}")
+
+    snapshot = tracker.poll(force=True)
+    assert snapshot["images_saved"] == 2
+    assert snapshot["images_skipped"] == 1
+    assert snapshot["errors"] == 3
+    assert snapshot["recent_errors"] == ["错误1", "错误2"]
+    assert snapshot["eta"] == pytest.approx(snapshot["elapsed"] * 3)
+    assert "提示词 1/4" in summary_text(snapshot)
+
+def test_format_duration():
+    """测试时长格式化"""
+    assert format_duration(None) == "--"
+    assert format_duration(42) == "42秒"
+    assert format_duration(125) == "2分5秒"
+    assert format_duration(7260) == "2小时1分"
@@ -0,0 +1,93 @@
+import pytest
+from src.utils.record_exporter import (
+    export_history, import_history, read_rows, detect_format, flatten_history_record
+)
+
+@pytest.fixture
+def records():
+    """创建历史记录"""
+    return [
+        {
+            "timestamp": f"2024-01-15 12:00:0{i}",
+            "params": {
+                "prompt": f"提示词 {i}, with comma",
+                "negative_prompt": "",
+                "model": "test/model",
+                "size": "512x512",
+                "num_inference_steps": 20,
+                "guidance_scale": 7.5,
+                "seed": 9999999990 + i,
+                "source": "batch"
+            },
+            "image_paths": [f"/output/image_{i}.png", f"/output/image_{i}_1.png"]
+        }
+        for i in range(3)
+    ]
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".parquet"])
+def test_round_trip(records, tmp_path, suffix):
+    """测试导出后导入得到相同的记录"""
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    file_path = tmp_path / f"history{suffix}"
+
+    assert export_history(records, file_path, chunk_size=2) == 3
+    imported = list(import_history(file_path))
+
+    assert len(imported) == 3
+    for original, restored in zip(records, imported):
+        assert restored["timestamp"] == original["timestamp"]
+        assert restored["image_paths"] == original["image_paths"]
+        expected = {k: v for k, v in original["params"].items() if v != ""}
+        assert restored["params"] == expected
+
+def test_column_selection(records, tmp_path):
+    """测试只导出和读取指定列"""
+    file_path = tmp_path / "history.csv"
+    export_history(records, file_path, columns=["prompt", "seed"])
+
+    rows = list(read_rows(file_path))
+    assert list(rows[0]) == ["prompt", "seed"]
+    assert list(read_rows(file_path, columns=["seed"]))[2] == {"seed": "9999999992"}
+
+    with pytest.raises(ValueError):
+        export_history(records, file_path, columns=["unknown"])
+
+def test_detect_format():
+    """测试根据后缀确定格式"""
+    assert detect_format("a.ndjson") == "jsonl"
+    assert detect_format("a.PARQUET") == "parquet"
+    with pytest.raises(ValueError):
+        detect_format("a.xlsx")
+
+def test_flatten_legacy_record():
+    """测试兼容旧格式的单图片记录"""
+    row = flatten_history_record({"params": {"seed": ""}, "image_path": "a.png"})
+    assert row["image_paths"] == ["a.png"]
+    assert row["seed"] is None
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".parquet"])
+def test_invalid_values_are_reported(records, tmp_path, suffix):
+    """测试非数字的种子值和步数导出为空并报告，不中断导出"""
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    records[1]["params"].update({"seed": "random", "num_inference_steps": "abc"})
+    file_path = tmp_path / f"history{suffix}"
+
+    invalid = []
+    assert export_history(records, file_path, invalid=invalid) == 3
+    assert sorted(invalid) == ["num_inference_steps", "seed"]
+    imported = list(import_history(file_path))
+    assert "seed" not in imported[1]["params"]
+    assert imported[2]["params"]["seed"] == 9999999992
+
+def test_import_skips_invalid_values(tmp_path):
+    """测试导入时跳过无法转换的值"""
+    file_path = tmp_path / "history.csv"
+    file_path.write_text("timestamp,prompt,seed,image_paths\n2024-01-15 12:00:00,猫,abc,not json\n", encoding="utf-8")
+
+    invalid = []
+    record = list(import_history(file_path, invalid=invalid))[0]
+    assert record["params"] == {"prompt": "猫"}
+    assert record["image_paths"] == []
+    assert sorted(invalid) == ["image_paths", "seed"]
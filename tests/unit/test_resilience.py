@@ -0,0 +1,80 @@
+import time
+from threading import Event
+
+import pytest
+
+from src.utils.resilience import CircuitBreaker, HedgePolicy, is_retryable
+
+def test_is_retryable():
+    """测试区分可重试和不可重试的错误"""
+    assert is_retryable(None) and is_retryable(429) and is_retryable(503) and is_retryable(504)
+    assert not is_retryable(400) and not is_retryable(401) and not is_retryable(404)
+
+def test_circuit_breaker_opens_and_recovers():
+    """测试连续失败后熔断，超时后只放行一个探测请求"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # 探测请求返回前不放行其他请求
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_hedge_policy_uses_first_result():
+    """测试请求超过等待时间时发出对冲请求并采用先返回的结果"""
+    hedge = HedgePolicy(percentile=0.9, min_delay=0.05)
+    for _ in range(10):
+        hedge.latencies.add(0.01)
+    assert hedge.delay() == 0.05
+
+    stalled = Event()
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) == 1:
+            stalled.wait(5)  # 第一个请求卡住
+            return "slow"
+        return "fast"
+
+    assert hedge.call(request) == "fast"
+    stalled.set()
+    assert hedge.stats()["hedged"] == 1
+    assert hedge.stats()["hedge_wins"] == 1
+
+def test_hedge_policy_ignores_failed_response():
+    """测试先返回的结果不成功时等待另一个请求"""
+    hedge = HedgePolicy(percentile=0.9, min_delay=0.05)
+    for _ in range(10):
+        hedge.latencies.add(0.01)
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.2)  # 第一个请求较慢但成功
+            return 200
+        return 503
+
+    assert hedge.call(request, accept=lambda status: status == 200) == 200
+    assert hedge.stats()["hedge_wins"] == 0
+
+def test_hedge_policy_waits_for_samples():
+    """测试样本不足时不发送对冲请求"""
+    hedge = HedgePolicy()
+    assert hedge.delay() is None
+    assert hedge.call(lambda: "ok") == "ok"
+    with pytest.raises(ValueError):
+        hedge.call(lambda: int("x"))
+    assert hedge.hedged == 0
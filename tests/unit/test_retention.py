@@ -0,0 +1,114 @@
+import os
+import time
+import pytest
+from datetime import datetime, timedelta
+
+from src.utils.history_manager import HistoryManager
+from src.utils.retention import (
+    RetentionEngine, RetentionPolicy, RetentionResult, RetentionService, referenced_paths
+)
+
+class FakeConfig:
+    """只提供 get 的配置"""
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+def make_image(path, size=100, age=0):
+    """创建指定大小的文件，age 为修改时间距今的秒数"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    if age:
+        when = time.time() - age
+        os.utime(path, (when, when))
+    return str(path)
+
+def make_records(tmp_path, count, size=100):
+    """创建 count 条记录（最新的在前），每条一张图片，间隔一天"""
+    now = datetime.now()
+    return [{
+        "timestamp": (now - timedelta(days=i)).strftime("%Y-%m-%d %H:%M:%S"),
+        "image_paths": [make_image(tmp_path / f"img_{i}.png", size)],
+    } for i in range(count)]
+
+def test_plan_by_count_age_and_size(tmp_path):
+    """测试按条数、天数和总大小选出最旧的记录"""
+    records = make_records(tmp_path, 10)
+    engine = RetentionEngine(str(tmp_path))
+
+    assert engine.plan(records, RetentionPolicy(max_items=7)) == [7, 8, 9]
+    assert engine.plan(records, RetentionPolicy(max_age_days=3.5)) == [4, 5, 6, 7, 8, 9]
+    assert engine.plan(records, RetentionPolicy(max_bytes=450)) == [4, 5, 6, 7, 8, 9]
+    # 各条件共同生效，没有时间的记录不按天数删除
+    records.append({"params": {}})
+    assert engine.plan(records, RetentionPolicy(max_items=20, max_age_days=8.5)) == [9]
+    assert engine.plan(records, RetentionPolicy()) == []
+
+def test_preview_counts_without_deleting(tmp_path):
+    """测试试运行只统计，默认不删除图片"""
+    records = make_records(tmp_path, 5)
+    records[0]["image_paths"].append(records[4]["image_paths"][0])
+    engine = RetentionEngine(str(tmp_path))
+
+    assert not RetentionPolicy().delete_files
+    result = engine.preview(records, RetentionPolicy(max_items=2))
+    assert (result.records, result.files) == (3, 0)
+    result = engine.preview(records, RetentionPolicy(max_items=2, delete_files=True))
+    assert (result.records, result.files, result.bytes) == (3, 2, 200)
+    assert all(os.path.exists(path) for record in records for path in record["image_paths"])
+
+def test_collect_orphans_in_batches(tmp_path):
+    """测试分批回收未被引用的旧图片，跳过新图片、非图片和隐藏目录"""
+    kept = make_image(tmp_path / "kept.png", age=7200)
+    orphans = [make_image(tmp_path / "sub" / f"old_{i}.jpg", 50, age=7200) for i in range(5)]
+    recent = make_image(tmp_path / "recent.png")
+    notes = make_image(tmp_path / "notes.txt", age=7200)
+    hidden = make_image(tmp_path / ".trash" / "old.png", age=7200)
+    sheet = make_image(tmp_path / "contact_sheets" / "sweep_001.png", age=7200)
+
+    engine = RetentionEngine(str(tmp_path))
+    policy = RetentionPolicy(delete_orphans=True, orphan_min_age=3600, scan_batch=3)
+    referenced = referenced_paths([{"image_path": kept}])
+    result = RetentionResult()
+    passes = 0
+    while not engine.collect_orphans(referenced, policy, result):
+        passes += 1
+    assert passes >= 2  # 每次只检查3个条目
+    assert result.orphans == result.files == 5
+    assert result.bytes == 250
+    assert not any(os.path.exists(path) for path in orphans)
+    assert all(os.path.exists(path) for path in (kept, recent, notes, hidden, sheet))
+
+def test_service_removes_records_and_unshared_files(qtbot, tmp_path):
+    """测试后台清理：一次删除记录，仍被其他记录引用的图片保留"""
+    history = HistoryManager(tmp_path / "history.json")
+    records = make_records(tmp_path, 5)
+    records[0]["image_paths"].append(records[4]["image_paths"][0])  # 去重时多条记录引用同一文件
+    history.add_records(records)
+
+    config = FakeConfig({"retention.enabled": True, "retention.delete_files": True,
+                         "history.max_items": 2, "paths.output_dir": str(tmp_path)})
+    service = RetentionService(history, config)
+    with qtbot.waitSignal(service.finished, timeout=5000) as blocker:
+        assert service.run_once()
+    result = blocker.args[0]
+
+    assert result.records == 3
+    assert result.files == 2
+    assert len(history.get_records()) == 2
+    assert len(HistoryManager(tmp_path / "history.json").get_records()) == 2
+    assert os.path.exists(records[4]["image_paths"][0])
+    assert not os.path.exists(records[2]["image_paths"][0])
+    assert not service.busy
+
+    # 未开启删除图片时只删除记录
+    config.values.update({"history.max_items": 1, "retention.delete_files": False})
+    with qtbot.waitSignal(service.finished, timeout=5000) as blocker:
+        assert service.run_once()
+    assert (blocker.args[0].records, blocker.args[0].files) == (1, 0)
+    assert os.path.exists(records[1]["image_paths"][0])
+
+    config.values["retention.enabled"] = False
+    assert not service.run_once()
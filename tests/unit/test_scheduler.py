@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from src.models.generation_task import GenerationTask
+from src.utils.cancellation import CancelToken, OperationCancelled
+from src.utils.scheduler import (
+    JobQueue, JobScheduler, ScheduledAPI, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+)
+
+def make_tasks(job, count, priority=PRIORITY_NORMAL):
+    return [GenerationTask(f"{job}-{i}", "model", "512x512", job=job, priority=priority) for i in range(count)]
+
+def test_job_queue_priority_and_fair_share():
+    """测试高优先级作业先出队，同优先级作业轮流出队"""
+    queue = JobQueue()
+    for task in make_tasks("big", 4) + make_tasks("small", 2):
+        queue.put(task)
+    queue.put(make_tasks("urgent", 1, PRIORITY_INTERACTIVE)[0])
+
+    order = [queue.get_nowait().prompt for _ in range(7)]
+    assert order[0] == "urgent-0"
+    assert order[1:5] == ["big-0", "small-0", "big-1", "small-1"]
+    assert order[5:] == ["big-2", "big-3"]
+    assert queue.empty()
+
+def test_job_queue_remove_job():
+    """测试移除作业中尚未开始的任务"""
+    queue = JobQueue()
+    for task in make_tasks("a", 3) + make_tasks("b", 1):
+        queue.put(task)
+    assert [t.prompt for t in queue.remove_job("a")] == ["a-0", "a-1", "a-2"]
+    assert queue.qsize() == 1
+    assert [job["name"] for job in queue.jobs()] == ["b"]
+    queue.get_nowait()
+    queue.task_done()
+    queue.join()
+
+def test_scheduler_prefers_interactive_job():
+    """测试名额空出时先分配给交互式作业"""
+    scheduler = JobScheduler(max_concurrent=1)
+    batch = scheduler.job("batch")
+    single = scheduler.job("single", PRIORITY_INTERACTIVE)
+
+    scheduler.acquire(batch)
+    order = []
+
+    def request(job, label):
+        scheduler.acquire(job)
+        order.append(label)
+        scheduler.release(job)
+
+    waiters = [threading.Thread(target=request, args=(batch, "batch"))]
+    waiters[0].start()
+    time.sleep(0.05)
+    waiters.append(threading.Thread(target=request, args=(single, "single")))
+    waiters[1].start()
+    time.sleep(0.05)
+
+    scheduler.release(batch)
+    for waiter in waiters:
+        waiter.join(2)
+    assert order == ["single", "batch"]
+    assert {item["name"]: item["served"] for item in scheduler.stats()} == {"batch": 2, "single": 1}
+
+def test_scheduled_api_cancel_while_waiting():
+    """测试等待名额期间被取消"""
+    scheduler = JobScheduler(max_concurrent=1)
+    holder = scheduler.job("holder")
+    scheduler.acquire(holder)
+
+    class DummyAPI:
+        def generate_image(self, **kwargs):
+            return {"data": []}
+
+    api = ScheduledAPI(DummyAPI(), scheduler, scheduler.job("batch"))
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(OperationCancelled):
+        api.generate_image(prompt="test", cancel=token)
+
+    scheduler.release(holder)
+    assert api.generate_image(prompt="test") == {"data": []}
+    api.close()
+    assert [item["name"] for item in scheduler.stats()] == ["holder"]
+
+def test_scheduled_api_records_queue_wait():
+    """测试等待调度器名额的时间记为排队耗时"""
+    from src.utils.telemetry import Telemetry
+
+    scheduler = JobScheduler(max_concurrent=1)
+    holder = scheduler.job("holder")
+    scheduler.acquire(holder)
+
+    class DummyAPI:
+        telemetry = Telemetry()
+
+        def generate_image(self, **kwargs):
+            return {"data": []}
+
+    api = ScheduledAPI(DummyAPI(), scheduler, scheduler.job("batch"))
+    threading.Timer(0.1, scheduler.release, args=(holder,)).start()
+    api.generate_image(prompt="test")
+    stats = DummyAPI.telemetry.snapshot()["queue_wait"]
+    assert stats["count"] == 1 and stats["sum"] >= 0.05
+
+def test_scheduler_same_name_jobs_and_priority_update():
+    """测试注销后同名的新作业与旧作业对象各自调度，重新注册时更新优先级"""
+    scheduler = JobScheduler(max_concurrent=1)
+    old = scheduler.job("batch")
+    scheduler.remove(old)
+    new = scheduler.job("batch")
+    assert new is not old
+
+    done = threading.Event()
+
+    def request():
+        scheduler.acquire(old)  # 旧对象重新加入，不再无限等待
+        scheduler.release(old)
+        done.set()
+
+    threading.Thread(target=request, daemon=True).start()
+    assert done.wait(2)
+
+    assert scheduler.job("batch", PRIORITY_INTERACTIVE) is new
+    assert new.priority == PRIORITY_INTERACTIVE
+
+def test_job_queue_updates_priority_of_queued_job():
+    """测试作业排队后以更高优先级加入任务时，整个作业提前"""
+    queue = JobQueue()
+    for task in make_tasks("a", 2) + make_tasks("b", 2):
+        queue.put(task)
+    queue.put(make_tasks("b", 1, PRIORITY_INTERACTIVE)[0])
+    assert {job["name"]: job["priority"] for job in queue.jobs()} == {"a": PRIORITY_NORMAL, "b": PRIORITY_INTERACTIVE}
+    assert [queue.get_nowait().prompt for _ in range(3)] == ["b-0", "b-1", "b-0"]
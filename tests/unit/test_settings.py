@@ -78,6 +78,14 @@ def test_save_settings(settings_tab, monkeypatch):
     # 设置测试数据
     settings_tab.api_key_input.setText("test_key")
     settings_tab.output_dir.setText("/test/path")
+    settings_tab.layout_combo.setCurrentIndex(settings_tab.layout_combo.findData("date"))
+    settings_tab.shard_size_spin.setValue(2000)
+    settings_tab.retention_check.setChecked(True)
+    settings_tab.max_items_spin.setValue(500)
+    settings_tab.max_total_spin.setValue(2048)
+    assert not settings_tab.concurrency_check.isChecked()
+    settings_tab.concurrency_check.setChecked(True)
+    settings_tab.max_concurrency_spin.setValue(4)
     
     # 保存设置
     settings_tab.save_settings()
@@ -85,10 +93,42 @@ def test_save_settings(settings_tab, monkeypatch):
     # 验证配置是否正确保存
     assert settings_tab.config.get("api_key") == "test_key"
     assert settings_tab.config.get("paths.output_dir") == "/test/path"
+    assert settings_tab.config.get("output_layout.mode") == "date"
+    assert settings_tab.config.get("output_layout.shard_size") == 2000
+    assert settings_tab.config.get("retention.enabled") is True
+    assert settings_tab.config.get("history.max_items") == 500
+    assert settings_tab.config.get("retention.max_total_mb") == 2048
+    assert settings_tab.config.get("concurrency.enabled") is True
+    assert settings_tab.config.get("concurrency.max") == 4
     
     # 验证是否显示成功消息
     mock_message_box.assert_called_once()
 
+def test_retention_requires_confirmation(settings_tab, monkeypatch):
+    """测试启用存储清理前试运行并确认，拒绝时不保存"""
+    history = MagicMock()
+    history.get_records.return_value = [{"timestamp": "2024-01-01 00:00:00", "image_paths": []}] * 5
+    settings_tab.history_manager = history
+    monkeypatch.setattr(QMessageBox, 'information', MagicMock())
+    question = MagicMock(return_value=QMessageBox.StandardButton.No)
+    monkeypatch.setattr(QMessageBox, 'question', question)
+    
+    settings_tab.retention_check.setChecked(True)
+    settings_tab.max_items_spin.setValue(2)
+    settings_tab.save_settings()
+    assert "3 条历史记录" in question.call_args[0][2]
+    assert not settings_tab.config.get("retention.enabled", False)
+    
+    question.return_value = QMessageBox.StandardButton.Yes
+    settings_tab.save_settings()
+    assert settings_tab.config.get("retention.enabled") is True
+    assert settings_tab.config.get("retention.delete_files") is False
+    
+    # 策略未变化时不再确认
+    question.reset_mock()
+    settings_tab.save_settings()
+    question.assert_not_called()
+
 @patch('src.utils.api_client.SiliconFlowAPI.validate_api_key')
 def test_test_api_key_success(mock_validate, settings_tab, monkeypatch, qtbot):
     """测试API密钥验证成功"""
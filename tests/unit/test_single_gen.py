@@ -164,4 +164,33 @@ def test_random_seed_functionality(single_gen_tab):
     params = single_gen_tab.get_generation_params()
     assert "seed" in params
     assert isinstance(params["seed"], int)
-    assert 1 <= params["seed"] <= 9999999998 
\ No newline at end of file
+    assert 1 <= params["seed"] <= 9999999998 
+def test_defaults_updated_on_main_thread(app, mock_history, tmp_path, monkeypatch):
+    """测试在其他线程中修改默认参数时，界面在主线程中更新"""
+    import threading
+    
+    monkeypatch.chdir(tmp_path)
+    config_manager = ConfigManager(save_delay=0)
+    tab = SingleGenTab(APIManager(config_manager), config_manager, mock_history)
+    updated_in = []
+    tab.defaults_changed.connect(lambda: updated_in.append(threading.current_thread()))
+    
+    worker = threading.Thread(target=config_manager.set, args=("defaults.steps", 33))
+    worker.start()
+    worker.join()
+    assert tab.steps_spin.value() != 33  # 尚未在主线程中处理
+    
+    app.processEvents()
+    assert tab.steps_spin.value() == 33
+    assert updated_in == [threading.main_thread()]
+
+def test_history_window_uses_dedup_index(app, mock_history, tmp_path, monkeypatch):
+    """测试历史记录窗口使用与批量生成共用的去重索引"""
+    from src.utils.dedup_index import get_dedup_index
+    
+    monkeypatch.chdir(tmp_path)
+    config_manager = ConfigManager(save_delay=0)
+    tab = SingleGenTab(APIManager(config_manager), config_manager, mock_history)
+    tab.show_history_window()
+    assert tab.history_window.dedup_index is get_dedup_index(config_manager)
+    tab.history_window.close()
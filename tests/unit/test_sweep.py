@@ -0,0 +1,100 @@
+import pytest
+from PyQt6.QtGui import QColor, QImage
+
+from src.utils.sweep import ParameterSweep, base_params, parse_axis_values, write_contact_sheets
+
+BASE = {"prompt": "测试", "negative_prompt": "", "model": "m/model-a", "size": "512x512",
+        "steps": 20, "guidance": 7.5, "seed": -1}
+
+def test_parse_axis_values():
+    """测试解析列表和范围写法"""
+    assert parse_axis_values("steps", "20-40:10") == [20, 30, 40]
+    assert parse_axis_values("guidance", "5-6:0.5") == [5.0, 5.5, 6.0]
+    assert parse_axis_values("seed", "1, 2,3") == [1, 2, 3]
+    assert parse_axis_values("model", "a/b, c/d") == ["a/b", "c/d"]
+    with pytest.raises(ValueError):
+        parse_axis_values("steps", "abc")
+    with pytest.raises(ValueError):
+        parse_axis_values("prompt", "a")
+
+def test_base_params_from_preset():
+    """测试预设中的参数名转换为批量生成的参数名"""
+    preset = {"name": "p", "params": {}, "prompt": "猫", "guidance_scale": 5.0, "num_inference_steps": 30}
+    params = base_params(preset, {"model": "default/model", "size": "768x768"})
+    assert params["guidance"] == 5.0 and params["steps"] == 30
+    assert params["model"] == "default/model" and params["prompt"] == "猫"
+    with pytest.raises(ValueError):
+        base_params({"prompt": ""})
+
+def test_points_are_lazy_and_seed_is_innermost():
+    """测试扫描点按序号计算，种子轴位于最内层"""
+    sweep = ParameterSweep(BASE, {"seed": range(1000), "guidance": [5.0, 7.5], "steps": range(1, 501)})
+    assert sweep.names == ["guidance", "steps", "seed"]
+    assert len(sweep) == 2 * 500 * 1000
+    point = sweep.point(len(sweep) - 1)
+    assert (point["guidance"], point["steps"], point["seed"]) == (7.5, 500, 999)
+    assert sweep.point(1)["seed"] == 1 and sweep.point(1000)["steps"] == 2
+    assert [p["seed"] for p in list(ParameterSweep(BASE, {"seed": [1, 2]}))] == [1, 2]
+    with pytest.raises(IndexError):
+        sweep.point(len(sweep))
+
+def test_requests_pack_seeds():
+    """测试只有种子不同的扫描点打包为一次请求"""
+    sweep = ParameterSweep(BASE, {"guidance": [5.0, 7.5], "seed": [1, 2, 3, 4, 5, 6]})
+    requests = list(sweep.requests(max_batch=4))
+    assert sweep.request_count(max_batch=4) == len(requests) == 4
+    assert [r.points for r in requests] == [[0, 1, 2, 3], [4, 5], [6, 7, 8, 9], [10, 11]]
+    assert requests[1].seeds == [5, 6] and requests[1].params["batch_size"] == 2
+    assert requests[2].params["guidance"] == 7.5
+    
+    # 没有种子轴时每个扫描点一次请求，种子由基础参数决定
+    plain = list(ParameterSweep(BASE, {"steps": [10, 20]}).requests())
+    assert [r.points for r in plain] == [[0], [1]]
+    assert plain[0].seeds is None and plain[0].params["batch_size"] == 1
+
+def test_contact_sheets(tmp_path):
+    """测试按最内两层扫描轴生成对比图，超出单张上限时拆分"""
+    sweep = ParameterSweep(BASE, {"model": ["a", "b"], "steps": [10, 20], "seed": [1, 2, 3]})
+    image = QImage(64, 32, QImage.Format.Format_RGB32)
+    image.fill(QColor("blue"))
+    image_path = str(tmp_path / "cell.png")
+    image.save(image_path)
+    images = {point: image_path for point in range(6)}  # 只有第一个模型的结果
+    
+    paths = write_contact_sheets(sweep, images, str(tmp_path / "sheets"), cell_size=32, max_cells=2)
+    assert len(paths) == 2  # 3列拆分为2张，第二个模型没有结果
+    sheet = QImage(paths[0])
+    assert sheet.width() == 2 * 32 and sheet.height() == 28 + 2 * (32 + 20)  # 标题和每格下方的标注
+    assert sheet.pixelColor(16, 28 + 16) == QColor("blue")
+
+def test_contact_sheets_only_for_blocks_with_results(tmp_path, monkeypatch):
+    """测试只为有结果的组合生成对比图，不遍历全部扫描点"""
+    import src.utils.sweep as sweep_module
+    sweep = ParameterSweep(BASE, {"steps": list(range(1, 1001)), "guidance": list(range(1000)),
+                                  "seed": [1, 2]})
+    composed = []
+    monkeypatch.setattr(sweep_module, "compose_contact_sheet", lambda tiles, path, **kwargs: composed.append(tiles))
+    images = {len(sweep) - 1: "last.png"}
+
+    paths = write_contact_sheets(sweep, images, str(tmp_path), max_cells=16)
+    assert len(paths) == len(composed) == 1
+    assert [tile.path for tile in composed[0]].count("last.png") == 1
+
+def test_sweep_dialog_uses_defaults(qtbot):
+    """测试没有预设时以默认参数和填写的提示词为基础参数"""
+    from unittest.mock import MagicMock
+    from src.ui.sweep_dialog import SweepDialog
+    presets = MagicMock()
+    presets.list_summaries.return_value = []
+    dialog = SweepDialog(presets, {"model": "default/model", "steps": 25})
+    qtbot.addWidget(dialog)
+    dialog.axis_inputs["seed"].setText("1-4")
+
+    with pytest.raises(ValueError):
+        dialog.sweep()
+    dialog.prompt_input.setText("一只猫")
+    sweep = dialog.sweep()
+    assert len(sweep) == 4
+    assert sweep.base["prompt"] == "一只猫" and sweep.base["model"] == "default/model"
+    assert sweep.base["steps"] == 25
+
@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import MagicMock
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QColor
+
+from src.models.task_store import TaskStore
+from src.ui.task_list_model import TaskListModel
+
+@pytest.fixture
+def model(qtbot):
+    """创建包含三个任务的列表模型"""
+    store = TaskStore()
+    store.extend({"prompt": f"prompt {i}", "model": "model", "size": "512x512"} for i in range(3))
+    return TaskListModel(store)
+
+def test_rows_read_from_store(model):
+    """测试列表内容直接读取任务存储"""
+    assert model.rowCount() == 3
+    index = model.index(1)
+    assert index.data() == "[等待中] 提示词: prompt 1..."
+    assert index.data(Qt.ItemDataRole.ToolTipRole) == "prompt 1"
+    assert index.data(Qt.ItemDataRole.UserRole).index == 1
+    assert index.data(Qt.ItemDataRole.DecorationRole) is None
+
+def test_update_task_changes_single_row(model, tmp_path):
+    """测试状态更新只通知对应的行，完成后显示缩略图"""
+    image_path = tmp_path / "done.png"
+    image = QImage(256, 128, QImage.Format.Format_RGB32)
+    image.fill(QColor("red"))
+    image.save(str(image_path))
+
+    changed = MagicMock()
+    model.dataChanged.connect(lambda top, bottom: changed(top.row(), bottom.row()))
+    model.update_task(2, "完成", str(image_path))
+    model.update_task(5, "完成")  # 超出范围的序号被忽略
+
+    changed.assert_called_once_with(2, 2)
+    index = model.index(2)
+    assert model.store[2].status == "完成"
+    assert index.data().startswith("[完成]")
+    icon = index.data(Qt.ItemDataRole.DecorationRole)
+    assert icon is not None and not icon.isNull()
+
+def test_load_and_clear(model):
+    """测试导入时替换全部任务，清空后没有行"""
+    resets = MagicMock()
+    model.modelReset.connect(resets)
+
+    assert model.load({"prompt": f"new {i}"} for i in range(100000)) == 100000
+    assert model.rowCount() == 100000
+    assert model.index(99999).data(Qt.ItemDataRole.ToolTipRole) == "new 99999"
+
+    model.clear()
+    assert model.rowCount() == 0
+    assert resets.call_count == 2
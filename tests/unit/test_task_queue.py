@@ -6,6 +6,7 @@ import time
 from src.utils.task_queue import TaskQueue
 from src.utils.excel_handler import GenerationTask
 from src.utils.api_client import SiliconFlowAPI
+from src.models.task_store import TaskStore
 
 @pytest.fixture
 def mock_api():
@@ -33,7 +34,7 @@ def test_init(task_queue):
     """测试初始化"""
     assert task_queue.api is not None
     assert isinstance(task_queue.queue, Queue)
-    assert isinstance(task_queue.tasks, list)
+    assert isinstance(task_queue.tasks, TaskStore)
     assert task_queue.current_task is None
     assert task_queue.worker_thread is None
     assert isinstance(task_queue.pause_event, Event)
@@ -163,4 +164,32 @@ def test_task_error(task_queue, sample_tasks, mock_api):
     
     # 验证回调
     assert error_mock.call_count == 2
-    progress_mock.assert_called_with(2, 2) 
\ No newline at end of file
+    progress_mock.assert_called_with(2, 2)
+
+def test_result_keeps_only_paths_and_seeds(task_queue, mock_api, sample_tasks):
+    """测试完成回调收到完整结果，任务存储中只保留图片地址和种子值"""
+    mock_api.generate_image.return_value = {
+        "data": [{"url": "https://example.com/a.png", "seed": 1},
+                 {"url": "data:image/png;base64,AAAA", "b64_json": "AAAA", "seed": 2}],
+        "timings": {"inference": 1.0},
+    }
+    seen = []
+    task_queue.on_task_complete = lambda task: seen.append(task.result)
+    task_queue.add_tasks(sample_tasks[:1])
+    task_queue.start()
+    time.sleep(0.5)
+
+    assert seen[0]["data"][1]["b64_json"] == "AAAA"
+    assert task_queue.tasks[0].result == {"images": [{"seed": 1, "url": "https://example.com/a.png"}, {"seed": 2}]}
+
+def test_cancel_job(task_queue):
+    """测试按作业取消尚未开始的任务"""
+    background = [GenerationTask(prompt=f"后台{i}", model="model1", size="512x512") for i in range(3)]
+    interactive = [GenerationTask(prompt="交互", model="model1", size="512x512")]
+    task_queue.add_tasks(background, job="background")
+    task_queue.add_tasks(interactive, job="interactive", priority=10)
+    
+    assert {job["name"]: job["waiting"] for job in task_queue.jobs()} == {"background": 3, "interactive": 1}
+    assert task_queue.cancel_job("background") == 3
+    assert task_queue.tasks.counts()["已取消"] == 3
+    assert task_queue.queue.get_nowait().prompt == "交互"
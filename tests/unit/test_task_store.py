@@ -0,0 +1,64 @@
+import pytest
+
+from src.models.generation_task import GenerationTask
+from src.models.task_store import TaskStore, TaskView
+
+def test_append_from_task_and_dict():
+    """测试从任务对象和字典添加任务，缺少的字段使用默认值"""
+    store = TaskStore(capacity=1)
+    first = store.append(GenerationTask(prompt="测试1", model="模型A", size="512x512"))
+    second = store.append({"prompt": "测试2", "model": "模型A", "size": "1024x1024", "seed": 42, "guidance": 7.3})
+
+    assert len(store) == 2
+    assert isinstance(first, TaskView)
+    assert first.prompt == "测试1" and first.status == "等待中" and first.job == "default"
+    assert second["seed"] == 42 and second["guidance"] == 7.3 and second["steps"] == 20
+    assert store[-1].size == "1024x1024"
+    # 相同的模型名称只保存一份
+    assert store.column("model") == ["模型A", "模型A"]
+    assert len(store.strings) == 7  # 两个提示词、一个模型、两个尺寸、空的反向提示词和作业名
+    with pytest.raises(IndexError):
+        store[2]
+
+def test_views_write_through():
+    """测试通过视图修改的字段保存到存储中"""
+    store = TaskStore()
+    store.extend({"prompt": f"p{i}"} for i in range(3))
+
+    task = store[1]
+    task.status = "完成"
+    task.result = {"image_path": "a.png"}
+    task["prompt"] = "edited"
+
+    assert store[1].status == "完成"
+    assert store[1]["result"] == {"image_path": "a.png"}
+    assert store.column("prompt") == ["p0", "edited", "p2"]
+    assert dict(store[0])["result"] is None
+    with pytest.raises(ValueError):
+        task.status = "未知状态"
+
+def test_status_counts():
+    """测试按状态统计任务数"""
+    store = TaskStore()
+    store.extend({"prompt": str(i)} for i in range(10))
+    for index in (1, 3, 5):
+        store[index].status = "完成"
+    store[7].status = "失败"
+
+    counts = store.counts()
+    assert counts["等待中"] == 6 and counts["完成"] == 3 and counts["失败"] == 1
+    assert store.count("完成", "失败") == 4
+    assert store.indices("完成").tolist() == [1, 3, 5]
+
+def test_compact_storage_and_clear():
+    """测试大量任务按列紧凑保存，清空后释放"""
+    store = TaskStore()
+    store.extend({"prompt": f"prompt {i}", "model": "model", "size": "512x512"} for i in range(20000))
+
+    assert len(store) == 20000
+    assert store.nbytes < 100 * 20000 * 2  # 每个任务的列数据不超过100字节（含预留空间）
+    assert store[19999].prompt == "prompt 19999"
+
+    store.clear()
+    assert len(store) == 0
+    assert store.counts()["等待中"] == 0
@@ -0,0 +1,81 @@
+import json
+import pytest
+import responses
+from src.utils.telemetry import Histogram, Telemetry
+from src.utils.api_client import SiliconFlowAPI
+
+@pytest.fixture
+def telemetry():
+    return Telemetry()
+
+def test_histogram_quantiles():
+    """测试直方图统计和分位数估算"""
+    histogram = Histogram(buckets=(1.0, 2.0, 3.0))
+    for value in (0.5, 1.5, 1.5, 2.5):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(6.0)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert 1.0 <= histogram.quantile(0.5) <= 2.0
+    assert histogram.quantile(1.0) == pytest.approx(2.5)
+
+def test_span_records_duration(telemetry):
+    """测试计时上下文记录耗时和属性"""
+    with pytest.raises(ValueError):
+        with telemetry.span("http", model="test") as attrs:
+            attrs["status"] = 500
+            raise ValueError("失败时同样记录")
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["http"]["count"] == 1
+    span = telemetry.recent_spans()[-1]
+    assert span["stage"] == "http"
+    assert span["model"] == "test"
+    assert span["status"] == 500
+
+def test_export_formats(telemetry, tmp_path):
+    """测试导出JSON和Prometheus格式"""
+    telemetry.record("download", 0.02)
+    telemetry.record("download", 0.2)
+
+    data = json.loads(telemetry.to_json())
+    assert data["stages"]["download"]["count"] == 2
+
+    text = telemetry.to_prometheus()
+    assert 'image_generation_stage_seconds_bucket{stage="download",le="+Inf"} 2' in text
+    assert 'image_generation_stage_seconds_count{stage="download"} 2' in text
+
+    telemetry.export(tmp_path / "metrics.prom")
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8") == text
+
+@responses.activate
+def test_api_client_records_stages(telemetry):
+    """测试API客户端记录HTTP往返和推理耗时"""
+    responses.add(
+        responses.POST,
+        "https://api.siliconflow.cn/v1/images/generations",
+        json={"data": [{"url": "http://example.com/image.png"}], "timings": {"inference": 1.5}},
+        status=200
+    )
+    api = SiliconFlowAPI("test_key", telemetry=telemetry)
+    api.generate_image(prompt="test", model="test-model")
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["http"]["count"] == 1
+    assert snapshot["inference"]["sum"] == pytest.approx(1.5)
+    assert telemetry.recent_spans()[0]["status"] == 200
+
+def test_sink_receives_records_while_attached(telemetry):
+    """测试单次运行的统计只包含附加期间的记录"""
+    run = Telemetry()
+    telemetry.record("http", 0.1)
+    telemetry.add_sink(run)
+    telemetry.record("http", 0.2)
+    telemetry.remove_sink(run)
+    telemetry.record("http", 0.3)
+
+    assert telemetry.snapshot()["http"]["count"] == 3
+    assert run.snapshot()["http"]["count"] == 1
+    assert run.snapshot()["http"]["sum"] == 0.2
+
@@ -0,0 +1,66 @@
+import os
+import time
+
+from src.utils.trash import MANIFEST, Trash, configured_trash_dir
+
+def make_files(directory, count):
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"img_{i}.png"
+        path.write_bytes(b"x" * (i + 1))
+        paths.append(str(path))
+    return paths
+
+def test_move_and_restore(tmp_path):
+    """测试移入回收站后撤销，文件回到原处，批次目录被删除"""
+    paths = make_files(tmp_path / "output", 450)
+    trash = Trash(str(tmp_path / "trash"))
+    batch = trash.new_batch()
+    progress = []
+
+    assert trash.move(batch, paths + [str(tmp_path / "missing.png")], progress=lambda *p: progress.append(p)) == 450
+    assert progress == [(200, 451), (400, 451), (451, 451)]
+    assert not any(os.path.exists(path) for path in paths)
+    assert os.path.exists(os.path.join(batch, MANIFEST))
+
+    assert trash.restore(batch) == 450
+    assert all(os.path.getsize(path) == i + 1 for i, path in enumerate(paths))
+    assert trash.batches() == []
+
+def test_restore_keeps_conflicts_and_expire(tmp_path):
+    """测试原位置已有文件时保留在回收站，过期的批次被清除"""
+    paths = make_files(tmp_path / "output", 2)
+    trash = Trash(str(tmp_path / "trash"), max_age_days=1)
+    batch = trash.new_batch()
+    trash.move(batch, paths)
+    (tmp_path / "output" / "img_0.png").write_bytes(b"new")
+
+    assert trash.restore(batch) == 1
+    assert (tmp_path / "output" / "img_0.png").read_bytes() == b"new"
+    assert trash.batches() == [batch]
+
+    assert trash.expire() == 0
+    assert trash.expire(now=time.time() + 2 * 86400) == 1
+    assert trash.batches() == []
+
+def test_records_saved_with_batch(tmp_path):
+    """测试删除的记录随批次保存，只恢复一次；只有记录的批次恢复后删除"""
+    trash = Trash(str(tmp_path / "trash"))
+    batch = trash.new_batch()
+    removed = [(0, {"prompt": "a"}), (3, {"prompt": "b"})]
+    trash.save_records(batch, removed)
+
+    assert trash.info(batch)["records"] == 2
+    assert trash.info(batch)["files"] == 0
+    assert trash.take_records(batch) == removed
+    assert trash.take_records(batch) == []
+    assert trash.restore(batch) == 0
+    assert trash.batches() == []
+
+def test_configured_trash_dir(tmp_path):
+    """测试回收站默认位于输出目录下，可由 paths.trash_dir 指定"""
+    config = {"paths.output_dir": str(tmp_path), "paths.trash_dir": ""}
+    assert configured_trash_dir(config) == os.path.join(str(tmp_path), ".trash")
+    config["paths.trash_dir"] = str(tmp_path / "bin")
+    assert configured_trash_dir(config) == str(tmp_path / "bin")